@@ -0,0 +1,134 @@
+# agregador_velas.py — Timeframes superiores construidos localmente desde M1
+#
+# Se mantiene un solo stream M1 por símbolo (BufferVelas) y cada vela nueva
+# de M1 actualiza en memoria las velas de 5M, 15M, 30M, 1H y 4H:
+#   open = open de la primera M1 del bloque     high = máx(high)
+#   close = close de la última M1 del bloque    low  = mín(low)
+#   tick_volume = Σ tick_volume
+#
+# Bloques alineados en hora del broker (igual que MT5, que arma los
+# timeframes superiores a partir de sus barras M1):
+#   inicio_bloque = t - t mod (minutos · 60)
+#
+# Los buffers de los timeframes superiores se siembran una vez desde MT5
+# (60 velas de 4H son 14 400 M1); después solo se alimentan desde M1.
+#
+import numpy as np
+from buffer_velas import BufferVelas, CAMPOS_VELA
+from config import TIMEFRAME_MAP, BUFFER_VELAS_CAPACIDAD
+
+TF_BASE = "1M"
+
+
+def agregar_velas(velas, minutos):
+    """
+    Agrega velas M1 (ascendentes por time) a velas de `minutos`.
+
+    Args:
+        velas:   array estructurado de MT5 o dict de arrays con los campos de CAMPOS_VELA
+        minutos: int — minutos del timeframe destino
+
+    Returns:
+        dict[campo -> np.ndarray] — una vela por bloque presente en la entrada
+    """
+    tiempos = np.asarray(velas["time"], dtype=np.int64)
+    if len(tiempos) == 0:
+        return {campo: np.empty(0, dtype=dtype) for campo, dtype in CAMPOS_VELA}
+
+    segundos = minutos * 60
+    bloque = tiempos - tiempos % segundos
+    inicios = np.flatnonzero(np.r_[True, bloque[1:] != bloque[:-1]])
+    finales = np.r_[inicios[1:], len(tiempos)] - 1
+
+    return {
+        "time":        bloque[inicios],
+        "open":        np.asarray(velas["open"], dtype=np.float64)[inicios],
+        "high":        np.maximum.reduceat(np.asarray(velas["high"], dtype=np.float64), inicios),
+        "low":         np.minimum.reduceat(np.asarray(velas["low"], dtype=np.float64), inicios),
+        "close":       np.asarray(velas["close"], dtype=np.float64)[finales],
+        "tick_volume": np.add.reduceat(np.asarray(velas["tick_volume"], dtype=np.uint64), inicios),
+    }
+
+
+class AgregadorTimeframes:
+    """
+    Alimenta los buffers de timeframes superiores desde el stream M1 de cada símbolo.
+
+    Comparte el dict `buffers[(symbol, tf_name)]` con main: el buffer M1 de
+    cada símbolo vive ahí bajo TF_BASE (con capacidad suficiente para cubrir
+    el bloque de 4H en curso) y los derivados se actualizan en su lugar.
+
+    Uso:
+        agregador = AgregadorTimeframes(TIMEFRAMES_ACTIVOS, buffers)
+        agregador.sembrar(symbol, obtener_rates(symbol, 1, agregador.capacidad_m1))
+        agregador.actualizar(symbol, obtener_rates_desde(symbol, 1, agregador.ultimo_epoch(symbol)))
+    """
+    __slots__ = ("buffers", "capacidad_m1", "_minutos")
+
+    def __init__(self, timeframes, buffers, capacidad=BUFFER_VELAS_CAPACIDAD):
+        self.buffers = buffers
+        self._minutos = {
+            tf: TIMEFRAME_MAP[tf] for tf in timeframes
+            if tf != TF_BASE and tf in TIMEFRAME_MAP
+        }
+        # El M1 debe contener el bloque en curso del timeframe más largo
+        self.capacidad_m1 = max(capacidad, max(self._minutos.values(), default=1) + 1)
+
+    def gestiona(self, tf_name):
+        """True si el buffer de tf_name se alimenta desde M1 (no hace falta pedirlo a MT5)."""
+        return tf_name == TF_BASE or tf_name in self._minutos
+
+    def sembrar(self, symbol, rates_m1):
+        """Crea el buffer M1 del símbolo a partir de las últimas capacidad_m1 velas."""
+        if rates_m1 is None or len(rates_m1) == 0:
+            return False
+        self.buffers[(symbol, TF_BASE)] = BufferVelas.desde_rates(rates_m1, self.capacidad_m1)
+        return True
+
+    def ultimo_epoch(self, symbol):
+        """Time (epoch broker) de la última M1 del símbolo; None si no está sembrado."""
+        buffer = self.buffers.get((symbol, TF_BASE))
+        return buffer.ultimo_epoch if buffer is not None else None
+
+    def actualizar(self, symbol, rates_m1):
+        """
+        Incorpora velas M1 nuevas y rehace los bloques afectados de cada timeframe.
+
+        Solo se reagregan las M1 desde el inicio del bloque que contiene la
+        primera M1 modificada; la vela en formación de cada timeframe se
+        sobrescribe y las nuevas se agregan al final de su buffer.
+
+        Returns:
+            dict[tf_name -> int] — velas nuevas por timeframe (incluye TF_BASE)
+        """
+        m1 = self.buffers.get((symbol, TF_BASE))
+        if m1 is None or rates_m1 is None or len(rates_m1) == 0:
+            return {}
+
+        ultimo_previo = m1.ultimo_epoch
+        nuevas = {TF_BASE: m1.actualizar(rates_m1)}
+
+        tiempos_rates = np.asarray(rates_m1["time"], dtype=np.int64)
+        modificados = tiempos_rates[tiempos_rates >= ultimo_previo]
+        if len(modificados) == 0:
+            return nuevas
+        primera = int(modificados.min())
+
+        tiempos = m1.columna("time")
+        mas_antigua = int(tiempos[0])
+        for tf_name, minutos in self._minutos.items():
+            buffer = self.buffers.get((symbol, tf_name))
+            if buffer is None:
+                continue
+            segundos = minutos * 60
+            desde = primera - primera % segundos
+            if desde < mas_antigua:
+                # Bloque sin todas sus M1 en memoria: no sobrescribir con una vela parcial
+                desde = mas_antigua - mas_antigua % segundos + segundos
+            i = int(np.searchsorted(tiempos, desde))
+            if i >= len(tiempos):
+                nuevas[tf_name] = 0
+                continue
+            velas = {campo: m1.columna(campo)[i:] for campo, _ in CAMPOS_VELA}
+            nuevas[tf_name] = buffer.actualizar(agregar_velas(velas, minutos))
+        return nuevas
@@ -0,0 +1,199 @@
+# almacen_velas.py — Almacén local de velas en disco, columnar y memory-mapped
+#
+# Una carpeta por serie, {directorio}/{SYMBOL}_{TF}/, con un archivo binario
+# por campo de CAMPOS_VELA (time.bin, open.bin, ...). Cada archivo es un
+# array numpy crudo (little-endian) que solo crece por el final:
+#   - leer() mapea los archivos con np.memmap: sin copia ni parseo
+#   - 'time' está ordenado y es el índice: desde/hasta se resuelven con
+#     searchsorted sobre el propio archivo
+#
+# Al arrancar, main lee de aquí la ventana inicial y solo pide a MT5 el
+# hueco desde la última vela guardada. Los trabajos de investigación pueden
+# leer el mismo almacén sin tocar el broker.
+#
+# Si el proceso muere a mitad de una escritura, los campos pueden quedar con
+# longitudes distintas: al abrir la serie se recortan a la más corta.
+#
+import os
+import numpy as np
+from buffer_velas import CAMPOS_VELA
+
+# Dtypes en disco fijos (little-endian) para que el almacén sea portable
+DTYPES_ALMACEN = {campo: np.dtype(dtype).newbyteorder("<") for campo, dtype in CAMPOS_VELA}
+
+
+class AlmacenVelas:
+    """
+    Almacén append-only de velas OHLCV por (symbol, timeframe).
+
+    'time' se guarda en epoch del broker, igual que en los rates de MT5 y en
+    BufferVelas. Las lecturas devuelven dict[campo -> np.memmap] (solo
+    lectura), aceptado por BufferVelas.actualizar() y agregar_velas().
+
+    Uso:
+        almacen = AlmacenVelas("almacen_velas")
+        almacen.agregar("EURUSD", "1M", rates)
+        velas = almacen.ultimas("EURUSD", "1M", 60)
+        sesion = almacen.leer("EURUSD", "1M", desde=epoch_ini, hasta=epoch_fin)
+    """
+    __slots__ = ("directorio", "_n")
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._n = {}   # (symbol, tf_name) -> velas guardadas (validado al abrir)
+
+    def _carpeta(self, symbol, tf_name):
+        return os.path.join(self.directorio, f"{symbol}_{tf_name}")
+
+    def _ruta(self, symbol, tf_name, campo):
+        return os.path.join(self._carpeta(symbol, tf_name), f"{campo}.bin")
+
+    def series(self):
+        """Lista de (symbol, tf_name) con velas guardadas."""
+        if not os.path.isdir(self.directorio):
+            return []
+        claves = []
+        for nombre in sorted(os.listdir(self.directorio)):
+            symbol, _, tf_name = nombre.rpartition("_")
+            if symbol and self.num_velas(symbol, tf_name):
+                claves.append((symbol, tf_name))
+        return claves
+
+    def num_velas(self, symbol, tf_name):
+        """Velas guardadas de la serie (0 si no existe)."""
+        clave = (symbol, tf_name)
+        if clave not in self._n:
+            self._n[clave] = self._abrir(symbol, tf_name)
+        return self._n[clave]
+
+    def _abrir(self, symbol, tf_name):
+        """Longitud común de los campos; recorta los que quedaron más largos por una escritura cortada."""
+        tamaños = {}
+        for campo, dtype in DTYPES_ALMACEN.items():
+            ruta = self._ruta(symbol, tf_name, campo)
+            tamaños[campo] = os.path.getsize(ruta) // dtype.itemsize if os.path.exists(ruta) else 0
+        n = min(tamaños.values())
+        for campo, tamaño in tamaños.items():
+            if tamaño > n:
+                with open(self._ruta(symbol, tf_name, campo), "r+b") as f:
+                    f.truncate(n * DTYPES_ALMACEN[campo].itemsize)
+        return n
+
+    def ultimo_epoch(self, symbol, tf_name):
+        """Time (epoch broker) de la última vela guardada; None si la serie está vacía."""
+        n = self.num_velas(symbol, tf_name)
+        if n == 0:
+            return None
+        dtype = DTYPES_ALMACEN["time"]
+        with open(self._ruta(symbol, tf_name, "time"), "rb") as f:
+            f.seek((n - 1) * dtype.itemsize)
+            return int(np.frombuffer(f.read(dtype.itemsize), dtype=dtype)[0])
+
+    def leer(self, symbol, tf_name, desde=None, hasta=None):
+        """
+        Velas con desde <= time <= hasta (epoch broker; None = sin límite), sin copia.
+
+        Returns:
+            dict[campo -> np.memmap] de solo lectura, o None si no hay velas en el rango
+        """
+        n = self.num_velas(symbol, tf_name)
+        if n == 0:
+            return None
+        velas = {
+            campo: np.memmap(self._ruta(symbol, tf_name, campo), dtype=dtype, mode="r", shape=(n,))
+            for campo, dtype in DTYPES_ALMACEN.items()
+        }
+        tiempos = velas["time"]
+        ini = 0 if desde is None else int(np.searchsorted(tiempos, desde, side="left"))
+        fin = n if hasta is None else int(np.searchsorted(tiempos, hasta, side="right"))
+        if ini >= fin:
+            return None
+        return {campo: arr[ini:fin] for campo, arr in velas.items()}
+
+    def ultimas(self, symbol, tf_name, num_bars, hasta=None):
+        """Últimas num_bars velas guardadas con time <= hasta (dict[campo -> np.memmap]) o None."""
+        velas = self.leer(symbol, tf_name, hasta=hasta)
+        if velas is None:
+            return None
+        n = len(velas["time"])
+        return {campo: arr[max(0, n - num_bars):] for campo, arr in velas.items()}
+
+    def agregar(self, symbol, tf_name, rates):
+        """
+        Guarda velas de MT5 (array estructurado o dict de arrays), ascendentes por time.
+
+        Mismas reglas que BufferVelas.actualizar():
+        - time == última guardada: sobrescribe la vela (aún en formación)
+        - time >  última guardada: se agrega al final
+        - time <  última guardada: se funde con la serie (reescritura completa;
+          solo pasa al rellenar historia anterior a la guardada)
+
+        Returns:
+            int — número de velas nuevas guardadas
+        """
+        if rates is None or len(rates) == 0:
+            return 0
+        tiempos = np.asarray(rates["time"], dtype=np.int64)
+        if len(tiempos) == 0:
+            return 0
+
+        clave = (symbol, tf_name)
+        n = self.num_velas(symbol, tf_name)
+        ultimo = self.ultimo_epoch(symbol, tf_name)
+        if ultimo is not None and tiempos[0] < ultimo:
+            return self._fundir(symbol, tf_name, rates, tiempos)
+
+        os.makedirs(self._carpeta(symbol, tf_name), exist_ok=True)
+        sobrescribir = ultimo is not None and tiempos[0] == ultimo
+        for campo, dtype in DTYPES_ALMACEN.items():
+            valores = np.ascontiguousarray(np.asarray(rates[campo]), dtype=dtype)
+            with open(self._ruta(symbol, tf_name, campo), "r+b" if sobrescribir else "ab") as f:
+                if sobrescribir:
+                    f.seek((n - 1) * dtype.itemsize)
+                f.write(valores.tobytes())
+
+        nuevas = len(tiempos) - int(sobrescribir)
+        self._n[clave] = n + nuevas
+        return nuevas
+
+    def _fundir(self, symbol, tf_name, rates, tiempos):
+        """Une lo guardado con rates (rates gana en time repetido) y reescribe la serie."""
+        guardadas = self.leer(symbol, tf_name)
+        n = len(guardadas["time"])
+        todos = np.concatenate([np.asarray(guardadas["time"]), tiempos])
+        orden = np.argsort(todos, kind="stable")
+        ordenados = todos[orden]
+        # En cada time repetido se queda la última aparición (la de rates)
+        orden = orden[np.r_[ordenados[1:] != ordenados[:-1], True]]
+
+        columnas = {
+            campo: np.concatenate([np.asarray(guardadas[campo]), np.asarray(rates[campo], dtype=dtype)])[orden]
+            for campo, dtype in DTYPES_ALMACEN.items()
+        }
+        del guardadas
+        for campo, dtype in DTYPES_ALMACEN.items():
+            ruta = self._ruta(symbol, tf_name, campo)
+            with open(ruta + ".tmp", "wb") as f:
+                f.write(np.ascontiguousarray(columnas[campo], dtype=dtype).tobytes())
+            os.replace(ruta + ".tmp", ruta)
+
+        self._n[(symbol, tf_name)] = len(orden)
+        return len(orden) - n
+
+    def sincronizar(self, symbol, tf_name, buffer):
+        """
+        Guarda las velas de un BufferVelas posteriores (o igual) a la última almacenada.
+
+        Sirve para series alimentadas en memoria (p. ej. las agregadas desde M1).
+
+        Returns:
+            int — número de velas nuevas guardadas
+        """
+        if len(buffer) == 0:
+            return 0
+        tiempos = buffer.columna("time")
+        ultimo = self.ultimo_epoch(symbol, tf_name)
+        ini = 0 if ultimo is None else int(np.searchsorted(tiempos, ultimo, side="left"))
+        if ini >= len(tiempos):
+            return 0
+        return self.agregar(symbol, tf_name, {campo: buffer.columna(campo)[ini:] for campo, _ in CAMPOS_VELA})
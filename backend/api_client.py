@@ -1,9 +1,72 @@
 # api_client.py
+#
+# Transporte: una requests.Session por cliente (pool keep-alive, sin un
+# handshake TLS por llamada), timeouts (conexión, lectura) y cuerpos JSON
+# comprimidos con gzip a partir de HTTP_GZIP_MIN_BYTES. Si el servidor
+# rechaza la codificación (415, o 400 PGRST102: no pudo leer el cuerpo) se
+# reenvía sin comprimir y ningún cliente del proceso vuelve a usar gzip con
+# esa URL. Otros 400 son errores del payload y no se reenvían.
+#
+# Serialización con orjson si está instalado (acepta escalares y arrays
+# numpy); si no, json estándar con conversión de tipos numpy.
+#
+import gzip
+import json
+import time
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
-from config import SUPABASE_URL, SUPABASE_ANON_KEY, API_KEY
+from config import (
+    SUPABASE_URL, SUPABASE_ANON_KEY, API_KEY, VENTANA_VELAS,
+    HTTP_TIMEOUT_CONEXION_S, HTTP_TIMEOUT_LECTURA_S, HTTP_POOL_CONEXIONES, HTTP_GZIP_MIN_BYTES,
+    CONFIG_CACHE_TTL_S, CONFIG_TIMEOUT_S,
+)
 from utils import log_mensaje
 
+try:
+    import orjson
+except ImportError:  # opcional: fallback a json estándar
+    orjson = None
+
+# URLs de servidores que rechazaron un cuerpo gzip (compartido por los clientes del proceso)
+_SERVIDORES_SIN_GZIP = set()
+
+
+def _json_numpy(valor):
+    """default= de json.dumps para tipos numpy."""
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+
+def _rechaza_gzip(response):
+    """True si la respuesta a un cuerpo gzip indica que el servidor no lo decodificó."""
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    # PostgREST: PGRST102 = cuerpo JSON ilegible; el payload se serializó aquí, así que
+    # solo puede venir de que el servidor leyó los bytes comprimidos tal cual
+    try:
+        return response.json().get("code") == "PGRST102"
+    except (ValueError, AttributeError):
+        return False
+
+
+def serializar_json(payload):
+    """
+    Serializa un payload a bytes JSON (UTF-8, sin espacios).
+
+    Acepta escalares y arrays numpy sin convertirlos antes con float()/int().
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_json_numpy, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
 class SupabaseClient:
     def __init__(self):
         self.supabase_url = SUPABASE_URL
@@ -17,13 +80,95 @@ class SupabaseClient:
             "Content-Type": "application/json"
         }
 
+        # Sesión keep-alive: las llamadas reutilizan la conexión TLS del pool
+        self.sesion = requests.Session()
+        self.sesion.headers.update(self.headers)
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_CONEXIONES)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.mount("http://", adaptador)
+        self.timeout = (HTTP_TIMEOUT_CONEXION_S, HTTP_TIMEOUT_LECTURA_S)
+        self.gzip_min_bytes = HTTP_GZIP_MIN_BYTES
+
+        # Identidad y configuración cacheadas (ver obtener_configuracion)
+        self._user_id = None
+        self._config = None
+        self._config_version = None      # updated_at de user_config en el servidor
+        self._config_leida_en = None     # time.monotonic() de la última consulta; None = vencida
+        self._config_condicional = True  # False si el servidor no tiene get_user_config_if_changed
+
+        # Métricas por endpoint y de la última llamada (latencia, bytes JSON, bytes enviados)
+        self.metricas = {}
+        self.ultima_llamada = None
+
+    def _post(self, url, payload, timeout=None):
+        """
+        POST de un payload JSON por la sesión, comprimido si supera gzip_min_bytes.
+
+        Returns:
+            requests.Response (las excepciones de red se propagan al llamador)
+        """
+        cuerpo = serializar_json(payload)
+        comprimir = (0 < self.gzip_min_bytes <= len(cuerpo)
+                     and self.supabase_url not in _SERVIDORES_SIN_GZIP)
+        response = self._enviar(url, cuerpo, comprimir, timeout)
+
+        if comprimir and _rechaza_gzip(response):
+            # El servidor no acepta Content-Encoding: gzip en la petición
+            log_mensaje("El servidor rechaza cuerpos gzip: se envían sin comprimir", "WARNING")
+            _SERVIDORES_SIN_GZIP.add(self.supabase_url)
+            self.gzip_min_bytes = 0
+            response = self._enviar(url, cuerpo, False, timeout)
+        return response
+
+    def _enviar(self, url, cuerpo, comprimir, timeout=None):
+        datos = gzip.compress(cuerpo, compresslevel=5) if comprimir else cuerpo
+        headers = {"Content-Encoding": "gzip"} if comprimir else None
+        t0 = time.perf_counter()
+        response = self.sesion.post(url, data=datos, headers=headers, timeout=timeout or self.timeout)
+        self._registrar(url, time.perf_counter() - t0, len(cuerpo), len(datos), response.status_code)
+        return response
+
+    def _get(self, url, timeout=None):
+        t0 = time.perf_counter()
+        response = self.sesion.get(url, timeout=timeout or self.timeout)
+        self._registrar(url, time.perf_counter() - t0, 0, 0, response.status_code)
+        return response
+
+    def _registrar(self, url, segundos, bytes_json, bytes_enviados, status):
+        endpoint = url.split("/rest/v1/", 1)[-1].split("?", 1)[0]
+        self.ultima_llamada = {
+            "endpoint": endpoint, "segundos": segundos, "status": status,
+            "bytes_json": bytes_json, "bytes_enviados": bytes_enviados,
+        }
+        acumulado = self.metricas.setdefault(
+            endpoint, {"llamadas": 0, "segundos": 0.0, "bytes_json": 0, "bytes_enviados": 0}
+        )
+        acumulado["llamadas"] += 1
+        acumulado["segundos"] += segundos
+        acumulado["bytes_json"] += bytes_json
+        acumulado["bytes_enviados"] += bytes_enviados
+
+    def resumen_ultima_llamada(self):
+        """Texto corto con latencia y bytes de la última llamada (para el log del ciclo)."""
+        u = self.ultima_llamada
+        if u is None:
+            return ""
+        texto = f"{u['endpoint']} {u['segundos'] * 1e3:.0f} ms"
+        if u["bytes_json"]:
+            texto += f" | {u['bytes_json'] / 1024:.1f} KB JSON → {u['bytes_enviados'] / 1024:.1f} KB enviados"
+        return texto
+
     def obtener_user_id(self):
         """
-        Obtiene user_id desde API_KEY usando función RPC de Supabase
+        Obtiene user_id desde API_KEY usando función RPC de Supabase.
+        Se resuelve una vez por cliente; las llamadas siguientes no van a la red.
 
         Returns:
             str: UUID del usuario o None si falla
         """
+        if self._user_id is not None:
+            return self._user_id
+
         if not self.api_key:
             log_mensaje("API_KEY no configurada en .env", "ERROR")
             return None
@@ -32,11 +177,12 @@ class SupabaseClient:
         payload = {"api_key_param": self.api_key}
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._post(url, payload)
 
             if response.status_code == 200:
                 user_id = response.json()
                 if user_id:
+                    self._user_id = user_id
                     return user_id
                 else:
                     log_mensaje("API_KEY no válida o usuario inactivo", "ERROR")
@@ -49,37 +195,84 @@ class SupabaseClient:
             log_mensaje(f"Excepción obteniendo user_id: {e}", "ERROR")
             return None
 
-    def obtener_configuracion(self):
+    def obtener_configuracion(self, forzar=False):
         """
-        Consulta configuración personalizada del usuario desde Supabase
+        Configuración personalizada del usuario, cacheada CONFIG_CACHE_TTL_S segundos.
+
+        Dentro del TTL no hay llamada HTTP. Al vencer se hace una lectura
+        condicional (get_user_config_if_changed con la versión en caché): si
+        no cambió, el servidor no devuelve la fila. Sin ese RPC en el
+        servidor se lee user_config con el user_id cacheado. Si la red falla
+        o tarda más de CONFIG_TIMEOUT_S se sigue usando la última leída; si
+        aún no se leyó ninguna, la caché sigue vencida y la próxima llamada
+        vuelve a consultar (sin esperar el TTL).
+
+        Args:
+            forzar: bool — ignorar el TTL (también tras invalidar_configuracion())
 
         Returns:
-            dict: Configuración del usuario o None si falla
+            dict: Configuración del usuario o None si no hay
         """
-        user_id = self.obtener_user_id()
-        if not user_id:
-            return None
-
-        url = f"{self.supabase_url}/rest/v1/user_config?user_id=eq.{user_id}"
+        ahora = time.monotonic()
+        if not forzar and self._config_leida_en is not None and ahora - self._config_leida_en < CONFIG_CACHE_TTL_S:
+            return self._config
 
         try:
-            response = requests.get(url, headers=self.headers)
+            self._refrescar_configuracion()
+        except Exception as e:
+            if self._config is None:
+                log_mensaje(f"Excepción obteniendo config: {e}", "ERROR")
+                return None
+            log_mensaje(f"Config no disponible ({e}); se usa la última leída", "WARNING")
+        self._config_leida_en = ahora
+        return self._config
+
+    def invalidar_configuracion(self):
+        """
+        Marca la configuración como vencida: la próxima obtener_configuracion() consulta al servidor.
+
+        Punto de entrada para eventos de cambio (p. ej. realtime de Supabase sobre user_config).
+        """
+        self._config_leida_en = None
+
+    def _refrescar_configuracion(self):
+        """Lee la configuración del servidor y actualiza la caché (las excepciones se propagan)."""
+        timeout = (HTTP_TIMEOUT_CONEXION_S, CONFIG_TIMEOUT_S)
+        if self._config_condicional:
+            url = f"{self.supabase_url}/rest/v1/rpc/get_user_config_if_changed"
+            payload = {"api_key_param": self.api_key, "version_param": self._config_version}
+            response = self._post(url, payload, timeout=timeout)
 
             if response.status_code == 200:
-                data = response.json()
-                if data and len(data) > 0:
-                    log_mensaje("Configuración cargada desde Supabase", "SUCCESS")
-                    return data[0]
-                else:
-                    log_mensaje("No se encontró configuración del usuario", "WARNING")
-                    return None
-            else:
-                log_mensaje(f"Error obteniendo config: {response.status_code}", "ERROR")
-                return None
+                datos = response.json()
+                if not datos:
+                    self._guardar_configuracion(None, None)
+                elif datos.get("cambiado"):
+                    self._guardar_configuracion(datos.get("config"), datos.get("version"))
+                return
+            if response.status_code != 404:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            # RPC sin instalar (migración sección 6 pendiente): lectura directa de la tabla
+            self._config_condicional = False
 
-        except Exception as e:
-            log_mensaje(f"Excepción obteniendo config: {e}", "ERROR")
-            return None
+        user_id = self.obtener_user_id()
+        if not user_id:
+            raise RuntimeError("user_id no disponible")
+
+        url = f"{self.supabase_url}/rest/v1/user_config?user_id=eq.{user_id}"
+        response = self._get(url, timeout=timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        data = response.json()
+        self._guardar_configuracion(data[0] if data else None, None)
+
+    def _guardar_configuracion(self, config, version):
+        if config is None:
+            if self._config is not None or self._config_leida_en is None:
+                log_mensaje("No se encontró configuración del usuario", "WARNING")
+        elif config != self._config:
+            log_mensaje("Configuración cargada desde Supabase", "SUCCESS")
+        self._config, self._config_version = config, version
 
     def enviar_datos(self, rows):
         """
@@ -99,7 +292,7 @@ class SupabaseClient:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._post(url, payload)
 
             if response.status_code == 200:
                 result = response.json()
@@ -116,6 +309,43 @@ class SupabaseClient:
             log_mensaje(f"Excepción enviando datos: {e}", "ERROR")
             return False
 
+    def confirmar_filas(self, rows, ventana=VENTANA_VELAS):
+        """
+        Upsert de filas + recorte de ventana en un solo RPC (commit_cycle_data).
+
+        En una transacción el servidor hace el upsert de todas las filas y
+        recorta cada (symbol, timeframe) tocado a sus `ventana` velas más
+        recientes; reemplaza un delete_oldest_candle + enviar_datos por serie.
+
+        Returns:
+            bool: True si el commit fue exitoso (o no había filas), False si falla
+        """
+        if not rows:
+            return True
+
+        url = f"{self.supabase_url}/rest/v1/rpc/commit_cycle_data"
+        payload = {
+            "api_key_param": self.api_key,
+            "rows_param": rows,
+            "window_param": ventana,
+        }
+
+        try:
+            response = self._post(url, payload)
+
+            if response.status_code == 200:
+                if response.json():
+                    return True
+                log_mensaje("API_KEY no válida al enviar ciclo", "ERROR")
+                return False
+            else:
+                log_mensaje(f"Error enviando ciclo: {response.status_code} - {response.text}", "ERROR")
+                return False
+
+        except Exception as e:
+            log_mensaje(f"Excepción enviando ciclo: {e}", "ERROR")
+            return False
+
     def delete_user_data(self):
         """
         Elimina TODOS los datos del usuario en Supabase.
@@ -128,7 +358,7 @@ class SupabaseClient:
         payload = {"api_key_param": self.api_key}
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._post(url, payload)
 
             if response.status_code == 200:
                 return True
@@ -160,7 +390,7 @@ class SupabaseClient:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._post(url, payload)
 
             if response.status_code == 200:
                 return True
@@ -0,0 +1,205 @@
+# bench_build_rows.py — Benchmark: build_rows columnar vs versión original con iterrows()
+#
+# Ejecutar: python bench_build_rows.py
+# No requiere MT5 ni Supabase. Mide ambas implementaciones sobre el mismo
+# DataFrame sintético (60, 1k y 100k filas) y verifica que la salida coincida.
+#
+import time
+import numpy as np
+import serializacion
+import pandas as pd
+from calculos_rendlog import clasificar_regimen
+from calculos_gbm import calcular_gbm_anomalia, _campos_nulos
+from calculos_multipair import es_movimiento_sistemico
+from calculos_fusion import calcular_estadisticas_df
+from config import DEFAULT_CONFIG
+from serializacion import build_rows
+
+
+# ============================================================
+# Implementación original (referencia, recorrido fila a fila)
+# ============================================================
+
+def _safe_float_legacy(value, default=0.0):
+    """Convierte a float seguro para JSON. NaN/Inf -> default."""
+    if value is None or pd.isna(value) or np.isinf(value):
+        return default
+    return float(value)
+
+
+def build_rows_iterrows(df_slice, config, timeframe_name, symbol, pca_result=None, exposure=None):
+    """
+    Construye lista de dicts para enviar a Supabase.
+
+    Novedades v4.1:
+      - Agrega campo 'symbol' al nivel de fila
+      - Agrega campos GBM (gbm_prob_reversion, etc.) en rendlog
+      - Agrega campos PCA (pca_pc1_loading, pca_es_sistemico, etc.) en rendlog
+    """
+    if exposure is None:
+        exposure = {}
+
+    pca_es_sistemico = es_movimiento_sistemico(pca_result, symbol)
+    pc1_loading = None
+    pc1_varianza = None
+    if pca_result and pca_result.get("pca_valido"):
+        pc1_loading  = pca_result["pc1_loadings"].get(symbol)
+        pc1_varianza = pca_result.get("pc1_varianza")
+
+    rows = []
+    for _, row in df_slice.iterrows():
+        z_score = 0.0
+        media_valid     = not pd.isna(row.get('media', None))
+        std_valid       = not pd.isna(row.get('std', None)) and row['std'] > 0
+        std_static_valid = not pd.isna(row.get('std_static', None)) and row['std_static'] > 0
+
+        if std_valid and media_valid:
+            z_score = _safe_float_legacy((row['log_return'] - row['media']) / row['std'])
+
+        z_score_static = 0.0
+        if std_static_valid and media_valid:
+            z_score_static = _safe_float_legacy((row['log_return'] - row['media']) / row['std_static'])
+
+        # Señal base (umbral de z-score)
+        senal = None
+        if z_score < config.get('umbral_sigma_compra', -2.0):
+            senal = "COMPRA"
+        elif z_score > config.get('umbral_sigma_venta', 2.0):
+            senal = "VENTA"
+
+        # Supresión por PCA (movimiento sistémico USD)
+        senal_suprimida_pca = False
+        if senal is not None and pca_es_sistemico:
+            senal = None
+            senal_suprimida_pca = True
+
+        # GBM: solo en velas con anomalía
+        media_val = _safe_float_legacy(row.get('media'))
+        std_val   = _safe_float_legacy(row.get('std'))
+        close_val = _safe_float_legacy(row.get('close'))
+        gbm_fields = calcular_gbm_anomalia(
+            z_score=z_score,
+            mu=media_val,
+            sigma_ewma=std_val,
+            precio_close=close_val,
+            timeframe=timeframe_name,
+        )
+
+        er_val = row.get('efficiency_ratio', np.nan)
+
+        rows.append({
+            "symbol": symbol,
+            "timeframe": timeframe_name,
+            "data_timestamp": row['time'].isoformat(),
+            "rendlog": {
+                # Retorno y señal
+                "z_score":  z_score,
+                "senal":    senal,
+                "log_return": _safe_float_legacy(row['log_return']),
+                "media":    _safe_float_legacy(row.get('media')),
+                "std":      _safe_float_legacy(row.get('std')),
+                # Bandas
+                "banda_2sigma_superior": _safe_float_legacy(row.get('banda_2sigma_superior')),
+                "banda_2sigma_inferior": _safe_float_legacy(row.get('banda_2sigma_inferior')),
+                "banda_3sigma_superior": _safe_float_legacy(row.get('banda_3sigma_superior')),
+                "banda_3sigma_inferior": _safe_float_legacy(row.get('banda_3sigma_inferior')),
+                # Diagnóstico EWMA vs estático
+                "z_score_static": z_score_static,
+                "sigma_ewma":     _safe_float_legacy(row.get('std')),
+                "sigma_static":   _safe_float_legacy(row.get('std_static')),
+                "vol_ratio":      _safe_float_legacy(row.get('vol_ratio'), default=1.0),
+                # Régimen
+                "er":      _safe_float_legacy(er_val) if not pd.isna(er_val) else None,
+                "regimen": clasificar_regimen(er_val),
+                # Supresión de señal
+                "senal_suprimida":     senal_suprimida_pca or (
+                    senal is None and (
+                        (z_score < config.get('umbral_sigma_compra', -2.0)) or
+                        (z_score > config.get('umbral_sigma_venta', 2.0))
+                    )
+                ),
+                "senal_suprimida_pca": senal_suprimida_pca,
+                # GBM Monte Carlo (None en velas sin anomalía)
+                **gbm_fields,
+                # PCA multi-par
+                "pca_pc1_loading":  round(pc1_loading, 4) if pc1_loading is not None else None,
+                "pca_pc1_varianza": round(pc1_varianza, 4) if pc1_varianza is not None else None,
+                "pca_es_sistemico": pca_es_sistemico,
+                "exposure_usd_alto": bool(exposure.get(symbol, False)),
+            },
+            "orderflow": {
+                "delta":       int(row['delta']) if not pd.isna(row.get('delta', None)) else 0,
+                "vol_relativo": float(row['volumen_relativo']) if not pd.isna(row.get('volumen_relativo', None)) else 1.0,
+                "anomalia_vol": bool(row['anomalia_volumen']) if not pd.isna(row.get('anomalia_volumen', None)) else False,
+                "z_score_vol":  float(row['z_score_volumen']) if not pd.isna(row.get('z_score_volumen', None)) else 0,
+                "tick_volume":  int(row['tick_volume']) if not pd.isna(row.get('tick_volume', None)) else 0,
+            }
+        })
+    return rows
+
+
+# ============================================================
+# Benchmark
+# ============================================================
+
+def make_df_calculado(n, seed=0):
+    """DataFrame sintético ya pasado por el motor estadístico."""
+    rng = np.random.default_rng(seed)
+    close = 1.08 + np.cumsum(rng.normal(0, 0.0005, n))
+    df = pd.DataFrame({
+        'time':        pd.date_range('2026-01-01', periods=n, freq='1min'),
+        'open':        np.r_[close[0], close[:-1]],
+        'high':        close + 0.0001,
+        'low':         close - 0.0001,
+        'close':       close,
+        'tick_volume': rng.integers(10, 500, n).astype(np.uint64),
+    })
+    df = calcular_estadisticas_df(df, ventana=20, timeframe="1M", symbol="EURUSD")
+    return df.dropna(subset=['log_return'])
+
+
+def _medir(func, *args, repeticiones=3):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        func(*args)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def _tabla(titulo):
+    pca = {"pca_valido": True, "pc1_varianza": 0.7, "pc1_loadings": {"EURUSD": 0.8}}
+    print(f"\n{titulo}")
+    print(f"{'filas':>8} | {'iterrows (ms)':>14} | {'columnar (ms)':>14} | {'speedup':>8}")
+    print("-" * 56)
+    for n in (60, 1_000, 100_000):
+        df = make_df_calculado(n)
+        args = (df, DEFAULT_CONFIG, "1M", "EURUSD", pca, {"EURUSD": True})
+
+        np.random.seed(0)
+        esperado = build_rows_iterrows(*args)
+        np.random.seed(0)
+        obtenido = build_rows(*args)
+        assert esperado == obtenido, f"Salida distinta con {n} filas"
+
+        rep = 1 if n >= 100_000 else 5
+        t_old = _medir(build_rows_iterrows, *args, repeticiones=rep)
+        t_new = _medir(build_rows, *args, repeticiones=rep)
+        print(f"{n:>8} | {t_old * 1e3:>14.2f} | {t_new * 1e3:>14.2f} | {t_old / t_new:>7.1f}x")
+
+
+def main():
+    _tabla("build_rows completo (incluye GBM en velas con |z| > umbral)")
+
+    # Solo serialización: GBM reemplazado por campos nulos en ambas versiones
+    global calcular_gbm_anomalia
+    original = calcular_gbm_anomalia
+    calcular_gbm_anomalia = serializacion.calcular_gbm_anomalia = lambda **_: _campos_nulos()
+    try:
+        _tabla("Solo serialización (GBM desactivado)")
+    finally:
+        calcular_gbm_anomalia = serializacion.calcular_gbm_anomalia = original
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# bench_flujo_ticks.py — Benchmark: ingesta de ticks por lote (regla del tick + agregación 6 TFs)
+#
+# Ejecutar: python bench_flujo_ticks.py
+# No requiere MT5 ni Supabase. Simula los 4 símbolos con lotes del tamaño
+# de un ciclo M1 y reporta ticks/s frente a la tasa pico de una sesión.
+#
+import time
+import numpy as np
+from flujo_ticks import MotorFlujoTicks, DTYPE_TICKS
+from config import SYMBOLS_ACTIVOS, TIMEFRAMES_ACTIVOS
+
+INICIO_MSC = 1_772_409_600_000
+TICKS_PICO_POR_SEG = 50   # Orden de magnitud en la apertura de Londres/NY por par
+
+
+def _ticks(n, seed):
+    rng = np.random.default_rng(seed)
+    ticks = np.empty(n, dtype=DTYPE_TICKS)
+    ticks["time_msc"] = INICIO_MSC + np.cumsum(rng.integers(0, 2 * 1000 // TICKS_PICO_POR_SEG, n))
+    mid = 1.09 + np.cumsum(rng.choice([-1, 0, 1], n)) * 0.00001
+    ticks["bid"] = mid - 0.00001
+    ticks["ask"] = mid + 0.00001
+    return ticks
+
+
+def main():
+    print(f"{'ticks/lote':>11} | {'ticks/s':>12} | {'× pico 4 pares':>15}")
+    print("-" * 45)
+    for por_lote in (60 * TICKS_PICO_POR_SEG, 600 * TICKS_PICO_POR_SEG):
+        datos = {s: _ticks(20 * por_lote, seed=i) for i, s in enumerate(SYMBOLS_ACTIVOS)}
+        motor = MotorFlujoTicks(TIMEFRAMES_ACTIVOS)
+        total = 0
+        t0 = time.perf_counter()
+        for inicio in range(0, 20 * por_lote, por_lote):
+            for symbol, ticks in datos.items():
+                total += motor.ingerir(symbol, ticks[inicio:inicio + por_lote])
+        duracion = time.perf_counter() - t0
+        tasa = total / duracion
+        print(f"{por_lote:>11,} | {tasa:>12,.0f} | {tasa / (TICKS_PICO_POR_SEG * len(datos)):>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
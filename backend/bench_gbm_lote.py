@@ -0,0 +1,47 @@
+# bench_gbm_lote.py — Benchmark: GBM Monte Carlo por fila vs lote (tensor 3-D)
+#
+# Ejecutar: python bench_gbm_lote.py
+# No requiere MT5 ni Supabase. Reporta simulaciones (anomalías) por segundo
+# con horizontes mezclados de todos los timeframes.
+#
+import time
+import numpy as np
+from calculos_gbm import simular_gbm, simular_gbm_lote, gbm_analitico
+from config import GBM_N_PATHS, GBM_HORIZONTE_VELAS
+
+
+def _anomalias(m, seed=0):
+    rng = np.random.default_rng(seed)
+    precios    = rng.choice([1.09, 1.27, 150.0, 1.36], m)
+    mus        = rng.normal(0, 0.0001, m)
+    sigmas     = rng.uniform(0.0003, 0.0015, m)
+    horizontes = rng.choice(list(GBM_HORIZONTE_VELAS.values()), m)
+    return precios, mus, sigmas, horizontes
+
+
+def main():
+    print(f"GBM_N_PATHS = {GBM_N_PATHS}")
+    print(f"{'anomalías':>10} | {'por fila (sim/s)':>17} | {'lote (sim/s)':>13} | {'analítico (sim/s)':>18}")
+    print("-" * 70)
+    for m in (24, 240, 2400):
+        precios, mus, sigmas, horizontes = _anomalias(m)
+
+        t0 = time.perf_counter()
+        for i in range(m):
+            simular_gbm(precios[i], mus[i], sigmas[i], n_paths=GBM_N_PATHS, n_horizonte=int(horizontes[i]))
+        t_fila = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        simular_gbm_lote(precios, mus, sigmas, horizontes, rng=np.random.default_rng(0))
+        t_lote = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for i in range(m):
+            gbm_analitico(precios[i], mus[i], sigmas[i], n_horizonte=int(horizontes[i]))
+        t_an = time.perf_counter() - t0
+
+        print(f"{m:>10} | {m / t_fila:>17,.0f} | {m / t_lote:>13,.0f} | {m / t_an:>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
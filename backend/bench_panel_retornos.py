@@ -0,0 +1,61 @@
+# bench_panel_retornos.py — Benchmark: alineación de retornos con pd.merge encadenado vs PanelRetornos
+#
+# Ejecutar: python bench_panel_retornos.py
+# No requiere MT5 ni Supabase. Por cada tamaño de universo mide el costo por
+# actualización de un TF: la versión anterior (copiar, renombrar y unir N
+# DataFrames de 60 velas + dropna) frente al panel mantenido en vivo (escribir
+# la columna de cada símbolo con vela nueva + matriz()).
+#
+import time
+import numpy as np
+import pandas as pd
+from panel_retornos import PanelRetornos
+from config import VENTANA_VELAS
+
+
+def _merge_encadenado(dataframes):
+    """construir_matriz_retornos anterior (sin el umbral de filas mínimas)."""
+    merged = None
+    for sym, df in dataframes.items():
+        df = df[["time", "log_return"]].copy().rename(columns={"log_return": sym})
+        merged = df if merged is None else pd.merge(merged, df, on="time", how="inner")
+    merged = merged.dropna(subset=list(dataframes))
+    return merged[list(dataframes)].values.astype(np.float64)
+
+
+def _medir(fn, repeticiones):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - t0) / repeticiones
+
+
+def main():
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2026-03-02", periods=VENTANA_VELAS + 1, freq="min")
+    epochs = times.to_numpy(dtype="datetime64[s]").view(np.int64)
+
+    print(f"{'símbolos':>9} | {'pd.merge (ms)':>14} | {'panel (ms)':>11} | {'speedup':>8}")
+    print("-" * 52)
+    for n_symbols in (4, 12, 28, 40):
+        symbols = [f"S{i:02d}" for i in range(n_symbols)]
+        retornos = rng.normal(0, 0.0005, (len(times), n_symbols))
+        dfs = {s: pd.DataFrame({"time": times[1:], "log_return": retornos[1:, j]}) for j, s in enumerate(symbols)}
+
+        panel = PanelRetornos(symbols, VENTANA_VELAS)
+        for j, s in enumerate(symbols):
+            panel.actualizar(s, epochs[:-1], retornos[:-1, j])
+
+        def _panel():
+            for j, s in enumerate(symbols):
+                panel.actualizar(s, epochs[-VENTANA_VELAS:], retornos[-VENTANA_VELAS:, j])
+            return panel.matriz()[0]
+
+        assert np.array_equal(_panel(), _merge_encadenado(dfs))
+        t_merge = _medir(lambda: _merge_encadenado(dfs), 20)
+        t_panel = _medir(_panel, 200)
+        print(f"{n_symbols:>9} | {t_merge * 1e3:>14.2f} | {t_panel * 1e3:>11.3f} | {t_merge / t_panel:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# bench_pca_movil.py — Benchmark: PCA por vela desde cero vs covarianza Welford + PC1 por potencia
+#
+# Ejecutar: python bench_pca_movil.py
+# No requiere MT5 ni Supabase. Recorre 600 velas con una ventana de
+# VENTANA_VELAS filas alineadas (por ciclo entra una vela, sale la más
+# antigua y se corrige la que estaba en formación) y mide el costo por vela
+# de calcular_covarianza + calcular_pca frente a PCAMovil.actualizar.
+#
+import time
+import numpy as np
+from calculos_multipair import calcular_covarianza, calcular_pca
+from pca_movil import PCAMovil
+from config import VENTANA_VELAS
+
+N_VELAS = 600
+
+
+def _retornos(n, n_symbols, seed=0):
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 0.0005, n)
+    cargas = rng.uniform(-1, 1, n_symbols)
+    return factor[:, None] * cargas + rng.normal(0, 0.0002, (n, n_symbols))
+
+
+def _ventanas(retornos):
+    """(R, epochs) de cada ciclo: la última fila se corrige en el ciclo siguiente."""
+    epochs = np.arange(len(retornos), dtype=np.int64)
+    formacion = retornos + np.random.default_rng(1).normal(0, 0.0001, retornos.shape)
+    for t in range(VENTANA_VELAS, len(retornos)):
+        R = retornos[t - VENTANA_VELAS + 1:t + 1].copy()
+        R[-1] = formacion[t]
+        yield R, epochs[t - VENTANA_VELAS + 1:t + 1]
+
+
+def main():
+    print(f"{'símbolos':>9} | {'eigh (µs/vela)':>15} | {'incremental (µs/vela)':>22} | {'speedup':>8} | {'max |Δλ1/λ1|':>13}")
+    print("-" * 80)
+    for n_symbols in (4, 12, 28, 40):
+        symbols = [f"S{i:02d}" for i in range(n_symbols)]
+        ventanas = list(_ventanas(_retornos(N_VELAS, n_symbols)))
+
+        t0 = time.perf_counter()
+        exactos = [calcular_pca(calcular_covarianza(R), symbols) for R, _ in ventanas]
+        t_exacto = (time.perf_counter() - t0) / len(ventanas)
+
+        movil = PCAMovil()
+        t0 = time.perf_counter()
+        incrementales = [movil.actualizar(R, symbols, ep)[1] for R, ep in ventanas]
+        t_movil = (time.perf_counter() - t0) / len(ventanas)
+
+        error = max(abs(a["pc1_varianza"] - b["pc1_varianza"]) / b["pc1_varianza"]
+                    for a, b in zip(incrementales, exactos))
+        print(f"{n_symbols:>9} | {t_exacto * 1e6:>15.0f} | {t_movil * 1e6:>22.0f} | "
+              f"{t_exacto / t_movil:>7.1f}x | {error:>13.1e}")
+
+
+if __name__ == "__main__":
+    main()
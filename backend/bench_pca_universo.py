@@ -0,0 +1,52 @@
+# bench_pca_universo.py — Benchmark: PCA clásico (Σ muestral + eigh completo) vs modo universo
+#
+# Ejecutar: python bench_pca_universo.py
+# No requiere MT5 ni Supabase. Para SYMBOLS_UNIVERSO (28 pares + metales) con
+# ventanas cortas mide el costo por llamada de calcular_covarianza +
+# calcular_pca frente a calcular_pca_universo (shrinkage + top-k), el número
+# de condición de cada matriz y cuántos pares marca sistémicos cada uno con
+# un shock de USD y otro de JPY.
+#
+import time
+import numpy as np
+from calculos_multipair import calcular_covarianza, calcular_pca, es_movimiento_sistemico
+from pca_universo import calcular_pca_universo, correlacion_shrinkage, matriz_monedas
+from config import SYMBOLS_UNIVERSO
+
+REPETICIONES = 300
+
+
+def _retornos(n, seed=0):
+    rng = np.random.default_rng(seed)
+    monedas, D = matriz_monedas(SYMBOLS_UNIVERSO)
+    f = rng.normal(0, 0.0002, (n, len(monedas)))
+    f[:, monedas.index("USD")] += rng.normal(0, 0.0015, n)
+    f[:, monedas.index("JPY")] += rng.normal(0, 0.0010, n)
+    return f @ D.T + rng.normal(0, 0.0001, (n, len(SYMBOLS_UNIVERSO)))
+
+
+def _medir(fn):
+    t0 = time.perf_counter()
+    for _ in range(REPETICIONES):
+        resultado = fn()
+    return (time.perf_counter() - t0) / REPETICIONES, resultado
+
+
+def main():
+    print(f"{'velas':>6} | {'clásico (µs)':>13} | {'universo (µs)':>14} | {'cond Σ':>9} | {'cond C*':>8} | "
+          f"{'sistémicos clás/univ':>21}")
+    print("-" * 88)
+    for n_velas in (30, 45, 60):
+        R = _retornos(n_velas)
+        t_clasico, pca_c = _medir(lambda: calcular_pca(calcular_covarianza(R), SYMBOLS_UNIVERSO))
+        t_universo, (_, pca_u) = _medir(lambda: calcular_pca_universo(R, SYMBOLS_UNIVERSO))
+        cond_muestral = np.linalg.cond(np.corrcoef(R.T))
+        cond_shrink = np.linalg.cond(correlacion_shrinkage(R)[0])
+        n_c = sum(es_movimiento_sistemico(pca_c, s) for s in SYMBOLS_UNIVERSO)
+        n_u = sum(es_movimiento_sistemico(pca_u, s) for s in SYMBOLS_UNIVERSO)
+        print(f"{n_velas:>6} | {t_clasico * 1e6:>13.0f} | {t_universo * 1e6:>14.0f} | {cond_muestral:>9.1e} | "
+              f"{cond_shrink:>8.1f} | {n_c:>10}/{n_u:<10}")
+
+
+if __name__ == "__main__":
+    main()
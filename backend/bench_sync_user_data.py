@@ -0,0 +1,145 @@
+# bench_sync_user_data.py — Benchmark: sync_user_data set-based vs versión con loop por fila
+#
+# Ejecutar: BENCH_PG_DSN=postgresql://postgres@localhost/postgres python bench_sync_user_data.py
+# Requiere un Postgres local y psycopg (pip install psycopg); no toca Supabase.
+# Crea un esquema temporal con user_profiles/user_data, carga sync_user_data
+# tal cual está en supabase_migrations.sql y la versión anterior con
+# FOR ... LOOP, y mide filas/s con la carga inicial (4 pares × 6 TFs × 60
+# velas) y con el reenvío del mismo lote sin cambios.
+#
+import os
+import re
+import json
+import time
+import uuid
+import psycopg
+from bench_build_rows import make_df_calculado
+from serializacion import build_rows
+from config import DEFAULT_CONFIG, SYMBOLS_ACTIVOS, TIMEFRAMES_ACTIVOS, VENTANA_VELAS
+
+DSN = os.getenv("BENCH_PG_DSN", "postgresql://postgres@localhost/postgres")
+ESQUEMA = "bench_sync_user_data"
+MIGRACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "supabase_migrations.sql")
+
+TABLAS = """
+CREATE TABLE user_profiles (id UUID PRIMARY KEY, api_key TEXT UNIQUE);
+CREATE TABLE user_data (
+  id             BIGSERIAL PRIMARY KEY,
+  user_id        UUID NOT NULL,
+  symbol         TEXT NOT NULL DEFAULT 'EURUSD',
+  timeframe      TEXT NOT NULL,
+  data_timestamp TIMESTAMPTZ NOT NULL,
+  rendlog        JSONB,
+  orderflow      JSONB,
+  UNIQUE (user_id, symbol, timeframe, data_timestamp)
+);
+"""
+
+# Versión anterior (referencia): un INSERT ... ON CONFLICT por fila
+SYNC_LOOP = """
+CREATE FUNCTION sync_user_data_loop(api_key_param TEXT, rows_param JSONB)
+RETURNS BOOLEAN AS $$
+DECLARE
+  found_user_id UUID;
+  row_data      JSONB;
+BEGIN
+  SELECT id INTO found_user_id FROM user_profiles WHERE api_key = api_key_param;
+  IF found_user_id IS NULL THEN
+    RETURN FALSE;
+  END IF;
+
+  FOR row_data IN SELECT * FROM jsonb_array_elements(rows_param)
+  LOOP
+    INSERT INTO user_data (
+      user_id, symbol, timeframe, data_timestamp, rendlog, orderflow
+    ) VALUES (
+      found_user_id,
+      COALESCE(row_data->>'symbol', 'EURUSD'),
+      row_data->>'timeframe',
+      (row_data->>'data_timestamp')::TIMESTAMPTZ,
+      row_data->'rendlog',
+      row_data->'orderflow'
+    )
+    ON CONFLICT (user_id, symbol, timeframe, data_timestamp)
+    DO UPDATE SET
+      rendlog   = EXCLUDED.rendlog,
+      orderflow = EXCLUDED.orderflow;
+  END LOOP;
+
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _sync_migracion():
+    """CREATE FUNCTION sync_user_data tal cual figura en supabase_migrations.sql."""
+    with open(MIGRACIONES, encoding="utf-8") as f:
+        sql = f.read()
+    m = re.search(r"^CREATE OR REPLACE FUNCTION sync_user_data\(.*?^\$\$ LANGUAGE plpgsql SECURITY DEFINER;",
+                  sql, re.S | re.M)
+    return m.group(0)
+
+
+def _filas_carga_inicial():
+    """Lote de la carga inicial: VENTANA_VELAS filas por (símbolo, TF)."""
+    base = make_df_calculado(VENTANA_VELAS + 1)
+    filas = []
+    for symbol in SYMBOLS_ACTIVOS:
+        for tf_name in TIMEFRAMES_ACTIVOS:
+            filas.extend(build_rows(base, DEFAULT_CONFIG, tf_name, symbol))
+    return filas
+
+
+def _preparar(cur, api_key):
+    cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {ESQUEMA}")
+    cur.execute(f"SET search_path TO {ESQUEMA}")
+    cur.execute(TABLAS)
+    cur.execute(_sync_migracion())
+    cur.execute(SYNC_LOOP)
+    cur.execute("INSERT INTO user_profiles VALUES (%s, %s)", (uuid.uuid4(), api_key))
+
+
+def _medir(cur, funcion, api_key, payload, vaciar, repeticiones=5):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        if vaciar:
+            cur.execute("TRUNCATE user_data")
+        t0 = time.perf_counter()
+        cur.execute(f"SELECT {funcion}(%s, %s::jsonb)", (api_key, payload))
+        assert cur.fetchone()[0]
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def _contenido(cur):
+    cur.execute("SELECT symbol, timeframe, data_timestamp, rendlog, orderflow FROM user_data "
+                "ORDER BY symbol, timeframe, data_timestamp")
+    return cur.fetchall()
+
+
+def main():
+    filas = _filas_carga_inicial()
+    payload = json.dumps(filas)
+    api_key = "bench-" + uuid.uuid4().hex
+
+    with psycopg.connect(DSN, autocommit=True) as conn, conn.cursor() as cur:
+        _preparar(cur, api_key)
+        try:
+            print(f"{len(filas)} filas ({len(payload) / 1024:.0f} KB de JSON)\n")
+            print(f"{'escenario':>20} | {'loop (filas/s)':>15} | {'set-based (filas/s)':>20} | {'speedup':>8}")
+            print("-" * 74)
+            for escenario, vaciar in (("carga inicial", True), ("reenvío sin cambios", False)):
+                t_loop = _medir(cur, "sync_user_data_loop", api_key, payload, vaciar)
+                esperado = _contenido(cur)
+                t_set = _medir(cur, "sync_user_data", api_key, payload, vaciar)
+                assert _contenido(cur) == esperado, f"Contenido distinto en '{escenario}'"
+                print(f"{escenario:>20} | {len(filas) / t_loop:>15,.0f} | "
+                      f"{len(filas) / t_set:>20,.0f} | {t_loop / t_set:>7.1f}x")
+        finally:
+            cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+
+
+if __name__ == "__main__":
+    main()
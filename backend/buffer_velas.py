@@ -0,0 +1,182 @@
+# buffer_velas.py — Buffer circular de velas OHLCV por (symbol, timeframe)
+#
+# Se siembra una vez con la ventana inicial y después solo recibe las velas
+# posteriores a la última almacenada (copy_rates_range desde ese timestamp).
+#
+# Buffer "espejo": cada campo es un array preasignado de 2·capacidad y cada
+# vela se escribe en pos y pos + capacidad. Así la ventana ordenada de la más
+# antigua a la más reciente es siempre el slice contiguo [inicio, inicio + n)
+# y leerla no requiere np.roll ni concatenaciones.
+#
+import numpy as np
+import pandas as pd
+from config import BROKER_UTC_OFFSET_HOURS
+
+# Campos OHLCV que se conservan de los rates de MT5 (dtype de copy_rates_*)
+CAMPOS_VELA = (
+    ("time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("tick_volume", np.uint64),
+)
+
+
+def rates_a_columnas(rates):
+    """
+    Columnas numpy de un array de copy_rates_* sin pasar por DataFrame.
+
+    open, high, low, close y tick_volume son vistas de los campos del array
+    estructurado (sin copia; conservan el stride del registro de MT5). 'time'
+    es el único array nuevo: int64 epoch UTC (epoch broker − BROKER_UTC_OFFSET_HOURS).
+
+    Returns:
+        dict[campo -> np.ndarray] con los campos de CAMPOS_VELA, o None si no hay velas
+    """
+    if rates is None or len(rates) == 0:
+        return None
+    columnas = {"time": np.asarray(rates["time"], dtype=np.int64) - BROKER_UTC_OFFSET_HOURS * 3600}
+    for campo, _ in CAMPOS_VELA[1:]:
+        columnas[campo] = rates[campo]
+    return columnas
+
+
+def columnas_a_dataframe(columnas):
+    """
+    DataFrame desde rates_a_columnas(), solo para quien lo pida explícitamente.
+
+    Mismas columnas y tipos que obtener_datos_historicos(): time (UTC), open,
+    high, low, close, tick_volume ('time' en datetime64[ns], la resolución de
+    pandas 2). Copia los datos (las vistas no sobreviven al DataFrame).
+    """
+    if columnas is None:
+        return None
+    datos = {"time": pd.to_datetime(columnas["time"], unit="s").as_unit("ns")}
+    for campo, _ in CAMPOS_VELA[1:]:
+        datos[campo] = np.array(columnas[campo])
+    return pd.DataFrame(datos)
+
+
+class BufferVelas:
+    """
+    Ventana móvil de velas de una serie, con capacidad fija y sin realocación.
+
+    'time' se guarda como en MT5: segundos epoch en hora del broker. La
+    conversión a UTC (restar BROKER_UTC_OFFSET_HOURS) se hace solo al
+    construir el DataFrame, igual que obtener_datos_historicos().
+
+    Uso:
+        buffer = BufferVelas.desde_rates(rates, capacidad=VENTANA_VELAS)
+        nuevas = buffer.actualizar(obtener_rates_desde(symbol, tf, buffer.ultimo_epoch))
+        df     = buffer.dataframe()
+    """
+    __slots__ = ("capacidad", "_datos", "_inicio", "_n")
+
+    def __init__(self, capacidad):
+        if capacidad < 1:
+            raise ValueError(f"Capacidad de buffer inválida: {capacidad}")
+        self.capacidad = int(capacidad)
+        self._datos = {campo: np.zeros(2 * self.capacidad, dtype=dtype) for campo, dtype in CAMPOS_VELA}
+        self._inicio = 0
+        self._n = 0
+
+    @classmethod
+    def desde_rates(cls, rates, capacidad):
+        """Crea y siembra un buffer con las velas de copy_rates_* (ascendentes por time)."""
+        buffer = cls(capacidad)
+        buffer.actualizar(rates)
+        return buffer
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def ultimo_epoch(self):
+        """Time (epoch broker, segundos) de la vela más reciente; None si está vacío."""
+        if self._n == 0:
+            return None
+        return int(self._datos["time"][self._inicio + self._n - 1])
+
+    @property
+    def ultimo_time(self):
+        """Time de la vela más reciente en UTC (mismo valor que la columna 'time' del DataFrame)."""
+        if self._n == 0:
+            return None
+        return pd.Timestamp(self.ultimo_epoch, unit="s") - pd.Timedelta(hours=BROKER_UTC_OFFSET_HOURS)
+
+    def columna(self, campo, n=None):
+        """
+        Vista (sin copia) de las últimas n velas de un campo, de la más antigua a la más reciente.
+
+        La vista deja de ser válida tras la siguiente actualizar().
+        """
+        n = self._n if n is None else min(n, self._n)
+        fin = self._inicio + self._n
+        return self._datos[campo][fin - n:fin]
+
+    def actualizar(self, rates):
+        """
+        Incorpora velas de MT5 (array estructurado o dict de arrays), ascendentes por time.
+
+        - time <  última almacenada: se ignora (ya está en el buffer)
+        - time == última almacenada: sobrescribe la vela (aún en formación)
+        - time >  última almacenada: se agrega; si el buffer está lleno
+          se descarta la más antigua
+
+        Returns:
+            int — número de velas nuevas agregadas
+        """
+        if rates is None or len(rates) == 0:
+            return 0
+
+        tiempos = np.asarray(rates["time"], dtype=np.int64)
+        ultimo = self.ultimo_epoch
+
+        if ultimo is not None:
+            iguales = np.flatnonzero(tiempos == ultimo)
+            if len(iguales):
+                pos = self._inicio + self._n - 1
+                self._escribir(rates, iguales[-1:], np.array([pos % self.capacidad]))
+            nuevas = np.flatnonzero(tiempos > ultimo)
+        else:
+            nuevas = np.arange(len(tiempos))
+
+        k = len(nuevas)
+        if k == 0:
+            return 0
+
+        cap = self.capacidad
+        if k >= cap:
+            # Más velas nuevas que capacidad: el buffer queda con las últimas cap
+            self._escribir(rates, nuevas[-cap:], np.arange(cap))
+            self._inicio, self._n = 0, cap
+            return k
+
+        posiciones = (self._inicio + self._n + np.arange(k)) % cap
+        self._escribir(rates, nuevas, posiciones)
+        descartadas = max(0, self._n + k - cap)
+        self._inicio = (self._inicio + descartadas) % cap
+        self._n = min(self._n + k, cap)
+        return k
+
+    def _escribir(self, rates, idx, posiciones):
+        """Copia las filas idx de rates en las posiciones del anillo y en su espejo."""
+        for campo, _ in CAMPOS_VELA:
+            valores = np.asarray(rates[campo])[idx]
+            arr = self._datos[campo]
+            arr[posiciones] = valores
+            arr[posiciones + self.capacidad] = valores
+
+    def dataframe(self, n=None):
+        """
+        DataFrame de las últimas n velas (todas si n es None).
+
+        Mismas columnas y tipos que obtener_datos_historicos():
+        time (UTC), open, high, low, close, tick_volume.
+        """
+        tiempos = pd.to_datetime(self.columna("time", n), unit="s") - pd.Timedelta(hours=BROKER_UTC_OFFSET_HOURS)
+        datos = {"time": tiempos}
+        for campo, _ in CAMPOS_VELA[1:]:
+            datos[campo] = self.columna(campo, n).copy()
+        return pd.DataFrame(datos)
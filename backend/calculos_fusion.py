@@ -0,0 +1,190 @@
+# calculos_fusion.py — Motor estadístico fusionado (una pasada, sin copias de DataFrame)
+#
+# Produce en arrays numpy preasignados las mismas columnas que la cadena:
+#   calcular_rendimientos_log → calcular_bandas_sigma → calcular_delta_volumen
+#   → calcular_volumen_relativo → detectar_anomalia_volumen → calcular_efficiency_ratio
+#
+# Cada función de la cadena hace df.copy() y agrega columnas vía pandas
+# (6 copias completas + Series temporales por serie y ciclo). Aquí se trabaja
+# sobre las columnas OHLCV crudas y el DataFrame se construye una sola vez,
+# solo si el llamador lo pide (calcular_estadisticas_df).
+#
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from calculos_rendlog import _varianza_ewma, seleccionar_lambda, efficiency_ratio_vectorizado
+
+# Orden de columnas idéntico al de la cadena original
+COLUMNAS_ESTADISTICAS = (
+    'log_return', 'media', 'std_static', 'std',
+    'banda_2sigma_superior', 'banda_2sigma_inferior',
+    'banda_3sigma_superior', 'banda_3sigma_inferior',
+    'vol_ratio',
+    'es_alcista', 'volumen_alcista', 'volumen_bajista', 'delta',
+    'promedio_volumen', 'volumen_relativo',
+    'z_score_volumen', 'anomalia_volumen',
+    'efficiency_ratio',
+)
+
+
+def _rolling_media_std(x, ventana, media_out, std_out=None):
+    """
+    Media y std muestral (ddof=1) móviles escritas en arrays preasignados.
+
+    Misma semántica que pandas rolling(window=ventana): NaN hasta completar
+    la primera ventana y NaN en toda ventana que contenga un NaN.
+    """
+    media_out.fill(np.nan)
+    if std_out is not None:
+        std_out.fill(np.nan)
+
+    if ventana < 1 or len(x) < ventana:
+        return
+
+    ventanas = sliding_window_view(x, ventana)
+    np.mean(ventanas, axis=1, out=media_out[ventana - 1:])
+    if std_out is not None and ventana > 1:
+        np.std(ventanas, axis=1, ddof=1, out=std_out[ventana - 1:])
+
+
+def calcular_columnas(open_, close, tick_volume, ventana=20, timeframe=None, symbol=None,
+                      ventana_volumen=None, ventana_er=None, flujo=None):
+    """
+    Calcula todas las columnas derivadas RendLog + OrderFlow en una pasada.
+
+    Args:
+        open_:           np.ndarray [n] — precios de apertura
+        close:           np.ndarray [n] — precios de cierre
+        tick_volume:     np.ndarray [n] — volumen de ticks (uint64 de MT5 o int)
+        ventana:         int — ventana de media/std móvil y z-score de volumen
+        timeframe:       str — selecciona lambda EWMA (ej: "30M")
+        symbol:          str — selecciona lambda EWMA por par
+        ventana_volumen: int — ventana del volumen relativo (default: min(ventana, 20))
+        ventana_er:      int — ventana del Efficiency Ratio (default: RENDLOG_ER_VENTANA)
+        flujo:           dict — order flow por tick alineado a las velas
+                         (MotorFlujoTicks.columnas); donde no es NaN reemplaza
+                         el reparto por dirección de la vela
+
+    Returns:
+        dict[str -> np.ndarray] con las claves de COLUMNAS_ESTADISTICAS
+        (+ 'delta_acumulado' si se pasa flujo)
+    """
+    close = np.asarray(close, dtype=np.float64)
+    open_ = np.asarray(open_, dtype=np.float64)
+    tick_volume = np.asarray(tick_volume)
+    n = len(close)
+    if ventana_volumen is None:
+        ventana_volumen = min(ventana, 20)
+
+    # Preasignación de todas las columnas float
+    buf = np.empty((12, n))
+    (log_return, media, std_static, std,
+     b2_sup, b2_inf, b3_sup, b3_inf,
+     vol_ratio, promedio_volumen, volumen_relativo, z_score_volumen) = buf
+
+    # --- Rendimientos logarítmicos ---
+    log_return[0] = np.nan
+    if n > 1:
+        np.divide(close[1:], close[:-1], out=log_return[1:])
+        np.log(log_return[1:], out=log_return[1:])
+
+    # --- Media / std estático / EWMA ---
+    _rolling_media_std(log_return, ventana, media, std_static)
+
+    variance, first_valid_idx = _varianza_ewma(log_return, seleccionar_lambda(timeframe, symbol))
+    if variance is None:
+        std.fill(0.0)
+    else:
+        np.maximum(variance, 1e-12, out=std)
+        np.sqrt(std, out=std)
+        std[:first_valid_idx] = np.nan
+
+    # --- Bandas ±2σ / ±3σ ---
+    np.multiply(std, 2, out=b2_sup)
+    np.subtract(media, b2_sup, out=b2_inf)
+    np.add(media, b2_sup, out=b2_sup)
+    np.multiply(std, 3, out=b3_sup)
+    np.subtract(media, b3_sup, out=b3_inf)
+    np.add(media, b3_sup, out=b3_sup)
+
+    # --- Ratio EWMA / estático (σ estático 0 → NaN → 1.0) ---
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(std, np.where(std_static == 0, np.nan, std_static), out=vol_ratio)
+    vol_ratio[np.isnan(vol_ratio)] = 1.0
+
+    # --- Delta de volumen (dirección de la vela) ---
+    es_alcista = close > open_
+    volumen_alcista = np.where(es_alcista, tick_volume, 0).astype(tick_volume.dtype, copy=False)
+    volumen_bajista = np.where(~es_alcista, tick_volume, 0).astype(tick_volume.dtype, copy=False)
+    if flujo is not None:
+        # Velas con cobertura de ticks: compra/venta por regla del tick
+        con_ticks = ~np.isnan(flujo['volumen_compra'])
+        volumen_alcista = np.where(con_ticks, np.nan_to_num(flujo['volumen_compra']), volumen_alcista)
+        volumen_bajista = np.where(con_ticks, np.nan_to_num(flujo['volumen_venta']), volumen_bajista)
+        volumen_alcista = volumen_alcista.astype(tick_volume.dtype)
+        volumen_bajista = volumen_bajista.astype(tick_volume.dtype)
+    # Cast a int64 para evitar overflow con uint64 de MT5
+    delta = volumen_alcista.astype(np.int64) - volumen_bajista.astype(np.int64)
+
+    # --- Volumen relativo y z-score de volumen ---
+    vol = tick_volume.astype(np.float64)
+    _rolling_media_std(vol, ventana_volumen, promedio_volumen)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(vol, promedio_volumen, out=volumen_relativo)
+    volumen_relativo[np.isnan(volumen_relativo)] = 1.0
+
+    vol_mean = np.empty(n)
+    vol_std  = np.empty(n)
+    _rolling_media_std(vol, ventana, vol_mean, vol_std)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(vol, vol_mean, out=z_score_volumen)
+        np.divide(z_score_volumen, vol_std, out=z_score_volumen)
+    anomalia_volumen = np.abs(z_score_volumen) > 2
+    z_score_volumen[np.isnan(z_score_volumen)] = 0
+
+    columnas = {
+        'log_return': log_return,
+        'media': media,
+        'std_static': std_static,
+        'std': std,
+        'banda_2sigma_superior': b2_sup,
+        'banda_2sigma_inferior': b2_inf,
+        'banda_3sigma_superior': b3_sup,
+        'banda_3sigma_inferior': b3_inf,
+        'vol_ratio': vol_ratio,
+        'es_alcista': es_alcista,
+        'volumen_alcista': volumen_alcista,
+        'volumen_bajista': volumen_bajista,
+        'delta': delta,
+        'promedio_volumen': promedio_volumen,
+        'volumen_relativo': volumen_relativo,
+        'z_score_volumen': z_score_volumen,
+        'anomalia_volumen': anomalia_volumen,
+        'efficiency_ratio': efficiency_ratio_vectorizado(close, ventana_er),
+    }
+    if flujo is not None:
+        columnas['delta_acumulado'] = flujo['delta_acumulado']
+    return columnas
+
+
+def calcular_estadisticas_df(df, ventana=20, timeframe=None, symbol=None, flujo=None):
+    """
+    Adaptador: mismo DataFrame que la cadena de 6 funciones, en una sola construcción.
+
+    Args:
+        df:        DataFrame con columnas time, open, high, low, close, tick_volume
+        ventana:   int — ventana estadística
+        timeframe: str — nombre del timeframe
+        symbol:    str — nombre del par
+        flujo:     dict — order flow por tick (ver calcular_columnas)
+
+    Returns:
+        DataFrame con las columnas originales + COLUMNAS_ESTADISTICAS
+    """
+    columnas = calcular_columnas(
+        df['open'].values, df['close'].values, df['tick_volume'].values,
+        ventana=ventana, timeframe=timeframe, symbol=symbol, flujo=flujo,
+    )
+    base = {col: df[col].values for col in df.columns}
+    base.update(columnas)
+    return pd.DataFrame(base, index=df.index, copy=False)
@@ -10,11 +10,146 @@
 # Reversión: un camino "revierte" si en alguna vela del horizonte
 #   |r_k - mu| ≤ sigma  (el retorno vuelve a estar dentro de 1σ de la media)
 #
+# Forma cerrada (motor "analitico"): los r_k de un camino son i.i.d. normales, así que
+#   p = P(|r_k - mu| ≤ sigma) = P(|Z - sigma/2| ≤ 1) = Φ(1 + sigma/2) - Φ(-1 + sigma/2)
+#   P(revierte en n velas) = 1 - (1 - p)^n
+#   S_n = S_0 · exp(n·(mu - sigma²/2) + sigma·√n·Z)  → cuantiles lognormales
+#
+# Reducción de varianza (motor "montecarlo"):
+#   antitetico: cada Z se acompaña de -Z. Reduce varianza en los percentiles del
+#               precio final, no en la reversión: |Z - sigma/2| ≤ 1 es casi simétrico
+#               en Z, así que Z y -Z revierten juntos (para la reversión conviene sobol)
+#   sobol:      Z = Φ⁻¹(U), U de una secuencia Sobol aleatorizada (scipy.stats.qmc)
+#   secuencial: tandas de caminos hasta que el IC 95% de gbm_prob_reversion
+#               tenga semiancho < tolerancia (o se llegue a n_paths); en lote, cada
+#               anomalía sale del sorteo cuando cierra su propio IC
+#
+# Simulación conjunta (varios pares anómalos en el mismo TF y vela):
+#   Z_k = L · ε_k   con L = cholesky(Corr), Corr derivada de la covarianza PCA
+#   Cada par usa su propio sigma EWMA; la correlación solo acopla los shocks.
+#   Cesta revierte ⇔ todos los pares anómalos revierten dentro del horizonte.
+#   Solo se sortea la cesta; los campos por par salen de resolver_gbm_lote.
+#
+import zlib
 import numpy as np
-from config import GBM_N_PATHS, GBM_HORIZONTE_VELAS, GBM_Z_UMBRAL_ACTIVACION
+from scipy.special import ndtr, ndtri
+from scipy.stats import qmc
+from calculos_multipair import calcular_correlacion
+from config import (
+    GBM_N_PATHS,
+    GBM_HORIZONTE_VELAS,
+    GBM_Z_UMBRAL_ACTIVACION,
+    GBM_METODO,
+    GBM_LOTE_MAX_ELEMENTOS,
+    GBM_SEMILLA,
+    GBM_MUESTREO,
+    GBM_TOLERANCIA,
+    GBM_PATHS_POR_TANDA,
+)
+
+# Cuantiles normales estándar de los percentiles reportados (5, 50, 95)
+_Z_PERCENTILES = ndtri(np.array([0.05, 0.50, 0.95]))
+
+# Generadores por serie: {(symbol, timeframe): np.random.Generator}
+_RNG_POR_SERIE = {}
+
+
+def rng_para_serie(symbol, timeframe, semilla=GBM_SEMILLA):
+    """
+    Stream RNG reproducible e independiente por (symbol, timeframe).
+
+    Deriva el generador de SeedSequence(semilla, spawn_key=crc32(symbol), crc32(tf)),
+    así cada serie tiene su propio stream y el resultado no depende del
+    orden en que se procesan las demás. El generador se reutiliza entre
+    llamadas (no se re-siembra en cada vela).
+    """
+    clave = (symbol, timeframe, semilla)
+    if clave not in _RNG_POR_SERIE:
+        spawn_key = (zlib.crc32(str(symbol).encode()), zlib.crc32(str(timeframe).encode()))
+        _RNG_POR_SERIE[clave] = np.random.default_rng(np.random.SeedSequence(semilla, spawn_key=spawn_key))
+    return _RNG_POR_SERIE[clave]
+
+
+def _sobol(d, rng):
+    """Motor Sobol aleatorizado (scramble) compatible con scipy < 1.15 (seed=) y >= 1.15 (rng=)."""
+    try:
+        return qmc.Sobol(d, scramble=True, rng=rng)
+    except TypeError:
+        return qmc.Sobol(d, scramble=True, seed=rng)
+
+
+def _normales(n_paths, n_horizonte, muestreo="estandar", rng=None, filas=1):
+    """
+    Tensor de normales (filas, n_paths, n_horizonte) según el esquema de muestreo.
+
+    Con muestreo="estandar" y rng=None usa el estado global de np.random
+    (mismo comportamiento que antes; np.random.seed sigue siendo válido).
+    En "sobol" cada fila usa su propio motor aleatorizado y n_paths se
+    redondea a la potencia de 2 superior (balance de la secuencia).
+    """
+    if muestreo == "estandar":
+        if rng is None:
+            return np.random.standard_normal((filas, n_paths, n_horizonte))
+        return rng.standard_normal((filas, n_paths, n_horizonte))
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    if muestreo == "antitetico":
+        mitad = rng.standard_normal((filas, (n_paths + 1) // 2, n_horizonte))
+        return np.concatenate([mitad, -mitad], axis=1)[:, :n_paths]
+
+    if muestreo == "sobol":
+        m = int(np.ceil(np.log2(max(n_paths, 2))))
+        u = np.stack([_sobol(n_horizonte, rng).random_base2(m) for _ in range(filas)])
+        return ndtri(np.clip(u, 1e-12, 1 - 1e-12))
+
+    raise ValueError(f"Muestreo GBM desconocido: {muestreo}")
+
+
+def _evaluar_caminos(Z, precio_actual, mu, sigma_ewma):
+    """Indicador de reversión por camino y precio final, para Z de forma (n_paths, n_horizonte)."""
+    # Retornos simulados con corrección de Ito: (mu - sigma²/2) + sigma·Z
+    drift_corregido = mu - 0.5 * sigma_ewma ** 2
+    log_returns_sim = drift_corregido + sigma_ewma * Z   # (n_paths, n_horizonte)
+
+    # Condición de reversión: ∃ vela k donde |r_k - mu| ≤ sigma
+    reversion_por_vela = np.abs(log_returns_sim - mu) <= sigma_ewma  # (n_paths, n_horizonte)
+    revierte = np.any(reversion_por_vela, axis=1)                    # (n_paths,)
+
+    # Precio al final del horizonte: S_0 · exp(suma de retornos)
+    precios_finales = precio_actual * np.exp(np.sum(log_returns_sim, axis=1))
+    return revierte, precios_finales
+
+
+def _semiancho_ic(revierte, muestreo, tanda):
+    """
+    Semiancho del IC 95% de la probabilidad de reversión.
+
+    La unidad independiente depende del muestreo: el camino (estándar),
+    el par (Z, -Z) (antitético) o la tanda completa (Sobol aleatorizado,
+    cada tanda es una réplica RQMC independiente).
+
+    Acepta [n] (una anomalía) o [b × n] (una por fila; resultado [b]).
+    """
+    x = revierte.astype(np.float64)
+    filas = x.shape[:-1]
+    if muestreo == "antitetico":
+        # Dentro de cada tanda, el camino i y el i + tanda/2 forman el par (Z, -Z)
+        por_tanda = x.reshape(filas + (-1, tanda))
+        unidades = 0.5 * (por_tanda[..., :tanda // 2] + por_tanda[..., tanda // 2:]).reshape(filas + (-1,))
+    elif muestreo == "sobol":
+        unidades = x.reshape(filas + (-1, tanda)).mean(axis=-1)
+    else:
+        unidades = x
+    n = unidades.shape[-1]
+    if n < 2:
+        return np.full(filas, np.inf) if filas else np.inf
+    return 1.96 * np.std(unidades, axis=-1, ddof=1) / np.sqrt(n)
 
 
-def simular_gbm(precio_actual, mu, sigma_ewma, n_paths=GBM_N_PATHS, n_horizonte=10):
+def simular_gbm(precio_actual, mu, sigma_ewma, n_paths=GBM_N_PATHS, n_horizonte=10,
+                muestreo="estandar", rng=None, tolerancia=None):
     """
     Ejecuta simulación Monte Carlo vectorizada bajo GBM discreto.
 
@@ -22,8 +157,14 @@ def simular_gbm(precio_actual, mu, sigma_ewma, n_paths=GBM_N_PATHS, n_horizonte=
         precio_actual: float — precio de cierre de la vela con anomalía (S_0)
         mu:            float — drift (rolling mean de log returns)
         sigma_ewma:    float — volatilidad EWMA condicional
-        n_paths:       int   — número de caminos simulados
+        n_paths:       int   — número de caminos simulados (máximo en modo secuencial)
         n_horizonte:   int   — velas hacia adelante
+        muestreo:      str   — "estandar" | "antitetico" | "sobol"
+        rng:           np.random.Generator — None = estado global de np.random
+                       (ver rng_para_serie() para streams por serie)
+        tolerancia:    float — si se indica, modo secuencial: tandas de
+                       GBM_PATHS_POR_TANDA caminos hasta que el semiancho del
+                       IC 95% de la probabilidad sea < tolerancia
 
     Returns:
         dict con:
@@ -35,22 +176,31 @@ def simular_gbm(precio_actual, mu, sigma_ewma, n_paths=GBM_N_PATHS, n_horizonte=
     if sigma_ewma <= 0 or np.isnan(sigma_ewma) or np.isnan(mu):
         return _campos_nulos()
 
-    # Matriz de ruido: shape (n_paths, n_horizonte)
-    Z = np.random.standard_normal((n_paths, n_horizonte))
+    if tolerancia is None:
+        Z = _normales(n_paths, n_horizonte, muestreo, rng)[0]
+        revierte, precios_finales = _evaluar_caminos(Z, precio_actual, mu, sigma_ewma)
+    else:
+        if rng is None:
+            rng = np.random.default_rng()
+        tanda = GBM_PATHS_POR_TANDA
+        tandas_rev, tandas_fin = [], []
+        total = 0
+        while True:
+            Z = _normales(tanda, n_horizonte, muestreo, rng)[0]
+            rev, fin = _evaluar_caminos(Z, precio_actual, mu, sigma_ewma)
+            tandas_rev.append(rev)
+            tandas_fin.append(fin)
+            total += len(rev)
+            revierte = np.concatenate(tandas_rev)
+            if total >= n_paths:
+                break
+            # Mínimo 2 tandas antes de confiar en el IC
+            if len(tandas_rev) >= 2 and _semiancho_ic(revierte, muestreo, tanda) < tolerancia:
+                break
+        precios_finales = np.concatenate(tandas_fin)
 
-    # Retornos simulados con corrección de Ito: (mu - sigma²/2) + sigma·Z
-    drift_corregido = mu - 0.5 * sigma_ewma ** 2
-    log_returns_sim = drift_corregido + sigma_ewma * Z   # (n_paths, n_horizonte)
-
-    # Condición de reversión: ∃ vela k donde |r_k - mu| ≤ sigma
-    reversion_por_vela = np.abs(log_returns_sim - mu) <= sigma_ewma  # (n_paths, n_horizonte)
-    revierte = np.any(reversion_por_vela, axis=1)                    # (n_paths,)
     prob_reversion = float(np.mean(revierte))
 
-    # Caminos de precio acumulados: S_k = S_0 · exp(suma acumulada de retornos)
-    precios_sim = precio_actual * np.exp(np.cumsum(log_returns_sim, axis=1))
-    precios_finales = precios_sim[:, -1]   # precio al final del horizonte
-
     return {
         "gbm_prob_reversion": round(prob_reversion, 4),
         "gbm_percentil_5":    round(float(np.percentile(precios_finales, 5)), 6),
@@ -59,7 +209,60 @@ def simular_gbm(precio_actual, mu, sigma_ewma, n_paths=GBM_N_PATHS, n_horizonte=
     }
 
 
-def calcular_gbm_anomalia(z_score, mu, sigma_ewma, precio_close, timeframe=None):
+def _gbm_analitico_arrays(precio_actual, mu, sigma_ewma, n_horizonte):
+    """
+    Núcleo vectorizado de la forma cerrada (acepta escalares o arrays).
+
+    Returns:
+        tuple(prob_reversion, p5, p50, p95) — arrays sin redondear
+    """
+    precio_actual = np.asarray(precio_actual, dtype=np.float64)
+    mu            = np.asarray(mu, dtype=np.float64)
+    sigma         = np.asarray(sigma_ewma, dtype=np.float64)
+    n             = np.asarray(n_horizonte, dtype=np.float64)
+
+    # Probabilidad por vela de caer dentro de 1σ de mu
+    p_vela = ndtr(1.0 + 0.5 * sigma) - ndtr(-1.0 + 0.5 * sigma)
+    prob_reversion = 1.0 - (1.0 - p_vela) ** n
+
+    # Log-precio terminal ~ N(n·drift, sigma²·n)
+    media_log = n * (mu - 0.5 * sigma ** 2)
+    desv_log  = sigma * np.sqrt(n)
+    p5, p50, p95 = (precio_actual * np.exp(media_log + desv_log * z) for z in _Z_PERCENTILES)
+
+    return prob_reversion, p5, p50, p95
+
+
+def gbm_analitico(precio_actual, mu, sigma_ewma, n_horizonte=10):
+    """
+    Versión en forma cerrada de simular_gbm(): mismos campos, sin muestreo.
+
+    Determinista (sin ruido entre ejecuciones) y de costo O(1).
+
+    Args:
+        precio_actual: float — precio de cierre de la vela con anomalía (S_0)
+        mu:            float — drift (rolling mean de log returns)
+        sigma_ewma:    float — volatilidad EWMA condicional
+        n_horizonte:   int   — velas hacia adelante
+
+    Returns:
+        dict con gbm_prob_reversion y gbm_percentil_5/50/95 (igual que simular_gbm)
+    """
+    if sigma_ewma <= 0 or np.isnan(sigma_ewma) or np.isnan(mu):
+        return _campos_nulos()
+
+    prob, p5, p50, p95 = _gbm_analitico_arrays(precio_actual, mu, sigma_ewma, n_horizonte)
+
+    return {
+        "gbm_prob_reversion": round(float(prob), 4),
+        "gbm_percentil_5":    round(float(p5), 6),
+        "gbm_percentil_50":   round(float(p50), 6),
+        "gbm_percentil_95":   round(float(p95), 6),
+    }
+
+
+def calcular_gbm_anomalia(z_score, mu, sigma_ewma, precio_close, timeframe=None, metodo=None,
+                          rng=None):
     """
     Punto de entrada desde main.py/build_rows().
     Ejecuta GBM solo si |z_score| supera el umbral de activación.
@@ -70,6 +273,8 @@ def calcular_gbm_anomalia(z_score, mu, sigma_ewma, precio_close, timeframe=None)
         sigma_ewma:   float — sigma EWMA de la vela actual
         precio_close: float — precio de cierre de la vela (S_0 para simulación)
         timeframe:    str   — nombre del timeframe (ej: "30M") para seleccionar horizonte
+        metodo:       str   — "analitico" | "montecarlo". None = GBM_METODO de config.py
+        rng:          np.random.Generator para Monte Carlo (ver rng_para_serie())
 
     Returns:
         dict con campos GBM. Si no hay anomalía, todos los valores son None.
@@ -77,19 +282,310 @@ def calcular_gbm_anomalia(z_score, mu, sigma_ewma, precio_close, timeframe=None)
     if abs(z_score) <= GBM_Z_UMBRAL_ACTIVACION:
         return _campos_nulos()
 
-    n_horizonte = GBM_HORIZONTE_VELAS.get(timeframe, 10) if timeframe else 10
+    n_horizonte = horizonte_para(timeframe)
+    metodo = metodo or GBM_METODO
 
-    resultado = simular_gbm(
-        precio_actual=precio_close,
-        mu=mu,
-        sigma_ewma=sigma_ewma,
-        n_paths=GBM_N_PATHS,
-        n_horizonte=n_horizonte,
-    )
+    if metodo == "analitico":
+        resultado = gbm_analitico(
+            precio_actual=precio_close,
+            mu=mu,
+            sigma_ewma=sigma_ewma,
+            n_horizonte=n_horizonte,
+        )
+    elif metodo == "montecarlo":
+        resultado = simular_gbm(
+            precio_actual=precio_close,
+            mu=mu,
+            sigma_ewma=sigma_ewma,
+            n_paths=GBM_N_PATHS,
+            n_horizonte=n_horizonte,
+            muestreo=GBM_MUESTREO,
+            rng=rng,
+            tolerancia=GBM_TOLERANCIA,
+        )
+    else:
+        raise ValueError(f"Método GBM desconocido: {metodo}")
     resultado["gbm_horizonte_velas"] = n_horizonte
     return resultado
 
 
+def horizonte_para(timeframe):
+    """Horizonte GBM (velas) de un timeframe; 10 si no está configurado."""
+    return GBM_HORIZONTE_VELAS.get(timeframe, 10) if timeframe else 10
+
+
+def simular_gbm_lote(precios, mus, sigmas, horizontes, n_paths=GBM_N_PATHS, rng=None,
+                     muestreo="estandar", tolerancia=None):
+    """
+    Monte Carlo de muchas anomalías en tensores 3-D, sin relleno.
+
+    Las anomalías se agrupan por horizonte h (de 5 a 20 velas según el
+    timeframe) y cada grupo se simula con un único tensor (b, n_paths, h),
+    sin sortear ni procesar celdas de relleno hasta un horizonte común.
+    Cada grupo se parte en bloques de a lo sumo GBM_LOTE_MAX_ELEMENTOS
+    normales para acotar la memoria.
+
+    Args:
+        precios:    array [m] — S_0 de cada anomalía
+        mus:        array [m] — drift por vela
+        sigmas:     array [m] — sigma EWMA por vela
+        horizontes: array [m] — velas hacia adelante
+        n_paths:    int — caminos por anomalía (máximo en modo secuencial)
+        rng:        np.random.Generator (None = default_rng() sin semilla)
+        muestreo:   str — "estandar" | "antitetico" | "sobol"
+        tolerancia: float — si se indica, modo secuencial como en simular_gbm():
+                    tandas de GBM_PATHS_POR_TANDA caminos; cada anomalía deja de
+                    simularse cuando el semiancho de su IC 95% es < tolerancia
+
+    Returns:
+        tuple(prob_reversion, p5, p50, p95) — arrays [m]; NaN donde sigma/mu
+        no son válidos
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    precios    = np.asarray(precios, dtype=np.float64)
+    mus        = np.asarray(mus, dtype=np.float64)
+    sigmas     = np.asarray(sigmas, dtype=np.float64)
+    horizontes = np.asarray(horizontes, dtype=np.int64)
+    m = len(precios)
+
+    prob = np.full(m, np.nan)
+    pct  = np.full((3, m), np.nan)
+
+    validos = np.flatnonzero((sigmas > 0) & ~np.isnan(sigmas) & ~np.isnan(mus))
+
+    for h in np.unique(horizontes[validos]):
+        grupo = validos[horizontes[validos] == h]
+        filas_por_bloque = max(1, GBM_LOTE_MAX_ELEMENTOS // (n_paths * int(h)))
+
+        for inicio in range(0, len(grupo), filas_por_bloque):
+            idx = grupo[inicio:inicio + filas_por_bloque]
+            if tolerancia is None:
+                Z = _normales(n_paths, int(h), muestreo, rng, filas=len(idx))   # (b, n_paths, h)
+                revierte, precios_finales = _evaluar_bloque(Z, precios[idx], mus[idx], sigmas[idx], h)
+                prob[idx] = revierte.mean(axis=1)
+                pct[:, idx] = np.percentile(precios_finales, [5, 50, 95], axis=1)
+            else:
+                prob[idx], pct[:, idx] = _bloque_secuencial(
+                    precios[idx], mus[idx], sigmas[idx], int(h), n_paths, muestreo, rng, tolerancia
+                )
+
+    return prob, pct[0], pct[1], pct[2]
+
+
+def _evaluar_bloque(Z, precios, mus, sigmas, h):
+    """Reversión y precio final por camino para Z (b, n, h); devuelve dos arrays (b, n)."""
+    mu    = mus[:, None]
+    sigma = sigmas[:, None]
+
+    # Reversión: |r_k - mu| ≤ sigma  ⇔  |Z_k - sigma/2| ≤ 1
+    revierte = np.any(np.abs(Z - 0.5 * sigma[:, :, None]) <= 1.0, axis=2)
+
+    # Precio final: S_0 · exp(h·(mu - sigma²/2) + sigma·ΣZ_k)
+    log_final = h * (mu - 0.5 * sigma ** 2) + sigma * Z.sum(axis=2)
+    return revierte, precios[:, None] * np.exp(log_final)
+
+
+def _bloque_secuencial(precios, mus, sigmas, h, n_paths, muestreo, rng, tolerancia):
+    """
+    Modo secuencial de simular_gbm_lote() para un bloque de anomalías con el mismo horizonte.
+
+    Cada tanda sortea solo las anomalías cuyo IC todavía no cerró; el corte
+    (mínimo 2 tandas, tope n_paths) es el mismo que en simular_gbm().
+
+    Returns:
+        tuple(prob [b], pct [3 × b])
+    """
+    tanda = GBM_PATHS_POR_TANDA
+    max_tandas = -(-n_paths // tanda)
+    b = len(precios)
+    revierte = np.zeros((b, max_tandas * tanda), dtype=bool)
+    finales  = np.empty((b, max_tandas * tanda))
+    tandas   = np.zeros(b, dtype=np.int64)
+    activas  = np.arange(b)
+
+    for t in range(max_tandas):
+        Z = _normales(tanda, h, muestreo, rng, filas=len(activas))
+        cols = slice(t * tanda, (t + 1) * tanda)
+        revierte[activas, cols], finales[activas, cols] = _evaluar_bloque(
+            Z, precios[activas], mus[activas], sigmas[activas], h
+        )
+        tandas[activas] += 1
+        if t >= 1:
+            activas = activas[_semiancho_ic(revierte[activas, :cols.stop], muestreo, tanda) >= tolerancia]
+            if len(activas) == 0:
+                break
+
+    prob = np.empty(b)
+    pct  = np.empty((3, b))
+    for n_tandas in np.unique(tandas):
+        filas = np.flatnonzero(tandas == n_tandas)
+        usados = int(n_tandas) * tanda
+        prob[filas] = revierte[filas, :usados].mean(axis=1)
+        pct[:, filas] = np.percentile(finales[filas, :usados], [5, 50, 95], axis=1)
+    return prob, pct
+
+
+def resolver_gbm_lote(pendientes, rng=None, metodo=None, n_paths=GBM_N_PATHS, muestreo=None,
+                      tolerancia=GBM_TOLERANCIA):
+    """
+    Calcula en lote los campos GBM de filas ya construidas y los escribe en ellas.
+
+    Args:
+        pendientes: list[tuple(rendlog_dict, mu, sigma, precio_close, horizonte)]
+                    — acumulada por build_rows(..., gbm_pendientes=lista)
+        rng:        np.random.Generator para el motor Monte Carlo
+        metodo:     "analitico" | "montecarlo". None = GBM_METODO de config.py
+        n_paths:    caminos por anomalía (solo Monte Carlo)
+        muestreo:   "estandar" | "antitetico" | "sobol". None = GBM_MUESTREO
+        tolerancia: semiancho del IC 95% que corta el muestreo secuencial
+                    (None = n_paths fijos). Default GBM_TOLERANCIA, como
+                    calcular_gbm_anomalia()
+
+    Returns:
+        int — número de anomalías resueltas
+    """
+    if not pendientes:
+        return 0
+
+    metodo = metodo or GBM_METODO
+    _, mus, sigmas, precios, horizontes = (np.array(col) for col in zip(*pendientes))
+    mus = mus.astype(np.float64)
+    sigmas = sigmas.astype(np.float64)
+
+    if metodo == "analitico":
+        validos = (sigmas > 0) & ~np.isnan(sigmas) & ~np.isnan(mus)
+        prob, p5, p50, p95 = _gbm_analitico_arrays(precios, mus, sigmas, horizontes)
+        prob = np.where(validos, prob, np.nan)
+    elif metodo == "montecarlo":
+        prob, p5, p50, p95 = simular_gbm_lote(
+            precios, mus, sigmas, horizontes, n_paths=n_paths, rng=rng, muestreo=muestreo or GBM_MUESTREO,
+            tolerancia=tolerancia,
+        )
+    else:
+        raise ValueError(f"Método GBM desconocido: {metodo}")
+
+    for (rendlog, *_), h, pr, a, b, c in zip(pendientes, horizontes.tolist(), prob.tolist(),
+                                             p5.tolist(), p50.tolist(), p95.tolist()):
+        if np.isnan(pr):
+            rendlog.update(_campos_nulos())
+        else:
+            rendlog.update({
+                "gbm_prob_reversion": round(pr, 4),
+                "gbm_percentil_5":    round(a, 6),
+                "gbm_percentil_50":   round(b, 6),
+                "gbm_percentil_95":   round(c, 6),
+            })
+        rendlog["gbm_horizonte_velas"] = h
+
+    return len(pendientes)
+
+
+def _factor_cholesky(corr):
+    """
+    Factor de Cholesky de una matriz de correlación.
+
+    Si la matriz no es definida positiva (pares casi colineales o ventana
+    corta) se recortan los autovalores a un mínimo y se renormaliza la
+    diagonal a 1 antes de factorizar.
+    """
+    try:
+        return np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        valores, vectores = np.linalg.eigh(corr)
+        corr_pd = (vectores * np.maximum(valores, 1e-8)) @ vectores.T
+        d = np.sqrt(np.diag(corr_pd))
+        return np.linalg.cholesky(corr_pd / np.outer(d, d))
+
+
+def simular_prob_cesta(sigmas, corr, n_horizonte=10, n_paths=GBM_N_PATHS, rng=None, muestreo="estandar"):
+    """
+    P(todos los pares revierten) para k pares con shocks correlacionados, en un solo sorteo.
+
+    Solo la cesta: los campos por par (reversión, percentiles) no se
+    calculan aquí sino en resolver_gbm_lote(). La reversión de un camino no
+    depende de mu ni de S_0 (|Z - sigma/2| ≤ 1), así que basta con sigma.
+
+    Args:
+        sigmas:      array [k] — sigma EWMA por vela (todas > 0)
+        corr:        array [k × k] — correlación entre los retornos de los pares
+        n_horizonte: int — velas hacia adelante (común: mismo timeframe)
+        n_paths:     int — caminos simulados
+        rng:         np.random.Generator (None = default_rng() sin semilla)
+        muestreo:    str — "estandar" | "antitetico" | "sobol"
+
+    Returns:
+        float — fracción de caminos en que todos los pares revierten en el horizonte
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    sigmas = np.asarray(sigmas, dtype=np.float64)
+    k = len(sigmas)
+
+    # ε: (n_paths, h, k) independientes → Z = ε · Lᵀ correlacionadas entre pares
+    eps = _normales(n_paths, n_horizonte * k, muestreo, rng)[0].reshape(-1, n_horizonte, k)
+    Z = eps @ _factor_cholesky(np.asarray(corr, dtype=np.float64)).T
+
+    # Reversión por par: |Z_k - sigma/2| ≤ 1 en alguna vela; la cesta, si revierten todos
+    revierte = np.any(np.abs(Z - 0.5 * sigmas) <= 1.0, axis=1)       # (n_paths, k)
+    return float(np.all(revierte, axis=1).mean())
+
+
+def resolver_gbm_conjunto(pendientes_por_simbolo, cov_matrix, symbols, rng=None,
+                          n_paths=GBM_N_PATHS, muestreo=None, corr_matrix=None):
+    """
+    Probabilidad de que reviertan juntas las anomalías simultáneas de un timeframe.
+
+    Solo agrega gbm_prob_cesta y gbm_cesta_pares, y solo simula eso
+    (simular_prob_cesta): los campos por par (gbm_prob_reversion,
+    percentiles) los resuelve resolver_gbm_lote() para todas las filas, con
+    el motor de GBM_METODO, haya o no otro par anómalo en la misma vela. Entran los pares presentes en la covarianza con
+    sigma/mu válidos y, como la simulación es por timeframe, todos comparten
+    horizonte. Se necesitan al menos 2; si no, no simula nada.
+
+    Args:
+        pendientes_por_simbolo: dict[symbol -> tuple(rendlog, mu, sigma, close, horizonte)]
+                                — una anomalía por par, de la misma vela
+        cov_matrix: np.ndarray [n × n] de calcular_covarianza() (o None)
+        symbols:    list[str] en el orden de cov_matrix
+        rng:        np.random.Generator
+        n_paths:    caminos simulados
+        muestreo:   "estandar" | "antitetico" | "sobol". None = GBM_MUESTREO
+        tolerancia: semiancho del IC 95% que corta el muestreo secuencial
+                    (None = n_paths fijos); como calcular_gbm_anomalia()
+        corr_matrix: np.ndarray opcional — correlación de cov_matrix ya calculada
+
+    Returns:
+        int — pares en la cesta (0 si no se simuló)
+    """
+    if cov_matrix is None or not symbols:
+        return 0
+
+    conjunto = [
+        sym for sym, (_, mu, sigma, _, _) in pendientes_por_simbolo.items()
+        if sym in symbols and sigma > 0 and not np.isnan(sigma) and not np.isnan(mu)
+    ]
+    if len(conjunto) < 2:
+        return 0
+
+    idx = [symbols.index(sym) for sym in conjunto]
+    if corr_matrix is None:
+        corr_matrix = calcular_correlacion(np.asarray(cov_matrix))
+    corr = corr_matrix[np.ix_(idx, idx)]
+    filas = [pendientes_por_simbolo[sym] for sym in conjunto]
+    sigmas = np.array([sigma for _, _, sigma, _, _ in filas], dtype=np.float64)
+
+    prob_cesta = round(simular_prob_cesta(sigmas, corr, n_horizonte=int(filas[0][4]), n_paths=n_paths,
+                                          rng=rng, muestreo=muestreo or GBM_MUESTREO), 4)
+    for rendlog, *_ in filas:
+        rendlog["gbm_prob_cesta"] = prob_cesta
+        rendlog["gbm_cesta_pares"] = len(conjunto)
+
+    return len(conjunto)
+
+
 def _campos_nulos():
     """Devuelve dict con todos los campos GBM en None (vela sin anomalía)."""
     return {
@@ -1,7 +1,7 @@
 # calculos_multipair.py — Álgebra lineal multi-par: Covarianza + PCA
 #
 # Fórmulas:
-#   Matriz de retornos: R [T × 4] — inner join por timestamp entre 4 pares
+#   Matriz de retornos: R [T × 4] — filas del PanelRetornos con retorno en los 4 pares
 #   Covarianza:         Σ = R.T @ R / (T-1)   [4×4]
 #   PCA (eigh):         Σ = V·Λ·V.T  → eigenvalues λ, eigenvectors V
 #   Correlación:        Corr[i,j] = Σ[i,j] / sqrt(Σ[i,i] · Σ[j,j])
@@ -15,14 +15,17 @@ from config import (
     PCA_CORRELACION_UMBRAL,
     PCA_MIN_FILAS_ALINEADAS,
 )
+from panel_retornos import PanelRetornos
 
 
 def construir_matriz_retornos(dataframes):
     """
     Alinea DataFrames por timestamp y construye la matriz de retornos R.
 
-    Usa inner join en la columna 'time' para garantizar alineación exacta.
-    Descarta filas donde cualquier símbolo tiene NaN en log_return.
+    Cada serie se escribe en un PanelRetornos indexado por epoch (sin
+    pd.merge ni copias por símbolo) y R son las filas con retorno en todos
+    los símbolos: el mismo resultado que el inner join en 'time' + dropna.
+    Con un panel ya mantenido en vivo, usar directamente panel.matriz().
 
     Args:
         dataframes: dict[str, pd.DataFrame] — clave = symbol, valor = df con
@@ -38,30 +41,12 @@ def construir_matriz_retornos(dataframes):
     if not dataframes:
         return None, None, None
 
-    symbols = list(dataframes.keys())
+    R, symbols, epochs = PanelRetornos.desde_dataframes(dataframes).matriz()
 
-    # Construir una sola tabla con retornos por símbolo, alineada por 'time'
-    merged = None
-    for sym in symbols:
-        df = dataframes[sym][['time', 'log_return']].copy()
-        df = df.rename(columns={'log_return': sym})
-        if merged is None:
-            merged = df
-        else:
-            merged = pd.merge(merged, df, on='time', how='inner')
-
-    if merged is None or len(merged) < PCA_MIN_FILAS_ALINEADAS:
-        return None, None, None
-
-    # Eliminar filas con cualquier NaN
-    merged = merged.dropna(subset=symbols)
-
-    if len(merged) < PCA_MIN_FILAS_ALINEADAS:
+    if len(R) < PCA_MIN_FILAS_ALINEADAS:
         return None, None, None
 
-    R = merged[symbols].values.astype(np.float64)   # [T × n_symbols]
-    timestamps = merged['time']
-
+    timestamps = pd.Series(epochs.astype("datetime64[ns]"), name="time")
     return R, symbols, timestamps
 
 
@@ -135,24 +120,43 @@ def calcular_pca(cov_matrix, symbols):
     }
 
 
-def detectar_exposicion_usd(cov_matrix, symbols):
+def calcular_correlacion(cov_matrix):
     """
-    Calcula la correlación de cada par con EURUSD y detecta alta exposición USD.
+    Matriz de correlación a partir de la covarianza.
 
-    Exposición alta: correlación con EURUSD > PCA_CORRELACION_UMBRAL.
+    Corr[i,j] = Σ[i,j] / sqrt(Σ[i,i] · Σ[j,j]); diagonal forzada a 1
+    (también para series con varianza 0).
 
     Args:
         cov_matrix: np.ndarray [n_symbols × n_symbols]
-        symbols:    list[str]
 
     Returns:
-        dict[symbol -> bool] — True si el par tiene alta correlación con EURUSD
+        np.ndarray [n_symbols × n_symbols]
     """
     diag = np.sqrt(np.diag(cov_matrix))
     # Evitar división por cero
     diag_safe = np.where(diag > 0, diag, 1.0)
     corr_matrix = cov_matrix / np.outer(diag_safe, diag_safe)
     np.fill_diagonal(corr_matrix, 1.0)
+    return corr_matrix
+
+
+def detectar_exposicion_usd(cov_matrix, symbols, corr_matrix=None):
+    """
+    Calcula la correlación de cada par con EURUSD y detecta alta exposición USD.
+
+    Exposición alta: correlación con EURUSD > PCA_CORRELACION_UMBRAL.
+
+    Args:
+        cov_matrix:  np.ndarray [n_symbols × n_symbols]
+        symbols:     list[str]
+        corr_matrix: np.ndarray opcional — calcular_correlacion(cov_matrix) ya calculada
+
+    Returns:
+        dict[symbol -> bool] — True si el par tiene alta correlación con EURUSD
+    """
+    if corr_matrix is None:
+        corr_matrix = calcular_correlacion(cov_matrix)
 
     exposicion = {}
     if "EURUSD" not in symbols:
@@ -169,21 +173,20 @@ def detectar_exposicion_usd(cov_matrix, symbols):
     return exposicion
 
 
-def calcular_correlacion_con_eurusd(cov_matrix, symbols):
+def calcular_correlacion_con_eurusd(cov_matrix, symbols, corr_matrix=None):
     """
     Retorna la correlación escalar de cada símbolo con EURUSD.
 
     Args:
-        cov_matrix: np.ndarray [n_symbols × n_symbols]
-        symbols:    list[str]
+        cov_matrix:  np.ndarray [n_symbols × n_symbols]
+        symbols:     list[str]
+        corr_matrix: np.ndarray opcional — calcular_correlacion(cov_matrix) ya calculada
 
     Returns:
         dict[symbol -> float | None]
     """
-    diag = np.sqrt(np.diag(cov_matrix))
-    diag_safe = np.where(diag > 0, diag, 1.0)
-    corr_matrix = cov_matrix / np.outer(diag_safe, diag_safe)
-    np.fill_diagonal(corr_matrix, 1.0)
+    if corr_matrix is None:
+        corr_matrix = calcular_correlacion(cov_matrix)
 
     if "EURUSD" not in symbols:
         return {sym: None for sym in symbols}
@@ -220,6 +223,8 @@ def es_movimiento_sistemico(pca_result, symbol):
     Condición:
         PC1 explica > PCA_PC1_VARIANZA_UMBRAL (60%) de la varianza
         AND loading del símbolo en PC1 > PCA_PC1_LOADING_UMBRAL (0.70)
+    En modo universo (pca_universo) el resultado ya trae 'sistemico' por
+    símbolo, evaluado contra los k factores por moneda.
 
     Args:
         pca_result: dict devuelto por calcular_pca() — puede ser None
@@ -230,6 +235,8 @@ def es_movimiento_sistemico(pca_result, symbol):
     """
     if pca_result is None or not pca_result.get("pca_valido", False):
         return False
+    if "sistemico" in pca_result:
+        return bool(pca_result["sistemico"].get(symbol, False))
 
     pc1_varianza = pca_result.get("pc1_varianza", 0.0)
     loading = abs(pca_result.get("pc1_loadings", {}).get(symbol, 0.0))
@@ -237,6 +244,21 @@ def es_movimiento_sistemico(pca_result, symbol):
     return pc1_varianza > PCA_PC1_VARIANZA_UMBRAL and loading > PCA_PC1_LOADING_UMBRAL
 
 
+def es_sistemico_por_fila(pc1_varianza, pc1_loading):
+    """
+    es_movimiento_sistemico() por columnas, para un PCA distinto en cada vela.
+
+    Args:
+        pc1_varianza: np.ndarray [n] — NaN donde no hubo PCA
+        pc1_loading:  np.ndarray [n] — loading del símbolo en PC1 (NaN sin PCA)
+
+    Returns:
+        np.ndarray bool [n]
+    """
+    with np.errstate(invalid='ignore'):
+        return (pc1_varianza > PCA_PC1_VARIANZA_UMBRAL) & (np.abs(pc1_loading) > PCA_PC1_LOADING_UMBRAL)
+
+
 def _pca_nulo(symbols):
     """Estructura PCA vacía cuando el cálculo no es posible."""
     return {
@@ -1,6 +1,7 @@
 # calculos_rendlog.py — v3.0 Fase 1: EWMA Sigma Dinámico
 import numpy as np
 import pandas as pd
+from scipy.signal import lfilter
 from config import (
     RENDLOG_LAMBDA_EWMA,
     RENDLOG_LAMBDA_DEFAULT,
@@ -25,43 +26,74 @@ def calcular_rendimientos_log(df):
     return df
 
 
-def _calcular_ewma_std(returns_series: pd.Series, lambda_decay: float) -> pd.Series:
+def _varianza_ewma(returns, lambda_decay):
     """
-    Calcula serie de sigma condicional EWMA para cada punto.
+    Kernel vectorizado de la recursión EWMA sobre un array de retornos.
 
-    La varianza EWMA en t depende de la varianza en t-1 y del
-    retorno al cuadrado en t-1 (no el actual — causal).
+    Misma recursión que el loop original, resuelta en una sola pasada
+    con scipy.signal.lfilter (filtro IIR de primer orden):
+        var[t] = λ·var[t-1] + (1-λ)·r[t-1]²
+    Los retornos NaN no actualizan la varianza (se arrastra var[t-1]).
+    El resultado es idéntico bit a bit al loop en Python.
 
     Args:
-        returns_series: Serie de retornos logarítmicos
-        lambda_decay:   Factor de decaimiento λ
+        returns:      np.ndarray de retornos logarítmicos
+        lambda_decay: Factor de decaimiento λ
 
     Returns:
-        Serie de sigma condicional (misma longitud)
+        tuple(variance, first_valid_idx), o (None, 0) si hay < 2 retornos válidos
     """
-    n = len(returns_series)
-    returns = returns_series.values
+    n = len(returns)
     variance = np.zeros(n)
 
     # Inicialización: varianza de los primeros 5 retornos válidos
     valid_mask = ~np.isnan(returns)
     if valid_mask.sum() < 2:
-        return pd.Series(np.zeros(n), index=returns_series.index)
+        return None, 0
 
-    first_valid_idx = np.argmax(valid_mask)
+    first_valid_idx = int(np.argmax(valid_mask))
     init_window = returns[first_valid_idx:first_valid_idx + 5]
     init_var = np.nanvar(init_window) if len(init_window) > 1 else 1e-10
     variance[first_valid_idx] = init_var if init_var > 0 else 1e-10
 
-    for t in range(first_valid_idx + 1, n):
-        r_prev = returns[t - 1]
-        if np.isnan(r_prev):
-            variance[t] = variance[t - 1]
-        else:
-            variance[t] = (
-                lambda_decay * variance[t - 1] +
-                (1 - lambda_decay) * r_prev ** 2
-            )
+    # r[t-1] para t = first_valid_idx+1 .. n-1
+    r_prev = returns[first_valid_idx:n - 1]
+    validos = ~np.isnan(r_prev)
+    if validos.any():
+        actualizaciones, _ = lfilter(
+            [1 - lambda_decay], [1.0, -lambda_decay],
+            r_prev[validos] ** 2,
+            zi=[lambda_decay * variance[first_valid_idx]],
+        )
+        # Índice de la última actualización válida vista en cada t (-1 = ninguna aún)
+        pos = np.cumsum(validos) - 1
+        variance[first_valid_idx + 1:] = np.where(
+            pos >= 0, actualizaciones[np.maximum(pos, 0)], variance[first_valid_idx]
+        )
+    else:
+        variance[first_valid_idx + 1:] = variance[first_valid_idx]
+
+    return variance, first_valid_idx
+
+
+def _calcular_ewma_std(returns_series: pd.Series, lambda_decay: float) -> pd.Series:
+    """
+    Calcula serie de sigma condicional EWMA para cada punto.
+
+    La varianza EWMA en t depende de la varianza en t-1 y del
+    retorno al cuadrado en t-1 (no el actual — causal).
+
+    Args:
+        returns_series: Serie de retornos logarítmicos
+        lambda_decay:   Factor de decaimiento λ
+
+    Returns:
+        Serie de sigma condicional (misma longitud)
+    """
+    n = len(returns_series)
+    variance, first_valid_idx = _varianza_ewma(returns_series.values, lambda_decay)
+    if variance is None:
+        return pd.Series(np.zeros(n), index=returns_series.index)
 
     sigma = np.sqrt(np.maximum(variance, 1e-12))
 
@@ -72,6 +104,97 @@ def _calcular_ewma_std(returns_series: pd.Series, lambda_decay: float) -> pd.Ser
     return sigma_series
 
 
+def seleccionar_lambda(timeframe=None, symbol=None):
+    """
+    Lambda EWMA para un par+timeframe.
+
+    Primero por símbolo+timeframe (RENDLOG_LAMBDA_EWMA_SYMBOL), luego por
+    timeframe solo (RENDLOG_LAMBDA_EWMA), y finalmente RENDLOG_LAMBDA_DEFAULT.
+    """
+    if symbol and symbol in RENDLOG_LAMBDA_EWMA_SYMBOL:
+        return RENDLOG_LAMBDA_EWMA_SYMBOL[symbol].get(timeframe, RENDLOG_LAMBDA_DEFAULT)
+    return RENDLOG_LAMBDA_EWMA.get(timeframe, RENDLOG_LAMBDA_DEFAULT)
+
+
+class EstadoEWMA:
+    """
+    Estado EWMA persistente por (symbol, timeframe) con actualización O(1).
+
+    Se siembra una vez desde el historial (una pasada vectorizada) y luego
+    recibe un retorno por vela nueva. Sigma tras cada actualización es
+    idéntico al que daría calcular_bandas_sigma() sobre el historial
+    completo extendido con esa vela.
+
+    El loop de main no lo usa: cada fila publicada debe ser bit a bit la de
+    calcular_bandas_sigma() sobre su ventana de VENTANA_VELAS velas, que
+    reinicia la recursión al principio de la ventana; un estado arrastrado
+    desde el arranque pondera también las velas que ya salieron (λ^k) y no
+    coincide. Sirve a quien consume la serie completa sin ventana.
+
+    Uso:
+        estado = EstadoEWMA.desde_historial(df['log_return'].values, lambda_decay)
+        sigma  = estado.actualizar(nuevo_log_return)
+    """
+    __slots__ = ("lambda_decay", "varianza", "ultimo_retorno", "_historial")
+
+    def __init__(self, lambda_decay):
+        self.lambda_decay   = lambda_decay
+        self.varianza       = None
+        self.ultimo_retorno = np.nan
+        # Historial completo solo mientras la ventana de inicialización
+        # (primeros 5 retornos válidos) no está completa
+        self._historial = []
+
+    @classmethod
+    def desde_historial(cls, returns, lambda_decay):
+        """Crea y siembra un estado desde un array de retornos logarítmicos."""
+        estado = cls(lambda_decay)
+        estado._sembrar(np.asarray(returns, dtype=np.float64))
+        return estado
+
+    def _sembrar(self, returns):
+        variance, first_valid_idx = _varianza_ewma(returns, self.lambda_decay)
+        self._historial = list(returns)
+        if variance is None:
+            self.varianza = None
+            return np.zeros(len(returns))
+
+        self.varianza       = float(variance[-1])
+        self.ultimo_retorno = float(returns[-1])
+        if len(returns) >= first_valid_idx + 5:
+            self._historial = None
+
+        sigma = np.sqrt(np.maximum(variance, 1e-12))
+        sigma[:first_valid_idx] = np.nan
+        return sigma
+
+    @property
+    def sigma(self):
+        """Sigma condicional de la última vela (NaN si aún no hay datos suficientes)."""
+        if self.varianza is None:
+            return np.nan
+        return float(np.sqrt(max(self.varianza, 1e-12)))
+
+    def actualizar(self, log_return):
+        """
+        Incorpora el retorno de la vela nueva y devuelve su sigma condicional.
+
+        Causal: la varianza de la vela nueva usa el retorno de la vela anterior.
+        """
+        if self._historial is not None:
+            self._historial.append(float(log_return))
+            return float(self._sembrar(np.asarray(self._historial))[-1])
+
+        r_prev = self.ultimo_retorno
+        if not np.isnan(r_prev):
+            self.varianza = (
+                self.lambda_decay * self.varianza +
+                (1 - self.lambda_decay) * r_prev ** 2
+            )
+        self.ultimo_retorno = float(log_return)
+        return self.sigma
+
+
 def calcular_bandas_sigma(df, ventana=20, timeframe=None, symbol=None):
     """
     Calcula media móvil y bandas sigma usando EWMA para sigma dinámico.
@@ -98,10 +221,7 @@ def calcular_bandas_sigma(df, ventana=20, timeframe=None, symbol=None):
     df = df.copy()
 
     # Seleccionar lambda: primero por símbolo+timeframe, luego por timeframe solo
-    if symbol and symbol in RENDLOG_LAMBDA_EWMA_SYMBOL:
-        lambda_decay = RENDLOG_LAMBDA_EWMA_SYMBOL[symbol].get(timeframe, RENDLOG_LAMBDA_DEFAULT)
-    else:
-        lambda_decay = RENDLOG_LAMBDA_EWMA.get(timeframe, RENDLOG_LAMBDA_DEFAULT)
+    lambda_decay = seleccionar_lambda(timeframe, symbol)
 
     # Media móvil — sin cambio respecto a v2.0
     df['media'] = df['log_return'].rolling(window=ventana).mean()
@@ -360,43 +480,77 @@ def calcular_umbrales_calibrados(nu):
 # ============================================================
 
 
-def calcular_efficiency_ratio(df, ventana=None):
+def efficiency_ratio_vectorizado(prices, ventana=None):
     """
-    Calcula Efficiency Ratio para cada punto de la serie.
+    Efficiency Ratio de toda la serie en O(n) con sumas prefijo.
 
-    ER = desplazamiento_neto / suma_movimientos_individuales
+    suma_movimientos[i] = C[i] - C[i-ventana],  C = cumsum(|Δprecio|)
+    desplazamiento[i]   = |p[i] - p[i-ventana]|
+
+    Acepta un array 1-D (una serie) o 2-D [T × n_series] (muchas series a la
+    vez, una por columna, igual que la matriz R de calculos_multipair).
+    Un cierre NaN da ER = 0.0 en las ventanas que lo contienen, como el loop
+    original (su suma de |Δprecio| es NaN y 'NaN > 0' es falso), y no toca las
+    siguientes: la suma prefijo acumula las |Δprecio| con NaN → 0 y otra suma
+    prefijo cuenta los NaN.
 
     Args:
-        df:      DataFrame con columna 'close'
+        prices:  np.ndarray [T] o [T × n_series] de precios de cierre
         ventana: int — número de velas para calcular ER
                        Si None, usa RENDLOG_ER_VENTANA de config.py
 
     Returns:
-        DataFrame con columna 'efficiency_ratio' agregada
+        np.ndarray con la misma forma que prices; NaN en las primeras
+        'ventana' filas, 0.0 en ventanas planas o con algún cierre NaN,
+        recortado a [0, 1]
     """
     if ventana is None:
         ventana = RENDLOG_ER_VENTANA
 
-    df = df.copy()
+    prices = np.asarray(prices, dtype=np.float64)
+    er_values = np.full(prices.shape, np.nan)
+
+    if prices.shape[0] <= ventana:
+        return er_values
 
-    er_values = np.full(len(df), np.nan)
+    ceros = np.zeros((1,) + prices.shape[1:])
 
-    prices = df['close'].values
+    # C[k] = suma de |Δp| de las primeras k diferencias (C[0] = 0); un NaN no
+    # contamina el resto de la suma prefijo
+    movimientos = np.nan_to_num(np.abs(np.diff(prices, axis=0)))
+    cumsum = np.concatenate([ceros, np.cumsum(movimientos, axis=0)], axis=0)
 
-    for i in range(ventana, len(prices)):
-        window = prices[i - ventana: i + 1]
+    # N[k] = cierres NaN entre los k primeros; la ventana de la fila i abarca i-ventana..i
+    cuenta_nan = np.concatenate([ceros, np.cumsum(np.isnan(prices), axis=0)], axis=0)
+    con_nan = (cuenta_nan[ventana + 1:] - cuenta_nan[:-ventana - 1]) > 0
 
-        net_displacement    = abs(window[-1] - window[0])
-        individual_moves    = np.sum(np.abs(np.diff(window)))
+    net_displacement = np.abs(prices[ventana:] - prices[:-ventana])
+    individual_moves = cumsum[ventana:] - cumsum[:-ventana]
 
-        if individual_moves > 0:
-            er_values[i] = net_displacement / individual_moves
-        else:
-            er_values[i] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        er = np.where(individual_moves > 0, net_displacement / individual_moves, 0.0)
+    er[con_nan] = 0.0
 
-    er_series = np.clip(er_values, 0.0, 1.0)
-    df['efficiency_ratio'] = er_series
+    er_values[ventana:] = np.clip(er, 0.0, 1.0)
+    return er_values
 
+
+def calcular_efficiency_ratio(df, ventana=None):
+    """
+    Calcula Efficiency Ratio para cada punto de la serie.
+
+    ER = desplazamiento_neto / suma_movimientos_individuales
+
+    Args:
+        df:      DataFrame con columna 'close'
+        ventana: int — número de velas para calcular ER
+                       Si None, usa RENDLOG_ER_VENTANA de config.py
+
+    Returns:
+        DataFrame con columna 'efficiency_ratio' agregada
+    """
+    df = df.copy()
+    df['efficiency_ratio'] = efficiency_ratio_vectorizado(df['close'].values, ventana)
     return df
 
 
@@ -0,0 +1,276 @@
+# cola_envios.py — Cola de envío a Supabase en segundo plano, con write-ahead log en disco
+#
+# main encola las filas de cada ciclo y sigue calculando; un hilo las envía
+# con SupabaseClient.confirmar_filas() (commit_cycle_data: upsert + recorte
+# de ventana). Si Supabase tarda o falla, el loop no espera y las filas no
+# se pierden:
+#   - cada encolar() se agrega primero al WAL ({directorio}/wal.jsonl, una
+#     línea JSON {"seq", "filas"} con fsync) y solo después a memoria
+#   - tras un envío exitoso se escribe el último seq confirmado en ack.json;
+#     al arrancar se reencolan las líneas del WAL con seq mayor
+#   - fallos: reintento con backoff exponencial (COLA_REINTENTO_BASE_S ..
+#     COLA_REINTENTO_MAX_S); encolar durante la espera no adelanta el reintento
+#
+# Memoria acotada: las pendientes se fusionan por (symbol, timeframe,
+# data_timestamp) — gana la última versión — y por serie solo se guardan las
+# `ventana` más recientes; las más viejas el servidor las borraría en el
+# mismo commit. Con el WAL ya confirmado entero se vacía; si crece más de
+# COLA_WAL_MAX_BYTES (también sin conexión, al encolar) se reescribe con las
+# pendientes fusionadas y el lote en vuelo: queda acotado por la ventana.
+#
+import os
+import json
+import time
+import threading
+from api_client import serializar_json
+from config import (
+    VENTANA_VELAS, COLA_REINTENTO_BASE_S, COLA_REINTENTO_MAX_S, COLA_WAL_MAX_BYTES,
+)
+from utils import log_mensaje
+
+
+class ColaEnvios:
+    """
+    Cola durable de filas hacia Supabase con un hilo de envío.
+
+    Uso:
+        cola = ColaEnvios(SupabaseClient(), directorio="cola_envios")
+        cola.iniciar()                 # reencola lo que quedó sin confirmar
+        cola.encolar(filas)            # no bloquea por la red
+        cola.detener(timeout=30)       # vacía la cola (lo no enviado queda en el WAL)
+    """
+
+    def __init__(self, cliente, directorio=None, ventana=VENTANA_VELAS):
+        self.cliente = cliente
+        self.directorio = directorio or None   # None / "" = sin WAL (solo memoria)
+        self.ventana = ventana
+
+        self._cond = threading.Condition()
+        self._pendientes = {}     # (symbol, timeframe) -> {data_timestamp: fila}
+        self._seq = 0             # último seq escrito en el WAL
+        self._seq_confirmado = 0  # último seq confirmado por Supabase
+        self._en_vuelo = 0        # filas del lote que se está enviando
+        self._lote = None         # ese lote (entra en la compactación del WAL)
+        self._proximo_intento = 0.0   # time.monotonic() antes del cual no se reintenta
+        self._detener = False
+        self._limite = None       # time.monotonic() hasta el que se reintenta al detener
+        self._fallos = 0
+        self._hilo = None
+
+        # Contadores para el log del ciclo
+        self.filas_enviadas = 0
+        self.envios_fallidos = 0
+
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+            self._recuperar()
+
+    # ------------------------------------------------------------------
+    # WAL
+    # ------------------------------------------------------------------
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def _recuperar(self):
+        """Reencola las filas del WAL posteriores al último seq confirmado."""
+        try:
+            with open(self._ruta("ack.json"), encoding="utf-8") as f:
+                self._seq_confirmado = self._seq = int(json.load(f)["seq"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        recuperadas = 0
+        try:
+            with open(self._ruta("wal.jsonl"), "rb") as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        break   # última línea cortada por una caída a mitad de escritura
+                    self._seq = max(self._seq, registro["seq"])
+                    if registro["seq"] > self._seq_confirmado:
+                        self._fusionar(registro["filas"])
+                        recuperadas += len(registro["filas"])
+        except OSError:
+            return
+        if recuperadas:
+            log_mensaje(f"Cola de envío: {recuperadas} filas sin confirmar recuperadas del WAL", "WARNING")
+
+    def _escribir_wal(self, filas):
+        self._seq += 1
+        if self.directorio:
+            with open(self._ruta("wal.jsonl"), "ab") as f:
+                f.write(serializar_json({"seq": self._seq, "filas": filas}) + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return self._seq
+
+    def _confirmar_wal(self, seq):
+        self._seq_confirmado = seq
+        if not self.directorio:
+            return
+        temporal = self._ruta("ack.json.tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self._ruta("ack.json"))
+
+        # Compactar: vacío si todo está confirmado; si no, solo las pendientes fusionadas
+        if not self._pendientes:
+            self._compactar_wal([])
+        elif os.path.getsize(self._ruta("wal.jsonl")) > COLA_WAL_MAX_BYTES:
+            self._compactar_wal(self._filas_pendientes())
+
+    def _compactar_wal(self, filas):
+        """Reescribe el WAL como un único registro con `filas` y el último seq (vacío si no hay filas)."""
+        ruta = self._ruta("wal.jsonl")
+        contenido = serializar_json({"seq": self._seq, "filas": filas}) + b"\n" if filas else b""
+        with open(ruta + ".tmp", "wb") as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta + ".tmp", ruta)
+
+    # ------------------------------------------------------------------
+    # Pendientes en memoria
+    # ------------------------------------------------------------------
+
+    def _fusionar(self, filas, reemplazar=True):
+        """Agrega filas a las pendientes: una por clave y `ventana` por serie."""
+        for fila in filas:
+            serie = self._pendientes.setdefault((fila.get("symbol", "EURUSD"), fila["timeframe"]), {})
+            if reemplazar or fila["data_timestamp"] not in serie:
+                serie[fila["data_timestamp"]] = fila
+        for serie in self._pendientes.values():
+            if len(serie) > self.ventana:
+                for ts in sorted(serie)[:-self.ventana]:
+                    del serie[ts]
+
+    def _filas_pendientes(self):
+        return [fila for serie in self._pendientes.values() for fila in serie.values()]
+
+    @property
+    def num_pendientes(self):
+        """Filas esperando envío (incluye el lote en vuelo)."""
+        with self._cond:
+            return sum(len(serie) for serie in self._pendientes.values()) + self._en_vuelo
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def encolar(self, filas):
+        """
+        Registra filas en el WAL y las deja para el hilo de envío (no espera a la red).
+
+        Args:
+            filas: list[dict] — filas de build_rows()
+        """
+        if not filas:
+            return
+        with self._cond:
+            self._escribir_wal(filas)
+            self._fusionar(filas)
+            if self.directorio and os.path.getsize(self._ruta("wal.jsonl")) > COLA_WAL_MAX_BYTES:
+                # Sin confirmaciones (Supabase caído) el WAL no se compacta al enviar:
+                # se reescribe aquí, con el lote en vuelo por si no llega a confirmarse
+                self._compactar_wal((self._lote or []) + self._filas_pendientes())
+            self._cond.notify()
+
+    def descartar_pendientes(self):
+        """
+        Da por confirmado todo lo encolado o recuperado del WAL sin enviarlo.
+
+        Para el arranque de main, que borra los datos del usuario en Supabase:
+        las filas de la sesión anterior ya no tienen dónde ir.
+
+        Returns:
+            int — filas descartadas
+        """
+        with self._cond:
+            descartadas = sum(len(serie) for serie in self._pendientes.values())
+            self._pendientes = {}
+            if self._seq > self._seq_confirmado:
+                self._confirmar_wal(self._seq)
+            return descartadas
+
+    def iniciar(self):
+        """Arranca el hilo de envío."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="cola-envios", daemon=True)
+            self._hilo.start()
+
+    def detener(self, timeout=None):
+        """
+        Termina de enviar lo pendiente y detiene el hilo.
+
+        Los envíos fallidos se siguen reintentando mientras quede tiempo.
+
+        Args:
+            timeout: float — segundos máximos de espera (None = sin límite)
+
+        Returns:
+            bool: True si no quedó nada pendiente (lo que quede sigue en el WAL)
+        """
+        with self._cond:
+            self._detener = True
+            self._limite = None if timeout is None else time.monotonic() + timeout
+            self._cond.notify()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+        with self._cond:
+            return not self._pendientes and not self._en_vuelo
+
+    # ------------------------------------------------------------------
+    # Hilo de envío
+    # ------------------------------------------------------------------
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._pendientes:
+                        if self._detener:
+                            return
+                        self._cond.wait()
+                        continue
+                    # Tras un fallo, encolar() despierta al hilo pero no adelanta el reintento
+                    espera = self._proximo_intento - time.monotonic()
+                    if espera <= 0:
+                        break
+                    if self._detener and self._limite is not None and self._proximo_intento > self._limite:
+                        return
+                    self._cond.wait(espera)
+                lote = self._filas_pendientes()
+                self._pendientes = {}
+                seq = self._seq
+                self._lote, self._en_vuelo = lote, len(lote)
+
+            ok = self.cliente.confirmar_filas(lote, self.ventana)
+
+            with self._cond:
+                self._lote, self._en_vuelo = None, 0
+                if ok:
+                    self._fallos = 0
+                    self._proximo_intento = 0.0
+                    self.filas_enviadas += len(lote)
+                    self._confirmar_wal(seq)
+                    log_mensaje(
+                        f"Cola de envío: {len(lote)} filas confirmadas | "
+                        f"Supabase: {self.cliente.resumen_ultima_llamada()}",
+                        "INFO",
+                    )
+                    continue
+
+                # Devolver el lote sin pisar versiones más nuevas llegadas mientras tanto
+                self._fusionar(lote, reemplazar=False)
+                self._fallos += 1
+                self.envios_fallidos += 1
+                espera = min(COLA_REINTENTO_BASE_S * 2 ** (self._fallos - 1), COLA_REINTENTO_MAX_S)
+                self._proximo_intento = time.monotonic() + espera
+                log_mensaje(
+                    f"Cola de envío: fallo #{self._fallos} ({len(lote)} filas), reintento en {espera:.0f}s",
+                    "WARNING",
+                )
@@ -1,8 +1,8 @@
 # conexion_mt5.py
 import MetaTrader5 as mt5
-import pandas as pd
-from datetime import datetime
-from config import MT5_LOGIN, MT5_PASSWORD, MT5_SERVER, SYMBOLS_ACTIVOS, BROKER_UTC_OFFSET_HOURS
+from datetime import datetime, timedelta, timezone
+from buffer_velas import rates_a_columnas, columnas_a_dataframe
+from config import MT5_LOGIN, MT5_PASSWORD, MT5_SERVER, SYMBOLS_ACTIVOS
 from utils import log_mensaje
 
 def conectar_mt5():
@@ -49,6 +49,23 @@ def conectar_mt5():
         log_mensaje(f"Excepción en conexión MT5: {e}", "ERROR")
         return False
 
+def desconectar_mt5():
+    """Cierra la conexión con MetaTrader 5."""
+    mt5.shutdown()
+
+def _mt5_timeframe(timeframe_minutes):
+    """Mapea minutos del timeframe a la constante MT5 (M30 si no está mapeado)."""
+    timeframe_map = {
+        1: mt5.TIMEFRAME_M1,
+        5: mt5.TIMEFRAME_M5,
+        15: mt5.TIMEFRAME_M15,
+        30: mt5.TIMEFRAME_M30,
+        60: mt5.TIMEFRAME_H1,
+        240: mt5.TIMEFRAME_H4,
+        1440: mt5.TIMEFRAME_D1
+    }
+    return timeframe_map.get(timeframe_minutes, mt5.TIMEFRAME_M30)
+
 def obtener_datos_historicos(symbol, timeframe_minutes, num_bars):
     """
     Obtiene datos históricos de MT5
@@ -62,33 +79,104 @@ def obtener_datos_historicos(symbol, timeframe_minutes, num_bars):
         DataFrame con columnas: time, open, high, low, close, tick_volume
     """
     try:
-        # Mapear timeframe a constante MT5
-        timeframe_map = {
-            1: mt5.TIMEFRAME_M1,
-            5: mt5.TIMEFRAME_M5,
-            15: mt5.TIMEFRAME_M15,
-            30: mt5.TIMEFRAME_M30,
-            60: mt5.TIMEFRAME_H1,
-            240: mt5.TIMEFRAME_H4,
-            1440: mt5.TIMEFRAME_D1
-        }
-
-        mt5_timeframe = timeframe_map.get(timeframe_minutes, mt5.TIMEFRAME_M30)
-
         # Obtener datos
-        rates = mt5.copy_rates_from_pos(symbol, mt5_timeframe, 0, num_bars)
+        rates = mt5.copy_rates_from_pos(symbol, _mt5_timeframe(timeframe_minutes), 0, num_bars)
 
         if rates is None or len(rates) == 0:
             log_mensaje(f"No se pudieron obtener datos de {symbol}", "ERROR")
             return None
 
-        # Convertir a DataFrame
-        df = pd.DataFrame(rates)
-        # MT5 devuelve timestamps en hora del broker; restar offset para obtener UTC real
-        df['time'] = pd.to_datetime(df['time'], unit='s') - pd.Timedelta(hours=BROKER_UTC_OFFSET_HOURS)
-
-        return df[['time', 'open', 'high', 'low', 'close', 'tick_volume']]
+        # Columnas directas del array de MT5 (time ya en UTC); un solo DataFrame al final
+        return columnas_a_dataframe(rates_a_columnas(rates))
 
     except Exception as e:
         log_mensaje(f"Error obteniendo datos históricos: {e}", "ERROR")
         return None
+
+def obtener_rates(symbol, timeframe_minutes, num_bars):
+    """
+    Últimas num_bars velas como array estructurado de MT5 (sin DataFrame).
+
+    Para sembrar un BufferVelas; 'time' queda en epoch del broker.
+
+    Returns:
+        np.ndarray estructurado (time, open, high, low, close, tick_volume, ...) o None
+    """
+    try:
+        rates = mt5.copy_rates_from_pos(symbol, _mt5_timeframe(timeframe_minutes), 0, num_bars)
+        if rates is None or len(rates) == 0:
+            log_mensaje(f"No se pudieron obtener datos de {symbol}", "ERROR")
+            return None
+        return rates
+    except Exception as e:
+        log_mensaje(f"Error obteniendo rates: {e}", "ERROR")
+        return None
+
+def obtener_columnas(symbol, timeframe_minutes, num_bars):
+    """
+    Últimas num_bars velas como columnas numpy (ruta de cálculo, sin DataFrame).
+
+    Returns:
+        dict[campo -> np.ndarray] de rates_a_columnas() ('time' en epoch UTC) o None
+    """
+    return rates_a_columnas(obtener_rates(symbol, timeframe_minutes, num_bars))
+
+def obtener_rates_desde(symbol, timeframe_minutes, desde_epoch):
+    """
+    Velas con time >= desde_epoch (epoch del broker) vía copy_rates_range.
+
+    Incluye la vela de desde_epoch (puede haber cambiado si estaba en
+    formación); BufferVelas.actualizar() la sobrescribe y agrega el resto.
+    El extremo final se deja un día por delante de la hora actual para
+    cubrir cualquier offset del broker.
+
+    Returns:
+        np.ndarray estructurado o None (sin datos o error)
+    """
+    try:
+        desde = datetime.fromtimestamp(int(desde_epoch), tz=timezone.utc)
+        hasta = datetime.now(timezone.utc) + timedelta(days=1)
+        rates = mt5.copy_rates_range(symbol, _mt5_timeframe(timeframe_minutes), desde, hasta)
+        if rates is None or len(rates) == 0:
+            return None
+        return rates
+    except Exception as e:
+        log_mensaje(f"Error obteniendo velas nuevas de {symbol}: {e}", "ERROR")
+        return None
+
+def obtener_ticks_desde(symbol, desde_msc):
+    """
+    Ticks con time_msc >= desde_msc (epoch broker en ms) vía copy_ticks_range.
+
+    Mismo criterio de rango que obtener_rates_desde(); los ticks repetidos
+    del milisegundo inicial los descarta MotorFlujoTicks.ingerir().
+
+    Returns:
+        np.ndarray estructurado (time, bid, ask, last, volume, time_msc, flags, volume_real) o None
+    """
+    try:
+        desde = datetime.fromtimestamp(int(desde_msc) / 1000, tz=timezone.utc)
+        hasta = datetime.now(timezone.utc) + timedelta(days=1)
+        ticks = mt5.copy_ticks_range(symbol, desde, hasta, mt5.COPY_TICKS_ALL)
+        if ticks is None or len(ticks) == 0:
+            return None
+        return ticks
+    except Exception as e:
+        log_mensaje(f"Error obteniendo ticks de {symbol}: {e}", "ERROR")
+        return None
+
+def obtener_hora_broker(symbol):
+    """
+    Hora del broker (epoch en segundos) según el último tick del símbolo.
+
+    Returns:
+        int o None si MT5 no devuelve tick
+    """
+    try:
+        tick = mt5.symbol_info_tick(symbol)
+        if tick is None:
+            return None
+        return int(tick.time)
+    except Exception as e:
+        log_mensaje(f"Error obteniendo hora del broker: {e}", "ERROR")
+        return None
@@ -12,6 +12,24 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 API_KEY = os.getenv("API_KEY")  # Usuario lo configura después de registrarse
 
+# Transporte HTTP: una sesión keep-alive por cliente, timeouts explícitos y
+# cuerpos JSON comprimidos con gzip a partir de HTTP_GZIP_MIN_BYTES (0 = nunca)
+HTTP_TIMEOUT_CONEXION_S = float(os.getenv("HTTP_TIMEOUT_CONEXION_S", "3.05"))
+HTTP_TIMEOUT_LECTURA_S = float(os.getenv("HTTP_TIMEOUT_LECTURA_S", "20"))
+HTTP_POOL_CONEXIONES = int(os.getenv("HTTP_POOL_CONEXIONES", "4"))
+HTTP_GZIP_MIN_BYTES = int(os.getenv("HTTP_GZIP_MIN_BYTES", "1024"))
+# user_config cacheada en el cliente: se revalida (lectura condicional) al vencer el TTL;
+# con la red lenta (> CONFIG_TIMEOUT_S) se sigue usando la última leída
+CONFIG_CACHE_TTL_S = float(os.getenv("CONFIG_CACHE_TTL_S", "300"))
+CONFIG_TIMEOUT_S = float(os.getenv("CONFIG_TIMEOUT_S", "2"))
+# Cola de envío en segundo plano con write-ahead log (cola_envios.py).
+# Vacío = sin WAL: la cola sigue siendo asíncrona pero no sobrevive a un reinicio.
+COLA_ENVIOS_DIRECTORIO = os.getenv("COLA_ENVIOS_DIRECTORIO", "cola_envios")
+COLA_REINTENTO_BASE_S = 1.0          # Primer reintento tras un fallo; se duplica en cada fallo
+COLA_REINTENTO_MAX_S = 60.0          # Tope del backoff
+COLA_WAL_MAX_BYTES = 8 * 1024 * 1024 # Por encima se compacta el WAL a las filas pendientes
+COLA_DETENER_TIMEOUT_S = 30.0        # Espera máxima al vaciar la cola al terminar
+
 # ============================================================
 # MT5 (Broker Local)
 # ============================================================
@@ -29,6 +47,15 @@ BROKER_UTC_OFFSET_HOURS = int(os.getenv("BROKER_UTC_OFFSET", "2"))
 # ============================================================
 # Numero exacto de velas que se mantienen en Supabase por timeframe
 VENTANA_VELAS = 60
+# Velas por (symbol, timeframe) en el buffer en memoria (>= VENTANA_VELAS).
+# Solo la sembrada inicial pide esta cantidad a MT5; después se agregan las nuevas.
+BUFFER_VELAS_CAPACIDAD = int(os.getenv("BUFFER_VELAS_CAPACIDAD", str(VENTANA_VELAS)))
+# 5M–4H se construyen en memoria desde el stream M1 (una consulta MT5 por símbolo y ciclo).
+# Opcional: por defecto cada timeframe sigue saliendo de las velas del broker
+AGREGADOR_DESDE_M1 = os.getenv("AGREGADOR_DESDE_M1", "0") == "1"
+# Almacén local de velas (memory-mapped): al arrancar solo se pide a MT5 el hueco
+# desde la última vela guardada. Vacío = desactivado. Una subcarpeta por proveedor.
+ALMACEN_VELAS_DIRECTORIO = os.getenv("ALMACEN_VELAS_DIRECTORIO", "almacen_velas")
 
 # ============================================================
 # CONFIGURACIÓN POR DEFECTO
@@ -60,6 +87,30 @@ TIMEFRAME_MAP = {
     "4H": 240   # mt5.TIMEFRAME_H4
 }
 
+# ============================================================
+# ORDER FLOW POR TICK (regla del tick)
+# ============================================================
+# Delta comprador/vendedor desde los ticks (copy_ticks_range) en lugar de la
+# dirección de la vela. Velas sin cobertura de ticks usan la dirección de la vela.
+# Opcional: por defecto orderflow.delta sigue siendo el proxy por dirección de vela
+ORDERFLOW_TICKS = os.getenv("ORDERFLOW_TICKS", "0") == "1"
+ORDERFLOW_TICKS_INICIAL_MIN = 60   # Minutos de ticks que se descargan al arrancar
+
+# ============================================================
+# PROVEEDOR DE DATOS DE MERCADO
+# ============================================================
+PROVEEDOR_DATOS = os.getenv("PROVEEDOR_DATOS", "mt5")        # "mt5" | "replay"
+REPLAY_DIRECTORIO = os.getenv("REPLAY_DIRECTORIO", "replay")  # {SYMBOL}_{TF}.parquet|csv
+REPLAY_VELOCIDAD = float(os.getenv("REPLAY_VELOCIDAD", "0"))  # 1 = tiempo real, N = N×, 0 = sin pausas
+REPLAY_INICIO = os.getenv("REPLAY_INICIO")                    # Hora ISO del broker; vacío = automático
+
+# ============================================================
+# PLANIFICADOR — despertar al cierre de vela
+# ============================================================
+PLANIFICADOR_GRACIA_S = 0.5       # Segundos tras el cierre antes de consultar MT5
+PLANIFICADOR_REINTENTO_S = 1.0    # Reintento si alguna serie aún no tiene la vela nueva
+PLANIFICADOR_MAX_REINTENTOS = 10  # Reintentos por periodo antes de esperar al próximo cierre
+
 # ============================================================
 # RENDLOG v3.0 — PARÁMETROS ESTADÍSTICOS
 # ============================================================
@@ -95,7 +146,20 @@ RENDLOG_NU_MIN_DATOS = 50
 #   GBPUSD → libra esterlina (alta correlación con EUR, driver Eurozona)
 #   USDJPY → yen (risk-off / diferenciales de tasas, driver independiente)
 #   USDCAD → dólar canadiense (correlación regional + commodities)
-SYMBOLS_ACTIVOS = ["EURUSD", "GBPUSD", "USDJPY", "USDCAD"]
+SYMBOLS_USD4 = ["EURUSD", "GBPUSD", "USDJPY", "USDCAD"]
+# Universo amplio: los 28 majors/cruces de las 8 monedas principales + metales
+SYMBOLS_UNIVERSO = [
+    "EURUSD", "GBPUSD", "AUDUSD", "NZDUSD", "USDJPY", "USDCAD", "USDCHF",
+    "EURGBP", "EURJPY", "EURCHF", "EURAUD", "EURCAD", "EURNZD",
+    "GBPJPY", "GBPCHF", "GBPAUD", "GBPCAD", "GBPNZD",
+    "AUDJPY", "AUDCHF", "AUDCAD", "AUDNZD",
+    "NZDJPY", "NZDCHF", "NZDCAD",
+    "CADJPY", "CADCHF", "CHFJPY",
+    "XAUUSD", "XAGUSD",
+]
+# UNIVERSO_SIMBOLOS: "usd4" (por defecto) | "amplio"
+UNIVERSO_SIMBOLOS = os.getenv("UNIVERSO_SIMBOLOS", "usd4")
+SYMBOLS_ACTIVOS = SYMBOLS_UNIVERSO if UNIVERSO_SIMBOLOS == "amplio" else SYMBOLS_USD4
 
 # EWMA lambda por símbolo (USDJPY tiene mayor vol, decae más rápido)
 RENDLOG_LAMBDA_EWMA_SYMBOL = {
@@ -118,6 +182,16 @@ GBM_HORIZONTE_VELAS = {            # Horizonte de proyección por timeframe
     "4H":  5,
 }
 GBM_Z_UMBRAL_ACTIVACION = 2.0     # Solo simula cuando |z_score| > este umbral
+# Motor GBM: "analitico" (forma cerrada, determinista) | "montecarlo" (simulación de caminos)
+GBM_METODO = os.getenv("GBM_METODO", "montecarlo")
+GBM_SEMILLA = int(os.getenv("GBM_SEMILLA", "20260301"))  # Semilla del np.random.Generator del lote
+GBM_LOTE_MAX_ELEMENTOS = 4_000_000  # Tope de normales por bloque en simular_gbm_lote (~32 MB)
+# Reducción de varianza (solo motor Monte Carlo). Opcional: los defaults dan los mismos
+# caminos que antes ("estandar", n_paths fijos)
+GBM_MUESTREO = os.getenv("GBM_MUESTREO", "estandar")  # "estandar" | "antitetico" | "sobol"
+# Semiancho IC 95% de gbm_prob_reversion para cortar el muestreo secuencial (p. ej. 0.01); 0 = n_paths fijos
+GBM_TOLERANCIA = float(os.getenv("GBM_TOLERANCIA", "0")) or None
+GBM_PATHS_POR_TANDA = 64   # Caminos por tanda en modo secuencial (potencia de 2 para Sobol)
 
 # ============================================================
 # PCA — Análisis de Componentes Principales
@@ -126,3 +200,23 @@ PCA_PC1_VARIANZA_UMBRAL = 0.60    # PC1 explica >60% → movimiento sistémico
 PCA_PC1_LOADING_UMBRAL  = 0.70    # Loading en PC1 >0.70 → par dominado por factor USD
 PCA_CORRELACION_UMBRAL  = 0.85    # Correlación con EURUSD >0.85 → alta exposición USD
 PCA_MIN_FILAS_ALINEADAS = 30      # Mínimo de velas alineadas para PCA válido
+# Carga inicial: velas pedidas por serie para el PCA por vela. Una ventana previa a
+# las VENTANA_VELAS publicadas, para que cada vela tenga su ventana móvil completa
+PCA_HISTORIA_VELAS = 2 * VENTANA_VELAS
+# PCA incremental (pca_movil.py): covarianza con altas/bajas de Welford y PC1 por
+# iteración de potencia desde el autovector anterior; cada PCA_RECALCULO_EXACTO_CADA
+# actualizaciones se recalcula exacta (eigh) y se mide la deriva
+PCA_INCREMENTAL = os.getenv("PCA_INCREMENTAL", "1") == "1"
+PCA_RECALCULO_EXACTO_CADA = 60    # Actualizaciones entre recálculos exactos (una ventana)
+PCA_POTENCIA_MAX_ITER = 25        # Pasos con Σ²; sin convergencia (λ1 ≈ λ2) se usa eigh
+PCA_POTENCIA_TOL = 1e-7           # ‖v_k − v_{k−1}‖ para dar PC1 por convergido (loadings a 4 decimales)
+PCA_DERIVA_TOL = 1e-8             # Deriva relativa de Σ acumulada por encima de la cual se avisa
+# Modo universo (pca_universo.py): correlación con shrinkage de Ledoit-Wolf, top-k
+# autovectores y un factor por moneda en lugar del único factor USD
+# PCA_MODO: "auto" (universo con más de PCA_UNIVERSO_MIN_SIMBOLOS) | "clasico" | "universo"
+PCA_MODO = os.getenv("PCA_MODO", "auto")
+PCA_UNIVERSO_MIN_SIMBOLOS = 8     # Hasta 8 símbolos el PCA clásico (un factor USD) basta
+PCA_FACTORES_K = 3                # Factores extraídos (USD, JPY/riesgo, EUR/commodities...)
+# Una moneda está en 7 de los 28 pares: su factor explica a lo sumo ~25% del universo;
+# >15% (≈60% de ese techo, como el 60% del PC1 clásico) → factor sistémico
+PCA_UNIVERSO_VARIANZA_UMBRAL = 0.15
@@ -0,0 +1,202 @@
+# flujo_ticks.py — Order flow a nivel de tick (regla del tick)
+#
+# calcular_columnas() reparte todo el tick_volume de la vela según
+# close > open: una vela alcista es 100% compra y una doji 100% venta.
+# Aquí cada tick se clasifica con la regla del tick sobre el precio medio
+# (bid + ask) / 2:
+#   uptick   (precio > anterior) → compra
+#   downtick (precio < anterior) → venta
+#   sin cambio                   → hereda el signo del último cambio
+# y se agrega por vela: volumen comprador, vendedor, delta y delta acumulado.
+#
+# Ingesta por lotes: una llamada a copy_ticks_range por símbolo y ciclo
+# desde el último tick procesado; clasificación y agregación son
+# vectorizadas (np.diff + np.maximum.accumulate + np.add.reduceat).
+#
+# Cada tick cuenta como una unidad de volumen, igual que tick_volume de MT5
+# (forex no informa volumen real).
+#
+import numpy as np
+from config import TIMEFRAME_MAP, BUFFER_VELAS_CAPACIDAD
+
+# Campos mínimos de un tick (subconjunto del dtype de copy_ticks_*; time_msc en epoch broker)
+DTYPE_TICKS = np.dtype([("time_msc", np.int64), ("bid", np.float64), ("ask", np.float64)])
+
+
+def clasificar_ticks(precios, precio_previo=np.nan, signo_previo=0):
+    """
+    Regla del tick vectorizada.
+
+    Args:
+        precios:       np.ndarray [n] — precio de cada tick, en orden
+        precio_previo: float — precio del último tick del lote anterior (NaN = ninguno)
+        signo_previo:  int — signo del último tick del lote anterior (0 = sin clasificar)
+
+    Returns:
+        np.ndarray int8 [n] — +1 compra, -1 venta, 0 sin clasificar (ningún cambio
+        de precio todavía)
+    """
+    precios = np.asarray(precios, dtype=np.float64)
+    n = len(precios)
+    if n == 0:
+        return np.empty(0, dtype=np.int8)
+
+    cambios = np.empty(n)
+    cambios[0] = precios[0] - precio_previo
+    np.subtract(precios[1:], precios[:-1], out=cambios[1:])
+    signos = np.sign(np.nan_to_num(cambios, nan=0.0)).astype(np.int8)
+
+    # Sin cambio: índice del último tick con cambio (forward-fill por índice)
+    ultimo = np.where(signos != 0, np.arange(n), -1)
+    np.maximum.accumulate(ultimo, out=ultimo)
+    return np.where(ultimo >= 0, signos[np.maximum(ultimo, 0)], np.int8(signo_previo)).astype(np.int8)
+
+
+def agregar_ticks(tiempos_msc, signos, minutos):
+    """
+    Agrega ticks clasificados a velas de `minutos` (bloques en hora del broker, como agregar_velas).
+
+    Returns:
+        dict — time (epoch broker de apertura), volumen_compra, volumen_venta (int64),
+        una entrada por bloque presente en la entrada
+    """
+    segundos = np.asarray(tiempos_msc, dtype=np.int64) // 1000
+    if len(segundos) == 0:
+        vacio = np.empty(0, dtype=np.int64)
+        return {"time": vacio, "volumen_compra": vacio, "volumen_venta": vacio}
+
+    bloque = segundos - segundos % (minutos * 60)
+    inicios = np.flatnonzero(np.r_[True, bloque[1:] != bloque[:-1]])
+    return {
+        "time":           bloque[inicios],
+        "volumen_compra": np.add.reduceat((signos > 0).astype(np.int64), inicios),
+        "volumen_venta":  np.add.reduceat((signos < 0).astype(np.int64), inicios),
+    }
+
+
+class MotorFlujoTicks:
+    """
+    Estado de order flow por tick para todos los símbolos y timeframes.
+
+    Por símbolo guarda el último tick procesado (time_msc, precio, signo) y
+    desde cuándo hay cobertura; por (symbol, timeframe) las últimas
+    `capacidad` velas con volumen comprador/vendedor y delta acumulado.
+
+    Uso:
+        motor = MotorFlujoTicks(TIMEFRAMES_ACTIVOS)
+        motor.ingerir(symbol, obtener_ticks_desde(symbol, desde_msc), desde_msc=desde_msc)
+        motor.ingerir(symbol, obtener_ticks_desde(symbol, motor.ultimo_msc(symbol)))
+        flujo = motor.columnas(symbol, "5M", buffer.columna("time"))
+    """
+    __slots__ = ("capacidad", "_minutos", "_estado", "_series")
+
+    def __init__(self, timeframes, capacidad=BUFFER_VELAS_CAPACIDAD):
+        self.capacidad = int(capacidad)
+        self._minutos = {tf: TIMEFRAME_MAP[tf] for tf in timeframes if tf in TIMEFRAME_MAP}
+        self._estado = {}   # symbol -> dict(cobertura_msc, ultimo_msc, repetidos, precio, signo)
+        self._series = {}   # (symbol, tf_name) -> dict(time, volumen_compra, volumen_venta, delta_acumulado)
+
+    def ultimo_msc(self, symbol):
+        """time_msc (epoch broker) del último tick procesado; None si el símbolo no se inició."""
+        estado = self._estado.get(symbol)
+        return estado["ultimo_msc"] if estado is not None else None
+
+    def ingerir(self, symbol, ticks, desde_msc=None):
+        """
+        Clasifica un lote de ticks (array de copy_ticks_* o dict con time_msc, bid, ask) y actualiza las velas.
+
+        El lote puede solaparse con el anterior: copy_ticks_range desde
+        ultimo_msc vuelve a traer los ticks de ese milisegundo y se descartan.
+        La primera llamada fija la cobertura en desde_msc (o en el primer
+        tick): las velas que abren antes no tienen todos sus ticks.
+
+        Returns:
+            int — ticks nuevos procesados
+        """
+        estado = self._estado.get(symbol)
+        if estado is None:
+            if desde_msc is None and (ticks is None or len(ticks) == 0):
+                return 0
+            inicio = int(desde_msc) if desde_msc is not None else int(ticks["time_msc"][0])
+            estado = self._estado[symbol] = {
+                "cobertura_msc": inicio, "ultimo_msc": inicio, "repetidos": 0,
+                "precio": np.nan, "signo": 0,
+            }
+        if ticks is None or len(ticks) == 0:
+            return 0
+
+        tiempos = np.asarray(ticks["time_msc"], dtype=np.int64)
+        # Descartar lo ya procesado: anteriores a ultimo_msc y los primeros ticks de ese mismo ms
+        ini = int(np.searchsorted(tiempos, estado["ultimo_msc"], side="left"))
+        en_ultimo = int(np.searchsorted(tiempos, estado["ultimo_msc"], side="right")) - ini
+        ini += min(en_ultimo, estado["repetidos"])
+        if ini >= len(tiempos):
+            return 0
+
+        tiempos = tiempos[ini:]
+        precios = (np.asarray(ticks["bid"], dtype=np.float64)[ini:]
+                   + np.asarray(ticks["ask"], dtype=np.float64)[ini:]) * 0.5
+        signos = clasificar_ticks(precios, estado["precio"], estado["signo"])
+
+        ultimo = int(tiempos[-1])
+        repetidos = int(len(tiempos) - np.searchsorted(tiempos, ultimo, side="left"))
+        if ultimo == estado["ultimo_msc"]:
+            repetidos += estado["repetidos"]
+        estado.update(ultimo_msc=ultimo, repetidos=repetidos, precio=float(precios[-1]), signo=int(signos[-1]))
+
+        for tf_name, minutos in self._minutos.items():
+            self._fusionar((symbol, tf_name), agregar_ticks(tiempos, signos, minutos))
+        return len(tiempos)
+
+    def _fusionar(self, clave, lote):
+        """Suma el lote a la vela abierta de la serie, agrega las nuevas y recorta a capacidad."""
+        delta = lote["volumen_compra"] - lote["volumen_venta"]
+        serie = self._series.get(clave)
+        if serie is None:
+            nueva = dict(lote, delta_acumulado=np.cumsum(delta))
+        else:
+            compra = serie["volumen_compra"].copy()
+            venta = serie["volumen_venta"].copy()
+            acumulado = serie["delta_acumulado"].copy()
+            if lote["time"][0] != serie["time"][-1]:
+                # Primera vela del lote posterior a la última: se abre vacía
+                compra, venta = np.r_[compra, 0], np.r_[venta, 0]
+                acumulado = np.r_[acumulado, acumulado[-1]]
+                serie = dict(serie, time=np.r_[serie["time"], lote["time"][0]])
+            compra[-1] += lote["volumen_compra"][0]
+            venta[-1] += lote["volumen_venta"][0]
+            acumulado[-1] += delta[0]
+            nueva = {
+                "time":            np.r_[serie["time"], lote["time"][1:]],
+                "volumen_compra":  np.r_[compra, lote["volumen_compra"][1:]],
+                "volumen_venta":   np.r_[venta, lote["volumen_venta"][1:]],
+                "delta_acumulado": np.r_[acumulado, acumulado[-1] + np.cumsum(delta[1:])],
+            }
+        self._series[clave] = {campo: arr[-self.capacidad:] for campo, arr in nueva.items()}
+
+    def columnas(self, symbol, tf_name, tiempos_velas):
+        """
+        Order flow alineado a las velas de un buffer.
+
+        Args:
+            tiempos_velas: np.ndarray — apertura de cada vela en epoch broker
+                           (BufferVelas.columna("time"))
+
+        Returns:
+            dict[str -> np.ndarray float] con volumen_compra, volumen_venta y
+            delta_acumulado; NaN en las velas sin cobertura completa de ticks.
+            None si la serie no tiene ticks.
+        """
+        serie = self._series.get((symbol, tf_name))
+        if serie is None:
+            return None
+        tiempos = np.asarray(tiempos_velas, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(serie["time"], tiempos), len(serie["time"]) - 1)
+        cubiertas = (serie["time"][pos] == tiempos) & (tiempos * 1000 >= self._estado[symbol]["cobertura_msc"])
+
+        salida = {}
+        for campo in ("volumen_compra", "volumen_venta", "delta_acumulado"):
+            valores = np.full(len(tiempos), np.nan)
+            valores[cubiertas] = serie[campo][pos[cubiertas]]
+            salida[campo] = valores
+        return salida
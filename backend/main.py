@@ -1,198 +1,143 @@
 # main.py - V4.1 (Multi-par: 4 símbolos × 6 TFs | GBM Monte Carlo | PCA Sistémico)
-import MetaTrader5 as mt5
-import time
-import pandas as pd
 from datetime import datetime
-from conexion_mt5 import conectar_mt5, obtener_datos_historicos
+import os
+import time
+from proveedor_datos import crear_proveedor, FinReplay
+from planificador import PlanificadorVelas
+from buffer_velas import BufferVelas
+from agregador_velas import AgregadorTimeframes, TF_BASE
+from almacen_velas import AlmacenVelas
+from flujo_ticks import MotorFlujoTicks
 from calculos_rendlog import (
-    calcular_rendimientos_log,
-    calcular_bandas_sigma,
     detectar_anomalias,
     estimar_distribucion_t,
-    calcular_efficiency_ratio,
-    clasificar_regimen
 )
 import numpy as np
-from calculos_orderflow import calcular_delta_volumen, calcular_volumen_relativo, detectar_anomalia_volumen
-from calculos_gbm import calcular_gbm_anomalia
-from calculos_multipair import (
-    construir_matriz_retornos,
-    calcular_covarianza,
-    calcular_pca,
-    detectar_exposicion_usd,
-    calcular_correlacion_con_eurusd,
-    es_movimiento_sistemico,
-)
+from calculos_fusion import calcular_estadisticas_df
+from calculos_gbm import resolver_gbm_lote, resolver_gbm_conjunto
+from snapshot_multipar import SnapshotMultipar
+from panel_retornos import PanelRetornos
+from pca_movil import PCAMovil, calcular_pca_historico, pca_historico_para
+from pca_universo import usar_modo_universo, calcular_pca_historico_universo
+from calculos_multipair import es_movimiento_sistemico
+from serializacion import build_rows
 from api_client import SupabaseClient
+from cola_envios import ColaEnvios
 from config import (
     DEFAULT_CONFIG, TIMEFRAME_MAP, TIMEFRAMES_ACTIVOS,
-    VENTANA_VELAS, SYMBOLS_ACTIVOS, PCA_MIN_FILAS_ALINEADAS
+    VENTANA_VELAS, SYMBOLS_ACTIVOS, PCA_MIN_FILAS_ALINEADAS, PCA_HISTORIA_VELAS, PCA_INCREMENTAL, GBM_SEMILLA,
+    BUFFER_VELAS_CAPACIDAD, AGREGADOR_DESDE_M1, ALMACEN_VELAS_DIRECTORIO,
+    ORDERFLOW_TICKS, ORDERFLOW_TICKS_INICIAL_MIN, COLA_ENVIOS_DIRECTORIO, COLA_DETENER_TIMEOUT_S,
 )
 from utils import log_mensaje
 
 
-def _safe_float(value, default=0.0):
-    """Convierte a float seguro para JSON. NaN/Inf -> default."""
-    if value is None or pd.isna(value) or np.isinf(value):
-        return default
-    return float(value)
+def calcular_estadisticas(df, config, timeframe=None, symbol=None, flujo=None):
+    """
+    Calcula todas las métricas RendLog y OrderFlow sobre el DataFrame.
+
+    Usa el motor fusionado (calculos_fusion): una pasada sobre las columnas
+    OHLCV sin copias intermedias; devuelve el mismo DataFrame que la cadena
+    calcular_rendimientos_log → ... → calcular_efficiency_ratio.
+    Con flujo (MotorFlujoTicks.columnas) el delta sale de la regla del tick.
+    """
+    ventana = min(config.get('ventana_estadistica', 20), VENTANA_VELAS // 3)
+    return calcular_estadisticas_df(df, ventana=ventana, timeframe=timeframe, symbol=symbol, flujo=flujo)
+
+
+def _flujo_para(motor_ticks, buffer, symbol, tf_name):
+    """Order flow por tick alineado a la ventana del buffer (None sin motor o sin ticks)."""
+    if motor_ticks is None:
+        return None
+    return motor_ticks.columnas(symbol, tf_name, buffer.columna("time", VENTANA_VELAS))
 
 
-def build_rows(df_slice, config, timeframe_name, symbol, pca_result=None, exposure=None):
+def _rates_iniciales(proveedor, almacen, symbol, tf_name, num_bars):
     """
-    Construye lista de dicts para enviar a Supabase.
+    Últimas num_bars velas para sembrar un buffer.
 
-    Novedades v4.1:
-      - Agrega campo 'symbol' al nivel de fila
-      - Agrega campos GBM (gbm_prob_reversion, etc.) en rendlog
-      - Agrega campos PCA (pca_pc1_loading, pca_es_sistemico, etc.) en rendlog
+    Con almacén: se pide al proveedor solo el hueco desde la última vela
+    guardada (o las num_bars completas si la serie guardada es más corta),
+    se guarda y se devuelve la cola del almacén. Sin almacén: num_bars del proveedor.
+    Solo cuentan las velas guardadas hasta la hora actual del proveedor: un
+    replay anterior puede haber dejado velas posteriores a su reloj virtual.
     """
-    if exposure is None:
-        exposure = {}
-
-    pca_es_sistemico = es_movimiento_sistemico(pca_result, symbol)
-    pc1_loading = None
-    pc1_varianza = None
-    if pca_result and pca_result.get("pca_valido"):
-        pc1_loading  = pca_result["pc1_loadings"].get(symbol)
-        pc1_varianza = pca_result.get("pc1_varianza")
-
-    rows = []
-    for _, row in df_slice.iterrows():
-        z_score = 0.0
-        media_valid     = not pd.isna(row.get('media', None))
-        std_valid       = not pd.isna(row.get('std', None)) and row['std'] > 0
-        std_static_valid = not pd.isna(row.get('std_static', None)) and row['std_static'] > 0
-
-        if std_valid and media_valid:
-            z_score = _safe_float((row['log_return'] - row['media']) / row['std'])
-
-        z_score_static = 0.0
-        if std_static_valid and media_valid:
-            z_score_static = _safe_float((row['log_return'] - row['media']) / row['std_static'])
-
-        # Señal base (umbral de z-score)
-        senal = None
-        if z_score < config.get('umbral_sigma_compra', -2.0):
-            senal = "COMPRA"
-        elif z_score > config.get('umbral_sigma_venta', 2.0):
-            senal = "VENTA"
-
-        # Supresión por PCA (movimiento sistémico USD)
-        senal_suprimida_pca = False
-        if senal is not None and pca_es_sistemico:
-            senal = None
-            senal_suprimida_pca = True
-
-        # GBM: solo en velas con anomalía
-        media_val = _safe_float(row.get('media'))
-        std_val   = _safe_float(row.get('std'))
-        close_val = _safe_float(row.get('close'))
-        gbm_fields = calcular_gbm_anomalia(
-            z_score=z_score,
-            mu=media_val,
-            sigma_ewma=std_val,
-            precio_close=close_val,
-            timeframe=timeframe_name,
-        )
+    tf_minutes = TIMEFRAME_MAP.get(tf_name, 1)
+    if almacen is None:
+        return proveedor.obtener_rates(symbol, tf_minutes, num_bars)
+
+    hora = proveedor.obtener_hora_broker(symbol)
+    guardadas = almacen.leer(symbol, tf_name, hasta=hora)
+    if guardadas is None or len(guardadas["time"]) < num_bars:
+        rates = proveedor.obtener_rates(symbol, tf_minutes, num_bars)
+    else:
+        rates = proveedor.obtener_rates_desde(symbol, tf_minutes, int(guardadas["time"][-1]))
+    del guardadas
+    almacen.agregar(symbol, tf_name, rates)
+    return almacen.ultimas(symbol, tf_name, num_bars, hasta=hora)
 
-        er_val = row.get('efficiency_ratio', np.nan)
-
-        rows.append({
-            "symbol": symbol,
-            "timeframe": timeframe_name,
-            "data_timestamp": row['time'].isoformat(),
-            "rendlog": {
-                # Retorno y señal
-                "z_score":  z_score,
-                "senal":    senal,
-                "log_return": _safe_float(row['log_return']),
-                "media":    _safe_float(row.get('media')),
-                "std":      _safe_float(row.get('std')),
-                # Bandas
-                "banda_2sigma_superior": _safe_float(row.get('banda_2sigma_superior')),
-                "banda_2sigma_inferior": _safe_float(row.get('banda_2sigma_inferior')),
-                "banda_3sigma_superior": _safe_float(row.get('banda_3sigma_superior')),
-                "banda_3sigma_inferior": _safe_float(row.get('banda_3sigma_inferior')),
-                # Diagnóstico EWMA vs estático
-                "z_score_static": z_score_static,
-                "sigma_ewma":     _safe_float(row.get('std')),
-                "sigma_static":   _safe_float(row.get('std_static')),
-                "vol_ratio":      _safe_float(row.get('vol_ratio'), default=1.0),
-                # Régimen
-                "er":      _safe_float(er_val) if not pd.isna(er_val) else None,
-                "regimen": clasificar_regimen(er_val),
-                # Supresión de señal
-                "senal_suprimida":     senal_suprimida_pca or (
-                    senal is None and (
-                        (z_score < config.get('umbral_sigma_compra', -2.0)) or
-                        (z_score > config.get('umbral_sigma_venta', 2.0))
-                    )
-                ),
-                "senal_suprimida_pca": senal_suprimida_pca,
-                # GBM Monte Carlo (None en velas sin anomalía)
-                **gbm_fields,
-                # PCA multi-par
-                "pca_pc1_loading":  round(pc1_loading, 4) if pc1_loading is not None else None,
-                "pca_pc1_varianza": round(pc1_varianza, 4) if pc1_varianza is not None else None,
-                "pca_es_sistemico": pca_es_sistemico,
-                "exposure_usd_alto": bool(exposure.get(symbol, False)),
-            },
-            "orderflow": {
-                "delta":       int(row['delta']) if not pd.isna(row.get('delta', None)) else 0,
-                "vol_relativo": float(row['volumen_relativo']) if not pd.isna(row.get('volumen_relativo', None)) else 1.0,
-                "anomalia_vol": bool(row['anomalia_volumen']) if not pd.isna(row.get('anomalia_volumen', None)) else False,
-                "z_score_vol":  float(row['z_score_volumen']) if not pd.isna(row.get('z_score_volumen', None)) else 0,
-                "tick_volume":  int(row['tick_volume']) if not pd.isna(row.get('tick_volume', None)) else 0,
-            }
-        })
-    return rows
-
-
-def calcular_estadisticas(df, config, timeframe=None, symbol=None):
-    """Calcula todas las métricas RendLog y OrderFlow sobre el DataFrame."""
-    ventana = min(config.get('ventana_estadistica', 20), VENTANA_VELAS // 3)
-    df = calcular_rendimientos_log(df)
-    df = calcular_bandas_sigma(df, ventana=ventana, timeframe=timeframe, symbol=symbol)
-    df = calcular_delta_volumen(df)
-    df = calcular_volumen_relativo(df, ventana=min(ventana, 20))
-    df = detectar_anomalia_volumen(df, ventana=ventana)
-    df = calcular_efficiency_ratio(df)
-    return df
 
+def _retornos_historia(velas):
+    """
+    (tiempos, log-returns) de una serie de velas para el panel de historia del PCA.
 
-def _calcular_pca_para_tf(dfs_por_simbolo):
+    Mismo cálculo que 'log_return' de calcular_estadisticas (log(close / close
+    anterior)), así las filas visibles coinciden con las del snapshot.
     """
-    Calcula PCA cross-símbolo para un timeframe dado.
+    cierres = np.asarray(velas["close"], dtype=np.float64)
+    return np.asarray(velas["time"], dtype=np.int64)[1:], np.log(cierres[1:] / cierres[:-1])
+
+
+def _calcular_pca_para_tf(snapshot):
+    """
+    Análisis cross-símbolo de un timeframe sobre todos sus símbolos con datos.
 
     Args:
-        dfs_por_simbolo: dict[symbol -> DataFrame con 'time' y 'log_return']
+        snapshot: SnapshotMultipar del timeframe (último frame de cada símbolo;
+                  Σ, correlación, exposición y PCA cacheados por epoch alineado)
 
     Returns:
-        tuple(pca_result, exposure, correlaciones)
-        Todos None si no hay suficientes datos alineados.
+        dict de SnapshotMultipar.analisis(), o None si no hay suficientes
+        datos alineados.
     """
-    R, syms, _ = construir_matriz_retornos(dfs_por_simbolo)
-    if R is None:
+    calculos = snapshot.calculos
+    analisis = snapshot.analisis()
+    if snapshot.calculos == calculos:
+        return analisis      # Mismo estado alineado: ya calculado y registrado
+    if analisis is None:
         log_mensaje(
             f"PCA: datos insuficientes (<{PCA_MIN_FILAS_ALINEADAS} filas alineadas), "
             "continuando sin análisis sistémico",
             "WARNING"
         )
-        return None, {}, {}
+        return None
 
-    cov        = calcular_covarianza(R)
-    pca_result = calcular_pca(cov, syms)
-    exposure   = detectar_exposicion_usd(cov, syms)
-    corrs      = calcular_correlacion_con_eurusd(cov, syms)
+    pca_result, syms = analisis["pca"], analisis["symbols"]
+    if not pca_result.get("pca_valido"):
+        log_mensaje("PCA: varianza nula en la ventana alineada", "WARNING")
+    elif "factores" in pca_result:
+        factores = ", ".join(f"{f['moneda']}={f['varianza']*100:.1f}%" for f in pca_result["factores"])
+        log_mensaje(
+            f"PCA universo ({len(syms)} símbolos, shrinkage={pca_result['intensidad_shrinkage']:.2f}): "
+            f"{factores} | Sistémicos: {sum(pca_result['sistemico'].values())}/{len(syms)}",
+            "INFO"
+        )
+    else:
+        log_mensaje(
+            f"PCA: PC1={pca_result['pc1_varianza']*100:.1f}% varianza | "
+            f"Sistémico={'SÍ' if pca_result['pc1_varianza'] > 0.60 else 'NO'} | "
+            f"Loadings: {', '.join(f'{s}={v:.2f}' for s,v in pca_result['pc1_loadings'].items())}",
+            "INFO"
+        )
+    return analisis
 
-    log_mensaje(
-        f"PCA: PC1={pca_result['pc1_varianza']*100:.1f}% varianza | "
-        f"Sistémico={'SÍ' if pca_result['pc1_varianza'] > 0.60 else 'NO'} | "
-        f"Loadings: {', '.join(f'{s}={v:.2f}' for s,v in pca_result['pc1_loadings'].items())}",
-        "INFO"
-    )
-    return pca_result, exposure, corrs
+
+def _detener_cola(cola):
+    """Vacía la cola de envío (hasta COLA_DETENER_TIMEOUT_S); lo que no se envíe queda en el WAL."""
+    if cola.detener(COLA_DETENER_TIMEOUT_S):
+        log_mensaje(f"Cola de envío vacía: {cola.filas_enviadas} filas enviadas", "SUCCESS")
+    else:
+        log_mensaje(f"Cola de envío: {cola.num_pendientes} filas sin enviar quedan en el WAL", "WARNING")
 
 
 def main():
@@ -204,9 +149,10 @@ def main():
     print(f"  Series totales: {len(SYMBOLS_ACTIVOS) * len(TIMEFRAMES_ACTIVOS)}")
     print("=" * 70)
 
-    log_mensaje("Intentando conectar a MT5...", "INFO")
-    if not conectar_mt5():
-        log_mensaje("No se pudo conectar a MT5. Abortando...", "ERROR")
+    proveedor = crear_proveedor()
+    log_mensaje(f"Intentando conectar al proveedor de datos ({proveedor.nombre})...", "INFO")
+    if not proveedor.conectar():
+        log_mensaje("No se pudo conectar al proveedor de datos. Abortando...", "ERROR")
         return
 
     log_mensaje("Inicializando cliente Supabase...", "INFO")
@@ -222,7 +168,7 @@ def main():
         log_mensaje("2. Copia el API_KEY en el archivo .env", "INFO")
         log_mensaje("3. Reinicia este backend", "INFO")
         log_mensaje("", "INFO")
-        mt5.shutdown()
+        proveedor.desconectar()
         return
 
     log_mensaje(f"Usuario autenticado: {user_id}", "SUCCESS")
@@ -231,11 +177,20 @@ def main():
     # PASO 1: RESET TOTAL
     # ============================================================
     print(f"\n{'=' * 70}")
+    # Cola de envío en segundo plano con su propio cliente (no comparte la sesión HTTP del loop).
+    # Lo que quedó sin confirmar en el WAL de una ejecución anterior se descarta antes del
+    # reset: son filas de la sesión vieja y la carga inicial vuelve a publicar la ventana.
+    cola = ColaEnvios(SupabaseClient(), directorio=COLA_ENVIOS_DIRECTORIO)
+    descartadas = cola.descartar_pendientes()
+    if descartadas:
+        log_mensaje(f"Cola de envío: {descartadas} filas de la sesión anterior descartadas", "WARNING")
+
     log_mensaje("Limpiando datos anteriores del usuario...", "WARNING")
     if supabase.delete_user_data():
         log_mensaje("Datos anteriores eliminados correctamente", "SUCCESS")
     else:
         log_mensaje("Error limpiando datos (puede ser primera ejecucion)", "WARNING")
+    cola.iniciar()
 
     config = supabase.obtener_configuracion()
     if not config:
@@ -257,20 +212,69 @@ def main():
     last_sent_time = {}
     all_initial_rows = []
     nu_estimado = {}   # Fase 2: {(symbol, tf_name): nu}
+    # buffers[(symbol, tf_name)] = BufferVelas sembrado aquí; el loop solo agrega velas nuevas
+    buffers = {}
+    # Por TF: último frame de cada símbolo, retornos alineados por epoch y el análisis
+    # multi-par cacheado por epoch alineado. PCAMovil actualiza Σ y PC1 con las velas
+    # que cambian (None = desde cero cada vez)
+    snapshots = {
+        tf_name: SnapshotMultipar(SYMBOLS_ACTIVOS, VENTANA_VELAS, PCAMovil() if PCA_INCREMENTAL else None)
+        for tf_name in TIMEFRAMES_ACTIVOS
+    }
+
+    # Velas guardadas en disco: el arranque solo descarga el hueco desde la última
+    almacen = None
+    if ALMACEN_VELAS_DIRECTORIO:
+        almacen = AlmacenVelas(os.path.join(ALMACEN_VELAS_DIRECTORIO, proveedor.nombre))
+        log_mensaje(f"Almacén de velas: {almacen.directorio} ({len(almacen.series())} series guardadas)", "INFO")
+
+    # 5M–4H construidos localmente desde un solo stream M1 por símbolo
+    agregador = AgregadorTimeframes(TIMEFRAMES_ACTIVOS, buffers) if AGREGADOR_DESDE_M1 else None
+    historia_m1 = {}   # {symbol: (tiempos, retornos)} de las M1 sembradas, para la historia del PCA
+    if agregador is not None:
+        for symbol in SYMBOLS_ACTIVOS:
+            rates_m1 = _rates_iniciales(proveedor, almacen, symbol, TF_BASE,
+                                        max(agregador.capacidad_m1, PCA_HISTORIA_VELAS))
+            if agregador.sembrar(symbol, rates_m1):
+                historia_m1[symbol] = _retornos_historia(rates_m1)
+
+    # Order flow por tick: se arranca con los últimos ORDERFLOW_TICKS_INICIAL_MIN minutos
+    motor_ticks = MotorFlujoTicks(TIMEFRAMES_ACTIVOS) if ORDERFLOW_TICKS else None
+    if motor_ticks is not None:
+        for symbol in SYMBOLS_ACTIVOS:
+            hora = proveedor.obtener_hora_broker(symbol)
+            if hora is None:
+                continue
+            desde_msc = (hora - ORDERFLOW_TICKS_INICIAL_MIN * 60) * 1000
+            motor_ticks.ingerir(symbol, proveedor.obtener_ticks_desde(symbol, desde_msc), desde_msc=desde_msc)
+
+    # GBM en lote: las anomalías de todos los pares/TFs se simulan juntas
+    rng_gbm = np.random.default_rng(GBM_SEMILLA)
+    gbm_pendientes = []
 
     for tf_name in TIMEFRAMES_ACTIVOS:
-        tf_minutes = TIMEFRAME_MAP.get(tf_name, 1)
         log_mensaje(f"[TF={tf_name}] Cargando {len(SYMBOLS_ACTIVOS)} pares...", "INFO")
-
-        dfs_por_simbolo = {}
+        snapshot = snapshots[tf_name]
+        # Retornos alineados con una ventana previa a la publicada (historia del PCA por vela)
+        historia = PanelRetornos(SYMBOLS_ACTIVOS, PCA_HISTORIA_VELAS)
 
         for symbol in SYMBOLS_ACTIVOS:
-            df = obtener_datos_historicos(symbol, tf_minutes, VENTANA_VELAS)
-            if df is None or df.empty:
-                log_mensaje(f"  [{symbol}] No se pudieron obtener datos, saltando", "WARNING")
-                continue
+            clave = (symbol, tf_name)
+            if clave not in buffers:
+                rates = _rates_iniciales(proveedor, almacen, symbol, tf_name,
+                                         max(BUFFER_VELAS_CAPACIDAD, PCA_HISTORIA_VELAS))
+                if rates is None:
+                    log_mensaje(f"  [{symbol}] No se pudieron obtener datos, saltando", "WARNING")
+                    continue
+                buffers[clave] = BufferVelas.desde_rates(rates, BUFFER_VELAS_CAPACIDAD)
+                historia.actualizar(symbol, *_retornos_historia(rates))
+            elif symbol in historia_m1:
+                historia.actualizar(symbol, *historia_m1[symbol])   # M1 sembrado por el agregador
+
+            df = buffers[clave].dataframe(VENTANA_VELAS)
 
-            df = calcular_estadisticas(df, config, timeframe=tf_name, symbol=symbol)
+            df = calcular_estadisticas(df, config, timeframe=tf_name, symbol=symbol,
+                                       flujo=_flujo_para(motor_ticks, buffers[clave], symbol, tf_name))
 
             dist_t = estimar_distribucion_t(df, min_datos=30)
             if dist_t:
@@ -281,69 +285,137 @@ def main():
                     "INFO"
                 )
 
-            dfs_por_simbolo[symbol] = df
+            snapshot.actualizar(symbol, df, buffers[clave].columna("time", VENTANA_VELAS))
 
         # PCA cross-símbolo para este timeframe
-        pca_result, exposure, _ = _calcular_pca_para_tf(dfs_por_simbolo)
+        analisis = _calcular_pca_para_tf(snapshot)
+        pca_result = analisis["pca"] if analisis else None
+        exposure = analisis["exposicion"] if analisis else {}
+
+        # Historia: cada vela lleva el PCA de su propia ventana móvil (sin datos futuros),
+        # todas las ventanas en un solo eigh por lotes (modo universo: una por vela).
+        # Con la ventana previa de historia, también las primeras velas publicadas tienen
+        # su ventana completa; una serie más corta (símbolo nuevo, inicio de un replay) deja
+        # sin PCA las velas con menos de PCA_MIN_FILAS_ALINEADAS filas alineadas
+        R, syms, epochs = historia.matriz(snapshot.symbols)
+        historico = None
+        if len(R) >= PCA_MIN_FILAS_ALINEADAS:
+            historico = (calcular_pca_historico_universo(R, syms, epochs) if usar_modo_universo(len(syms))
+                         else calcular_pca_historico(R, syms, epochs))
 
         # Construir filas por símbolo
-        for symbol, df in dfs_por_simbolo.items():
-            datos = df.dropna(subset=['log_return'])
-            rows = build_rows(datos, config, tf_name, symbol, pca_result, exposure)
+        for symbol in snapshot.symbols:
+            df = snapshot.frame(symbol)
+            validas = df['log_return'].notna().to_numpy()
+            datos = df[validas]
+            if datos.empty:
+                log_mensaje(f"  [{symbol}/{tf_name}] Menos de 2 velas, sin retornos todavía: saltando", "WARNING")
+                continue
+            epochs_filas = buffers[(symbol, tf_name)].columna("time", VENTANA_VELAS)[validas]
+            rows = build_rows(datos, config, tf_name, symbol, pca_result, exposure,
+                              gbm_pendientes=gbm_pendientes,
+                              pca_por_fila=pca_historico_para(historico, symbol, epochs_filas))
             all_initial_rows.extend(rows)
             last_sent_time[(symbol, tf_name)] = datos['time'].iloc[-1]
             log_mensaje(f"  [{symbol}/{tf_name}] {len(rows)} filas preparadas", "SUCCESS")
 
-    # Enviar carga inicial
+    n_gbm = resolver_gbm_lote(gbm_pendientes, rng=rng_gbm)
+    if n_gbm:
+        log_mensaje(f"GBM: {n_gbm} anomalías resueltas en un solo lote", "INFO")
+
+    # Encolar carga inicial (el hilo de envío la sube mientras arranca el loop)
     if all_initial_rows:
-        log_mensaje(f"Enviando {len(all_initial_rows)} filas iniciales a Supabase...", "INFO")
-        if supabase.enviar_datos(all_initial_rows):
-            log_mensaje(f"Carga inicial completada: {len(all_initial_rows)} filas", "SUCCESS")
-        else:
-            log_mensaje("Error en carga inicial", "ERROR")
+        cola.encolar(all_initial_rows)
+        log_mensaje(f"Carga inicial encolada: {len(all_initial_rows)} filas", "SUCCESS")
     else:
         log_mensaje("No se obtuvieron datos iniciales de ningun timeframe", "ERROR")
-        mt5.shutdown()
+        cola.detener(COLA_DETENER_TIMEOUT_S)
+        proveedor.desconectar()
         return
 
     # ============================================================
     # PASO 3: LOOP PRINCIPAL — ventana móvil multi-par
     # ============================================================
     print(f"\n{'=' * 70}")
-    log_mensaje("Iniciando loop de ventana movil (cada 30s)...", "INFO")
+    log_mensaje("Iniciando loop de ventana movil (al cierre de cada vela)...", "INFO")
     log_mensaje("   Presiona Ctrl+C para detener", "INFO")
     print("=" * 70)
 
+    planificador = PlanificadorVelas(TIMEFRAMES_ACTIVOS, reloj=proveedor.reloj, dormir=proveedor.dormir)
+    planificador.calibrar(proveedor.obtener_hora_broker(SYMBOLS_ACTIVOS[0]))
     ciclo = 0
+    velas_totales = 0
+    t_inicio_loop = time.perf_counter()
 
     try:
         while True:
-            time.sleep(30)
+            # Duerme hasta el próximo cierre; solo se consultan los TFs que cerraron
+            tfs_vencidos = planificador.esperar()
             ciclo += 1
             print(f"\n{'─' * 70}")
-            print(f"[Ciclo #{ciclo}] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"[Ciclo #{ciclo}] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | TFs: {', '.join(tfs_vencidos)}")
             print(f"{'─' * 70}")
 
+            # Caché con TTL: sin llamada HTTP salvo al vencer (lectura condicional)
             config = supabase.obtener_configuracion()
             if not config:
                 config = DEFAULT_CONFIG
 
             nuevas_en_ciclo = 0
+            filas_ciclo = []   # Todas las filas del ciclo: un solo encolar() (una escritura al WAL)
+
+            # Ticks desde el último procesado: un lote por símbolo y ciclo
+            if motor_ticks is not None:
+                for symbol in SYMBOLS_ACTIVOS:
+                    ultimo_msc = motor_ticks.ultimo_msc(symbol)
+                    if ultimo_msc is not None:
+                        motor_ticks.ingerir(symbol, proveedor.obtener_ticks_desde(symbol, ultimo_msc))
 
-            for tf_name in TIMEFRAMES_ACTIVOS:
+            # Una sola consulta M1 por símbolo alimenta todos los TFs derivados
+            if agregador is not None:
+                for symbol in SYMBOLS_ACTIVOS:
+                    if agregador.ultimo_epoch(symbol) is None:
+                        agregador.sembrar(
+                            symbol, _rates_iniciales(proveedor, almacen, symbol, TF_BASE, agregador.capacidad_m1)
+                        )
+                    else:
+                        agregador.actualizar(
+                            symbol, proveedor.obtener_rates_desde(symbol, 1, agregador.ultimo_epoch(symbol))
+                        )
+
+            for tf_name in tfs_vencidos:
                 tf_minutes = TIMEFRAME_MAP.get(tf_name, 1)
 
-                # Verificar qué símbolos tienen vela nueva en este TF
+                # Traer solo las velas posteriores a la última del buffer de cada símbolo
                 simbolos_nuevos = []
                 for symbol in SYMBOLS_ACTIVOS:
-                    df_check = obtener_datos_historicos(symbol, tf_minutes, 1)
-                    if df_check is None or df_check.empty:
-                        continue
-                    latest_time = df_check['time'].iloc[0]
                     clave = (symbol, tf_name)
+                    buffer = buffers.get(clave)
+                    if buffer is None:
+                        rates = _rates_iniciales(proveedor, almacen, symbol, tf_name, BUFFER_VELAS_CAPACIDAD)
+                        if rates is None:
+                            continue
+                        buffer = buffers[clave] = BufferVelas.desde_rates(rates, BUFFER_VELAS_CAPACIDAD)
+                    elif agregador is None or not agregador.gestiona(tf_name):
+                        buffer.actualizar(proveedor.obtener_rates_desde(symbol, tf_minutes, buffer.ultimo_epoch))
+                    if almacen is not None:
+                        almacen.sincronizar(symbol, tf_name, buffer)
+
+                    latest_time = buffer.ultimo_time
                     if clave not in last_sent_time or latest_time > last_sent_time[clave]:
                         simbolos_nuevos.append((symbol, latest_time))
 
+                # La vela nueva aparece con el primer tick del periodo: si alguna
+                # serie aún no la tiene, se reintenta este TF en ~1s
+                inicio_periodo = planificador.inicio_periodo(tf_name)
+                if any(
+                    (symbol, tf_name) not in buffers or buffers[(symbol, tf_name)].ultimo_epoch < inicio_periodo
+                    for symbol in SYMBOLS_ACTIVOS
+                ):
+                    planificador.reintentar(tf_name)
+                else:
+                    planificador.completar(tf_name)
+
                 if not simbolos_nuevos:
                     log_mensaje(f"[{tf_name}] Sin velas nuevas", "INFO")
                     continue
@@ -354,42 +426,56 @@ def main():
                     "SUCCESS"
                 )
 
-                dfs_por_simbolo = {}
-
+                snapshot = snapshots[tf_name]
                 for symbol, latest_time in simbolos_nuevos:
-                    # Eliminar vela más antigua de este símbolo+TF
-                    if not supabase.delete_oldest_candle(tf_name, symbol):
-                        log_mensaje(f"  [{symbol}/{tf_name}] Error eliminando vela antigua", "WARNING")
+                    # Ventana de 60 velas desde el buffer (sin volver a pedirla a MT5)
+                    buffer = buffers[(symbol, tf_name)]
+                    df = buffer.dataframe(VENTANA_VELAS)
 
-                    # Obtener ventana completa de 60 velas
-                    df = obtener_datos_historicos(symbol, tf_minutes, VENTANA_VELAS)
-                    if df is None or df.empty:
-                        continue
-
-                    df = calcular_estadisticas(df, config, timeframe=tf_name, symbol=symbol)
+                    df = calcular_estadisticas(df, config, timeframe=tf_name, symbol=symbol,
+                                               flujo=_flujo_para(motor_ticks, buffer, symbol, tf_name))
 
                     dist_t = estimar_distribucion_t(df, min_datos=30)
                     if dist_t:
                         nu_estimado[(symbol, tf_name)] = dist_t['nu']
 
-                    dfs_por_simbolo[symbol] = df
-
-                if not dfs_por_simbolo:
-                    continue
+                    snapshot.actualizar(symbol, df, buffer.columna("time", VENTANA_VELAS))
 
-                # PCA cross-símbolo con los DataFrames del ciclo actual
-                # (solo si tenemos los 4 símbolos; si alguno faltó, usamos lo disponible)
-                pca_result, exposure, _ = _calcular_pca_para_tf(dfs_por_simbolo)
+                # PCA cross-símbolo sobre todos los pares del TF: los que no tuvieron
+                # vela nueva aportan su último frame; filas hasta el último epoch alineado
+                analisis = _calcular_pca_para_tf(snapshot)
+                pca_result = analisis["pca"] if analisis else None
+                exposure = analisis["exposicion"] if analisis else {}
 
-                # Insertar solo la vela nueva de cada símbolo
+                # Construir solo la vela nueva de cada símbolo (GBM diferido al lote)
+                # anomalos[symbol] = pendiente GBM de su vela nueva (si es anómala)
+                anomalos = {}
+                nuevas_filas = []
                 for symbol, latest_time in simbolos_nuevos:
-                    if symbol not in dfs_por_simbolo:
-                        continue
-
-                    df = dfs_por_simbolo[symbol]
+                    df = snapshot.frame(symbol)
                     datos = df.dropna(subset=['log_return'])
-                    new_row = build_rows(datos.tail(1), config, tf_name, symbol, pca_result, exposure)
+                    gbm_pendientes = []
+                    new_row = build_rows(datos.tail(1), config, tf_name, symbol, pca_result, exposure,
+                                         gbm_pendientes=gbm_pendientes)
+                    if gbm_pendientes:
+                        anomalos[symbol] = gbm_pendientes[0]
+                    nuevas_filas.append((symbol, latest_time, df, new_row))
+
+                # Campos por par con el motor de GBM_METODO; varios pares anómalos a la vez
+                # agregan además la probabilidad conjunta (simulación correlacionada)
+                resolver_gbm_lote(list(anomalos.values()), rng=rng_gbm)
+                cov, syms_cov, corr = (analisis["cov"], analisis["symbols"], analisis["corr"]) if analisis \
+                    else (None, [], None)
+                if resolver_gbm_conjunto(anomalos, cov, syms_cov, rng=rng_gbm, corr_matrix=corr):
+                    cesta = next(p[0] for p in anomalos.values() if "gbm_prob_cesta" in p[0])
+                    log_mensaje(
+                        f"  [{tf_name}] GBM conjunto: {cesta['gbm_cesta_pares']} pares | "
+                        f"P(cesta revierte)={cesta['gbm_prob_cesta']:.2%}",
+                        "INFO"
+                    )
 
+                # Acumular: todas las filas del ciclo se encolan juntas al final
+                for symbol, latest_time, df, new_row in nuevas_filas:
                     senal_info = detectar_anomalias(
                         df,
                         config['umbral_sigma_compra'],
@@ -398,30 +484,53 @@ def main():
                         pca_es_sistemico=es_movimiento_sistemico(pca_result, symbol),
                     )
 
-                    if new_row and supabase.enviar_datos(new_row):
+                    if new_row:
+                        filas_ciclo.extend(new_row)
+                        nuevas_en_ciclo += 1
                         log_mensaje(
-                            f"  [{symbol}/{tf_name}] Insertada | "
+                            f"  [{symbol}/{tf_name}] Encolada | "
                             f"z={senal_info['z_score']:.3f} | "
                             f"señal={senal_info.get('señal') or 'ninguna'} | "
                             f"régimen={senal_info.get('regimen')}",
                             "SUCCESS"
                         )
-                        nuevas_en_ciclo += 1
                     else:
-                        log_mensaje(f"  [{symbol}/{tf_name}] Error insertando vela", "ERROR")
+                        log_mensaje(f"  [{symbol}/{tf_name}] Error construyendo vela", "ERROR")
 
                     last_sent_time[(symbol, tf_name)] = latest_time
 
+            # Sin esperar a la red: el hilo de la cola hace el commit (upsert + recorte de ventana)
+            cola.encolar(filas_ciclo)
+
+            velas_totales += nuevas_en_ciclo
             if nuevas_en_ciclo == 0:
                 log_mensaje("Sin velas nuevas en ningun par/timeframe", "INFO")
             else:
-                log_mensaje(f"{nuevas_en_ciclo} velas actualizadas en este ciclo", "SUCCESS")
+                log_mensaje(
+                    f"{nuevas_en_ciclo} velas encoladas en este ciclo | "
+                    f"cola: {cola.num_pendientes} pendientes, {cola.filas_enviadas} enviadas",
+                    "SUCCESS"
+                )
+
+    except FinReplay:
+        # Fin de la sesión grabada: resumen de throughput end-to-end (incluye vaciar la cola)
+        _detener_cola(cola)
+        duracion = time.perf_counter() - t_inicio_loop
+        print("\n" + "=" * 70)
+        log_mensaje(
+            f"Replay terminado: {ciclo} ciclos, {velas_totales} velas en {duracion:.2f}s "
+            f"({velas_totales / duracion if duracion > 0 else 0:.1f} velas/s)",
+            "SUCCESS"
+        )
+        proveedor.desconectar()
+        print("=" * 70)
 
     except KeyboardInterrupt:
         print("\n\n" + "=" * 70)
         log_mensaje("Deteniendo backend por peticion del usuario...", "WARNING")
-        mt5.shutdown()
-        log_mensaje("Desconectado de MT5", "SUCCESS")
+        _detener_cola(cola)
+        proveedor.desconectar()
+        log_mensaje(f"Desconectado del proveedor de datos ({proveedor.nombre})", "SUCCESS")
         print("=" * 70)
 
 if __name__ == "__main__":
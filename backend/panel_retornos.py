@@ -0,0 +1,202 @@
+# panel_retornos.py — Panel de retornos alineados por timestamp (una columna por símbolo)
+#
+# Reemplaza la cadena de pd.merge de construir_matriz_retornos(): en lugar
+# de copiar, renombrar y unir N DataFrames en cada actualización de un TF,
+# cada símbolo escribe sus log-returns en un array 2-D compartido
+#   retornos [filas × n_symbols]   indexado por epoch entero (una fila por vela)
+#   validos  [filas × n_symbols]   máscara: la celda tiene retorno de ese símbolo
+# y la matriz R para el PCA es la selección de filas válidas en todas las
+# columnas pedidas. Si todas lo son, R es una vista del panel (sin copia).
+#
+# Almacenamiento: arrays de 2·capacidad filas; la ventana es el slice
+# contiguo [ini, fin). Las velas nuevas se agregan al final y, al llegar al
+# borde, la ventana se mueve al principio (una copia cada ~capacidad velas).
+# Un epoch que cae entre filas existentes (un símbolo con una vela que otro
+# no tuvo) reordena la ventana: caso raro, O(capacidad · n_symbols).
+#
+import numpy as np
+
+
+class PanelRetornos:
+    """
+    Ventana móvil de retornos de varios símbolos alineados por epoch.
+
+    Los epochs son enteros en la unidad que use quien alimenta el panel
+    (segundos de BufferVelas, ns de un DataFrame): solo deben ser la misma
+    para todos los símbolos.
+
+    Uso:
+        panel = PanelRetornos(SYMBOLS_ACTIVOS, capacidad=VENTANA_VELAS)
+        panel.actualizar("EURUSD", buffer.columna("time", 60), df["log_return"].to_numpy())
+        R, symbols, epochs = panel.matriz()
+    """
+    __slots__ = ("symbols", "capacidad", "version", "_col", "_tiempos", "_retornos", "_validos", "_ini", "_fin")
+
+    def __init__(self, symbols, capacidad):
+        if capacidad < 1:
+            raise ValueError(f"Capacidad de panel inválida: {capacidad}")
+        self.symbols = list(symbols)
+        self.capacidad = int(capacidad)
+        self.version = 0   # Sube solo si cambia alguna celda o la ventana (clave de caché de SnapshotMultipar)
+        self._col = {sym: j for j, sym in enumerate(self.symbols)}
+        filas = 2 * self.capacidad
+        self._tiempos = np.zeros(filas, dtype=np.int64)
+        self._retornos = np.full((filas, len(self.symbols)), np.nan)
+        self._validos = np.zeros((filas, len(self.symbols)), dtype=bool)
+        self._ini = 0
+        self._fin = 0
+
+    @classmethod
+    def desde_dataframes(cls, dataframes, capacidad=None):
+        """
+        Panel con los 'log_return' de DataFrames con columnas 'time' y 'log_return'.
+
+        Epochs en nanosegundos. Sin capacidad, una fila por cada 'time' distinto
+        entre todos los DataFrames (no se descarta ninguna vela).
+        """
+        epochs = {sym: _epochs_ns(df["time"]) for sym, df in dataframes.items()}
+        if capacidad is None:
+            capacidad = max(len(np.unique(np.concatenate(list(epochs.values())))), 1) if epochs else 1
+        panel = cls(list(dataframes), capacidad)
+        for sym, df in dataframes.items():
+            panel.actualizar(sym, epochs[sym], df["log_return"].to_numpy(dtype=np.float64, na_value=np.nan))
+        return panel
+
+    def __len__(self):
+        return self._fin - self._ini
+
+    @property
+    def epochs(self):
+        """Vista de los epochs de la ventana, del más antiguo al más reciente."""
+        return self._tiempos[self._ini:self._fin]
+
+    def actualizar(self, symbol, tiempos, retornos):
+        """
+        Escribe los retornos de un símbolo en las filas de sus epochs.
+
+        - epoch ya presente: sobrescribe la celda del símbolo (vela en formación)
+        - epoch posterior al último: agrega la fila; si el panel está lleno
+          se descarta la más antigua
+        - epoch anterior a la ventana llena: se ignora
+        - retorno NaN/inf: no escribe (no invalida un valor ya guardado)
+
+        Args:
+            symbol:   str — uno de self.symbols
+            tiempos:  array-like int — epochs de las velas
+            retornos: array-like float — log-return de cada vela (mismo largo)
+
+        Returns:
+            int — número de filas nuevas en el panel
+        """
+        j = self._col[symbol]
+        tiempos = np.asarray(tiempos, dtype=np.int64)
+        retornos = np.asarray(retornos, dtype=np.float64)
+        finitos = np.isfinite(retornos)
+        tiempos, retornos = tiempos[finitos], retornos[finitos]
+        if len(tiempos) == 0:
+            return 0
+
+        nuevos = np.unique(tiempos[~self._presentes(tiempos)[1]])
+        if len(nuevos):
+            if len(self) == 0 or nuevos[0] > self._tiempos[self._fin - 1]:
+                self._agregar_filas(nuevos)
+            else:
+                self._reindexar(np.union1d(self.epochs, nuevos))
+
+        pos, dentro = self._presentes(tiempos)
+        filas = self._ini + pos[dentro]
+        if len(nuevos) or not (self._validos[filas, j].all()
+                               and np.array_equal(self._retornos[filas, j], retornos[dentro])):
+            self.version += 1
+        self._retornos[filas, j] = retornos[dentro]
+        self._validos[filas, j] = True
+        return int(self._presentes(nuevos)[1].sum()) if len(nuevos) else 0
+
+    def matriz(self, symbols=None, n=None):
+        """
+        Matriz de retornos alineados R: filas con retorno en todos los símbolos pedidos.
+
+        Equivale al inner join por 'time' + dropna de las series. Si todas las
+        filas de la ventana están completas y las columnas pedidas son contiguas
+        en el panel (p. ej. todas), R y epochs son vistas sin copia que dejan de
+        ser válidas tras la siguiente actualizar().
+
+        Args:
+            symbols: list[str] | None — columnas de R (None = todos, en orden del panel)
+            n:       int | None — solo las últimas n filas del panel
+
+        Returns:
+            tuple(R, symbols, epochs):
+                R:       np.ndarray [n_alineadas × n_symbols]
+                symbols: list[str] en el orden de las columnas de R
+                epochs:  np.ndarray int64 [n_alineadas]
+        """
+        symbols = self.symbols if symbols is None else list(symbols)
+        cols = [self._col[sym] for sym in symbols]
+        contiguas = cols == list(range(cols[0], cols[0] + len(cols))) if cols else True
+        sel = slice(cols[0], cols[0] + len(cols)) if cols and contiguas else cols
+
+        ini = self._ini if n is None else max(self._ini, self._fin - n)
+        completas = self._validos[ini:self._fin, sel].all(axis=1)
+        if completas.all():
+            return self._retornos[ini:self._fin, sel], symbols, self._tiempos[ini:self._fin]
+        filas = ini + np.flatnonzero(completas)
+        return self._retornos[filas][:, sel], symbols, self._tiempos[filas]
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _presentes(self, tiempos):
+        """Posición en la ventana de cada epoch y si está presente."""
+        actuales = self.epochs
+        pos = np.searchsorted(actuales, tiempos)
+        if len(actuales) == 0:
+            return pos, np.zeros(len(tiempos), dtype=bool)
+        return pos, (pos < len(actuales)) & (actuales[np.minimum(pos, len(actuales) - 1)] == tiempos)
+
+    def _agregar_filas(self, nuevos):
+        """Agrega filas vacías para epochs posteriores al último (ascendentes)."""
+        k = len(nuevos)
+        if k >= self.capacidad:
+            self._ini, self._fin = 0, 0
+            nuevos = nuevos[-self.capacidad:]
+            k = self.capacidad
+        elif self._fin + k > len(self._tiempos):
+            # Mover al principio solo lo que sigue en la ventana tras agregar k filas
+            conservar = min(len(self), self.capacidad - k)
+            origen = slice(self._fin - conservar, self._fin)
+            self._tiempos[:conservar] = self._tiempos[origen]
+            self._retornos[:conservar] = self._retornos[origen]
+            self._validos[:conservar] = self._validos[origen]
+            self._ini, self._fin = 0, conservar
+
+        nuevas = slice(self._fin, self._fin + k)
+        self._tiempos[nuevas] = nuevos
+        self._retornos[nuevas] = np.nan
+        self._validos[nuevas] = False
+        self._fin += k
+        self._ini = max(self._ini, self._fin - self.capacidad)
+
+    def _reindexar(self, tiempos):
+        """Rehace la ventana sobre los epochs dados (ascendentes), conservando sus celdas."""
+        tiempos = tiempos[-self.capacidad:]
+        viejos = self.epochs.copy()
+        retornos = self._retornos[self._ini:self._fin].copy()
+        validos = self._validos[self._ini:self._fin].copy()
+
+        m = len(tiempos)
+        self._ini, self._fin = 0, m
+        self._tiempos[:m] = tiempos
+        self._retornos[:m] = np.nan
+        self._validos[:m] = False
+
+        pos = np.searchsorted(tiempos, viejos)
+        siguen = (pos < m) & (tiempos[np.minimum(pos, m - 1)] == viejos)
+        self._retornos[pos[siguen]] = retornos[siguen]
+        self._validos[pos[siguen]] = validos[siguen]
+
+
+def _epochs_ns(serie_time):
+    """Columna 'time' (datetime64 de cualquier resolución) como int64 epoch en ns."""
+    return np.asarray(serie_time.to_numpy(dtype="datetime64[ns]")).view(np.int64)
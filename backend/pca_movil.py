@@ -0,0 +1,358 @@
+# pca_movil.py — Covarianza móvil y PC1 actualizados por vela (sin recalcular desde cero)
+#
+# _calcular_pca_para_tf reconstruía R, recalculaba Σ = Rcᵀ·Rc/(T−1) en
+# O(T·N²) y hacía un np.linalg.eigh completo cada vez que un par tenía vela
+# nueva. Entre dos ciclos la ventana solo cambia en los bordes: entra la
+# vela nueva, sale la más antigua y se corrige la que estaba en formación.
+#
+#   CovarianzaMovil: media y co-momentos M2 con altas y bajas de Welford
+#                    (en lote, la combinación de Chan), O(m·N²) por m vectores:
+#       alta de B (m filas, media μB, co-momentos M2B) sobre (n, μ, M2):
+#           δ = μB − μ;  n' = n + m;  μ' = μ + δ·m/n'
+#           M2' = M2 + M2B + δ⊗δ · n·m/n'
+#       baja: la inversa (se despeja n, μ, M2 de la combinación)
+#       Σ = M2 / (n − 1)
+#   PCAMovil:        PC1 por iteración de potencia arrancando del autovector
+#                    del ciclo anterior (converge en pocas iteraciones). Sin
+#                    convergencia (λ1 ≈ λ2) se usa eigh. Signo como en
+#                    calcular_pca(): loading de EURUSD positivo; sin EURUSD,
+#                    continuo con el ciclo anterior.
+#
+# Control de deriva: cada PCA_RECALCULO_EXACTO_CADA actualizaciones (o si
+# cambia más de media ventana) se recalcula Σ exacta desde R con eigh, se
+# mide la diferencia con la acumulada y se reemplaza el estado.
+#
+# Historia por vela (carga inicial): calcular_pca_historico() da el PCA que
+# habría visto cada vela con la ventana móvil de filas alineadas que termina
+# en ella (sin datos futuros). main le pasa PCA_HISTORIA_VELAS filas, una
+# ventana más que las publicadas, para que la primera vela publicada ya tenga
+# su ventana completa. Las T covarianzas salen de sumas acumuladas de Y = R − media
+#   S_t = Σ_{s<t} y_s      Q_t = Σ_{s<t} y_s ⊗ y_s
+#   Σ[a, b) = (Q_b − Q_a − (S_b − S_a)⊗(S_b − S_a)/n) / (n − 1)
+# y se descomponen en una sola llamada a np.linalg.eigh sobre [T × N × N].
+#
+import numpy as np
+from calculos_multipair import calcular_covarianza, calcular_pca, _pca_nulo
+from config import (
+    PCA_RECALCULO_EXACTO_CADA, PCA_POTENCIA_MAX_ITER, PCA_POTENCIA_TOL, PCA_DERIVA_TOL,
+    PCA_MIN_FILAS_ALINEADAS, VENTANA_VELAS,
+)
+from utils import log_mensaje
+
+
+class CovarianzaMovil:
+    """
+    Media y covarianza muestral de un conjunto de vectores que entran y salen.
+
+    Uso:
+        acum = CovarianzaMovil.desde_matriz(R)   # estado exacto de la ventana
+        acum.agregar(r_nuevo); acum.quitar(r_viejo)
+        cov = acum.covarianza()
+    """
+    __slots__ = ("n", "media", "m2")
+
+    def __init__(self, n_symbols):
+        self.n = 0
+        self.media = np.zeros(n_symbols)
+        self.m2 = np.zeros((n_symbols, n_symbols))
+
+    @classmethod
+    def desde_matriz(cls, R):
+        """Estado exacto de las filas de R [T × N]."""
+        acum = cls(R.shape[1])
+        acum.n = R.shape[0]
+        if acum.n:
+            acum.media = R.mean(axis=0)
+            centrado = R - acum.media
+            acum.m2 = centrado.T @ centrado
+        return acum
+
+    def agregar(self, X):
+        """Incorpora vectores de retornos: X [N] o [m × N]."""
+        X = np.atleast_2d(X)
+        m = len(X)
+        if m == 0:
+            return
+        media_b = X.sum(axis=0) / m
+        centrado = X - media_b
+        n = self.n + m
+        delta = media_b - self.media
+        self.m2 += centrado.T @ centrado + delta[:, None] * (delta * (self.n * m / n))
+        self.media += delta * (m / n)
+        self.n = n
+
+    def quitar(self, X):
+        """Retira vectores incorporados antes (inversa exacta de agregar)."""
+        X = np.atleast_2d(X)
+        m = len(X)
+        if m == 0:
+            return
+        n = self.n - m
+        if n <= 0:
+            self.__init__(len(self.media))
+            return
+        media_b = X.sum(axis=0) / m
+        centrado = X - media_b
+        media = (self.media * self.n - media_b * m) / n
+        delta = media_b - media
+        self.m2 -= centrado.T @ centrado + delta[:, None] * (delta * (n * m / self.n))
+        self.media = media
+        self.n = n
+
+    def covarianza(self):
+        """Σ = M2 / (n − 1), simetrizada (el redondeo de las altas/bajas no lo es)."""
+        if self.n < 2:
+            return np.zeros_like(self.m2)
+        cov = self.m2 / (self.n - 1)
+        return (cov + cov.T) / 2
+
+
+def pc1_por_potencia(cov, v0, max_iter=PCA_POTENCIA_MAX_ITER, tol=PCA_POTENCIA_TOL):
+    """
+    Primer autovector de Σ por iteración de potencia desde v0.
+
+    Itera con Σ² (una multiplicación de matrices): cada paso reduce el error
+    en (λ2/λ1)², la mitad de pasos que con Σ.
+
+    Args:
+        cov: np.ndarray [N × N] — simétrica semidefinida positiva
+        v0:  np.ndarray [N] — vector inicial (el PC1 anterior)
+
+    Returns:
+        tuple(v, lambda1, iteraciones), o None si no converge en max_iter
+        (autovalores casi repetidos) o Σ anula a v0
+    """
+    v = v0 / np.sqrt(v0 @ v0)
+    tol2 = tol * tol
+    cov2 = cov @ cov
+    for iteracion in range(1, max_iter + 1):
+        w = cov2 @ v
+        norma = np.sqrt(w @ w)
+        if norma == 0:
+            return None
+        w /= norma
+        d = w - v
+        if d @ d < tol2:
+            return w, float(w @ cov @ w), iteracion
+        v = w
+    return None
+
+
+class PCAMovil:
+    """
+    PCA de la ventana alineada de un timeframe, actualizado con los cambios de R.
+
+    Recibe en cada ciclo la matriz alineada completa (PanelRetornos.matriz);
+    compara sus epochs con los del ciclo anterior y solo da de alta / baja en
+    la covarianza las filas que entraron, salieron o cambiaron.
+
+    Devuelve (cov, pca_result) con la estructura de calcular_pca(); en las
+    actualizaciones incrementales varianza_total solo trae la fracción de PC1.
+    """
+
+    def __init__(self, recalculo_cada=PCA_RECALCULO_EXACTO_CADA):
+        self.recalculo_cada = recalculo_cada
+        self.symbols = None
+        self._R = None             # copia de la R del ciclo anterior
+        self._epochs = None
+        self._acum = None
+        self._v = None             # PC1 anterior (arranque de la potencia; signo continuo sin EURUSD)
+        self._desde_exacto = 0
+
+        # Diagnóstico
+        self.recalculos_exactos = 0
+        self.iteraciones = 0       # iteraciones de potencia de la última actualización (0 = eigh)
+        self.deriva = None         # max|Σ acumulada − Σ exacta| / max|Σ exacta| del último control
+
+    def actualizar(self, R, symbols, epochs):
+        """
+        Args:
+            R:       np.ndarray [T × N] — filas alineadas (puede ser una vista del panel)
+            symbols: list[str] — columnas de R
+            epochs:  np.ndarray int64 [T] — epoch de cada fila, ascendentes
+
+        Returns:
+            tuple(cov, pca_result)
+        """
+        symbols = list(symbols)
+        if not self._aplicar_cambios(R, symbols, epochs):
+            return self._exacto(R, symbols, epochs)
+        if self._desde_exacto >= self.recalculo_cada:
+            return self._exacto(R, symbols, epochs, control=True)
+
+        cov = self._acum.covarianza()
+        resultado = pc1_por_potencia(cov, self._v)
+        if resultado is None:
+            return cov, self._desde_eigh(cov, symbols)
+        v, lambda1, self.iteraciones = resultado
+        return cov, self._resultado(v, lambda1, np.trace(cov), symbols)
+
+    def _aplicar_cambios(self, R, symbols, epochs):
+        """Altas/bajas de las filas que cambiaron; False si conviene recalcular desde cero."""
+        if self._R is None or symbols != self.symbols or len(epochs) == 0:
+            return False
+        previos = self._epochs
+        # Caso normal: la ventana se desplazó (salen d filas del principio, entran al final)
+        d = int(np.searchsorted(previos, epochs[0]))
+        m = len(previos) - d
+        if m <= len(epochs) and (previos[d:] == epochs[:m]).all():
+            cambian = np.flatnonzero((self._R[d:] != R[:m]).any(axis=1))
+            altas = np.concatenate((R[m:], R[cambian]))
+            bajas = np.concatenate((self._R[:d], self._R[d + cambian]))
+        else:
+            _, i_prev, i_nuevo = np.intersect1d(previos, epochs, assume_unique=True, return_indices=True)
+            cambian = np.flatnonzero((self._R[i_prev] != R[i_nuevo]).any(axis=1))
+            entran = np.setdiff1d(np.arange(len(epochs)), i_nuevo, assume_unique=True)
+            salen = np.setdiff1d(np.arange(len(previos)), i_prev, assume_unique=True)
+            altas = R[np.concatenate((entran, i_nuevo[cambian]))]
+            bajas = self._R[np.concatenate((salen, i_prev[cambian]))]
+        if len(altas) + len(bajas) > len(R) // 2:
+            return False
+
+        # Altas antes que bajas: n nunca baja de 2 en una ventana válida
+        self._acum.agregar(altas)
+        self._acum.quitar(bajas)
+        self._R, self._epochs = np.array(R), np.array(epochs)
+        self._desde_exacto += 1
+        return True
+
+    def _exacto(self, R, symbols, epochs, control=False):
+        """Σ exacta desde R + eigh; en el control periódico mide la deriva de la acumulada."""
+        cov = calcular_covarianza(R)
+        if control:
+            escala = np.max(np.abs(cov)) or 1.0
+            self.deriva = float(np.max(np.abs(self._acum.covarianza() - cov)) / escala)
+            if self.deriva > PCA_DERIVA_TOL:
+                log_mensaje(f"PCA incremental: deriva {self.deriva:.1e} corregida con el recálculo exacto", "WARNING")
+        if symbols != self.symbols:
+            self._v = None
+        self.symbols = symbols
+        self._R, self._epochs = np.array(R), np.array(epochs)
+        self._acum = CovarianzaMovil.desde_matriz(self._R)
+        self._desde_exacto = 0
+        self.recalculos_exactos += 1
+        return cov, self._desde_eigh(cov, symbols)
+
+    def _orientar(self, v, symbols):
+        """Signo de PC1 de calcular_pca(): EURUSD positivo; sin EURUSD, continuo con el ciclo anterior."""
+        if "EURUSD" in symbols:
+            return -v if v[symbols.index("EURUSD")] < 0 else v
+        if self._v is not None and v @ self._v < 0:
+            return -v
+        return v
+
+    def _desde_eigh(self, cov, symbols):
+        """PCA con eigh, orientado con _orientar."""
+        self.iteraciones = 0
+        pca = calcular_pca(cov, symbols)
+        if not pca["pca_valido"]:
+            self._v = None
+            return pca
+        v = np.array([pca["pc1_loadings"][sym] for sym in symbols])
+        orientado = self._orientar(v, symbols)
+        if orientado is not v:
+            pca["pc1_loadings"] = {sym: float(orientado[i]) for i, sym in enumerate(symbols)}
+        self._v = orientado
+        return pca
+
+    def _resultado(self, v, lambda1, traza, symbols):
+        v = self._orientar(v, symbols)
+        self._v = v
+        if traza <= 0:
+            return _pca_nulo(symbols)
+        pc1_varianza = float(min(max(lambda1 / traza, 0.0), 1.0))
+        return {
+            "pc1_loadings": {sym: float(v[i]) for i, sym in enumerate(symbols)},
+            "pc1_varianza": pc1_varianza,
+            "varianza_total": [pc1_varianza],
+            "pca_valido": True,
+        }
+
+
+def calcular_pca_historico(R, symbols, epochs, ventana=VENTANA_VELAS, min_filas=PCA_MIN_FILAS_ALINEADAS):
+    """
+    PCA de cada fila de R con la ventana que termina en ella (solo datos pasados).
+
+    La fila t usa las filas [max(0, t − ventana + 1), t]; con menos de
+    min_filas no hay PCA (NaN). La última fila coincide con calcular_pca()
+    sobre la ventana completa. Signo: loading de EURUSD positivo, como
+    calcular_pca(); sin EURUSD, continuo de una fila a la siguiente.
+
+    Args:
+        R:       np.ndarray [T × N] — retornos alineados (PanelRetornos.matriz)
+        symbols: list[str] — columnas de R
+        epochs:  np.ndarray int64 [T] — epoch de cada fila
+
+    Returns:
+        dict con:
+            epochs:       np.ndarray [T]
+            symbols:      list[str]
+            pc1_loadings: np.ndarray [T × N] — NaN en filas sin PCA
+            pc1_varianza: np.ndarray [T] — NaN en filas sin PCA
+    """
+    R = np.asarray(R, dtype=np.float64)
+    T, N = R.shape
+    loadings = np.full((T, N), np.nan)
+    varianza = np.full(T, np.nan)
+    fin = np.arange(max(min_filas, 2), T + 1)          # la fila t = fin − 1 cierra la ventana
+    if len(fin) and N:
+        ini = np.maximum(fin - ventana, 0)
+        n = (fin - ini).astype(np.float64)
+
+        Y = R - R.mean(axis=0)
+        S = np.zeros((T + 1, N))
+        Q = np.zeros((T + 1, N, N))
+        np.cumsum(Y, axis=0, out=S[1:])
+        np.cumsum(Y[:, :, None] * Y[:, None, :], axis=0, out=Q[1:])
+        s = S[fin] - S[ini]
+        covs = (Q[fin] - Q[ini] - s[:, :, None] * s[:, None, :] / n[:, None, None]) / (n - 1)[:, None, None]
+
+        autovalores, autovectores = np.linalg.eigh(covs)   # ascendentes: PC1 es el último
+        positivos = np.maximum(autovalores, 0)
+        total = positivos.sum(axis=1)
+        v = autovectores[:, :, -1]
+        if "EURUSD" in symbols:
+            v = v * np.where(v[:, symbols.index("EURUSD")] < 0, -1.0, 1.0)[:, None]
+        else:
+            for i in range(1, len(v)):
+                if v[i] @ v[i - 1] < 0:
+                    v[i] = -v[i]
+        con_varianza = total > 0
+        filas = fin[con_varianza] - 1
+        loadings[filas] = v[con_varianza]
+        varianza[filas] = positivos[con_varianza, -1] / total[con_varianza]
+
+    return {"epochs": np.asarray(epochs), "symbols": list(symbols),
+            "pc1_loadings": loadings, "pc1_varianza": varianza}
+
+
+def pca_historico_para(historico, symbol, epochs):
+    """
+    Columnas PCA por vela de un símbolo para build_rows(pca_por_fila=...).
+
+    Cada vela toma el PCA de la última fila alineada en o antes de su epoch
+    (una vela que otro par no tuvo hereda el de la anterior).
+
+    Args:
+        historico: dict de calcular_pca_historico() o
+                   pca_universo.calcular_pca_historico_universo() (o None)
+        symbol:    str
+        epochs:    np.ndarray int64 [n] — epochs de las filas a serializar
+
+    Returns:
+        dict {pc1_loading: np.ndarray [n], pc1_varianza: np.ndarray [n]} (NaN = sin PCA),
+        más sistemico: np.ndarray bool [n] si el histórico es de modo universo
+    """
+    epochs = np.asarray(epochs)
+    nulo = {"pc1_loading": np.full(len(epochs), np.nan), "pc1_varianza": np.full(len(epochs), np.nan)}
+    if historico is None or symbol not in historico["symbols"] or len(historico["epochs"]) == 0:
+        return nulo
+    fila = np.searchsorted(historico["epochs"], epochs, side="right") - 1
+    hay = fila >= 0
+    j = historico["symbols"].index(symbol)
+    nulo["pc1_loading"][hay] = historico["pc1_loadings"][fila[hay], j]
+    nulo["pc1_varianza"][hay] = historico["pc1_varianza"][fila[hay]]
+    if "sistemico" in historico:
+        nulo["sistemico"] = np.zeros(len(epochs), dtype=bool)
+        nulo["sistemico"][hay] = historico["sistemico"][fila[hay], j]
+    return nulo
@@ -0,0 +1,198 @@
+# pca_universo.py — PCA para universos grandes (28 majors/cruces + metales): shrinkage + top-k + factores por moneda
+#
+# El PCA clásico (calculos_multipair) está pensado para 4 pares USD: Σ
+# muestral densa, eigh completo, EURUSD como ancla de signo y un único
+# factor USD con loadings de autovector (> 0.70). Con 30 símbolos y
+# ventanas de 30–60 velas la Σ muestral está mal condicionada (T ≈ N), los
+# loadings de autovector valen ~1/√N y hay más de un factor (USD, JPY, ...).
+#
+#   1. Retornos estandarizados por columna (los metales no dominan el PCA)
+#   2. Shrinkage de Ledoit-Wolf de la correlación hacia la identidad:
+#        C* = δ·I + (1 − δ)·C,   δ = min(b², d²) / d²
+#        d² = ‖C − I‖²_F / N,   b² = Σ_t ‖z_t z_tᵀ − C‖²_F / (N·T²)
+#   3. Solo los k autovectores mayores (scipy.linalg.eigh con subset_by_index)
+#   4. Cada factor se expresa en monedas: el par BASEQUOTE pesa +1 en su base
+#      y −1 en su cotizada; loadings ≈ D·c se resuelve por mínimos cuadrados
+#      y la moneda dominante (máx |c|) da nombre al factor. El signo se
+#      orienta con c_dominante > 0 (factor al alza = esa moneda se fortalece).
+#   5. Loadings como correlación par–factor: v_ij · √λ_j (escala independiente de N)
+#
+# Un par es sistémico si algún factor explica más de
+# PCA_UNIVERSO_VARIANZA_UMBRAL de la varianza del universo y el par tiene
+# |correlación| > PCA_PC1_LOADING_UMBRAL con él.
+#
+import numpy as np
+from scipy.linalg import eigh as eigh_scipy
+from calculos_multipair import _pca_nulo
+from config import (
+    PCA_MODO, PCA_UNIVERSO_MIN_SIMBOLOS, PCA_FACTORES_K,
+    PCA_UNIVERSO_VARIANZA_UMBRAL, PCA_PC1_LOADING_UMBRAL,
+    PCA_MIN_FILAS_ALINEADAS, VENTANA_VELAS,
+)
+
+_PROYECTOR_MONEDAS = {}   # tuple(symbols) -> (monedas, pinv(D)): el universo casi nunca cambia
+
+
+def usar_modo_universo(n_symbols):
+    """PCA_MODO: 'universo', 'clasico' o 'auto' (universo con más de PCA_UNIVERSO_MIN_SIMBOLOS)."""
+    if PCA_MODO == "auto":
+        return n_symbols > PCA_UNIVERSO_MIN_SIMBOLOS
+    return PCA_MODO == "universo"
+
+
+def correlacion_shrinkage(R):
+    """
+    Correlación de Ledoit-Wolf (objetivo: identidad) sobre retornos estandarizados.
+
+    Args:
+        R: np.ndarray [T × N]
+
+    Returns:
+        tuple(corr, sigma, intensidad):
+            corr:       np.ndarray [N × N] — bien condicionada aunque T ≤ N
+            sigma:      np.ndarray [N] — desvío muestral de cada columna (0 si constante)
+            intensidad: float — δ en [0, 1]
+    """
+    T, N = R.shape
+    centrado = R - R.mean(axis=0)
+    desvio = np.sqrt((centrado ** 2).sum(axis=0) / T)
+    Z = centrado / np.where(desvio > 0, desvio, 1.0)
+    C = Z.T @ Z / T                                     # estimador de LW (1/T): diagonal 1
+    np.fill_diagonal(C, 1.0)                            # columnas constantes: sin correlación
+    d2 = ((C - np.eye(N)) ** 2).sum() / N
+    if d2 <= 0:
+        intensidad = 1.0
+    else:
+        # Σ_t ‖z_t z_tᵀ − C‖²_F = Σ_t ‖z_t‖⁴ − T·‖C‖²_F
+        normas2 = (Z ** 2).sum(axis=1)
+        b2 = max((normas2 @ normas2 - T * (C ** 2).sum()) / (N * T * T), 0.0)
+        intensidad = min(b2, d2) / d2
+    corr = (1 - intensidad) * C
+    corr[np.diag_indices(N)] = 1.0
+    sigma = desvio * np.sqrt(T / max(T - 1, 1))         # mismo escalado que calcular_covarianza
+    return corr, sigma, float(intensidad)
+
+
+def top_k_autovectores(matriz, k):
+    """
+    Los k autovalores mayores (descendentes) y sus autovectores [N × k].
+
+    Solo calcula ese bloque del espectro (LAPACK syevr) en lugar de los N.
+    """
+    N = matriz.shape[0]
+    k = max(1, min(k, N))
+    autovalores, autovectores = eigh_scipy(matriz, subset_by_index=[N - k, N - 1], driver="evr")
+    return autovalores[::-1], autovectores[:, ::-1]
+
+
+def matriz_monedas(symbols):
+    """
+    Exposición de cada par a cada moneda: +1 en la base, −1 en la cotizada.
+
+    Returns:
+        tuple(monedas, D): list[str], np.ndarray [N × n_monedas]
+        (símbolos que no son BASEQUOTE de 6 letras quedan en cero)
+    """
+    monedas = sorted({sym[i:i + 3] for sym in symbols if len(sym) == 6 for i in (0, 3)})
+    col = {m: j for j, m in enumerate(monedas)}
+    D = np.zeros((len(symbols), len(monedas)))
+    for i, sym in enumerate(symbols):
+        if len(sym) == 6:
+            D[i, col[sym[:3]]] = 1.0
+            D[i, col[sym[3:]]] = -1.0
+    return monedas, D
+
+
+def _proyector_monedas(symbols):
+    """(monedas, D⁺) cacheado por universo: coef = D⁺ · loadings resuelve el mínimos cuadrados."""
+    clave = tuple(symbols)
+    if clave not in _PROYECTOR_MONEDAS:
+        monedas, D = matriz_monedas(symbols)
+        _PROYECTOR_MONEDAS[clave] = (monedas, np.linalg.pinv(D) if monedas else None)
+    return _PROYECTOR_MONEDAS[clave]
+
+
+def calcular_pca_universo(R, symbols, k=PCA_FACTORES_K):
+    """
+    PCA con shrinkage y top-k factores por moneda para universos grandes.
+
+    Args:
+        R:       np.ndarray [T × N] — retornos alineados
+        symbols: list[str]
+        k:       int — factores a extraer
+
+    Returns:
+        tuple(cov, pca_result):
+            cov:        np.ndarray [N × N] — covarianza con shrinkage (σ·C*·σ),
+                        para exposición y GBM conjunto
+            pca_result: dict compatible con calcular_pca() (pc1_* = factor 1,
+                        loadings como correlación) + factores, sistemico,
+                        factor_dominante e intensidad_shrinkage
+    """
+    symbols = list(symbols)
+    corr, sigma, intensidad = correlacion_shrinkage(np.asarray(R, dtype=np.float64))
+    cov = corr * np.outer(sigma, sigma)
+    if not (sigma > 0).any():
+        return cov, _pca_nulo(symbols)
+
+    autovalores, V = top_k_autovectores(corr, k)
+    autovalores = np.maximum(autovalores, 0)
+    fraccion = autovalores / np.trace(corr)             # traza = N
+    cargas = V * np.sqrt(autovalores)                   # correlación par–factor
+
+    monedas, proyector = _proyector_monedas(symbols)
+    if monedas:
+        coef = proyector @ cargas                       # [n_monedas × k], norma mínima (suma 0)
+        dominante = np.argmax(np.abs(coef), axis=0)
+        signo = np.sign(coef[dominante, np.arange(len(dominante))])
+        signo[signo == 0] = 1.0
+        cargas = cargas * signo
+        nombres = [monedas[j] for j in dominante]
+    else:
+        nombres = [None] * len(autovalores)
+
+    significativo = fraccion > PCA_UNIVERSO_VARIANZA_UMBRAL
+    dominado = (np.abs(cargas) > PCA_PC1_LOADING_UMBRAL) & significativo
+    factor_par = np.where(dominado.any(axis=1), np.argmax(np.abs(cargas) * dominado, axis=1), -1)
+
+    pca_result = {
+        "pc1_loadings": {sym: float(cargas[i, 0]) for i, sym in enumerate(symbols)},
+        "pc1_varianza": float(fraccion[0]),
+        "varianza_total": fraccion.tolist(),
+        "pca_valido": True,
+        "factores": [
+            {"moneda": nombres[j], "varianza": float(fraccion[j]),
+             "loadings": {sym: float(cargas[i, j]) for i, sym in enumerate(symbols)}}
+            for j in range(len(fraccion))
+        ],
+        "sistemico": {sym: bool(factor_par[i] >= 0) for i, sym in enumerate(symbols)},
+        "factor_dominante": {sym: (nombres[factor_par[i]] if factor_par[i] >= 0 else None)
+                             for i, sym in enumerate(symbols)},
+        "intensidad_shrinkage": intensidad,
+    }
+    return cov, pca_result
+
+
+def calcular_pca_historico_universo(R, symbols, epochs, ventana=VENTANA_VELAS, min_filas=PCA_MIN_FILAS_ALINEADAS,
+                                    k=PCA_FACTORES_K):
+    """
+    calcular_pca_historico() en modo universo: el PCA de cada vela con su ventana.
+
+    Una llamada a calcular_pca_universo por fila (cada ventana tiene su propio
+    shrinkage, no se puede apilar en un eigh por lotes). Agrega 'sistemico'
+    [T × N] para que build_rows use la regla por factores.
+    """
+    R = np.asarray(R, dtype=np.float64)
+    T, N = R.shape
+    loadings = np.full((T, N), np.nan)
+    varianza = np.full(T, np.nan)
+    sistemico = np.zeros((T, N), dtype=bool)
+    for t in range(max(min_filas, 2) - 1, T):
+        _, pca = calcular_pca_universo(R[max(0, t - ventana + 1):t + 1], symbols, k)
+        if not pca["pca_valido"]:
+            continue
+        loadings[t] = [pca["pc1_loadings"][sym] for sym in symbols]
+        varianza[t] = pca["pc1_varianza"]
+        sistemico[t] = [pca["sistemico"][sym] for sym in symbols]
+    return {"epochs": np.asarray(epochs), "symbols": list(symbols),
+            "pc1_loadings": loadings, "pc1_varianza": varianza, "sistemico": sistemico}
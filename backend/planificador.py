@@ -0,0 +1,128 @@
+# planificador.py — Planificador alineado al cierre de vela
+#
+# En lugar de dormir un intervalo fijo y consultar todas las series, calcula
+# con el reloj del broker el próximo cierre de cada timeframe y despierta
+# justo entonces (+ gracia). Solo los timeframes cuyo cierre ya pasó se
+# consultan a MT5.
+#
+# Cierre de vela (tiempos en epoch del broker, velas alineadas a su medianoche):
+#   cierre = (⌊t / Δ⌋ + 1) · Δ      Δ = minutos del timeframe · 60
+#
+# La vela nueva aparece en MT5 con el primer tick del periodo, que puede
+# llegar después del cierre: si alguna serie aún no la tiene, el timeframe
+# se reintenta cada PLANIFICADOR_REINTENTO_S hasta PLANIFICADOR_MAX_REINTENTOS.
+#
+import time
+from config import (
+    TIMEFRAME_MAP,
+    BROKER_UTC_OFFSET_HOURS,
+    PLANIFICADOR_GRACIA_S,
+    PLANIFICADOR_REINTENTO_S,
+    PLANIFICADOR_MAX_REINTENTOS,
+)
+
+
+def proximo_cierre(segundos_tf, ahora):
+    """Epoch (broker) del próximo cierre de una vela de segundos_tf, estrictamente posterior a ahora."""
+    return (int(ahora // segundos_tf) + 1) * segundos_tf
+
+
+class PlanificadorVelas:
+    """
+    Agenda del próximo cierre de cada timeframe activo.
+
+    El reloj del broker es time.time() + desfase; el desfase parte de
+    BROKER_UTC_OFFSET_HOURS y se puede recalibrar con la hora del último
+    tick (calibrar()), lo que cubre cambios de horario de verano del broker.
+
+    Uso:
+        planificador = PlanificadorVelas(TIMEFRAMES_ACTIVOS)
+        while True:
+            for tf_name in planificador.esperar():
+                ...
+                if faltan_series:
+                    planificador.reintentar(tf_name)
+    """
+    __slots__ = ("timeframes", "gracia", "reintento", "max_reintentos",
+                 "_desfase", "_segundos", "_proximo", "_reintentos", "_reloj", "_dormir")
+
+    def __init__(self, timeframes, gracia=PLANIFICADOR_GRACIA_S, reintento=PLANIFICADOR_REINTENTO_S,
+                 max_reintentos=PLANIFICADOR_MAX_REINTENTOS, reloj=time.time, dormir=time.sleep):
+        self.timeframes     = list(timeframes)
+        self.gracia         = gracia
+        self.reintento      = reintento
+        self.max_reintentos = max_reintentos
+        self._desfase  = BROKER_UTC_OFFSET_HOURS * 3600
+        self._segundos = {tf: TIMEFRAME_MAP.get(tf, 1) * 60 for tf in self.timeframes}
+        self._reloj    = reloj
+        self._dormir   = dormir
+        self._reintentos = {tf: 0 for tf in self.timeframes}
+        ahora = self.ahora()
+        self._proximo = {tf: self._despertar_regular(tf, ahora) for tf in self.timeframes}
+
+    def ahora(self):
+        """Hora actual del broker (epoch en segundos)."""
+        return self._reloj() + self._desfase
+
+    def calibrar(self, epoch_broker):
+        """
+        Ajusta el desfase con una hora del broker conocida (ej: time del último tick).
+
+        Se redondea a 30 min: la hora del tick llega con latencia y los
+        offsets de broker son múltiplos de 30 min.
+        """
+        if not epoch_broker:
+            return
+        self._desfase = round((epoch_broker - self._reloj()) / 1800) * 1800
+        ahora = self.ahora()
+        self._proximo = {tf: self._despertar_regular(tf, ahora) for tf in self.timeframes}
+
+    def _despertar_regular(self, tf, ahora):
+        return proximo_cierre(self._segundos[tf], ahora) + self.gracia
+
+    def inicio_periodo(self, tf):
+        """Epoch (broker) de apertura de la vela en curso de tf."""
+        return proximo_cierre(self._segundos[tf], self.ahora()) - self._segundos[tf]
+
+    def segundos_hasta_proximo(self):
+        """Segundos hasta el próximo despertar (0 si ya hay timeframes vencidos)."""
+        return max(0.0, min(self._proximo.values()) - self.ahora())
+
+    def vencidos(self):
+        """Timeframes cuyo despertar ya pasó, en el orden de self.timeframes."""
+        ahora = self.ahora()
+        return [tf for tf in self.timeframes if self._proximo[tf] <= ahora]
+
+    def esperar(self):
+        """
+        Duerme hasta el próximo cierre (+ gracia) y devuelve los timeframes vencidos.
+
+        Los devueltos quedan agendados para su siguiente cierre; el llamador
+        usa reintentar() si alguna serie todavía no tenía la vela nueva.
+        """
+        espera = self.segundos_hasta_proximo()
+        if espera > 0:
+            self._dormir(espera)
+        vencidos = self.vencidos()
+        ahora = self.ahora()
+        for tf in vencidos:
+            self._proximo[tf] = self._despertar_regular(tf, ahora)
+        return vencidos
+
+    def completar(self, tf):
+        """Marca el periodo de tf como resuelto (se reinicia el contador de reintentos)."""
+        self._reintentos[tf] = 0
+
+    def reintentar(self, tf):
+        """
+        Vuelve a consultar tf dentro de self.reintento segundos (sin pasar del próximo cierre).
+
+        Returns:
+            bool — False si ya se agotaron los reintentos del periodo
+        """
+        if self._reintentos[tf] >= self.max_reintentos:
+            self._reintentos[tf] = 0
+            return False
+        self._reintentos[tf] += 1
+        self._proximo[tf] = min(self.ahora() + self.reintento, self._proximo[tf])
+        return True
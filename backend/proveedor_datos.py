@@ -0,0 +1,295 @@
+# proveedor_datos.py — Proveedores de datos de mercado (MT5 en vivo o replay offline)
+#
+# main.py no habla con MetaTrader5 directamente: usa un ProveedorDatos.
+#   ProveedorMT5:    envoltorio de conexion_mt5 (requiere el paquete MetaTrader5, solo Windows)
+#   ProveedorReplay: reproduce velas grabadas en Parquet/CSV con un reloj virtual,
+#                    a 1×, N× o sin pausas (REPLAY_VELOCIDAD = 0)
+#
+# El reloj y el sueño también pasan por el proveedor, así el planificador
+# avanza sobre el tiempo de la sesión grabada cuando se hace replay.
+#
+# Archivos de replay: {REPLAY_DIRECTORIO}/{SYMBOL}_{TF}.parquet o .csv con
+# columnas time (epoch en segundos u hora ISO del broker), open, high, low,
+# close, tick_volume. Si falta un TF superior se agrega desde el de 1M.
+# Ticks opcionales: {SYMBOL}_ticks.parquet o .csv con time_msc (epoch broker
+# en ms), bid, ask; sin ese archivo el order flow usa la dirección de la vela.
+#
+import os
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+from buffer_velas import CAMPOS_VELA, rates_a_columnas, columnas_a_dataframe
+from flujo_ticks import DTYPE_TICKS
+from agregador_velas import agregar_velas
+from config import (
+    BROKER_UTC_OFFSET_HOURS,
+    TIMEFRAME_MAP,
+    SYMBOLS_ACTIVOS,
+    TIMEFRAMES_ACTIVOS,
+    VENTANA_VELAS,
+    PROVEEDOR_DATOS,
+    REPLAY_DIRECTORIO,
+    REPLAY_VELOCIDAD,
+    REPLAY_INICIO,
+)
+from utils import log_mensaje
+
+DTYPE_VELAS = np.dtype(list(CAMPOS_VELA))
+
+
+class FinReplay(Exception):
+    """El reloj virtual pasó la última vela grabada."""
+
+
+class ProveedorDatos(ABC):
+    """
+    Interfaz común de los proveedores.
+
+    Tiempos en epoch del broker (como MT5); los rates son arrays
+    estructurados con al menos los campos de CAMPOS_VELA. Un proveedor
+    sin alguno de los métodos abstractos no se puede instanciar.
+    """
+    nombre = None
+
+    @abstractmethod
+    def conectar(self):
+        """Abre la conexión/carga los datos; True si quedó listo."""
+
+    def desconectar(self):
+        pass
+
+    @abstractmethod
+    def obtener_rates(self, symbol, timeframe_minutes, num_bars):
+        """Últimas num_bars velas (array estructurado) o None."""
+
+    @abstractmethod
+    def obtener_rates_desde(self, symbol, timeframe_minutes, desde_epoch):
+        """Velas con time >= desde_epoch (array estructurado) o None."""
+
+    @abstractmethod
+    def obtener_hora_broker(self, symbol):
+        """Hora actual del broker (epoch) o None."""
+
+    def obtener_ticks_desde(self, symbol, desde_msc):
+        """Ticks (time_msc, bid, ask) desde desde_msc; None si el proveedor no tiene ticks."""
+        return None
+
+    def obtener_columnas(self, symbol, timeframe_minutes, num_bars):
+        """Últimas num_bars velas como columnas numpy sin copia ('time' en epoch UTC); ver rates_a_columnas()."""
+        return rates_a_columnas(self.obtener_rates(symbol, timeframe_minutes, num_bars))
+
+    def obtener_datos_historicos(self, symbol, timeframe_minutes, num_bars):
+        """DataFrame[time (UTC), open, high, low, close, tick_volume] de las últimas num_bars velas."""
+        return columnas_a_dataframe(self.obtener_columnas(symbol, timeframe_minutes, num_bars))
+
+    def reloj(self):
+        """Hora actual UTC (epoch en segundos)."""
+        return time.time()
+
+    def dormir(self, segundos):
+        time.sleep(segundos)
+
+
+class ProveedorMT5(ProveedorDatos):
+    """Datos en vivo de MetaTrader 5 vía conexion_mt5."""
+    nombre = "mt5"
+
+    def __init__(self):
+        # Import diferido: MetaTrader5 solo existe en Windows
+        import conexion_mt5
+        self._mt5 = conexion_mt5
+
+    def conectar(self):
+        return self._mt5.conectar_mt5()
+
+    def desconectar(self):
+        self._mt5.desconectar_mt5()
+
+    def obtener_rates(self, symbol, timeframe_minutes, num_bars):
+        return self._mt5.obtener_rates(symbol, timeframe_minutes, num_bars)
+
+    def obtener_rates_desde(self, symbol, timeframe_minutes, desde_epoch):
+        return self._mt5.obtener_rates_desde(symbol, timeframe_minutes, desde_epoch)
+
+    def obtener_hora_broker(self, symbol):
+        return self._mt5.obtener_hora_broker(symbol)
+
+    def obtener_ticks_desde(self, symbol, desde_msc):
+        return self._mt5.obtener_ticks_desde(symbol, desde_msc)
+
+    def obtener_datos_historicos(self, symbol, timeframe_minutes, num_bars):
+        return self._mt5.obtener_datos_historicos(symbol, timeframe_minutes, num_bars)
+
+
+def _leer_tabla(ruta):
+    return pd.read_parquet(ruta) if ruta.endswith(".parquet") else pd.read_csv(ruta)
+
+
+def _leer_archivo(ruta):
+    """Lee un archivo de replay y lo convierte al array estructurado de velas."""
+    df = _leer_tabla(ruta)
+
+    tiempos = df['time']
+    if pd.api.types.is_numeric_dtype(tiempos):
+        epoch = tiempos.to_numpy(dtype=np.int64)
+    else:
+        epoch = (pd.to_datetime(tiempos) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+        epoch = np.asarray(epoch, dtype=np.int64)
+
+    velas = np.empty(len(df), dtype=DTYPE_VELAS)
+    velas['time'] = epoch
+    for campo, _ in CAMPOS_VELA[1:]:
+        velas[campo] = df[campo].to_numpy()
+    return np.sort(velas, order='time')
+
+
+def _leer_ticks(ruta):
+    """Lee un archivo de ticks de replay (time_msc, bid, ask) como array estructurado ordenado."""
+    df = _leer_tabla(ruta)
+    ticks = np.empty(len(df), dtype=DTYPE_TICKS)
+    for campo in DTYPE_TICKS.names:
+        ticks[campo] = df[campo].to_numpy()
+    return ticks[np.argsort(ticks['time_msc'], kind='stable')]
+
+
+class ProveedorReplay(ProveedorDatos):
+    """
+    Reproduce velas grabadas con un reloj virtual.
+
+    Una vela es visible cuando el reloj virtual alcanza su hora de apertura
+    (como la vela en formación de MT5, pero ya con sus valores finales).
+
+    Args:
+        directorio: str — carpeta con {SYMBOL}_{TF}.parquet|csv
+        velocidad:  float — 1 = tiempo real, N = N veces más rápido, 0 = sin pausas
+        inicio:     int — epoch broker de arranque; None = primer instante en que
+                    todos los TFs (el más grueso manda) tienen VENTANA_VELAS
+                    velas cerradas, o su última vela si la sesión es más corta
+        symbols, timeframes: series a cargar (default: las activas)
+    """
+    nombre = "replay"
+
+    def __init__(self, directorio=REPLAY_DIRECTORIO, velocidad=REPLAY_VELOCIDAD, inicio=None,
+                 symbols=None, timeframes=None):
+        self.directorio = directorio
+        self.velocidad  = velocidad
+        self.symbols    = list(symbols or SYMBOLS_ACTIVOS)
+        self.timeframes = list(timeframes or TIMEFRAMES_ACTIVOS)
+        self._inicio    = inicio
+        self._series    = {}     # (symbol, minutos) -> array estructurado
+        self._ticks     = {}     # symbol -> array estructurado de ticks
+        self._ahora     = None   # epoch broker virtual
+        self._fin       = None
+
+    def conectar(self):
+        minutos_tfs = sorted({TIMEFRAME_MAP.get(tf, 1) for tf in self.timeframes} | {1})
+        for symbol in self.symbols:
+            for minutos in minutos_tfs:
+                velas = self._cargar(symbol, minutos)
+                if velas is not None and len(velas):
+                    self._series[(symbol, minutos)] = velas
+            for extension in (".parquet", ".csv"):
+                ruta = os.path.join(self.directorio, f"{symbol}_ticks{extension}")
+                if os.path.exists(ruta):
+                    self._ticks[symbol] = _leer_ticks(ruta)
+                    break
+
+        if not self._series:
+            log_mensaje(f"Replay: no hay archivos de velas en '{self.directorio}'", "ERROR")
+            return False
+
+        fino = min(minutos for _, minutos in self._series)
+        if self._inicio is None:
+            # Por TF: apertura de la vela VENTANA_VELAS del primer símbolo que la tiene;
+            # el arranque espera al TF más lento (60 velas de 4H son 10 días, no 60 minutos)
+            listo_por_tf = {}
+            for (_, minutos), v in self._series.items():
+                listo = int(v['time'][min(VENTANA_VELAS, len(v) - 1)])
+                listo_por_tf[minutos] = min(listo, listo_por_tf.get(minutos, listo))
+            self._inicio = max(listo_por_tf.values())
+        self._ahora = float(self._inicio)
+        self._fin = max(int(v['time'][-1]) + 60 * fino for (_, minutos), v in self._series.items() if minutos == fino)
+        log_mensaje(
+            f"Replay: {len(self._series)} series desde '{self.directorio}' | "
+            f"velocidad={'sin pausas' if not self.velocidad else f'{self.velocidad:g}x'}",
+            "SUCCESS"
+        )
+        return True
+
+    def _cargar(self, symbol, minutos):
+        tf_name = next((tf for tf, m in TIMEFRAME_MAP.items() if m == minutos), None)
+        for extension in (".parquet", ".csv"):
+            ruta = os.path.join(self.directorio, f"{symbol}_{tf_name}{extension}")
+            if os.path.exists(ruta):
+                return _leer_archivo(ruta)
+
+        # TF superior sin archivo propio: se agrega desde el de 1M
+        if minutos != 1:
+            m1 = self._series.get((symbol, 1))
+            if m1 is not None:
+                agregadas = agregar_velas(m1, minutos)
+                velas = np.empty(len(agregadas['time']), dtype=DTYPE_VELAS)
+                for campo, _ in CAMPOS_VELA:
+                    velas[campo] = agregadas[campo]
+                return velas
+        return None
+
+    def _visibles(self, symbol, timeframe_minutes):
+        velas = self._series.get((symbol, timeframe_minutes))
+        if velas is None:
+            return None
+        fin = int(np.searchsorted(velas['time'], self._ahora, side='right'))
+        return velas[:fin]
+
+    def obtener_rates(self, symbol, timeframe_minutes, num_bars):
+        velas = self._visibles(symbol, timeframe_minutes)
+        if velas is None or len(velas) == 0:
+            return None
+        return velas[-num_bars:]
+
+    def obtener_rates_desde(self, symbol, timeframe_minutes, desde_epoch):
+        velas = self._visibles(symbol, timeframe_minutes)
+        if velas is None:
+            return None
+        velas = velas[int(np.searchsorted(velas['time'], desde_epoch, side='left')):]
+        return velas if len(velas) else None
+
+    def obtener_ticks_desde(self, symbol, desde_msc):
+        ticks = self._ticks.get(symbol)
+        if ticks is None:
+            return None
+        tiempos = ticks['time_msc']
+        ini = int(np.searchsorted(tiempos, desde_msc, side='left'))
+        fin = int(np.searchsorted(tiempos, self._ahora * 1000, side='right'))
+        return ticks[ini:fin] if fin > ini else None
+
+    def obtener_hora_broker(self, symbol):
+        return int(self._ahora)
+
+    def reloj(self):
+        return self._ahora - BROKER_UTC_OFFSET_HOURS * 3600
+
+    def dormir(self, segundos):
+        """Avanza el reloj virtual; duerme segundos/velocidad reales (nada si velocidad = 0)."""
+        if self._ahora >= self._fin:
+            raise FinReplay()
+        self._ahora += segundos
+        if self.velocidad:
+            time.sleep(segundos / self.velocidad)
+
+
+def crear_proveedor(nombre=PROVEEDOR_DATOS):
+    """
+    Instancia el proveedor configurado ("mt5" | "replay").
+
+    REPLAY_INICIO se interpreta como hora ISO del broker.
+    """
+    if nombre == "mt5":
+        return ProveedorMT5()
+    if nombre == "replay":
+        inicio = None
+        if REPLAY_INICIO:
+            inicio = int((pd.Timestamp(REPLAY_INICIO) - pd.Timestamp(0)) // pd.Timedelta(seconds=1))
+        return ProveedorReplay(inicio=inicio)
+    raise ValueError(f"Proveedor de datos desconocido: {nombre}")
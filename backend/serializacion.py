@@ -0,0 +1,290 @@
+# serializacion.py — Construcción columnar de filas para Supabase
+#
+# build_rows() recibe el DataFrame ya calculado de un par+timeframe y emite
+# la lista de dicts anidados (symbol, timeframe, data_timestamp, rendlog,
+# orderflow) que consume sync_user_data.
+#
+# Todo se resuelve por columnas: saneo NaN/Inf, z-scores, señal, flags de
+# supresión, régimen y timestamps ISO se calculan como arrays y se convierten
+# a tipos nativos de Python con .tolist() una sola vez por columna.
+#
+import numpy as np
+import pandas as pd
+from calculos_gbm import calcular_gbm_anomalia, horizonte_para, rng_para_serie, _campos_nulos
+from calculos_multipair import es_movimiento_sistemico, es_sistemico_por_fila
+from config import (
+    GBM_Z_UMBRAL_ACTIVACION,
+    RENDLOG_ER_UMBRAL_RANGO,
+    RENDLOG_ER_UMBRAL_TENDENCIA,
+)
+
+
+def _columna_float(df, nombre):
+    """Columna como float64 (NaN si no existe o si el valor es nulo)."""
+    if nombre not in df.columns:
+        return np.full(len(df), np.nan)
+    return df[nombre].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _sanear(valores, default=0.0):
+    """Saneo seguro para JSON de una columna completa: NaN/Inf -> default."""
+    return np.where(np.isfinite(valores), valores, default)
+
+
+def _columna_int(df, nombre):
+    """Columna como int64 nativo; nulos (o columna ausente) -> 0."""
+    if nombre not in df.columns:
+        return np.zeros(len(df), dtype=np.int64)
+    serie = df[nombre]
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return serie.to_numpy().astype(np.int64)
+    valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(valores), 0, valores).astype(np.int64)
+
+
+def _timestamps_iso(serie_time):
+    """
+    isoformat() de toda la columna 'time' en bloque.
+
+    Para datetimes naive con resolución de segundos (caso MT5) usa
+    np.datetime_as_string; con fracciones de segundo o zona horaria
+    recurre a Timestamp.isoformat() para conservar el formato exacto.
+    """
+    if isinstance(serie_time.dtype, pd.DatetimeTZDtype):
+        return [t.isoformat() for t in serie_time]
+
+    valores = serie_time.to_numpy()
+    segundos = valores.astype('datetime64[s]')
+    if np.array_equal(segundos, valores):
+        return np.datetime_as_string(segundos, unit='s').tolist()
+    return [t.isoformat() for t in serie_time]
+
+
+def _regimenes(er):
+    """Versión columnar de clasificar_regimen()."""
+    return np.select(
+        [np.isnan(er), er < RENDLOG_ER_UMBRAL_RANGO, er > RENDLOG_ER_UMBRAL_TENDENCIA],
+        ["DESCONOCIDO", "RANGO", "TENDENCIA"],
+        default="AMBIGUO",
+    ).tolist()
+
+
+def _nulos_a_none(valores):
+    """Array float -> lista Python: NaN -> None, Inf -> 0.0."""
+    lista = _sanear(valores).tolist()
+    for i in np.flatnonzero(np.isnan(valores)):
+        lista[i] = None
+    return lista
+
+
+def build_rows(df_slice, config, timeframe_name, symbol, pca_result=None, exposure=None,
+               gbm_pendientes=None, pca_por_fila=None):
+    """
+    Construye lista de dicts para enviar a Supabase.
+
+    Novedades v4.1:
+      - Agrega campo 'symbol' al nivel de fila
+      - Agrega campos GBM (gbm_prob_reversion, etc.) en rendlog
+      - Agrega campos PCA (pca_pc1_loading, pca_es_sistemico, etc.) en rendlog
+
+    Columnar: mismo resultado que el recorrido con iterrows(), sin
+    accesos por fila a pandas.
+
+    Args:
+        gbm_pendientes: list opcional. Si se pasa, las velas con anomalía no
+                        simulan aquí: se agregan a la lista como
+                        (rendlog, mu, sigma, close, horizonte) para resolverlas
+                        todas juntas con calculos_gbm.resolver_gbm_lote().
+        pca_por_fila:   dict opcional {pc1_loading, pc1_varianza} con un array
+                        por fila de df_slice (pca_movil.pca_historico_para;
+                        NaN = sin PCA). Sustituye a pca_result en los campos
+                        PCA y en la supresión: cada vela usa el PCA de su ventana.
+                        Si trae 'sistemico' (modo universo) se usa tal cual.
+    """
+    if exposure is None:
+        exposure = {}
+
+    pca_es_sistemico = es_movimiento_sistemico(pca_result, symbol)
+    pc1_loading = None
+    pc1_varianza = None
+    if pca_result and pca_result.get("pca_valido"):
+        pc1_loading  = pca_result["pc1_loadings"].get(symbol)
+        pc1_varianza = pca_result.get("pc1_varianza")
+
+    n = len(df_slice)
+    if n == 0:
+        return []
+
+    if pca_por_fila is not None:
+        if "sistemico" in pca_por_fila:
+            pca_es_sistemico = np.asarray(pca_por_fila["sistemico"], dtype=bool)
+        else:
+            pca_es_sistemico = es_sistemico_por_fila(pca_por_fila["pc1_varianza"], pca_por_fila["pc1_loading"])
+
+    umbral_compra = config.get('umbral_sigma_compra', -2.0)
+    umbral_venta  = config.get('umbral_sigma_venta', 2.0)
+
+    log_return = _columna_float(df_slice, 'log_return')
+    media      = _columna_float(df_slice, 'media')
+    std        = _columna_float(df_slice, 'std')
+    std_static = _columna_float(df_slice, 'std_static')
+    er         = _columna_float(df_slice, 'efficiency_ratio')
+
+    # Z-scores (0.0 si media/sigma no válidos o resultado no finito)
+    media_valid      = ~np.isnan(media)
+    std_valid        = ~np.isnan(std) & (std > 0)
+    std_static_valid = ~np.isnan(std_static) & (std_static > 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_score = np.where(
+            std_valid & media_valid, _sanear((log_return - media) / std), 0.0
+        )
+        z_score_static = np.where(
+            std_static_valid & media_valid, _sanear((log_return - media) / std_static), 0.0
+        )
+
+    # Señal base (umbral de z-score) + supresión por PCA (movimiento sistémico USD)
+    fuera_de_umbral = (z_score < umbral_compra) | (z_score > umbral_venta)
+    senal = np.where(
+        z_score < umbral_compra, "COMPRA", np.where(z_score > umbral_venta, "VENTA", None)
+    ).astype(object)
+    senal_suprimida_pca = fuera_de_umbral & pca_es_sistemico
+    senal[senal_suprimida_pca] = None
+    # En build_rows la única supresión es PCA (el filtro ER vive en detectar_anomalias)
+    senal_suprimida = senal_suprimida_pca
+
+    # Columnas saneadas
+    media_s = _sanear(media)
+    std_s   = _sanear(std)
+    close_s = _sanear(_columna_float(df_slice, 'close'))
+
+    # GBM: solo en velas con anomalía (diferido al lote si hay gbm_pendientes)
+    gbm_nulos = _campos_nulos()
+    gbm_por_fila = [gbm_nulos] * n
+    anomalias = np.flatnonzero(np.abs(z_score) > GBM_Z_UMBRAL_ACTIVACION)
+    if gbm_pendientes is None:
+        rng = rng_para_serie(symbol, timeframe_name) if len(anomalias) else None
+        for i in anomalias:
+            gbm_por_fila[i] = calcular_gbm_anomalia(
+                z_score=float(z_score[i]),
+                mu=float(media_s[i]),
+                sigma_ewma=float(std_s[i]),
+                precio_close=float(close_s[i]),
+                timeframe=timeframe_name,
+                rng=rng,
+            )
+
+    # z_score_vol: NaN -> 0 (entero, como en la versión por filas)
+    z_score_vol = _columna_float(df_slice, 'z_score_volumen')
+    z_score_vol_lista = z_score_vol.tolist()
+    for i in np.flatnonzero(np.isnan(z_score_vol)):
+        z_score_vol_lista[i] = 0
+
+    vol_relativo = _columna_float(df_slice, 'volumen_relativo')
+    anomalia_vol = _columna_float(df_slice, 'anomalia_volumen')
+
+    columnas = {
+        "data_timestamp":        _timestamps_iso(df_slice['time']),
+        "z_score":               z_score.tolist(),
+        "senal":                 senal.tolist(),
+        "log_return":            _sanear(log_return).tolist(),
+        "media":                 media_s.tolist(),
+        "std":                   std_s.tolist(),
+        "banda_2sigma_superior": _sanear(_columna_float(df_slice, 'banda_2sigma_superior')).tolist(),
+        "banda_2sigma_inferior": _sanear(_columna_float(df_slice, 'banda_2sigma_inferior')).tolist(),
+        "banda_3sigma_superior": _sanear(_columna_float(df_slice, 'banda_3sigma_superior')).tolist(),
+        "banda_3sigma_inferior": _sanear(_columna_float(df_slice, 'banda_3sigma_inferior')).tolist(),
+        "z_score_static":        z_score_static.tolist(),
+        "sigma_static":          _sanear(std_static).tolist(),
+        "vol_ratio":             _sanear(_columna_float(df_slice, 'vol_ratio'), default=1.0).tolist(),
+        "er":                    _nulos_a_none(er),
+        "regimen":               _regimenes(er),
+        "senal_suprimida":       senal_suprimida.tolist(),
+        "senal_suprimida_pca":   senal_suprimida_pca.tolist(),
+        "delta":                 _columna_int(df_slice, 'delta').tolist(),
+        "vol_relativo":          np.where(np.isnan(vol_relativo), 1.0, vol_relativo).tolist(),
+        "anomalia_vol":          np.where(np.isnan(anomalia_vol), False, anomalia_vol != 0).tolist(),
+        "tick_volume":           _columna_int(df_slice, 'tick_volume').tolist(),
+    }
+    # Campos PCA: constantes por par+timeframe, o uno por vela con pca_por_fila
+    if pca_por_fila is not None:
+        pc1_loading_filas  = _nulos_a_none(np.round(pca_por_fila["pc1_loading"], 4))
+        pc1_varianza_filas = _nulos_a_none(np.round(pca_por_fila["pc1_varianza"], 4))
+        sistemico_filas    = pca_es_sistemico.tolist()
+    else:
+        pc1_loading_filas  = [round(pc1_loading, 4) if pc1_loading is not None else None] * n
+        pc1_varianza_filas = [round(pc1_varianza, 4) if pc1_varianza is not None else None] * n
+        sistemico_filas    = [pca_es_sistemico] * n
+    exposure_alto  = bool(exposure.get(symbol, False))
+
+    rows = []
+    for (ts, z, s, lr, m, sd, b2s, b2i, b3s, b3i, zs, ss, vr, er_i, reg, sup, sup_pca,
+         gbm_fields, d, vrel, anom, zv, tv, pc1_l, pc1_v, sistemico) in zip(
+            columnas["data_timestamp"], columnas["z_score"], columnas["senal"],
+            columnas["log_return"], columnas["media"], columnas["std"],
+            columnas["banda_2sigma_superior"], columnas["banda_2sigma_inferior"],
+            columnas["banda_3sigma_superior"], columnas["banda_3sigma_inferior"],
+            columnas["z_score_static"], columnas["sigma_static"], columnas["vol_ratio"],
+            columnas["er"], columnas["regimen"],
+            columnas["senal_suprimida"], columnas["senal_suprimida_pca"],
+            gbm_por_fila,
+            columnas["delta"], columnas["vol_relativo"], columnas["anomalia_vol"],
+            z_score_vol_lista, columnas["tick_volume"],
+            pc1_loading_filas, pc1_varianza_filas, sistemico_filas):
+        rows.append({
+            "symbol": symbol,
+            "timeframe": timeframe_name,
+            "data_timestamp": ts,
+            "rendlog": {
+                # Retorno y señal
+                "z_score":  z,
+                "senal":    s,
+                "log_return": lr,
+                "media":    m,
+                "std":      sd,
+                # Bandas
+                "banda_2sigma_superior": b2s,
+                "banda_2sigma_inferior": b2i,
+                "banda_3sigma_superior": b3s,
+                "banda_3sigma_inferior": b3i,
+                # Diagnóstico EWMA vs estático
+                "z_score_static": zs,
+                "sigma_ewma":     sd,
+                "sigma_static":   ss,
+                "vol_ratio":      vr,
+                # Régimen
+                "er":      er_i,
+                "regimen": reg,
+                # Supresión de señal
+                "senal_suprimida":     sup,
+                "senal_suprimida_pca": sup_pca,
+                # GBM Monte Carlo (None en velas sin anomalía)
+                **gbm_fields,
+                # PCA multi-par
+                "pca_pc1_loading":  pc1_l,
+                "pca_pc1_varianza": pc1_v,
+                "pca_es_sistemico": sistemico,
+                "exposure_usd_alto": exposure_alto,
+            },
+            "orderflow": {
+                "delta":        d,
+                "vol_relativo": vrel,
+                "anomalia_vol": anom,
+                "z_score_vol":  zv,
+                "tick_volume":  tv,
+            }
+        })
+
+    if 'delta_acumulado' in df_slice.columns:
+        # Solo con order flow por tick (MotorFlujoTicks); None en velas sin cobertura
+        acumulado = _nulos_a_none(_columna_float(df_slice, 'delta_acumulado'))
+        for row, da in zip(rows, acumulado):
+            row["orderflow"]["delta_acumulado"] = None if da is None else int(da)
+
+    if gbm_pendientes is not None:
+        horizonte = horizonte_para(timeframe_name)
+        for i in anomalias:
+            gbm_pendientes.append(
+                (rows[i]["rendlog"], float(media_s[i]), float(std_s[i]), float(close_s[i]), horizonte)
+            )
+    return rows
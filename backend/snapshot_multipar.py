@@ -0,0 +1,134 @@
+# snapshot_multipar.py — Estado multi-par por timeframe: último frame de cada símbolo + análisis cacheado
+#
+# En el loop, dfs_por_simbolo solo tenía los símbolos con vela nueva en el
+# ciclo: _calcular_pca_para_tf corría sobre ese subconjunto (o no llegaba a
+# PCA_MIN_FILAS_ALINEADAS) salvo que los 4 pares cerraran vela a la vez. Y la
+# misma matriz de correlación se reconstruía en detectar_exposicion_usd,
+# calcular_correlacion_con_eurusd y resolver_gbm_conjunto.
+#
+# SnapshotMultipar guarda por timeframe:
+#   - el último DataFrame calculado de cada símbolo (tenga o no vela nueva)
+#   - el PanelRetornos y el PCAMovil del TF
+#   - el análisis multi-par (Σ, correlación, exposición, correlación con
+#     EURUSD y PCA) sobre todos los símbolos con datos, calculado una vez por
+#     (símbolos, epoch alineado, versión del panel). La versión solo sube si
+#     cambia alguna celda: reescribir velas cerradas idénticas no recalcula,
+#     corregir la vela en formación sí.
+#
+import numpy as np
+from panel_retornos import PanelRetornos
+from pca_universo import usar_modo_universo, calcular_pca_universo
+from calculos_multipair import (
+    calcular_covarianza, calcular_pca, calcular_correlacion,
+    detectar_exposicion_usd, calcular_correlacion_con_eurusd,
+)
+from config import PCA_MIN_FILAS_ALINEADAS, VENTANA_VELAS
+
+
+class SnapshotMultipar:
+    """
+    Último estado de todos los símbolos de un timeframe y su análisis cross-par.
+
+    Uso:
+        snapshot = SnapshotMultipar(SYMBOLS_ACTIVOS, VENTANA_VELAS, PCAMovil())
+        snapshot.actualizar("EURUSD", df, buffer.columna("time", 60))
+        analisis = snapshot.analisis()          # None si faltan filas alineadas
+        analisis["pca"], analisis["exposicion"], analisis["corr"]
+    """
+
+    def __init__(self, symbols, ventana=VENTANA_VELAS, pca_movil=None):
+        self.panel = PanelRetornos(symbols, ventana)
+        self.pca_movil = pca_movil
+        self._frames = {}          # symbol -> DataFrame de su último recálculo
+        self._clave = None         # (symbols, epoch alineado, versión) del análisis cacheado
+        self._analisis = None
+
+        # Diagnóstico
+        self.calculos = 0          # análisis efectivamente calculados (el resto, aciertos de caché)
+
+    @property
+    def symbols(self):
+        """Símbolos con al menos un frame, en el orden del panel."""
+        return [sym for sym in self.panel.symbols if sym in self._frames]
+
+    def actualizar(self, symbol, df, tiempos):
+        """
+        Guarda el frame recalculado de un símbolo y escribe sus retornos en el panel.
+
+        Args:
+            symbol:  str — uno de los símbolos del panel
+            df:      pd.DataFrame con 'log_return' (salida de calcular_estadisticas)
+            tiempos: np.ndarray int64 — epoch de cada fila de df
+        """
+        self._frames[symbol] = df
+        self.panel.actualizar(symbol, tiempos, df['log_return'].to_numpy())
+
+    def frame(self, symbol):
+        """Último DataFrame de un símbolo (None si nunca se cargó)."""
+        return self._frames.get(symbol)
+
+    def matriz(self):
+        """(R, symbols, epochs) alineados de todos los símbolos con datos (vista del panel)."""
+        return self.panel.matriz(self.symbols)
+
+    def analisis(self):
+        """
+        Análisis multi-par de la ventana alineada, calculado una vez por estado del panel.
+
+        Returns:
+            dict | None — None con menos de PCA_MIN_FILAS_ALINEADAS filas alineadas:
+                symbols:       list[str] — columnas de cov/corr
+                epoch:         int — última fila alineada
+                filas:         int — filas alineadas usadas
+                cov, corr:     np.ndarray [N × N]
+                pca:           dict de calcular_pca() / PCAMovil / calcular_pca_universo()
+                exposicion:    dict de detectar_exposicion_usd()
+                correlaciones: dict de calcular_correlacion_con_eurusd()
+        """
+        symbols = self.symbols
+        if not symbols:
+            return None
+        R, syms, epochs = self.panel.matriz(symbols)
+        clave = (tuple(syms), int(epochs[-1]) if len(epochs) else None, self.panel.version)
+        if clave != self._clave:
+            self._clave = clave
+            self._analisis = None
+            if len(R) >= PCA_MIN_FILAS_ALINEADAS:
+                self._analisis = analizar_multipar(R, syms, epochs, self.pca_movil)
+            self.calculos += 1
+        return self._analisis
+
+
+def analizar_multipar(R, symbols, epochs, pca_movil=None):
+    """
+    Σ, correlación, exposición y PCA de una ventana alineada (una sola correlación).
+
+    Args:
+        R:         np.ndarray [T × N] — filas alineadas
+        symbols:   list[str]
+        epochs:    np.ndarray int64 [T]
+        pca_movil: PCAMovil del timeframe (None = covarianza + eigh desde cero).
+                   Con más de PCA_UNIVERSO_MIN_SIMBOLOS símbolos (PCA_MODO=auto)
+                   se usa el modo universo: shrinkage + top-k factores por moneda.
+
+    Returns:
+        dict — ver SnapshotMultipar.analisis()
+    """
+    if usar_modo_universo(len(symbols)):
+        cov, pca_result = calcular_pca_universo(R, symbols)
+    elif pca_movil is not None:
+        cov, pca_result = pca_movil.actualizar(R, symbols, epochs)
+    else:
+        cov        = calcular_covarianza(R)
+        pca_result = calcular_pca(cov, symbols)
+    corr = calcular_correlacion(np.asarray(cov))
+    return {
+        "symbols": list(symbols),
+        "epoch": int(epochs[-1]),
+        "filas": len(R),
+        "cov": cov,
+        "corr": corr,
+        "pca": pca_result,
+        "exposicion": detectar_exposicion_usd(cov, symbols, corr_matrix=corr),
+        "correlaciones": calcular_correlacion_con_eurusd(cov, symbols, corr_matrix=corr),
+    }
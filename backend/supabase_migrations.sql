@@ -99,52 +99,193 @@ $$ LANGUAGE plpgsql SECURITY DEFINER;
 
 
 -- ============================================================
--- SECCIÓN 4: sync_user_data — upsert actualizado con symbol
+-- SECCIÓN 4: sync_user_data — upsert set-based con symbol
 -- ============================================================
--- Reemplaza el RPC existente para usar el nuevo unique constraint
--- (user_id, symbol, timeframe, data_timestamp)
---
--- NOTA: Si el RPC sync_user_data existente usa ON CONFLICT con
---       el constraint anterior, debe actualizarse a:
---         ON CONFLICT (user_id, symbol, timeframe, data_timestamp)
---
--- Ejemplo de estructura (ajustar al RPC real del proyecto):
---
--- CREATE OR REPLACE FUNCTION sync_user_data(
---   api_key_param TEXT,
---   rows_param    JSONB
--- )
--- RETURNS BOOLEAN AS $$
--- DECLARE
---   found_user_id UUID;
---   row_data      JSONB;
--- BEGIN
---   SELECT id INTO found_user_id
---   FROM user_profiles
---   WHERE api_key = api_key_param;
---
---   IF found_user_id IS NULL THEN
---     RETURN FALSE;
---   END IF;
---
---   FOR row_data IN SELECT * FROM jsonb_array_elements(rows_param)
---   LOOP
---     INSERT INTO user_data (
---       user_id, symbol, timeframe, data_timestamp, rendlog, orderflow
---     ) VALUES (
---       found_user_id,
---       COALESCE(row_data->>'symbol', 'EURUSD'),
---       row_data->>'timeframe',
---       (row_data->>'data_timestamp')::TIMESTAMPTZ,
---       row_data->'rendlog',
---       row_data->'orderflow'
---     )
---     ON CONFLICT (user_id, symbol, timeframe, data_timestamp)
---     DO UPDATE SET
---       rendlog   = EXCLUDED.rendlog,
---       orderflow = EXCLUDED.orderflow;
+-- Reemplaza el RPC anterior, que recorría rows_param con
+--   FOR row_data IN SELECT * FROM jsonb_array_elements(rows_param) LOOP
+--     INSERT ... ON CONFLICT ... DO UPDATE ...;
 --   END LOOP;
+-- y ejecutaba un INSERT por fila (1.440 en la carga inicial de
+-- 4 pares × 6 TFs × 60 velas).
 --
---   RETURN TRUE;
--- END;
--- $$ LANGUAGE plpgsql SECURITY DEFINER;
+-- Ahora es un solo INSERT ... SELECT sobre jsonb_to_recordset:
+--   - DISTINCT ON deduplica claves repetidas dentro del lote (gana la
+--     última); ON CONFLICT no admite tocar la misma fila dos veces
+--   - el WHERE del DO UPDATE salta las filas cuyo payload no cambió:
+--     sin nueva versión de la tupla ni evento realtime
+--
+-- Benchmark contra la versión con loop: bench_sync_user_data.py
+
+CREATE OR REPLACE FUNCTION sync_user_data(
+  api_key_param TEXT,
+  rows_param    JSONB
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+  found_user_id UUID;
+BEGIN
+  SELECT id INTO found_user_id
+  FROM user_profiles
+  WHERE api_key = api_key_param;
+
+  IF found_user_id IS NULL THEN
+    RETURN FALSE;
+  END IF;
+
+  INSERT INTO user_data (
+    user_id, symbol, timeframe, data_timestamp, rendlog, orderflow
+  )
+  SELECT DISTINCT ON (symbol, timeframe, data_timestamp)
+    found_user_id, symbol, timeframe, data_timestamp, rendlog, orderflow
+  FROM (
+    SELECT
+      COALESCE(f.symbol, 'EURUSD') AS symbol,
+      f.timeframe, f.data_timestamp, f.rendlog, f.orderflow, f.orden
+    FROM ROWS FROM (
+      jsonb_to_recordset(rows_param) AS (
+        symbol         TEXT,
+        timeframe      TEXT,
+        data_timestamp TIMESTAMPTZ,
+        rendlog        JSONB,
+        orderflow      JSONB
+      )
+    ) WITH ORDINALITY AS f(symbol, timeframe, data_timestamp, rendlog, orderflow, orden)
+  ) filas
+  ORDER BY symbol, timeframe, data_timestamp, orden DESC
+  ON CONFLICT (user_id, symbol, timeframe, data_timestamp)
+  DO UPDATE SET
+    rendlog   = EXCLUDED.rendlog,
+    orderflow = EXCLUDED.orderflow
+  WHERE user_data.rendlog   IS DISTINCT FROM EXCLUDED.rendlog
+     OR user_data.orderflow IS DISTINCT FROM EXCLUDED.orderflow;
+
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+-- ============================================================
+-- SECCIÓN 5: commit_cycle_data — commit del ciclo en un solo RPC
+-- ============================================================
+-- Reemplaza, en el loop en vivo, un delete_oldest_candle + un sync_user_data
+-- por cada serie actualizada (hasta 48 round trips por ciclo).
+-- En una sola transacción:
+--   1. upsert de todas las filas del ciclo
+--   2. recorte de cada (symbol, timeframe) tocado a sus window_param
+--      velas más recientes
+-- Si una fila aparece repetida en rows_param gana la última y las filas
+-- sin cambios no se reescriben (ver sync_user_data).
+
+CREATE OR REPLACE FUNCTION commit_cycle_data(
+  api_key_param TEXT,
+  rows_param    JSONB,
+  window_param  INTEGER DEFAULT 60
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+  found_user_id UUID;
+BEGIN
+  SELECT id INTO found_user_id
+  FROM user_profiles
+  WHERE api_key = api_key_param;
+
+  IF found_user_id IS NULL THEN
+    RETURN FALSE;
+  END IF;
+
+  -- 1. Upsert set-based de todas las filas (mismo camino que sync_user_data)
+  PERFORM sync_user_data(api_key_param, rows_param);
+
+  -- 2. Recortar cada ventana tocada a las window_param velas más recientes
+  DELETE FROM user_data d
+  USING (
+    SELECT u.symbol, u.timeframe, u.data_timestamp
+    FROM (
+      SELECT
+        ud.symbol, ud.timeframe, ud.data_timestamp,
+        ROW_NUMBER() OVER (
+          PARTITION BY ud.symbol, ud.timeframe
+          ORDER BY ud.data_timestamp DESC
+        ) AS posicion
+      FROM user_data ud
+      JOIN (
+        SELECT DISTINCT
+          COALESCE(r->>'symbol', 'EURUSD') AS symbol,
+          r->>'timeframe'                  AS timeframe
+        FROM jsonb_array_elements(rows_param) AS r
+      ) tocadas
+        ON ud.symbol = tocadas.symbol AND ud.timeframe = tocadas.timeframe
+      WHERE ud.user_id = found_user_id
+    ) u
+    WHERE u.posicion > window_param
+  ) sobrantes
+  WHERE d.user_id        = found_user_id
+    AND d.symbol         = sobrantes.symbol
+    AND d.timeframe      = sobrantes.timeframe
+    AND d.data_timestamp = sobrantes.data_timestamp;
+
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+-- ============================================================
+-- SECCIÓN 6: get_user_config_if_changed — lectura condicional de user_config
+-- ============================================================
+-- El backend cachea user_config y al vencer el TTL pregunta solo si cambió,
+-- con la versión (updated_at) que tiene en caché:
+--   NULL                                    → API_KEY no válida o sin config
+--   {"cambiado": false, "version": ...}     → la caché sigue vigente
+--   {"cambiado": true,  "version": ..., "config": {...}}
+-- Un round trip (resuelve el usuario en el servidor) en lugar de
+-- get_user_id_from_api_key + GET user_config en cada ciclo.
+
+ALTER TABLE user_config
+  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION user_config_touch_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at := clock_timestamp();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS user_config_updated_at ON user_config;
+CREATE TRIGGER user_config_updated_at
+  BEFORE UPDATE ON user_config
+  FOR EACH ROW EXECUTE FUNCTION user_config_touch_updated_at();
+
+CREATE OR REPLACE FUNCTION get_user_config_if_changed(
+  api_key_param TEXT,
+  version_param TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+  found_user_id UUID;
+  cfg           user_config%ROWTYPE;
+BEGIN
+  SELECT id INTO found_user_id
+  FROM user_profiles
+  WHERE api_key = api_key_param;
+
+  IF found_user_id IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT * INTO cfg
+  FROM user_config
+  WHERE user_id = found_user_id
+  LIMIT 1;
+
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  IF version_param IS NOT NULL AND cfg.updated_at <= version_param THEN
+    RETURN jsonb_build_object('cambiado', FALSE, 'version', cfg.updated_at);
+  END IF;
+
+  RETURN jsonb_build_object('cambiado', TRUE, 'version', cfg.updated_at, 'config', to_jsonb(cfg));
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
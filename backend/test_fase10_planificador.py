@@ -0,0 +1,99 @@
+# test_fase10_planificador.py — Tests del planificador alineado al cierre de vela
+import pytest
+from planificador import PlanificadorVelas, proximo_cierre
+from config import BROKER_UTC_OFFSET_HOURS
+
+DESFASE = BROKER_UTC_OFFSET_HOURS * 3600
+# 2026-03-02 08:00:00 en hora del broker (múltiplo de 4H)
+BASE = 1_772_438_400
+
+
+class RelojFalso:
+    """Reloj UTC simulado; dormir() avanza el tiempo en vez de bloquear."""
+
+    def __init__(self, t):
+        self.t = t
+        self.dormido = []
+
+    def __call__(self):
+        return self.t
+
+    def dormir(self, segundos):
+        self.dormido.append(segundos)
+        self.t += segundos
+
+
+def _planificador(t_broker, timeframes=("1M", "5M", "15M", "30M", "1H", "4H"), **kw):
+    reloj = RelojFalso(t_broker - DESFASE)
+    p = PlanificadorVelas(timeframes, gracia=0.5, reintento=1.0, reloj=reloj, dormir=reloj.dormir, **kw)
+    return p, reloj
+
+
+def test_proximo_cierre():
+    assert proximo_cierre(60, BASE) == BASE + 60
+    assert proximo_cierre(60, BASE + 59.9) == BASE + 60
+    assert proximo_cierre(14400, BASE + 1) == BASE + 14400
+
+
+def test_despierta_al_cierre_mas_gracia():
+    p, reloj = _planificador(BASE + 12.0)
+    assert p.esperar() == ["1M"]
+    assert reloj.dormido == [pytest.approx(48.5)]
+    assert p.ahora() == pytest.approx(BASE + 60.5)
+
+
+def test_solo_vencen_los_timeframes_que_cierran():
+    p, reloj = _planificador(BASE + 1.0)
+    vistos = []
+    while p.ahora() < BASE + 3600:
+        vistos.append(p.esperar())
+    # 60 despertares de M1; 5M/15M/30M junto con su minuto; 1H en el último
+    assert len(vistos) == 60
+    assert sum("5M" in v for v in vistos) == 12
+    assert sum("15M" in v for v in vistos) == 4
+    assert sum("30M" in v for v in vistos) == 2
+    assert vistos[-1] == ["1M", "5M", "15M", "30M", "1H"]
+    assert all("4H" not in v for v in vistos)
+
+
+def test_sin_llamadas_mientras_no_cierra_nada():
+    """Con solo 4H activo, un despertar por cierre de 4H."""
+    p, reloj = _planificador(BASE + 1.0, timeframes=["4H"])
+    assert p.esperar() == ["4H"]
+    assert len(reloj.dormido) == 1
+    assert reloj.dormido[0] == pytest.approx(14400 - 1.0 + 0.5)
+
+
+def test_reintento_antes_del_proximo_cierre():
+    p, reloj = _planificador(BASE + 30.0, timeframes=["5M"])
+    assert p.esperar() == ["5M"]
+    assert p.reintentar("5M")
+    assert p.esperar() == ["5M"]
+    assert reloj.dormido[-1] == pytest.approx(1.0)
+    p.completar("5M")
+    p.esperar()
+    assert p.ahora() == pytest.approx(BASE + 600.5)
+
+
+def test_reintentos_agotados():
+    p, _ = _planificador(BASE + 30.0, timeframes=["1M"], max_reintentos=2)
+    p.esperar()
+    assert p.reintentar("1M") and p.reintentar("1M")
+    assert not p.reintentar("1M")
+
+
+def test_inicio_periodo():
+    p, _ = _planificador(BASE + 3700.0)
+    assert p.inicio_periodo("1H") == BASE + 3600
+    assert p.inicio_periodo("4H") == BASE
+    assert p.inicio_periodo("15M") == BASE + 3600
+
+
+def test_calibrar_con_hora_del_broker():
+    """Si el broker va 1h por delante de la config (horario de verano), se corrige el desfase."""
+    p, reloj = _planificador(BASE + 30.0)
+    p.calibrar(reloj() + DESFASE + 3600 + 4)   # tick con 4s de latencia
+    assert p.ahora() == pytest.approx(BASE + 3600 + 30.0)
+    assert p.inicio_periodo("1H") == BASE + 3600
+    p.calibrar(None)
+    assert p.ahora() == pytest.approx(BASE + 3600 + 30.0)
@@ -0,0 +1,122 @@
+# test_fase11_agregador.py — Tests del agregador M1 → 5M…4H
+import pytest
+import numpy as np
+import pandas as pd
+from agregador_velas import agregar_velas, AgregadorTimeframes
+from buffer_velas import BufferVelas
+from test_fase9_buffer_velas import DTYPE_RATES
+
+TFS = ["1M", "5M", "15M", "30M", "1H", "4H"]
+# 2026-03-02 00:00 broker (múltiplo de 4H)
+INICIO = 1_772_409_600
+
+
+def _m1(n, inicio=INICIO, seed=0, huecos=False):
+    """Rates M1 sintéticos; con huecos=True faltan algunos minutos (sin ticks)."""
+    rng = np.random.default_rng(seed)
+    minutos = np.arange(n * 2 if huecos else n)
+    if huecos:
+        minutos = np.sort(rng.choice(minutos, n, replace=False))
+    rates = np.zeros(n, dtype=DTYPE_RATES)
+    rates["time"] = inicio + 60 * minutos
+    close = 1.09 * np.exp(np.cumsum(rng.normal(0, 0.0003, n)))
+    rates["open"] = np.concatenate([[1.09], close[:-1]])
+    rates["close"] = close
+    rates["high"] = np.maximum(rates["open"], close) + rng.uniform(0, 0.0003, n)
+    rates["low"] = np.minimum(rates["open"], close) - rng.uniform(0, 0.0003, n)
+    rates["tick_volume"] = rng.integers(1, 300, n)
+    return rates
+
+
+def _resample_pandas(rates, minutos):
+    """Referencia: resample de pandas sobre el mismo M1 (hora del broker)."""
+    df = pd.DataFrame(rates).drop(columns=["spread", "real_volume"])
+    df.index = pd.to_datetime(df["time"], unit="s")
+    r = df.resample(f"{minutos}min").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "tick_volume": "sum"}
+    ).dropna(subset=["open"])
+    r["time"] = (r.index - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    return r
+
+
+@pytest.mark.parametrize("minutos", [5, 15, 30, 60, 240])
+@pytest.mark.parametrize("huecos", [False, True])
+def test_agregar_igual_a_resample(minutos, huecos):
+    rates = _m1(1500, huecos=huecos)
+    velas = agregar_velas(rates, minutos)
+    ref = _resample_pandas(rates, minutos)
+    assert np.array_equal(velas["time"], ref["time"].to_numpy())
+    for campo in ("open", "high", "low", "close"):
+        assert np.array_equal(velas[campo], ref[campo].to_numpy())
+    assert np.array_equal(velas["tick_volume"], ref["tick_volume"].to_numpy().astype(np.uint64))
+
+
+def test_agregar_vacio():
+    velas = agregar_velas(_m1(1)[:0], 5)
+    assert all(len(v) == 0 for v in velas.values())
+
+
+def _sembrado(todas, n_seed, capacidad=60):
+    """Siembra como main: TFs superiores desde 'MT5' (aquí, agregando todo el M1 hasta n_seed)."""
+    buffers = {}
+    agregador = AgregadorTimeframes(TFS, buffers, capacidad=capacidad)
+    agregador.sembrar("EURUSD", todas[:n_seed][-agregador.capacidad_m1:])
+    for tf, minutos in [("5M", 5), ("15M", 15), ("30M", 30), ("1H", 60), ("4H", 240)]:
+        buffers[("EURUSD", tf)] = BufferVelas.desde_rates(agregar_velas(todas[:n_seed], minutos), capacidad)
+    return agregador, buffers
+
+
+@pytest.mark.parametrize("por_paso", [1, 4, 17])
+def test_incremental_igual_a_agregar_todo(por_paso):
+    """Alimentar M1 de a poco (incluida la M1 en formación) = agregar todo el histórico de una vez."""
+    todas = _m1(3000, huecos=True, seed=3)
+    agregador, buffers = _sembrado(todas, 1000)
+
+    fin = 1000
+    while fin < len(todas):
+        nuevo_fin = min(fin + por_paso, len(todas))
+        # copy_rates_range desde la última M1: la repite (pudo cambiar) y trae las nuevas
+        lote = todas[fin - 1:nuevo_fin].copy()
+        nuevas = agregador.actualizar("EURUSD", lote)
+        assert nuevas["1M"] == nuevo_fin - fin
+        fin = nuevo_fin
+
+    for tf, minutos in [("5M", 5), ("15M", 15), ("30M", 30), ("1H", 60), ("4H", 240)]:
+        ref = BufferVelas.desde_rates(agregar_velas(todas, minutos), 60)
+        pd.testing.assert_frame_equal(buffers[("EURUSD", tf)].dataframe(), ref.dataframe())
+
+
+def test_vela_m1_en_formacion_actualiza_los_derivados():
+    todas = _m1(500)
+    agregador, buffers = _sembrado(todas, 500)
+    revision = todas[-1:].copy()
+    revision["high"] = 2.0
+    revision["tick_volume"] += 1000
+    nuevas = agregador.actualizar("EURUSD", revision)
+    assert nuevas["1M"] == 0 and nuevas["4H"] == 0
+    for tf in ("5M", "4H"):
+        assert buffers[("EURUSD", tf)].columna("high")[-1] == 2.0
+    esperado = agregar_velas(np.concatenate([todas[:-1], revision]), 240)["tick_volume"][-1]
+    assert buffers[("EURUSD", "4H")].columna("tick_volume")[-1] == esperado
+
+
+def test_no_sobrescribe_con_bloque_parcial():
+    """Si el M1 en memoria no cubre el inicio del bloque, la vela sembrada de MT5 se conserva."""
+    todas = _m1(400)
+    buffers = {}
+    agregador = AgregadorTimeframes(["1M", "4H"], buffers, capacidad=10)
+    agregador.capacidad_m1 = 30     # menos que un bloque de 4H
+    agregador.sembrar("EURUSD", todas[:300][-30:])
+    buffers[("EURUSD", "4H")] = BufferVelas.desde_rates(agregar_velas(todas[:300], 240), 10)
+    antes = buffers[("EURUSD", "4H")].dataframe()
+    agregador.actualizar("EURUSD", todas[299:305])
+    pd.testing.assert_frame_equal(buffers[("EURUSD", "4H")].dataframe(), antes)
+
+
+def test_capacidad_m1_y_gestiona():
+    agregador = AgregadorTimeframes(TFS, {}, capacidad=60)
+    assert agregador.capacidad_m1 == 241
+    assert agregador.gestiona("1M") and agregador.gestiona("4H")
+    assert not AgregadorTimeframes(["1M", "5M"], {}).gestiona("1H")
+    assert agregador.ultimo_epoch("EURUSD") is None
+    assert agregador.actualizar("EURUSD", _m1(3)) == {}
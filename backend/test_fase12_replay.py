@@ -0,0 +1,169 @@
+# test_fase12_replay.py — Tests del proveedor de replay y de main.main sobre una sesión grabada
+import pytest
+import numpy as np
+import pandas as pd
+import main
+from proveedor_datos import ProveedorDatos, ProveedorReplay, FinReplay, crear_proveedor
+from agregador_velas import agregar_velas
+from config import SYMBOLS_ACTIVOS, BROKER_UTC_OFFSET_HOURS, VENTANA_VELAS
+
+# 2026-03-02 00:00 broker
+INICIO = 1_772_409_600
+
+
+def _grabar_m1(directorio, symbol, n, seed, formato="csv"):
+    rng = np.random.default_rng(seed)
+    close = 1.09 * np.exp(np.cumsum(rng.normal(0, 0.0003, n)))
+    df = pd.DataFrame({
+        "time": INICIO + 60 * np.arange(n),
+        "open": np.concatenate([[1.09], close[:-1]]),
+        "close": close,
+        "tick_volume": rng.integers(1, 300, n).astype(np.uint64),
+    })
+    df["high"] = np.maximum(df["open"], df["close"]) + 0.0001
+    df["low"] = np.minimum(df["open"], df["close"]) - 0.0001
+    if formato == "csv":
+        df.to_csv(directorio / f"{symbol}_1M.csv", index=False)
+    else:
+        df["time"] = pd.to_datetime(df["time"], unit="s").astype(str)
+        df.to_csv(directorio / f"{symbol}_1M.csv", index=False)
+    return df
+
+
+@pytest.fixture
+def sesion(tmp_path):
+    for i, symbol in enumerate(SYMBOLS_ACTIVOS):
+        _grabar_m1(tmp_path, symbol, 2000, seed=i)
+    return tmp_path
+
+
+def test_conectar_sin_archivos(tmp_path):
+    assert not ProveedorReplay(directorio=str(tmp_path)).conectar()
+
+
+def test_proveedor_incompleto_no_se_instancia():
+    class SinHoraBroker(ProveedorDatos):
+        def conectar(self):
+            return True
+
+        def obtener_rates(self, symbol, timeframe_minutes, num_bars):
+            return None
+
+        def obtener_rates_desde(self, symbol, timeframe_minutes, desde_epoch):
+            return None
+
+    with pytest.raises(TypeError, match="obtener_hora_broker"):
+        SinHoraBroker()
+    with pytest.raises(TypeError):
+        ProveedorDatos()
+
+
+def test_visibilidad_y_reloj_virtual(sesion):
+    p = ProveedorReplay(directorio=str(sesion), inicio=INICIO + 600)
+    assert p.conectar()
+    rates = p.obtener_rates("EURUSD", 1, 5)
+    assert rates["time"][-1] == INICIO + 600 and len(rates) == 5
+    assert p.reloj() == INICIO + 600 - BROKER_UTC_OFFSET_HOURS * 3600
+    assert p.obtener_hora_broker("EURUSD") == INICIO + 600
+
+    p.dormir(120)
+    nuevas = p.obtener_rates_desde("EURUSD", 1, INICIO + 600)
+    assert list(nuevas["time"]) == [INICIO + 600, INICIO + 660, INICIO + 720]
+
+
+def test_tf_superior_se_agrega_desde_m1(sesion):
+    p = ProveedorReplay(directorio=str(sesion), inicio=INICIO + 1999 * 60)
+    p.conectar()
+    h1 = p.obtener_rates("GBPUSD", 60, 100)
+    m1 = pd.read_csv(sesion / "GBPUSD_1M.csv")
+    esperado = agregar_velas({c: m1[c].to_numpy() for c in m1.columns}, 60)
+    assert np.array_equal(h1["time"], esperado["time"])
+    assert np.array_equal(h1["close"], esperado["close"])
+
+
+def test_time_iso_y_datos_historicos(tmp_path):
+    df = _grabar_m1(tmp_path, "EURUSD", 100, seed=0, formato="iso")
+    p = ProveedorReplay(directorio=str(tmp_path), inicio=INICIO + 99 * 60, symbols=["EURUSD"])
+    p.conectar()
+    hist = p.obtener_datos_historicos("EURUSD", 1, 10)
+    assert list(hist.columns) == ["time", "open", "high", "low", "close", "tick_volume"]
+    assert hist["time"].iloc[-1] == pd.Timestamp(df["time"].iloc[-1]) - pd.Timedelta(hours=BROKER_UTC_OFFSET_HOURS)
+
+
+def test_inicio_por_defecto_espera_al_tf_mas_grueso(tmp_path):
+    _grabar_m1(tmp_path, "EURUSD", 5000, seed=0)
+    p = ProveedorReplay(directorio=str(tmp_path), symbols=["EURUSD"], timeframes=["1M", "1H"])
+    p.conectar()
+    assert p.obtener_hora_broker("EURUSD") == INICIO + VENTANA_VELAS * 3600
+    assert len(p.obtener_rates("EURUSD", 60, 1000)) == VENTANA_VELAS + 1
+
+
+def test_fin_de_sesion(sesion):
+    p = ProveedorReplay(directorio=str(sesion), inicio=INICIO + 1999 * 60)
+    p.conectar()
+    p.dormir(60)
+    with pytest.raises(FinReplay):
+        p.dormir(60)
+
+
+def test_proveedor_desconocido():
+    with pytest.raises(ValueError):
+        crear_proveedor("bloomberg")
+
+
+class SupabaseEnMemoria:
+    """Sustituto del cliente Supabase: guarda en memoria las filas confirmadas y la tabla resultante."""
+    filas = []   # Todas las filas confirmadas, en orden
+    tabla = {}   # (symbol, timeframe) -> {data_timestamp: fila}, recortada como commit_cycle_data
+
+    def obtener_user_id(self):
+        return "usuario-replay"
+
+    def delete_user_data(self):
+        return True
+
+    def obtener_configuracion(self):
+        return None
+
+    def confirmar_filas(self, rows, ventana=VENTANA_VELAS):
+        SupabaseEnMemoria.filas.extend(rows)
+        for fila in rows:
+            serie = SupabaseEnMemoria.tabla.setdefault((fila["symbol"], fila["timeframe"]), {})
+            serie[fila["data_timestamp"]] = fila
+            for ts in sorted(serie)[:-ventana]:
+                del serie[ts]
+        return True
+
+    def resumen_ultima_llamada(self):
+        return ""
+
+
+def test_main_con_inicio_por_defecto_y_tf_grueso_corto(sesion, monkeypatch):
+    """Con solo M1 grabado el 4H tiene pocas velas: la carga inicial no debe fallar."""
+    SupabaseEnMemoria.filas, SupabaseEnMemoria.tabla = [], {}
+    monkeypatch.setattr(main, "SupabaseClient", SupabaseEnMemoria)
+    monkeypatch.setattr(main, "ALMACEN_VELAS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "COLA_ENVIOS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "crear_proveedor", lambda: ProveedorReplay(directorio=str(sesion)))
+    main.main()
+    assert ("EURUSD", "4H") in SupabaseEnMemoria.tabla
+
+
+@pytest.mark.parametrize("agregador", [False, True])
+def test_main_end_to_end_sobre_replay(sesion, monkeypatch, agregador):
+    """main.main corre en Linux sobre la sesión grabada y publica cada vela nueva (con y sin agregador M1)."""
+    SupabaseEnMemoria.filas, SupabaseEnMemoria.tabla = [], {}
+    monkeypatch.setattr(main, "AGREGADOR_DESDE_M1", agregador)
+    monkeypatch.setattr(main, "SupabaseClient", SupabaseEnMemoria)
+    monkeypatch.setattr(main, "ALMACEN_VELAS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "COLA_ENVIOS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "crear_proveedor",
+                        lambda: ProveedorReplay(directorio=str(sesion), inicio=INICIO + 1950 * 60))
+    main.main()
+
+    # Carga inicial (59 velas con log_return) + 49 M1 reproducidas → ventana de 60 hasta la última M1
+    m1 = pd.to_datetime(sorted(SupabaseEnMemoria.tabla[("EURUSD", "1M")]))
+    assert len(m1) == VENTANA_VELAS
+    assert (m1[1:] - m1[:-1] == pd.Timedelta(minutes=1)).all()
+    assert m1[-1] == pd.to_datetime(INICIO + 1999 * 60 - BROKER_UTC_OFFSET_HOURS * 3600, unit="s")
+    assert {tf for _, tf in SupabaseEnMemoria.tabla} == {"1M", "5M", "15M", "30M", "1H", "4H"}
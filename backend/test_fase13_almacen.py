@@ -0,0 +1,140 @@
+# test_fase13_almacen.py — Tests del almacén de velas memory-mapped y del arranque en caliente
+import os
+import numpy as np
+import pandas as pd
+import main
+from almacen_velas import AlmacenVelas
+from buffer_velas import BufferVelas, CAMPOS_VELA
+from proveedor_datos import ProveedorReplay
+from test_fase9_buffer_velas import _rates, _df_mt5, PASO
+from test_fase12_replay import INICIO, SupabaseEnMemoria, sesion  # noqa: F401 (fixture)
+
+
+def _como_rates(velas):
+    """dict de memmaps del almacén → array estructurado comparable con _rates()."""
+    rates = np.zeros(len(velas["time"]), dtype=_rates(1).dtype)
+    for campo, _ in CAMPOS_VELA:
+        rates[campo] = velas[campo]
+    return rates
+
+
+def test_agregar_y_leer_sin_copia(tmp_path):
+    rates = _rates(100)
+    almacen = AlmacenVelas(str(tmp_path))
+    assert almacen.agregar("EURUSD", "15M", rates[:60]) == 60
+    # copy_rates_range desde la última guardada: la incluye
+    assert almacen.agregar("EURUSD", "15M", rates[59:]) == 40
+
+    velas = almacen.leer("EURUSD", "15M")
+    assert isinstance(velas["close"], np.memmap)
+    pd.testing.assert_frame_equal(_df_mt5(_como_rates(velas)), _df_mt5(rates))
+    assert almacen.ultimo_epoch("EURUSD", "15M") == int(rates["time"][-1])
+    assert almacen.series() == [("EURUSD", "15M")]
+
+
+def test_leer_rango_y_ultimas(tmp_path):
+    rates = _rates(50)
+    almacen = AlmacenVelas(str(tmp_path))
+    almacen.agregar("EURUSD", "15M", rates)
+    desde, hasta = int(rates["time"][10]), int(rates["time"][19])
+    assert np.array_equal(almacen.leer("EURUSD", "15M", desde=desde, hasta=hasta)["time"], rates["time"][10:20])
+    assert np.array_equal(almacen.ultimas("EURUSD", "15M", 5)["close"], rates["close"][-5:])
+    assert almacen.leer("EURUSD", "15M", desde=int(rates["time"][-1]) + PASO) is None
+    assert almacen.ultimas("GBPUSD", "15M", 5) is None
+
+
+def test_vela_en_formacion_se_sobrescribe(tmp_path):
+    rates = _rates(10)
+    almacen = AlmacenVelas(str(tmp_path))
+    almacen.agregar("EURUSD", "15M", rates)
+    actualizada = rates[-1:].copy()
+    actualizada["close"] = 1.2
+    assert almacen.agregar("EURUSD", "15M", actualizada) == 0
+    assert almacen.num_velas("EURUSD", "15M") == 10
+    assert almacen.leer("EURUSD", "15M")["close"][-1] == 1.2
+
+
+def test_historia_anterior_se_funde(tmp_path):
+    rates = _rates(40)
+    almacen = AlmacenVelas(str(tmp_path))
+    almacen.agregar("EURUSD", "15M", rates[30:])
+    assert almacen.agregar("EURUSD", "15M", rates[:35]) == 30
+    assert np.array_equal(almacen.leer("EURUSD", "15M")["time"], rates["time"])
+
+
+def test_reapertura_y_escritura_cortada(tmp_path):
+    rates = _rates(20)
+    AlmacenVelas(str(tmp_path)).agregar("EURUSD", "15M", rates)
+    # Proceso muerto a mitad de un append: 'close' quedó con una vela de más
+    with open(tmp_path / "EURUSD_15M" / "close.bin", "ab") as f:
+        f.write(np.float64(1.5).tobytes())
+
+    almacen = AlmacenVelas(str(tmp_path))
+    assert almacen.num_velas("EURUSD", "15M") == 20
+    assert os.path.getsize(tmp_path / "EURUSD_15M" / "close.bin") == 20 * 8
+    assert almacen.agregar("EURUSD", "15M", _rates(21)[19:]) == 1
+    assert np.array_equal(almacen.leer("EURUSD", "15M")["close"], _rates(21)["close"])
+
+
+def test_sincronizar_desde_buffer(tmp_path):
+    rates = _rates(30)
+    almacen = AlmacenVelas(str(tmp_path))
+    buffer = BufferVelas.desde_rates(rates[:20], capacidad=20)
+    assert almacen.sincronizar("EURUSD", "15M", buffer) == 20
+    buffer.actualizar(rates[19:])
+    assert almacen.sincronizar("EURUSD", "15M", buffer) == 10
+    assert np.array_equal(almacen.leer("EURUSD", "15M")["time"], rates["time"])
+
+
+class ReplayContado(ProveedorReplay):
+    """Replay que registra los TFs (minutos) pedidos completos con obtener_rates()."""
+    completas = set()
+
+    def obtener_rates(self, symbol, timeframe_minutes, num_bars):
+        ReplayContado.completas.add(timeframe_minutes)
+        return super().obtener_rates(symbol, timeframe_minutes, num_bars)
+
+
+def _correr_main(monkeypatch, directorio, almacen, inicio):
+    """Corre main sobre el replay; devuelve las claves que quedan en la tabla (ventana por serie)."""
+    SupabaseEnMemoria.filas, SupabaseEnMemoria.tabla = [], {}
+    ReplayContado.completas = set()
+    monkeypatch.setattr(main, "SupabaseClient", SupabaseEnMemoria)
+    monkeypatch.setattr(main, "ALMACEN_VELAS_DIRECTORIO", str(almacen))
+    monkeypatch.setattr(main, "COLA_ENVIOS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "crear_proveedor", lambda: ReplayContado(directorio=str(directorio), inicio=inicio))
+    main.main()
+    return sorted((serie, ts) for serie, velas in SupabaseEnMemoria.tabla.items() for ts in velas)
+
+
+def test_arranque_en_caliente(sesion, tmp_path, monkeypatch):
+    """El segundo arranque lee la ventana del almacén y solo descarga el hueco."""
+    # Primera ejecución: la sesión se corta en la M1 1900
+    corta = tmp_path / "corta"
+    corta.mkdir()
+    for archivo in sesion.glob("*.csv"):
+        pd.read_csv(archivo).head(1900).to_csv(corta / archivo.name, index=False)
+    almacen = tmp_path / "almacen"
+    _correr_main(monkeypatch, corta, almacen, INICIO + 1880 * 60)
+    assert 1 in ReplayContado.completas
+
+    # Reinicio 50 minutos después: M1–15M salen del almacén + hueco; 30M, 1H y 4H
+    # tienen menos velas guardadas que las pedidas (PCA_HISTORIA_VELAS) y se piden completas
+    calientes = _correr_main(monkeypatch, sesion, almacen, INICIO + 1950 * 60)
+    assert ReplayContado.completas == {30, 60, 240}
+
+    frias = _correr_main(monkeypatch, sesion, tmp_path / "vacio", INICIO + 1950 * 60)
+    assert calientes == frias
+
+    m1 = AlmacenVelas(str(almacen / "replay")).leer("EURUSD", "1M")
+    # Sin huecos ni duplicados entre lo guardado en la primera ejecución y el hueco descargado
+    assert np.all(np.diff(m1["time"]) == 60) and m1["time"][-1] == INICIO + 1999 * 60
+
+
+def test_replay_repetido_no_usa_velas_posteriores_al_reloj(sesion, tmp_path, monkeypatch):
+    """Un replay que arranca antes de lo ya guardado da lo mismo que con el almacén vacío."""
+    almacen = tmp_path / "almacen"
+    _correr_main(monkeypatch, sesion, almacen, INICIO + 1950 * 60)
+    repetido = _correr_main(monkeypatch, sesion, almacen, INICIO + 1900 * 60)
+    frio = _correr_main(monkeypatch, sesion, tmp_path / "vacio", INICIO + 1900 * 60)
+    assert repetido == frio
@@ -0,0 +1,46 @@
+# test_fase14_columnas.py — Tests de la conversión rates de MT5 → columnas numpy sin DataFrame
+import numpy as np
+import pandas as pd
+from buffer_velas import rates_a_columnas, columnas_a_dataframe, CAMPOS_VELA
+from proveedor_datos import ProveedorReplay
+from config import BROKER_UTC_OFFSET_HOURS
+from test_fase9_buffer_velas import _rates, _df_mt5
+from test_fase12_replay import INICIO, sesion  # noqa: F401 (fixture)
+
+
+def test_columnas_son_vistas_del_array_mt5():
+    rates = _rates(60)
+    columnas = rates_a_columnas(rates)
+    assert set(columnas) == {campo for campo, _ in CAMPOS_VELA}
+    for campo in ("open", "high", "low", "close", "tick_volume"):
+        assert np.shares_memory(columnas[campo], rates)
+        assert np.array_equal(columnas[campo], rates[campo])
+    # Única columna nueva: time en epoch UTC entero
+    assert columnas["time"].dtype == np.int64
+    assert np.array_equal(columnas["time"], rates["time"] - BROKER_UTC_OFFSET_HOURS * 3600)
+
+
+def test_dataframe_bajo_demanda_igual_al_de_mt5():
+    rates = _rates(60)
+    df = columnas_a_dataframe(rates_a_columnas(rates))
+    # pandas 3 deja la ruta DataFrame en datetime64[us]; los instantes son los mismos
+    pd.testing.assert_frame_equal(df, _df_mt5(rates), check_dtype=False)
+    assert df["time"].dtype == "datetime64[ns]"
+    # El DataFrame no comparte memoria con el array de MT5
+    assert not np.shares_memory(df["close"].to_numpy(), rates)
+
+
+def test_sin_velas():
+    assert rates_a_columnas(None) is None
+    assert rates_a_columnas(_rates(0)) is None
+    assert columnas_a_dataframe(None) is None
+
+
+def test_proveedor_obtener_columnas(sesion):
+    p = ProveedorReplay(directorio=str(sesion), inicio=INICIO + 600, symbols=["EURUSD"])
+    p.conectar()
+    columnas = p.obtener_columnas("EURUSD", 1, 5)
+    assert columnas["time"][-1] == INICIO + 600 - BROKER_UTC_OFFSET_HOURS * 3600
+    pd.testing.assert_frame_equal(
+        p.obtener_datos_historicos("EURUSD", 1, 5), columnas_a_dataframe(columnas)
+    )
@@ -0,0 +1,137 @@
+# test_fase15_flujo_ticks.py — Tests del order flow por tick (regla del tick)
+import pytest
+import numpy as np
+import pandas as pd
+from flujo_ticks import clasificar_ticks, agregar_ticks, MotorFlujoTicks, DTYPE_TICKS
+from calculos_fusion import calcular_columnas
+from serializacion import build_rows
+from proveedor_datos import ProveedorReplay
+from config import DEFAULT_CONFIG
+from test_fase12_replay import INICIO, sesion  # noqa: F401 (fixture)
+
+TFS = ["1M", "5M", "15M"]
+
+
+def _ticks(n, inicio_msc=INICIO * 1000, seed=0):
+    """Ticks sintéticos: ms crecientes con repetidos y precio medio con muchos 'sin cambio'."""
+    rng = np.random.default_rng(seed)
+    ticks = np.empty(n, dtype=DTYPE_TICKS)
+    ticks["time_msc"] = inicio_msc + np.cumsum(rng.choice([0, 0, 7, 150, 900], n))
+    mid = np.round(1.09 + np.cumsum(rng.choice([-1, 0, 0, 1], n)) * 0.00001, 5)
+    ticks["bid"] = mid - 0.00001
+    ticks["ask"] = mid + 0.00001
+    return ticks
+
+
+def _regla_del_tick_ref(precios):
+    """Implementación de referencia tick a tick."""
+    signos, previo, signo = [], None, 0
+    for p in precios:
+        if previo is not None and p != previo:
+            signo = 1 if p > previo else -1
+        signos.append(signo)
+        previo = p
+    return np.array(signos, dtype=np.int8)
+
+
+def test_regla_del_tick_igual_a_referencia():
+    ticks = _ticks(5000)
+    precios = (ticks["bid"] + ticks["ask"]) / 2
+    assert np.array_equal(clasificar_ticks(precios), _regla_del_tick_ref(precios))
+
+
+def test_regla_del_tick_con_estado_previo():
+    # Sin cambio respecto al lote anterior: hereda su signo
+    assert list(clasificar_ticks([1.0, 1.0, 0.9], precio_previo=1.0, signo_previo=1)) == [1, 1, -1]
+    assert list(clasificar_ticks([1.0, 1.0], precio_previo=0.9)) == [1, 1]
+    assert len(clasificar_ticks([])) == 0
+
+
+def test_doji_reparte_compra_y_venta():
+    """Vela que abre y cierra en el mismo precio: el proxy la manda entera a venta."""
+    precios = np.array([1.1000, 1.1001, 1.1002, 1.1001, 1.1000])
+    signos = clasificar_ticks(precios)
+    velas = agregar_ticks(INICIO * 1000 + np.arange(5) * 1000, signos, 1)
+    assert velas["volumen_compra"][0] == 2 and velas["volumen_venta"][0] == 2
+
+
+@pytest.mark.parametrize("tamaño_lote", [1, 37, 1000])
+def test_lotes_solapados_igual_a_un_solo_lote(tamaño_lote):
+    """Ingerir en lotes que repiten el último ms (copy_ticks_range) = ingerir todo de una vez."""
+    ticks = _ticks(3000)
+    completo = MotorFlujoTicks(TFS, capacidad=500)
+    completo.ingerir("EURUSD", ticks)
+
+    motor = MotorFlujoTicks(TFS, capacidad=500)
+    fin = 0
+    while fin < len(ticks):
+        ultimo = motor.ultimo_msc("EURUSD")
+        ini = 0 if ultimo is None else int(np.searchsorted(ticks["time_msc"], ultimo, side="left"))
+        fin = min(fin + tamaño_lote, len(ticks))
+        motor.ingerir("EURUSD", ticks[ini:fin])
+
+    for tf in TFS:
+        tiempos = completo._series[("EURUSD", tf)]["time"]
+        a, b = completo.columnas("EURUSD", tf, tiempos), motor.columnas("EURUSD", tf, tiempos)
+        for campo in a:
+            assert np.array_equal(a[campo], b[campo], equal_nan=True)
+    m1 = completo.columnas("EURUSD", "1M", completo._series[("EURUSD", "1M")]["time"])
+    assert np.nansum(m1["volumen_compra"] + m1["volumen_venta"]) <= len(ticks)
+    assert m1["delta_acumulado"][-1] == np.sum(
+        np.diff(_regla_del_tick_ref((ticks["bid"] + ticks["ask"]) / 2).astype(int), prepend=0).cumsum())
+
+
+def test_columnas_cobertura_y_capacidad():
+    ticks = _ticks(2000)
+    # Cobertura desde la mitad del primer minuto: esa vela queda sin cobertura completa
+    motor = MotorFlujoTicks(["1M"], capacidad=5)
+    motor.ingerir("EURUSD", ticks, desde_msc=int(ticks["time_msc"][0]) + 30_000)
+    serie = motor._series[("EURUSD", "1M")]
+    assert len(serie["time"]) == 5
+
+    velas = np.r_[INICIO, serie["time"]]
+    flujo = motor.columnas("EURUSD", "1M", velas)
+    assert np.isnan(flujo["volumen_compra"][0])
+    assert np.array_equal(flujo["volumen_venta"][1:], serie["volumen_venta"])
+    assert motor.columnas("GBPUSD", "1M", velas) is None
+
+
+def test_calcular_columnas_con_flujo():
+    rng = np.random.default_rng(3)
+    n = 60
+    close = 1.09 * np.exp(np.cumsum(rng.normal(0, 0.0003, n)))
+    open_ = np.r_[1.09, close[:-1]]
+    tick_volume = rng.integers(50, 300, n).astype(np.uint64)
+    flujo = {
+        "volumen_compra":  np.r_[np.full(10, np.nan), rng.integers(0, 50, n - 10)].astype(float),
+        "volumen_venta":   np.r_[np.full(10, np.nan), rng.integers(0, 50, n - 10)].astype(float),
+        "delta_acumulado": np.r_[np.full(10, np.nan), np.arange(n - 10)].astype(float),
+    }
+    base = calcular_columnas(open_, close, tick_volume)
+    cols = calcular_columnas(open_, close, tick_volume, flujo=flujo)
+    # Sin cobertura: proxy de la vela; con cobertura: regla del tick
+    assert np.array_equal(cols["delta"][:10], base["delta"][:10])
+    assert np.array_equal(cols["delta"][10:], (flujo["volumen_compra"] - flujo["volumen_venta"])[10:])
+    assert cols["volumen_alcista"].dtype == tick_volume.dtype
+    assert "delta_acumulado" not in base and cols["delta_acumulado"] is flujo["delta_acumulado"]
+
+    df = pd.DataFrame({
+        "time": pd.date_range("2026-03-02", periods=n, freq="min"),
+        "open": open_, "close": close, "tick_volume": tick_volume, **cols,
+    })
+    filas = build_rows(df.iloc[1:], DEFAULT_CONFIG, "1M", "EURUSD")
+    assert filas[0]["orderflow"]["delta_acumulado"] is None
+    assert filas[-1]["orderflow"]["delta_acumulado"] == n - 11
+
+
+def test_replay_sirve_ticks(sesion):
+    ticks = _ticks(500)
+    pd.DataFrame(ticks).to_csv(sesion / "EURUSD_ticks.csv", index=False)
+    p = ProveedorReplay(directorio=str(sesion), inicio=INICIO + 60)
+    p.conectar()
+    visibles = p.obtener_ticks_desde("EURUSD", INICIO * 1000)
+    assert np.all(visibles["time_msc"] <= (INICIO + 60) * 1000)
+    esperados = ticks[ticks["time_msc"] <= (INICIO + 60) * 1000]
+    assert np.array_equal(visibles["time_msc"], esperados["time_msc"])
+    assert np.allclose(visibles["bid"], esperados["bid"], rtol=0, atol=1e-12)
+    assert p.obtener_ticks_desde("GBPUSD", INICIO * 1000) is None
@@ -0,0 +1,84 @@
+# test_fase16_commit_ciclo.py — Tests del commit del ciclo en un solo RPC (commit_cycle_data)
+import json
+import requests
+import main
+from api_client import SupabaseClient
+from config import VENTANA_VELAS
+from proveedor_datos import ProveedorReplay
+from test_fase12_replay import INICIO, SupabaseEnMemoria, sesion  # noqa: F401 (fixture)
+
+
+class _Respuesta:
+    def __init__(self, status_code=200, cuerpo=True):
+        self.status_code = status_code
+        self.text = str(cuerpo)
+        self._cuerpo = cuerpo
+
+    def json(self):
+        return self._cuerpo
+
+
+def _capturar_posts(monkeypatch, respuesta):
+    llamadas = []
+
+    def post(sesion, url, data=None, headers=None, timeout=None):
+        llamadas.append((url, json.loads(data)))
+        return respuesta
+
+    monkeypatch.setattr(requests.Session, "post", post)
+    return llamadas
+
+
+def test_confirmar_filas_un_solo_rpc(monkeypatch):
+    llamadas = _capturar_posts(monkeypatch, _Respuesta())
+    cliente = SupabaseClient()
+    filas = [{"symbol": "EURUSD", "timeframe": "1M"}, {"symbol": "GBPUSD", "timeframe": "5M"}]
+
+    assert cliente.confirmar_filas(filas)
+    assert len(llamadas) == 1
+    url, payload = llamadas[0]
+    assert url.endswith("/rest/v1/rpc/commit_cycle_data")
+    assert [f["symbol"] for f in payload["rows_param"]] == ["EURUSD", "GBPUSD"]
+    assert payload["window_param"] == VENTANA_VELAS
+
+    # Sin filas: ninguna llamada
+    assert cliente.confirmar_filas([])
+    assert len(llamadas) == 1
+
+
+def test_confirmar_filas_fallido(monkeypatch):
+    llamadas = _capturar_posts(monkeypatch, _Respuesta(500, "error"))
+    cliente = SupabaseClient()
+    assert not cliente.confirmar_filas([{"symbol": "EURUSD", "timeframe": "1M"}])
+    assert len(llamadas) == 1
+
+    # API_KEY rechazada (el RPC devuelve false)
+    llamadas = _capturar_posts(monkeypatch, _Respuesta(200, False))
+    assert not cliente.confirmar_filas([{"symbol": "EURUSD", "timeframe": "1M"}])
+    assert len(llamadas) == 1
+
+
+class SupabaseContado(SupabaseEnMemoria):
+    """Registra cuántas filas confirma cada commit."""
+    commits = []
+
+    def confirmar_filas(self, rows, ventana=VENTANA_VELAS):
+        SupabaseContado.commits.append(len(rows))
+        return super().confirmar_filas(rows, ventana)
+
+
+def test_main_un_commit_por_ciclo(sesion, monkeypatch):
+    SupabaseEnMemoria.filas, SupabaseEnMemoria.tabla = [], {}
+    SupabaseContado.commits = []
+    monkeypatch.setattr(main, "SupabaseClient", SupabaseContado)
+    monkeypatch.setattr(main, "ALMACEN_VELAS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "COLA_ENVIOS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "crear_proveedor",
+                        lambda: ProveedorReplay(directorio=str(sesion), inicio=INICIO + 1950 * 60))
+    main.main()
+
+    # Carga inicial + 49 M1 reproducidas: como mucho un commit por ciclo (la cola
+    # fusiona ciclos si el envío va por detrás) y ninguna llamada por serie
+    assert 1 <= len(SupabaseContado.commits) <= 1 + 49
+    assert sum(SupabaseContado.commits) == len(SupabaseEnMemoria.filas)
+    assert all(len(serie) == VENTANA_VELAS for (_, tf), serie in SupabaseEnMemoria.tabla.items() if tf == "1M")
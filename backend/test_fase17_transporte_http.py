@@ -0,0 +1,120 @@
+# test_fase17_transporte_http.py — Tests del transporte HTTP de SupabaseClient (keep-alive, gzip, JSON numpy)
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+import api_client
+from api_client import SupabaseClient, serializar_json
+
+
+class _Servidor(BaseHTTPRequestHandler):
+    """RPC de prueba: registra puerto del cliente, encoding y cuerpo JSON; responde true."""
+    protocol_version = "HTTP/1.1"
+    peticiones = []
+    rechazo_gzip = None    # (status, cuerpo) con que se responde a un cuerpo gzip
+
+    def do_POST(self):
+        cuerpo = self.rfile.read(int(self.headers["Content-Length"]))
+        encoding = self.headers.get("Content-Encoding")
+        if encoding == "gzip":
+            if _Servidor.rechazo_gzip:
+                _Servidor.peticiones.append((self.client_address[1], encoding, None))
+                return self._responder(*_Servidor.rechazo_gzip)
+            cuerpo = gzip.decompress(cuerpo)
+        _Servidor.peticiones.append((self.client_address[1], encoding, json.loads(cuerpo)))
+        self._responder(200, b"true")
+
+    def _responder(self, status, cuerpo):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cliente():
+    _Servidor.peticiones, _Servidor.rechazo_gzip = [], None
+    api_client._SERVIDORES_SIN_GZIP.clear()
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Servidor)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    c = SupabaseClient()
+    c.supabase_url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    c.api_key = "clave"
+    yield c
+    c.sesion.close()
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _filas(n):
+    return [{"symbol": "EURUSD", "timeframe": "1M", "data_timestamp": f"2026-03-02T00:{i % 60:02d}:00",
+             "rendlog": {"z_score": np.float64(0.5) * i, "senal": None}, "orderflow": {"delta": np.int64(i)}}
+            for i in range(n)]
+
+
+def test_serializar_json_numpy(monkeypatch):
+    payload = {"f": np.float64(1.25), "i": np.int64(7), "b": np.bool_(True), "a": np.arange(3), "s": "ñ"}
+    esperado = {"f": 1.25, "i": 7, "b": True, "a": [0, 1, 2], "s": "ñ"}
+    assert json.loads(serializar_json(payload)) == esperado
+    monkeypatch.setattr(api_client, "orjson", None)
+    assert json.loads(serializar_json(payload)) == esperado
+    with pytest.raises(TypeError):
+        serializar_json({"x": object()})
+
+
+def test_keep_alive_y_gzip(cliente):
+    filas = _filas(200)
+    for _ in range(3):
+        assert cliente.enviar_datos(filas)
+    assert cliente.enviar_datos(filas[:1])
+
+    puertos = {puerto for puerto, _, _ in _Servidor.peticiones}
+    assert len(puertos) == 1   # una sola conexión TCP para las 4 llamadas
+    assert [enc for _, enc, _ in _Servidor.peticiones] == ["gzip"] * 3 + [None]
+    assert _Servidor.peticiones[0][2]["rows_param"][3]["orderflow"]["delta"] == 3
+
+    m = cliente.metricas["rpc/sync_user_data"]
+    assert m["llamadas"] == 4 and m["bytes_enviados"] < m["bytes_json"] / 3
+    assert cliente.ultima_llamada["bytes_json"] == cliente.ultima_llamada["bytes_enviados"]
+    assert cliente.resumen_ultima_llamada().startswith("rpc/sync_user_data")
+
+
+@pytest.mark.parametrize("rechazo", [(415, b'{"message":"Unsupported Media Type"}'),
+                                     (400, b'{"code":"PGRST102","message":"Empty or invalid json"}')])
+def test_servidor_sin_gzip_desactiva_compresion(cliente, rechazo):
+    _Servidor.rechazo_gzip = rechazo
+    filas = _filas(200)
+    assert cliente.enviar_datos(filas)
+    assert cliente.gzip_min_bytes == 0
+    assert cliente.enviar_datos(filas)
+    assert [enc for _, enc, _ in _Servidor.peticiones] == ["gzip", None, None]
+    assert cliente.metricas["rpc/sync_user_data"]["llamadas"] == 3
+
+    # Otro cliente del proceso (p. ej. el de la cola de envío) ya no prueba gzip con ese servidor
+    otro = SupabaseClient()
+    otro.supabase_url, otro.api_key = cliente.supabase_url, cliente.api_key
+    assert otro.enviar_datos(filas)
+    assert _Servidor.peticiones[-1][1] is None
+    otro.sesion.close()
+
+
+def test_otro_400_no_reenvia_sin_comprimir(cliente):
+    """Un 400 que no es de codificación (payload inválido) no se reenvía ni apaga gzip."""
+    _Servidor.rechazo_gzip = (400, b'{"code":"22P02","message":"invalid input syntax"}')
+    assert cliente.enviar_datos(_filas(200)) is False
+    assert [enc for _, enc, _ in _Servidor.peticiones] == ["gzip"]
+    assert cliente.gzip_min_bytes > 0
+    assert cliente.supabase_url not in api_client._SERVIDORES_SIN_GZIP
+
+
+def test_timeout_y_error_de_red(cliente):
+    assert cliente.timeout == (api_client.HTTP_TIMEOUT_CONEXION_S, api_client.HTTP_TIMEOUT_LECTURA_S)
+    cliente.supabase_url = "http://127.0.0.1:9"
+    assert cliente.enviar_datos(_filas(1)) is False
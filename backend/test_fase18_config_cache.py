@@ -0,0 +1,129 @@
+# test_fase18_config_cache.py — Tests de la caché de identidad y user_config en SupabaseClient
+import pytest
+import requests
+import api_client
+from api_client import SupabaseClient
+from test_fase16_commit_ciclo import _Respuesta
+
+CONFIG = {"user_id": "u1", "umbral_sigma_compra": -2.5, "updated_at": "2026-03-02T00:00:00+00:00"}
+
+
+class _Servidor:
+    """Sustituye _post/_get del cliente: registra las llamadas y responde según el estado."""
+
+    def __init__(self, cliente, monkeypatch, rpc_condicional=True):
+        self.llamadas = []
+        self.config, self.version = dict(CONFIG), CONFIG["updated_at"]
+        self.rpc_condicional = rpc_condicional
+        self.caida = False
+        monkeypatch.setattr(cliente, "_post", self._post)
+        monkeypatch.setattr(cliente, "_get", self._get)
+
+    def _post(self, url, payload, timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.llamadas.append((endpoint, payload))
+        if self.caida:
+            raise requests.Timeout("lectura lenta")
+        if endpoint == "get_user_id_from_api_key":
+            return _Respuesta(200, "u1")
+        if not self.rpc_condicional:
+            return _Respuesta(404, "")
+        if payload["version_param"] == self.version:
+            return _Respuesta(200, {"cambiado": False, "version": self.version})
+        return _Respuesta(200, {"cambiado": True, "version": self.version, "config": dict(self.config)})
+
+    def _get(self, url, timeout=None):
+        self.llamadas.append(("user_config", url))
+        if self.caida:
+            raise requests.Timeout("lectura lenta")
+        return _Respuesta(200, [dict(self.config)])
+
+    def endpoints(self):
+        return [e for e, _ in self.llamadas]
+
+
+@pytest.fixture
+def cliente():
+    c = SupabaseClient()
+    c.api_key = "clave"
+    return c
+
+
+def test_dentro_del_ttl_sin_red(cliente, monkeypatch):
+    monkeypatch.setattr(api_client, "CONFIG_CACHE_TTL_S", 300)
+    servidor = _Servidor(cliente, monkeypatch)
+    for _ in range(10):
+        assert cliente.obtener_configuracion() == CONFIG
+    assert servidor.endpoints() == ["get_user_config_if_changed"]
+
+
+def test_revalidacion_condicional(cliente, monkeypatch):
+    monkeypatch.setattr(api_client, "CONFIG_CACHE_TTL_S", 0)
+    servidor = _Servidor(cliente, monkeypatch)
+    primera = cliente.obtener_configuracion()
+    assert cliente.obtener_configuracion() is primera
+    assert servidor.llamadas[1][1]["version_param"] == CONFIG["updated_at"]
+
+    servidor.config["umbral_sigma_compra"] = -3.0
+    servidor.version = "2026-03-02T00:05:00+00:00"
+    assert cliente.obtener_configuracion()["umbral_sigma_compra"] == -3.0
+    assert "get_user_id_from_api_key" not in servidor.endpoints()
+
+
+def test_invalidar_fuerza_consulta(cliente, monkeypatch):
+    monkeypatch.setattr(api_client, "CONFIG_CACHE_TTL_S", 300)
+    servidor = _Servidor(cliente, monkeypatch)
+    cliente.obtener_configuracion()
+    cliente.invalidar_configuracion()
+    cliente.obtener_configuracion()
+    cliente.obtener_configuracion(forzar=True)
+    assert servidor.endpoints() == ["get_user_config_if_changed"] * 3
+
+
+def test_red_lenta_usa_la_ultima_leida(cliente, monkeypatch):
+    monkeypatch.setattr(api_client, "CONFIG_CACHE_TTL_S", 0)
+    servidor = _Servidor(cliente, monkeypatch)
+    servidor.caida = True
+    assert cliente.obtener_configuracion() is None
+
+    servidor.caida = False
+    assert cliente.obtener_configuracion() == CONFIG
+    servidor.caida = True
+    assert cliente.obtener_configuracion() == CONFIG
+
+
+def test_primera_lectura_fallida_no_espera_el_ttl(cliente, monkeypatch):
+    monkeypatch.setattr(api_client, "CONFIG_CACHE_TTL_S", 300)
+    servidor = _Servidor(cliente, monkeypatch)
+    servidor.caida = True
+    assert cliente.obtener_configuracion() is None
+    assert cliente.obtener_configuracion() is None
+    assert servidor.endpoints() == ["get_user_config_if_changed"] * 2
+
+    # En cuanto la red vuelve se lee, y desde ahí rige el TTL
+    servidor.caida = False
+    assert cliente.obtener_configuracion() == CONFIG
+    servidor.caida = True
+    assert cliente.obtener_configuracion() == CONFIG
+    assert len(servidor.llamadas) == 3
+
+
+def test_usuario_sin_config_se_cachea(cliente, monkeypatch):
+    monkeypatch.setattr(api_client, "CONFIG_CACHE_TTL_S", 300)
+    llamadas = []
+    monkeypatch.setattr(cliente, "_post", lambda url, payload, timeout=None: (
+        llamadas.append(url) or _Respuesta(200, None)))
+    assert cliente.obtener_configuracion() is None
+    assert cliente.obtener_configuracion() is None
+    assert len(llamadas) == 1
+
+
+def test_sin_rpc_condicional_resuelve_user_id_una_vez(cliente, monkeypatch):
+    monkeypatch.setattr(api_client, "CONFIG_CACHE_TTL_S", 0)
+    servidor = _Servidor(cliente, monkeypatch, rpc_condicional=False)
+    for _ in range(3):
+        assert cliente.obtener_configuracion() == CONFIG
+    assert cliente.obtener_user_id() == "u1"
+    assert servidor.endpoints() == [
+        "get_user_config_if_changed", "get_user_id_from_api_key", "user_config", "user_config", "user_config",
+    ]
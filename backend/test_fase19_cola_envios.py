@@ -0,0 +1,184 @@
+# test_fase19_cola_envios.py — Tests de la cola de envío en segundo plano con write-ahead log
+import json
+import time
+import threading
+import pytest
+import cola_envios
+from cola_envios import ColaEnvios
+
+
+def _filas(symbol, n, desde=0, tf="1M", version=0):
+    return [{"symbol": symbol, "timeframe": tf, "data_timestamp": f"2026-03-02T{(desde + i) // 60:02d}:{(desde + i) % 60:02d}:00",
+             "rendlog": {"v": version}, "orderflow": {}} for i in range(n)]
+
+
+class ClienteFalso:
+    """confirmar_filas() configurable: falla las primeras `fallos` veces y puede bloquearse."""
+
+    def __init__(self, fallos=0):
+        self.fallos = fallos
+        self.lotes = []
+        self.liberar = threading.Event()
+        self.liberar.set()
+
+    def confirmar_filas(self, rows, ventana):
+        self.liberar.wait()
+        if self.fallos:
+            self.fallos -= 1
+            return False
+        self.lotes.append(list(rows))
+        return True
+
+    def resumen_ultima_llamada(self):
+        return f"commit_cycle_data {len(self.lotes[-1])} filas" if self.lotes else ""
+
+    def recibidas(self):
+        return {(f["symbol"], f["data_timestamp"]): f["rendlog"]["v"] for lote in self.lotes for f in lote}
+
+
+@pytest.fixture(autouse=True)
+def backoff_corto(monkeypatch):
+    monkeypatch.setattr(cola_envios, "COLA_REINTENTO_BASE_S", 0.01)
+    monkeypatch.setattr(cola_envios, "COLA_REINTENTO_MAX_S", 0.05)
+
+
+def test_registra_latencia_y_bytes_de_cada_envio(tmp_path, monkeypatch):
+    mensajes = []
+    monkeypatch.setattr(cola_envios, "log_mensaje", lambda texto, nivel="INFO": mensajes.append(texto))
+    cliente = ClienteFalso()
+    cola = ColaEnvios(cliente, directorio=str(tmp_path))
+    cola.iniciar()
+    cola.encolar(_filas("EURUSD", 3))
+    assert cola.detener(timeout=5)
+    assert "Cola de envío: 3 filas confirmadas | Supabase: commit_cycle_data 3 filas" in mensajes
+
+
+def test_encolar_no_espera_a_la_red(tmp_path):
+    cliente = ClienteFalso()
+    cliente.liberar.clear()
+    cola = ColaEnvios(cliente, directorio=str(tmp_path))
+    cola.iniciar()
+    cola.encolar(_filas("EURUSD", 5))
+    time.sleep(0.05)   # el hilo ya tomó el lote y está bloqueado en la red
+    t0 = time.perf_counter()
+    for i in range(20):
+        cola.encolar(_filas("EURUSD", 1, desde=5 + i))
+    assert time.perf_counter() - t0 < 0.5
+    assert cola.num_pendientes == 25
+
+    cliente.liberar.set()
+    assert cola.detener(timeout=5)
+    assert len(cliente.recibidas()) == 25
+    assert len(cliente.lotes) == 2   # los 20 ciclos encolados durante el envío viajan juntos
+
+
+def test_fusion_por_clave_y_ventana():
+    cola = ColaEnvios(ClienteFalso(), directorio=None, ventana=10)
+    cola.encolar(_filas("EURUSD", 8, version=1))
+    cola.encolar(_filas("EURUSD", 8, desde=4, version=2))   # 4 claves repetidas, 4 nuevas
+    cola.encolar(_filas("GBPUSD", 3))
+    assert cola.num_pendientes == 10 + 3
+    cola.iniciar()
+    assert cola.detener(timeout=5)
+    recibidas = cola.cliente.recibidas()
+    assert min(ts for s, ts in recibidas if s == "EURUSD") == "2026-03-02T00:02:00"
+    assert all(v == 2 for (s, ts), v in recibidas.items() if s == "EURUSD" and ts >= "2026-03-02T00:04:00")
+
+
+def test_reintento_sin_perder_ni_pisar_filas(tmp_path):
+    cliente = ClienteFalso(fallos=3)
+    cola = ColaEnvios(cliente, directorio=str(tmp_path))
+    cola.iniciar()
+    cola.encolar(_filas("EURUSD", 3, version=1))
+    time.sleep(0.02)
+    cola.encolar(_filas("EURUSD", 1, version=2))   # versión nueva de la primera vela durante los reintentos
+    assert cola.detener(timeout=5)
+    assert cola.envios_fallidos == 3
+    assert cliente.recibidas() == {
+        ("EURUSD", "2026-03-02T00:00:00"): 2, ("EURUSD", "2026-03-02T00:01:00"): 1, ("EURUSD", "2026-03-02T00:02:00"): 1,
+    }
+
+
+def test_wal_sobrevive_a_un_reinicio(tmp_path):
+    caido = ClienteFalso(fallos=10**6)
+    cola = ColaEnvios(caido, directorio=str(tmp_path))
+    cola.iniciar()
+    cola.encolar(_filas("EURUSD", 4))
+    cola.encolar(_filas("USDJPY", 2))
+    assert not cola.detener(timeout=0.2)
+
+    # Caída a mitad de escribir la línea siguiente
+    with open(tmp_path / "wal.jsonl", "ab") as f:
+        f.write(b'{"seq": 3, "filas": [{"sym')
+
+    cliente = ClienteFalso()
+    cola = ColaEnvios(cliente, directorio=str(tmp_path))
+    assert cola.num_pendientes == 6
+    cola.iniciar()
+    assert cola.detener(timeout=5)
+    assert len(cliente.recibidas()) == 6
+    assert (tmp_path / "wal.jsonl").stat().st_size == 0
+    assert json.loads((tmp_path / "ack.json").read_text())["seq"] == 2
+
+    # Todo confirmado: un tercer arranque no reenvía nada
+    assert ColaEnvios(ClienteFalso(), directorio=str(tmp_path)).num_pendientes == 0
+
+
+class ClienteQueCae(ClienteFalso):
+    """Confirma el primer lote (cuando se libera) y después falla siempre."""
+
+    def confirmar_filas(self, rows, ventana):
+        self.fallos = 10**6 if self.lotes else 0
+        return super().confirmar_filas(rows, ventana)
+
+
+def test_wal_se_compacta(tmp_path, monkeypatch):
+    monkeypatch.setattr(cola_envios, "COLA_WAL_MAX_BYTES", 2000)
+    cliente = ClienteQueCae()
+    cliente.liberar.clear()
+    cola = ColaEnvios(cliente, directorio=str(tmp_path), ventana=5)
+    cola.iniciar()
+    cola.encolar(_filas("GBPUSD", 1))
+    time.sleep(0.05)
+    for i in range(40):   # el primer envío sigue bloqueado: sin confirmaciones el WAL se compacta al encolar
+        cola.encolar(_filas("EURUSD", 1, desde=1 + i))
+        assert (tmp_path / "wal.jsonl").stat().st_size <= 2000 + 500
+    # Una caída ahora no pierde el lote en vuelo (GBPUSD) ni las 5 EURUSD de la ventana
+    assert ColaEnvios(ClienteFalso(), directorio=str(tmp_path), ventana=5).num_pendientes == 6
+
+    # Confirmado el primer lote, lo recuperable son las 5 EURUSD (más GBPUSD si sigue en el registro compactado)
+    cliente.liberar.set()
+    assert not cola.detener(timeout=0.2)
+    recuperada = ColaEnvios(ClienteFalso(), directorio=str(tmp_path), ventana=5)
+    assert len(recuperada._pendientes[("EURUSD", "1M")]) == 5
+
+
+def test_fallos_no_se_reintentan_antes_del_backoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(cola_envios, "COLA_REINTENTO_BASE_S", 0.5)
+    monkeypatch.setattr(cola_envios, "COLA_REINTENTO_MAX_S", 0.5)
+    intentos = []
+
+    class Caido(ClienteFalso):
+        def confirmar_filas(self, rows, ventana):
+            intentos.append(time.monotonic())
+            return False
+
+    cola = ColaEnvios(Caido(), directorio=str(tmp_path))
+    cola.iniciar()
+    cola.encolar(_filas("EURUSD", 1))
+    for i in range(20):   # cada encolar() despierta al hilo durante la espera
+        time.sleep(0.01)
+        cola.encolar(_filas("EURUSD", 1, desde=1 + i))
+    assert len(intentos) == 1
+    assert not cola.detener(timeout=0.1)   # el próximo intento cae fuera del plazo
+    assert len(intentos) == 1
+
+
+def test_descartar_pendientes_del_wal(tmp_path):
+    caido = ClienteFalso(fallos=10**6)
+    cola = ColaEnvios(caido, directorio=str(tmp_path))
+    cola.encolar(_filas("EURUSD", 4))
+    cola = ColaEnvios(ClienteFalso(), directorio=str(tmp_path))
+    assert cola.descartar_pendientes() == 4
+    assert cola.num_pendientes == 0 and (tmp_path / "wal.jsonl").stat().st_size == 0
+    assert ColaEnvios(ClienteFalso(), directorio=str(tmp_path)).num_pendientes == 0
@@ -5,7 +5,13 @@ No requiere MT5 ni Supabase.
 """
 import numpy as np
 import pandas as pd
-from calculos_rendlog import calcular_rendimientos_log, calcular_bandas_sigma, detectar_anomalias
+from calculos_rendlog import (
+    calcular_rendimientos_log,
+    calcular_bandas_sigma,
+    detectar_anomalias,
+    seleccionar_lambda,
+    EstadoEWMA,
+)
 
 
 def make_df(prices, timeframe="30M"):
@@ -110,6 +116,79 @@ def test_columna_std_static_presente():
     print("  ✅ Todas las columnas de diagnóstico presentes")
 
 
+def _ewma_loop_referencia(returns, lambda_decay):
+    """Implementación original en loop (referencia para comparar el kernel vectorizado)."""
+    n = len(returns)
+    variance = np.zeros(n)
+    valid_mask = ~np.isnan(returns)
+    first_valid_idx = np.argmax(valid_mask)
+    init_window = returns[first_valid_idx:first_valid_idx + 5]
+    init_var = np.nanvar(init_window) if len(init_window) > 1 else 1e-10
+    variance[first_valid_idx] = init_var if init_var > 0 else 1e-10
+    for t in range(first_valid_idx + 1, n):
+        r_prev = returns[t - 1]
+        if np.isnan(r_prev):
+            variance[t] = variance[t - 1]
+        else:
+            variance[t] = lambda_decay * variance[t - 1] + (1 - lambda_decay) * r_prev ** 2
+    sigma = np.sqrt(np.maximum(variance, 1e-12))
+    sigma[:first_valid_idx] = np.nan
+    return sigma
+
+
+def test_kernel_vectorizado_identico_al_loop():
+    """El kernel vectorizado debe reproducir el loop original bit a bit (incluye NaN intermedios)."""
+    print("\n--- TEST 5: Kernel EWMA vectorizado == loop ---")
+    np.random.seed(3)
+    prices = 1.08 + np.cumsum(np.random.normal(0, 0.0005, 300))
+    df = make_df(prices, timeframe="1M")
+    returns = df['log_return'].values.copy()
+    returns[[40, 41, 150]] = np.nan
+
+    esperado = _ewma_loop_referencia(returns, 0.94)
+    obtenido = calcular_bandas_sigma(
+        pd.DataFrame({'log_return': returns}), ventana=20, timeframe="1M"
+    )['std'].values
+
+    assert np.array_equal(esperado, obtenido, equal_nan=True), "Kernel EWMA difiere del loop"
+    print("  ✅ Kernel vectorizado idéntico al loop")
+
+
+def test_estado_ewma_streaming_igual_a_recalculo():
+    """Sembrar + actualizar vela a vela debe coincidir con recalcular la serie completa."""
+    print("\n--- TEST 6: EstadoEWMA streaming == recálculo completo ---")
+    np.random.seed(11)
+    prices = 1.08 + np.cumsum(np.random.normal(0, 0.0005, 120))
+    df_total = make_df(prices, timeframe="5M")
+    lam = seleccionar_lambda("5M", "EURUSD")
+
+    returns = df_total['log_return'].values
+    estado = EstadoEWMA.desde_historial(returns[:60], lam)
+    sigmas_stream = [estado.actualizar(r) for r in returns[60:]]
+
+    assert np.array_equal(np.array(sigmas_stream), df_total['std'].values[60:]), \
+        "Actualización O(1) debe ser idéntica a calcular_bandas_sigma"
+    print("  ✅ Streaming idéntico al recálculo completo")
+
+
+def test_estado_ewma_arranque_sin_historial():
+    """
+    Un estado vacío debe coincidir con la serie completa una vez que la
+    ventana de inicialización (primeros 5 retornos válidos) está completa.
+    """
+    print("\n--- TEST 7: EstadoEWMA desde cero ---")
+    np.random.seed(5)
+    prices = 1.08 + np.cumsum(np.random.normal(0, 0.0005, 30))
+    df_total = make_df(prices, timeframe="1H")
+    lam = seleccionar_lambda("1H")
+
+    estado = EstadoEWMA(lam)
+    sigmas = [estado.actualizar(r) for r in df_total['log_return'].values]
+
+    assert np.array_equal(np.array(sigmas)[5:], df_total['std'].values[5:])
+    print("  ✅ Estado vacío converge al recálculo completo")
+
+
 if __name__ == "__main__":
     print("=" * 55)
     print("VALIDACIÓN FASE 1 — EWMA SIGMA DINÁMICO")
@@ -119,6 +198,9 @@ if __name__ == "__main__":
     test_ewma_menor_que_static_en_regimen_volatil()
     test_lambda_diferente_por_timeframe()
     test_columna_std_static_presente()
+    test_kernel_vectorizado_identico_al_loop()
+    test_estado_ewma_streaming_igual_a_recalculo()
+    test_estado_ewma_arranque_sin_historial()
 
     print("\n" + "=" * 55)
     print("✅ TODOS LOS TESTS PASARON")
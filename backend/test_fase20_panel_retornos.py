@@ -0,0 +1,115 @@
+# test_fase20_panel_retornos.py — Tests del panel de retornos alineados por epoch
+import pytest
+import numpy as np
+import pandas as pd
+from panel_retornos import PanelRetornos
+from calculos_multipair import construir_matriz_retornos
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "USDCAD"]
+
+
+def _dfs_con_huecos(n=80, seed=0):
+    """DataFrames con velas faltantes distintas por símbolo y algún NaN."""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2026-01-01", periods=n, freq="5min")
+    dfs = {}
+    for sym in SYMBOLS:
+        presentes = rng.random(n) > 0.1
+        retornos = rng.normal(0, 0.0005, n)
+        retornos[rng.random(n) < 0.05] = np.nan
+        dfs[sym] = pd.DataFrame({"time": times[presentes], "log_return": retornos[presentes]})
+    return dfs
+
+
+def _merge_referencia(dfs):
+    """Implementación anterior: inner join encadenado + dropna."""
+    merged = None
+    for sym, df in dfs.items():
+        df = df[["time", "log_return"]].rename(columns={"log_return": sym})
+        merged = df if merged is None else pd.merge(merged, df, on="time", how="inner")
+    merged = merged.dropna(subset=list(dfs))
+    return merged[list(dfs)].values, merged["time"].reset_index(drop=True)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_igual_a_merge_encadenado(seed):
+    dfs = _dfs_con_huecos(seed=seed)
+    R_ref, ts_ref = _merge_referencia(dfs)
+    R, syms, ts = construir_matriz_retornos(dfs)
+    assert syms == SYMBOLS
+    assert np.array_equal(R, R_ref)
+    assert ts.equals(ts_ref.astype("datetime64[ns]"))
+
+
+def test_incremental_igual_a_construccion_completa():
+    """Alimentar ventanas de 20 velas, símbolo a símbolo y fuera de fase, = panel completo."""
+    dfs = _dfs_con_huecos(n=200, seed=3)
+    epochs = {s: df["time"].to_numpy(dtype="datetime64[ns]").view(np.int64) for s, df in dfs.items()}
+    panel = PanelRetornos(SYMBOLS, capacidad=60)
+    tiempos = np.unique(np.concatenate(list(epochs.values())))
+    for corte in range(10, len(tiempos) + 1, 7):
+        # Cada símbolo se actualiza con un retraso distinto (velas que llegan en ciclos distintos)
+        for k, sym in enumerate(SYMBOLS):
+            limite = tiempos[max(corte - 1 - k, 0)]
+            mascara = epochs[sym] <= limite
+            panel.actualizar(sym, epochs[sym][mascara][-20:], dfs[sym]["log_return"].to_numpy()[mascara][-20:])
+    for sym in SYMBOLS:
+        panel.actualizar(sym, epochs[sym], dfs[sym]["log_return"].to_numpy())
+
+    completo = PanelRetornos.desde_dataframes(dfs)
+    R, _, ts = panel.matriz()
+    R_ref, _, ts_ref = completo.matriz(n=60)
+    assert np.array_equal(panel.epochs, tiempos[-60:])
+    assert np.array_equal(ts, ts_ref) and np.array_equal(R, R_ref)
+
+
+def test_matriz_es_vista_sin_copia():
+    times = np.arange(100, 160)
+    panel = PanelRetornos(SYMBOLS, capacidad=60)
+    for j, sym in enumerate(SYMBOLS):
+        panel.actualizar(sym, times, np.full(60, j + 1.0))
+    R, syms, epochs = panel.matriz()
+    assert R.shape == (60, 4) and np.shares_memory(R, panel._retornos)
+    assert np.shares_memory(epochs, panel._tiempos)
+    # Columnas contiguas: también vista; no contiguas o con filas incompletas: copia
+    assert np.shares_memory(panel.matriz(["GBPUSD", "USDJPY"])[0], panel._retornos)
+    assert not np.shares_memory(panel.matriz(["EURUSD", "USDJPY"])[0], panel._retornos)
+    panel.actualizar("EURUSD", [160], [0.5])
+    R, _, epochs = panel.matriz()
+    assert len(R) == 59 and epochs[-1] == 159
+    assert panel.matriz(["EURUSD"])[2][-1] == 160
+
+
+def test_capacidad_vela_en_formacion_y_nan():
+    panel = PanelRetornos(["A", "B"], capacidad=3)
+    assert panel.actualizar("A", [1, 2, 3], [0.1, 0.2, 0.3]) == 3
+    assert panel.actualizar("A", [3, 4], [0.35, 0.4]) == 1     # 3 sobrescrita, 4 nueva, 1 sale
+    assert list(panel.epochs) == [2, 3, 4]
+    assert panel.actualizar("B", [1, 2], [9.0, 0.02]) == 0     # 1 ya salió de la ventana
+    assert panel.actualizar("B", [3], [np.nan]) == 0           # NaN no escribe
+    R, _, epochs = panel.matriz()
+    assert list(epochs) == [2] and np.allclose(R, [[0.2, 0.02]])
+    assert np.allclose(panel.matriz(["A"])[0][:, 0], [0.2, 0.35, 0.4])
+
+
+def test_epoch_intermedio_reordena_la_ventana():
+    """Una vela que otro símbolo no tuvo cae entre filas existentes."""
+    panel = PanelRetornos(["A", "B"], capacidad=10)
+    panel.actualizar("A", [10, 30, 40], [1.0, 3.0, 4.0])
+    assert panel.actualizar("B", [10, 20, 30, 40], [0.1, 0.2, 0.3, 0.4]) == 1
+    assert list(panel.epochs) == [10, 20, 30, 40]
+    R, _, epochs = panel.matriz()
+    assert list(epochs) == [10, 30, 40]
+    assert np.allclose(R, [[1.0, 0.1], [3.0, 0.3], [4.0, 0.4]])
+
+
+def test_muchas_actualizaciones_compactan_sin_perder_la_ventana():
+    panel = PanelRetornos(["A", "B"], capacidad=5)
+    for t in range(1, 200):
+        panel.actualizar("A", [t], [float(t)])
+        panel.actualizar("B", [t], [-float(t)])
+    R, _, epochs = panel.matriz()
+    assert list(epochs) == [195, 196, 197, 198, 199]
+    assert np.allclose(R[:, 0], epochs) and np.allclose(R[:, 1], -epochs)
+    with pytest.raises(ValueError):
+        PanelRetornos(["A"], capacidad=0)
@@ -0,0 +1,142 @@
+# test_fase21_pca_movil.py — Tests de la covarianza móvil (Welford) y el PC1 incremental
+import pytest
+import numpy as np
+from calculos_multipair import calcular_covarianza, calcular_pca
+from panel_retornos import PanelRetornos
+from pca_movil import CovarianzaMovil, PCAMovil, pc1_por_potencia
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "USDCAD"]
+VENTANA = 60
+
+
+def _retornos_factor(n, seed=0, peso_factor=1.0):
+    """Retornos con un factor común (USD) + ruido idiosincrático."""
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 0.0005, n)
+    cargas = np.array([1.0, 0.9, -0.6, -0.7]) * peso_factor
+    return factor[:, None] * cargas + rng.normal(0, 0.0002, (n, len(SYMBOLS)))
+
+
+def _recorrer(panel, movil, retornos, epochs, forming=True, seed=1):
+    """Simula el loop: por ciclo entra una vela y la anterior (en formación) se corrige."""
+    rng = np.random.default_rng(seed)
+    for t in range(VENTANA, len(epochs)):
+        for j, sym in enumerate(SYMBOLS):
+            panel.actualizar(sym, epochs[t - VENTANA + 1:t + 1], retornos[t - VENTANA + 1:t + 1, j])
+        if forming:
+            # Vela en formación: el último valor llega primero aproximado y luego se corrige
+            retornos[t] += rng.normal(0, 0.0001, len(SYMBOLS))
+        R, syms, ep = panel.matriz()
+        yield t, R, syms, ep, movil.actualizar(R, syms, ep)
+
+
+def test_welford_altas_y_bajas_igual_a_exacta():
+    R = _retornos_factor(300)
+    acum = CovarianzaMovil.desde_matriz(R[:VENTANA])
+    for t in range(VENTANA, len(R)):
+        acum.agregar(R[t])
+        acum.quitar(R[t - VENTANA])
+        np.testing.assert_allclose(acum.covarianza(), calcular_covarianza(R[t - VENTANA + 1:t + 1]),
+                                   rtol=1e-9, atol=1e-18)
+    vacio = CovarianzaMovil(2)
+    vacio.agregar(np.array([1.0, 2.0]))
+    vacio.quitar(np.array([1.0, 2.0]))
+    assert vacio.n == 0 and not vacio.covarianza().any()
+
+
+def test_pc1_incremental_igual_a_eigh():
+    retornos = _retornos_factor(400)
+    epochs = np.arange(len(retornos)) * 60
+    panel = PanelRetornos(SYMBOLS, VENTANA)
+    movil = PCAMovil(recalculo_cada=1000)
+    previo = None
+    for t, R, syms, _, (cov, pca) in _recorrer(panel, movil, retornos, epochs):
+        np.testing.assert_allclose(cov, calcular_covarianza(R), rtol=1e-9, atol=1e-18)
+        ref = calcular_pca(calcular_covarianza(R), syms)
+        v = np.array([pca["pc1_loadings"][s] for s in syms])
+        v_ref = np.array([ref["pc1_loadings"][s] for s in syms])
+        np.testing.assert_allclose(v, v_ref, atol=1e-6)
+        assert pca["pc1_varianza"] == pytest.approx(ref["pc1_varianza"], abs=1e-8)
+        # Signo continuo entre ciclos
+        if previo is not None:
+            assert v @ previo > 0
+        previo = v
+    assert movil.recalculos_exactos == 1
+    assert 0 < movil.iteraciones < 50
+
+
+def test_signo_eurusd_positivo_con_loading_que_deriva():
+    """El loading de EURUSD cruza el cero: el signo sigue a calcular_pca, no al ciclo anterior."""
+    n = 400
+    rng = np.random.default_rng(7)
+    factor = rng.normal(0, 0.0005, n)
+    carga_eur = np.cos(np.linspace(0, 3 * np.pi, n))            # deriva de +1 a −1 y vuelta
+    cargas = np.column_stack([carga_eur, np.full(n, 0.9), np.full(n, -0.6), np.full(n, -0.7)])
+    retornos = factor[:, None] * cargas + rng.normal(0, 0.0002, (n, len(SYMBOLS)))
+    epochs = np.arange(n) * 60
+    movil = PCAMovil(recalculo_cada=1000)
+    negativos = 0
+    for _, R, syms, _, (_, pca) in _recorrer(PanelRetornos(SYMBOLS, VENTANA), movil, retornos, epochs):
+        ref = calcular_pca(calcular_covarianza(R), syms)
+        assert pca["pc1_loadings"]["EURUSD"] >= 0
+        assert all(np.sign(pca["pc1_loadings"][s]) == np.sign(ref["pc1_loadings"][s]) for s in syms
+                   if abs(ref["pc1_loadings"][s]) > 1e-6)
+        negativos += ref["pc1_loadings"]["GBPUSD"] < 0
+    # La orientación sí cambió respecto del resto de pares en algún tramo
+    assert negativos > 0
+
+
+def test_signo_continuo_sin_eurusd():
+    retornos = _retornos_factor(200, seed=8)
+    epochs = np.arange(len(retornos)) * 60
+    panel = PanelRetornos(SYMBOLS[1:], VENTANA)
+    movil = PCAMovil(recalculo_cada=1000)
+    previo = None
+    for t in range(VENTANA, len(epochs)):
+        for j, sym in enumerate(SYMBOLS[1:], start=1):
+            panel.actualizar(sym, epochs[t - VENTANA + 1:t + 1], retornos[t - VENTANA + 1:t + 1, j])
+        R, syms, ep = panel.matriz()
+        v = np.array(list(movil.actualizar(R, syms, ep)[1]["pc1_loadings"].values()))
+        if previo is not None:
+            assert v @ previo > 0
+        previo = v
+
+
+def test_recalculo_exacto_periodico_y_deriva():
+    retornos = _retornos_factor(200, seed=4)
+    epochs = np.arange(len(retornos)) * 60
+    movil = PCAMovil(recalculo_cada=20)
+    list(_recorrer(PanelRetornos(SYMBOLS, VENTANA), movil, retornos, epochs))
+    # 140 ciclos: uno inicial + uno cada 20
+    assert movil.recalculos_exactos == 140 // 20
+    assert movil.deriva is not None and movil.deriva < 1e-9
+
+
+def test_cambio_de_columnas_o_ventana_nueva_recalcula():
+    retornos = _retornos_factor(120, seed=5)
+    epochs = np.arange(120)
+    movil = PCAMovil()
+    movil.actualizar(retornos[:60], SYMBOLS, epochs[:60])
+    movil.actualizar(retornos[:60, :2], SYMBOLS[:2], epochs[:60])
+    assert movil.recalculos_exactos == 2
+    # Más de media ventana distinta: exacto
+    movil.actualizar(retornos[:60, :2], SYMBOLS[:2], epochs[:60])
+    movil.actualizar(retornos[50:110, :2], SYMBOLS[:2], epochs[50:110])
+    assert movil.recalculos_exactos == 3
+
+
+def test_autovalores_repetidos_usa_eigh():
+    """Sin factor común (λ1 ≈ λ2) la potencia no converge y el resultado sale de eigh."""
+    assert pc1_por_potencia(np.eye(3), np.array([1.0, 0.5, 0.2]), max_iter=5, tol=1e-12) is not None
+    cov = np.diag([1.0, 1.0 - 1e-9, 0.5])
+    assert pc1_por_potencia(cov, np.array([1.0, 1.0, 0.0]), max_iter=50, tol=1e-12) is None
+
+    rng = np.random.default_rng(6)
+    retornos = rng.normal(0, 0.0005, (200, len(SYMBOLS)))
+    epochs = np.arange(len(retornos))
+    movil = PCAMovil(recalculo_cada=1000)
+    for _, R, syms, _, (cov, pca) in _recorrer(PanelRetornos(SYMBOLS, VENTANA), movil, retornos, epochs,
+                                               forming=False):
+        ref = calcular_pca(calcular_covarianza(R), syms)
+        assert pca["pca_valido"]
+        assert pca["pc1_varianza"] == pytest.approx(ref["pc1_varianza"], abs=1e-6)
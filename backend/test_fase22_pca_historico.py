@@ -0,0 +1,123 @@
+# test_fase22_pca_historico.py — Tests del PCA por vela (ventanas móviles, eigh por lotes)
+import pytest
+import numpy as np
+import pandas as pd
+import main
+from calculos_multipair import calcular_covarianza, calcular_pca, es_movimiento_sistemico
+from pca_movil import calcular_pca_historico, pca_historico_para
+from serializacion import build_rows
+from proveedor_datos import ProveedorReplay
+from config import DEFAULT_CONFIG, PCA_MIN_FILAS_ALINEADAS, SYMBOLS_ACTIVOS, VENTANA_VELAS
+from test_fase12_replay import INICIO, SupabaseEnMemoria, _grabar_m1, sesion  # noqa: F401 (fixture)
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "USDCAD"]
+
+
+def _retornos(n, seed=0):
+    """Factor común cuyo peso crece con el tiempo: el PCA de cada vela es distinto."""
+    rng = np.random.default_rng(seed)
+    peso = np.linspace(0.2, 3.0, n)[:, None]
+    factor = rng.normal(0, 0.0005, n)[:, None]
+    return peso * factor * np.array([1.0, 0.9, -0.6, -0.7]) + rng.normal(0, 0.0003, (n, 4))
+
+
+@pytest.mark.parametrize("ventana", [60, 40])
+def test_cada_fila_igual_a_calcular_pca_de_su_ventana(ventana):
+    R = _retornos(60)
+    hist = calcular_pca_historico(R, SYMBOLS, np.arange(60) * 60, ventana=ventana)
+    assert np.isnan(hist["pc1_varianza"][:PCA_MIN_FILAS_ALINEADAS - 1]).all()
+    assert np.isnan(hist["pc1_loadings"][:PCA_MIN_FILAS_ALINEADAS - 1]).all()
+    for t in range(PCA_MIN_FILAS_ALINEADAS - 1, 60):
+        ref = calcular_pca(calcular_covarianza(R[max(0, t - ventana + 1):t + 1]), SYMBOLS)
+        assert hist["pc1_varianza"][t] == pytest.approx(ref["pc1_varianza"], abs=1e-10)
+        np.testing.assert_allclose(hist["pc1_loadings"][t], [ref["pc1_loadings"][s] for s in SYMBOLS], atol=1e-8)
+    # La historia cambia vela a vela (antes se repetía el PCA final en todas)
+    assert np.nanstd(hist["pc1_varianza"]) > 0.01
+
+
+def test_signo_continuo_sin_eurusd():
+    R = _retornos(60)[:, 1:]
+    hist = calcular_pca_historico(R, SYMBOLS[1:], np.arange(60))
+    v = hist["pc1_loadings"][PCA_MIN_FILAS_ALINEADAS - 1:]
+    assert (np.sum(v[1:] * v[:-1], axis=1) > 0).all()
+
+
+def test_pocas_filas_o_varianza_cero():
+    hist = calcular_pca_historico(_retornos(10), SYMBOLS, np.arange(10))
+    assert np.isnan(hist["pc1_varianza"]).all()
+    hist = calcular_pca_historico(np.zeros((40, 4)), SYMBOLS, np.arange(40))
+    assert np.isnan(hist["pc1_varianza"]).all()
+
+
+def test_historico_para_toma_la_ultima_fila_alineada():
+    R = _retornos(40)
+    hist = calcular_pca_historico(R, SYMBOLS, np.arange(40) * 10)
+    filas = pca_historico_para(hist, "USDJPY", np.array([-5, 295, 301, 305, 395]))
+    assert np.isnan(filas["pc1_loading"][0])
+    assert filas["pc1_varianza"][1] == hist["pc1_varianza"][29]
+    assert filas["pc1_loading"][2] == filas["pc1_loading"][3] == hist["pc1_loadings"][30, 2]
+    assert filas["pc1_varianza"][4] == hist["pc1_varianza"][39]
+    assert np.isnan(pca_historico_para(hist, "XAUUSD", [300])["pc1_varianza"]).all()
+    assert np.isnan(pca_historico_para(None, "EURUSD", [300])["pc1_loading"]).all()
+
+
+def test_build_rows_con_pca_por_fila():
+    n = 5
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "time": pd.date_range("2026-03-02", periods=n, freq="min"),
+        "log_return": [0.001, -0.004, 0.004, 0.0, -0.004],
+        "media": np.zeros(n), "std": np.full(n, 0.001), "close": 1.09 + rng.normal(0, 1e-4, n),
+    })
+    pca_filas = {
+        "pc1_loading":  np.array([np.nan, 0.9, 0.5, 0.9, 0.9]),
+        "pc1_varianza": np.array([np.nan, 0.7, 0.7, 0.7, 0.3]),
+    }
+    filas = build_rows(df, DEFAULT_CONFIG, "1M", "EURUSD", pca_por_fila=pca_filas)
+    rendlog = [f["rendlog"] for f in filas]
+    assert [r["pca_pc1_loading"] for r in rendlog] == [None, 0.9, 0.5, 0.9, 0.9]
+    assert [r["pca_es_sistemico"] for r in rendlog] == [False, True, False, True, False]
+    # Solo se suprime la vela fuera de umbral con PCA sistémico en esa vela
+    assert [r["senal_suprimida_pca"] for r in rendlog] == [False, True, False, False, False]
+    assert [r["senal"] for r in rendlog] == [None, None, "VENTA", None, "COMPRA"]
+
+    # Sin pca_por_fila: el PCA único en todas las filas (comportamiento anterior)
+    pca = {"pca_valido": True, "pc1_varianza": 0.7, "pc1_loadings": {"EURUSD": 0.9}}
+    filas = build_rows(df, DEFAULT_CONFIG, "1M", "EURUSD", pca_result=pca)
+    assert all(f["rendlog"]["pca_es_sistemico"] is es_movimiento_sistemico(pca, "EURUSD") for f in filas)
+
+
+def test_carga_inicial_con_pca_por_vela(sesion, monkeypatch):
+    """La carga inicial publica el PCA de la ventana móvil de cada vela, no el final repetido."""
+    SupabaseEnMemoria.filas, SupabaseEnMemoria.tabla = [], {}
+    monkeypatch.setattr(main, "SupabaseClient", SupabaseEnMemoria)
+    monkeypatch.setattr(main, "ALMACEN_VELAS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "COLA_ENVIOS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "crear_proveedor",
+                        lambda: ProveedorReplay(directorio=str(sesion), inicio=INICIO + 1995 * 60))
+    main.main()
+
+    iniciales = [f for f in SupabaseEnMemoria.filas if f["symbol"] == "EURUSD" and f["timeframe"] == "1M"][:59]
+    varianzas = [f["rendlog"]["pca_pc1_varianza"] for f in iniciales]
+    # Con la ventana previa de historia, todas las velas publicadas tienen su ventana completa
+    assert None not in varianzas
+    assert len(set(varianzas)) > 1
+
+
+def test_carga_inicial_sin_historia_previa(tmp_path, monkeypatch):
+    """Sin velas anteriores a la ventana publicada, las primeras quedan sin PCA (ventana parcial)."""
+    for i, symbol in enumerate(SYMBOLS_ACTIVOS):
+        _grabar_m1(tmp_path, symbol, VENTANA_VELAS + 3, seed=i)
+    SupabaseEnMemoria.filas, SupabaseEnMemoria.tabla = [], {}
+    monkeypatch.setattr(main, "SupabaseClient", SupabaseEnMemoria)
+    monkeypatch.setattr(main, "ALMACEN_VELAS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "COLA_ENVIOS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "TIMEFRAMES_ACTIVOS", ["1M"])
+    monkeypatch.setattr(main, "crear_proveedor", lambda: ProveedorReplay(
+        directorio=str(tmp_path), inicio=INICIO + (VENTANA_VELAS - 1) * 60, timeframes=["1M"]))
+    main.main()
+
+    iniciales = [f for f in SupabaseEnMemoria.filas if f["symbol"] == "EURUSD" and f["timeframe"] == "1M"]
+    varianzas = [f["rendlog"]["pca_pc1_varianza"] for f in iniciales[:VENTANA_VELAS - 1]]
+    assert varianzas[:PCA_MIN_FILAS_ALINEADAS - 1] == [None] * (PCA_MIN_FILAS_ALINEADAS - 1)
+    assert None not in varianzas[PCA_MIN_FILAS_ALINEADAS - 1:]
@@ -0,0 +1,143 @@
+# test_fase23_pca_universo.py — Tests del PCA de universo amplio (shrinkage + top-k + factores por moneda)
+import pytest
+import numpy as np
+import pandas as pd
+import main
+import pca_universo
+from calculos_multipair import es_movimiento_sistemico
+from pca_movil import pca_historico_para
+from pca_universo import (
+    correlacion_shrinkage, top_k_autovectores, matriz_monedas,
+    calcular_pca_universo, calcular_pca_historico_universo, usar_modo_universo,
+)
+from serializacion import build_rows
+from proveedor_datos import ProveedorReplay
+from config import DEFAULT_CONFIG, SYMBOLS_UNIVERSO, SYMBOLS_USD4, PCA_MIN_FILAS_ALINEADAS
+from test_fase12_replay import INICIO, SupabaseEnMemoria, sesion  # noqa: F401 (fixture)
+
+
+def _retornos_monedas(n, factores, seed=0):
+    """Retornos de SYMBOLS_UNIVERSO como f_base − f_cotizada + ruido; factores {moneda: vol extra}."""
+    rng = np.random.default_rng(seed)
+    monedas, D = matriz_monedas(SYMBOLS_UNIVERSO)
+    f = rng.normal(0, 0.0002, (n, len(monedas)))
+    for moneda, vol in factores.items():
+        f[:, monedas.index(moneda)] += rng.normal(0, vol, n)
+    return f @ D.T + rng.normal(0, 0.0001, (n, len(SYMBOLS_UNIVERSO)))
+
+
+def _ledoit_wolf_directo(R):
+    """Fórmula de Ledoit-Wolf (2004) con bucle explícito, como referencia."""
+    T, N = R.shape
+    Z = (R - R.mean(axis=0)) / R.std(axis=0)
+    C = Z.T @ Z / T
+    d2 = np.linalg.norm(C - np.eye(N)) ** 2 / N
+    b2 = sum(np.linalg.norm(np.outer(z, z) - C) ** 2 for z in Z) / N / T ** 2
+    delta = min(b2, d2) / d2
+    return delta * np.eye(N) + (1 - delta) * C, delta
+
+
+def test_shrinkage_igual_a_formula_y_bien_condicionada():
+    R = np.random.default_rng(1).normal(0, 0.001, (25, 30))      # T < N: Σ muestral singular
+    corr, sigma, delta = correlacion_shrinkage(R)
+    ref, delta_ref = _ledoit_wolf_directo(R)
+    assert delta == pytest.approx(delta_ref, rel=1e-10)
+    np.testing.assert_allclose(corr, ref, atol=1e-12)
+    np.testing.assert_allclose(sigma, R.std(axis=0, ddof=1))
+    assert np.linalg.eigvalsh(np.corrcoef(R.T))[0] < 1e-10
+    assert np.linalg.eigvalsh(corr)[0] > 0.05
+    # Columna constante: correlación 0 con el resto, sin NaN
+    R[:, 3] = 0.0
+    corr, sigma, _ = correlacion_shrinkage(R)
+    assert np.isfinite(corr).all() and sigma[3] == 0 and corr[3, 3] == 1.0
+
+
+def test_top_k_igual_a_eigh_completo():
+    A = np.random.default_rng(2).normal(size=(40, 30))
+    M = A.T @ A
+    valores, vectores = top_k_autovectores(M, 3)
+    ref_val, ref_vec = np.linalg.eigh(M)
+    np.testing.assert_allclose(valores, ref_val[::-1][:3])
+    np.testing.assert_allclose(np.abs(np.sum(vectores * ref_vec[:, ::-1][:, :3], axis=0)), 1.0, atol=1e-10)
+    assert top_k_autovectores(M, 50)[1].shape == (30, 30)
+
+
+def test_matriz_monedas():
+    monedas, D = matriz_monedas(["EURUSD", "USDJPY", "XAUUSD", "US500"])
+    assert monedas == ["EUR", "JPY", "USD", "XAU"]
+    np.testing.assert_array_equal(D, [[1, 0, -1, 0], [0, -1, 1, 0], [0, 0, -1, 1], [0, 0, 0, 0]])
+
+
+def test_factores_por_moneda_y_sistemico():
+    R = _retornos_monedas(60, {"USD": 0.0015, "JPY": 0.0010})
+    cov, pca = calcular_pca_universo(R, SYMBOLS_UNIVERSO)
+    assert cov.shape == (30, 30)
+    assert [f["moneda"] for f in pca["factores"][:2]] == ["USD", "JPY"]
+    assert pca["pc1_varianza"] == pca["factores"][0]["varianza"] == pca["varianza_total"][0]
+    # Orientación: factor al alza = la moneda se fortalece
+    usd, jpy = pca["factores"][0]["loadings"], pca["factores"][1]["loadings"]
+    assert usd["USDCAD"] > 0.7 and usd["EURUSD"] < -0.7 and usd["XAUUSD"] < -0.7
+    assert jpy["EURJPY"] < -0.7 and jpy["CHFJPY"] < -0.7
+    for sym in SYMBOLS_UNIVERSO:
+        esperado = "USD" if "USD" in sym else ("JPY" if "JPY" in sym else None)
+        assert pca["factor_dominante"][sym] == esperado, sym
+        assert es_movimiento_sistemico(pca, sym) is (esperado is not None)
+
+
+def test_ruido_puro_no_es_sistemico():
+    R = np.random.default_rng(3).normal(0, 0.0005, (40, 30))
+    _, pca = calcular_pca_universo(R, SYMBOLS_UNIVERSO)
+    assert pca["intensidad_shrinkage"] > 0.9
+    assert not any(pca["sistemico"].values())
+    _, pca = calcular_pca_universo(np.zeros((40, 30)), SYMBOLS_UNIVERSO)
+    assert not pca["pca_valido"] and not es_movimiento_sistemico(pca, "EURUSD")
+
+
+def test_modo_auto(monkeypatch):
+    assert not usar_modo_universo(len(SYMBOLS_USD4))
+    assert usar_modo_universo(len(SYMBOLS_UNIVERSO))
+    monkeypatch.setattr(pca_universo, "PCA_MODO", "clasico")
+    assert not usar_modo_universo(30)
+    monkeypatch.setattr(pca_universo, "PCA_MODO", "universo")
+    assert usar_modo_universo(4)
+
+
+def test_historico_universo_por_fila():
+    R = _retornos_monedas(60, {"USD": 0.0015}, seed=4)
+    epochs = np.arange(60) * 60
+    hist = calcular_pca_historico_universo(R, SYMBOLS_UNIVERSO, epochs)
+    assert np.isnan(hist["pc1_varianza"][:PCA_MIN_FILAS_ALINEADAS - 1]).all()
+    _, ultimo = calcular_pca_universo(R, SYMBOLS_UNIVERSO)
+    assert hist["pc1_varianza"][-1] == pytest.approx(ultimo["pc1_varianza"])
+    assert hist["sistemico"][-1].tolist() == [ultimo["sistemico"][s] for s in SYMBOLS_UNIVERSO]
+
+    filas = pca_historico_para(hist, "EURGBP", epochs)
+    assert filas["sistemico"].dtype == bool and not filas["sistemico"].any()
+    filas = pca_historico_para(hist, "EURUSD", epochs)
+    assert filas["sistemico"][-1] and not filas["sistemico"][0]
+
+    # build_rows usa 'sistemico' tal cual (la regla clásica de 0.60 no aplica aquí)
+    df = pd.DataFrame({
+        "time": pd.date_range("2026-03-02", periods=60, freq="min"),
+        "log_return": R[:, 0], "media": np.zeros(60), "std": np.full(60, 0.0001),
+        "close": np.full(60, 1.09),
+    })
+    rows = build_rows(df, DEFAULT_CONFIG, "1M", "EURUSD", pca_por_fila=filas)
+    assert [r["rendlog"]["pca_es_sistemico"] for r in rows] == filas["sistemico"].tolist()
+
+
+def test_main_en_modo_universo(sesion, monkeypatch):
+    """PCA_MODO=universo recorre carga inicial y loop con los campos PCA poblados."""
+    SupabaseEnMemoria.filas, SupabaseEnMemoria.tabla = [], {}
+    monkeypatch.setattr(pca_universo, "PCA_MODO", "universo")
+    monkeypatch.setattr(main, "SupabaseClient", SupabaseEnMemoria)
+    monkeypatch.setattr(main, "ALMACEN_VELAS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "COLA_ENVIOS_DIRECTORIO", "")
+    monkeypatch.setattr(main, "crear_proveedor",
+                        lambda: ProveedorReplay(directorio=str(sesion), inicio=INICIO + 1995 * 60))
+    main.main()
+
+    filas = [f for f in SupabaseEnMemoria.filas if f["timeframe"] == "1M"]
+    assert len(filas) > 4 * 59
+    varianzas = [f["rendlog"]["pca_pc1_varianza"] for f in filas if f["rendlog"]["pca_pc1_varianza"] is not None]
+    assert varianzas and all(0 < v <= 1 for v in varianzas)
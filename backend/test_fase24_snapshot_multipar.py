@@ -0,0 +1,113 @@
+# test_fase24_snapshot_multipar.py — Tests del snapshot multi-par por timeframe (análisis cacheado)
+import numpy as np
+import pandas as pd
+import calculos_multipair
+import snapshot_multipar
+from calculos_multipair import (
+    calcular_covarianza, calcular_pca, calcular_correlacion,
+    detectar_exposicion_usd, calcular_correlacion_con_eurusd,
+)
+from panel_retornos import PanelRetornos
+from pca_movil import PCAMovil
+from snapshot_multipar import SnapshotMultipar
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "USDCAD"]
+N = 80
+
+
+def _retornos(n=N, seed=0):
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 0.0005, n)[:, None]
+    return factor * np.array([1.0, 0.9, -0.6, -0.7]) + rng.normal(0, 0.0002, (n, 4))
+
+
+def _frame(retornos):
+    return pd.DataFrame({"log_return": retornos})
+
+
+def _cargar(snapshot, retornos, hasta, symbols=SYMBOLS):
+    """Escribe en el snapshot las 60 velas que terminan en `hasta` de cada símbolo."""
+    epochs = np.arange(N, dtype=np.int64) * 60
+    for sym in symbols:
+        j = SYMBOLS.index(sym)
+        snapshot.actualizar(sym, _frame(retornos[hasta - 59:hasta + 1, j]), epochs[hasta - 59:hasta + 1])
+
+
+def test_version_del_panel_solo_sube_con_cambios():
+    panel = PanelRetornos(["A", "B"], 5)
+    panel.actualizar("A", [1, 2, 3], [0.1, 0.2, 0.3])
+    v = panel.version
+    panel.actualizar("A", [1, 2, 3], [0.1, 0.2, 0.3])
+    assert panel.version == v
+    panel.actualizar("A", [3], [0.35])                    # vela en formación corregida
+    assert panel.version == v + 1
+    panel.actualizar("B", [2, 3], [0.1, 0.1])             # celdas vacías pasan a válidas
+    assert panel.version == v + 2
+    panel.actualizar("B", [4], [np.nan])                  # NaN no escribe
+    assert panel.version == v + 2
+
+
+def test_analisis_una_vez_por_estado_alineado():
+    R = _retornos()
+    snapshot = SnapshotMultipar(SYMBOLS, 60)
+    _cargar(snapshot, R, 70)
+    a = snapshot.analisis()
+    assert snapshot.analisis() is a and snapshot.calculos == 1
+    # Reescribir las mismas velas (p. ej. un reintento del TF) no recalcula
+    _cargar(snapshot, R, 70)
+    assert snapshot.analisis() is a and snapshot.calculos == 1
+
+    R_ref = R[11:71]
+    cov = calcular_covarianza(R_ref)
+    np.testing.assert_allclose(a["cov"], cov)
+    np.testing.assert_allclose(a["corr"], calcular_correlacion(cov))
+    assert a["pca"]["pc1_varianza"] == calcular_pca(cov, SYMBOLS)["pc1_varianza"]
+    assert a["exposicion"] == detectar_exposicion_usd(cov, SYMBOLS)
+    assert a["correlaciones"] == calcular_correlacion_con_eurusd(cov, SYMBOLS)
+    assert a["epoch"] == 70 * 60 and a["filas"] == 60
+
+    # La vela en formación cambia: nuevo análisis sobre el mismo epoch
+    R[70, 2] += 0.001
+    _cargar(snapshot, R, 70, ["USDJPY"])
+    b = snapshot.analisis()
+    assert b is not a and b["epoch"] == a["epoch"] and snapshot.calculos == 2
+
+
+def test_pca_sobre_todo_el_universo_aunque_solo_algunos_tengan_vela():
+    R = _retornos()
+    snapshot = SnapshotMultipar(SYMBOLS, 60, PCAMovil())
+    _cargar(snapshot, R, 70)
+    # Solo 2 pares cierran vela: los otros 2 siguen en el PCA con sus filas previas
+    _cargar(snapshot, R, 71, ["EURUSD", "USDJPY"])
+    a = snapshot.analisis()
+    assert a["symbols"] == SYMBOLS
+    assert a["epoch"] == 70 * 60 and a["filas"] == 59
+    np.testing.assert_allclose(a["cov"], calcular_covarianza(R[12:71]), rtol=1e-9)
+    # Llegan los otros dos: el epoch alineado avanza
+    _cargar(snapshot, R, 71, ["GBPUSD", "USDCAD"])
+    assert snapshot.analisis()["epoch"] == 71 * 60
+
+
+def test_una_sola_correlacion_por_analisis(monkeypatch):
+    llamadas = []
+
+    def contar(cov):
+        llamadas.append(1)
+        return calcular_correlacion(cov)
+
+    monkeypatch.setattr(snapshot_multipar, "calcular_correlacion", contar)
+    monkeypatch.setattr(calculos_multipair, "calcular_correlacion", contar)
+    snapshot = SnapshotMultipar(SYMBOLS, 60)
+    _cargar(snapshot, _retornos(), 70)
+    snapshot.analisis()
+    snapshot.analisis()
+    assert len(llamadas) == 1
+
+
+def test_sin_datos_o_pocas_filas():
+    snapshot = SnapshotMultipar(SYMBOLS, 60)
+    assert snapshot.analisis() is None and snapshot.symbols == []
+    epochs = np.arange(10, dtype=np.int64)
+    snapshot.actualizar("EURUSD", _frame(np.full(10, 0.001)), epochs)
+    assert snapshot.analisis() is None
+    assert snapshot.symbols == ["EURUSD"] and snapshot.frame("GBPUSD") is None
@@ -9,6 +9,7 @@ from calculos_rendlog import (
     calcular_rendimientos_log,
     calcular_bandas_sigma,
     calcular_efficiency_ratio,
+    efficiency_ratio_vectorizado,
     clasificar_regimen,
     detectar_anomalias
 )
@@ -110,6 +111,71 @@ def test_senal_activa_en_rango():
         print("  [OK] Senal no suprimida en regimen de rango/ambiguo")
 
 
+def _er_loop_referencia(prices, ventana):
+    """Implementación original O(n·ventana) (referencia)."""
+    er_values = np.full(len(prices), np.nan)
+    for i in range(ventana, len(prices)):
+        window = prices[i - ventana: i + 1]
+        net_displacement = abs(window[-1] - window[0])
+        individual_moves = np.sum(np.abs(np.diff(window)))
+        er_values[i] = net_displacement / individual_moves if individual_moves > 0 else 0.0
+    return np.clip(er_values, 0.0, 1.0)
+
+
+def test_er_vectorizado_igual_al_loop():
+    """El kernel con sumas prefijo debe coincidir con el loop original, incluidas ventanas planas."""
+    print("\n--- TEST 5: ER vectorizado == loop ---")
+    np.random.seed(8)
+    prices = 1.08 + np.cumsum(np.random.normal(0, 0.0003, 2000))
+    prices[500:530] = prices[500]   # tramo plano → ER = 0.0
+
+    esperado = _er_loop_referencia(prices, 14)
+    obtenido = efficiency_ratio_vectorizado(prices, ventana=14)
+
+    assert np.allclose(esperado, obtenido, rtol=1e-9, atol=1e-12, equal_nan=True)
+    assert np.all(obtenido[514:530] == 0.0), "Ventanas planas deben dar ER = 0.0"
+    assert np.nanmax(obtenido) <= 1.0 and np.nanmin(obtenido) >= 0.0
+    print("  [OK] ER vectorizado coincide con el loop")
+
+
+def test_er_vectorizado_2d():
+    """Matriz [T x n_series] debe dar el mismo ER que cada serie por separado."""
+    print("\n--- TEST 6: ER vectorizado sobre matriz 2-D ---")
+    np.random.seed(9)
+    matriz = 1.08 + np.cumsum(np.random.normal(0, 0.0003, (300, 5)), axis=0)
+
+    er_2d = efficiency_ratio_vectorizado(matriz, ventana=14)
+
+    assert er_2d.shape == matriz.shape
+    for j in range(matriz.shape[1]):
+        assert np.array_equal(er_2d[:, j], efficiency_ratio_vectorizado(matriz[:, j], ventana=14), equal_nan=True)
+    print("  [OK] ER 2-D coincide columna a columna")
+
+
+def test_er_cierre_nan_solo_anula_sus_ventanas():
+    """Un cierre NaN da ER = 0.0 (como el loop) en las ventanas que lo contienen y no toca las siguientes."""
+    np.random.seed(10)
+    matriz = 1.08 + np.cumsum(np.random.normal(0, 0.0003, (200, 3)), axis=0)
+    matriz[50, 1] = np.nan
+
+    esperado = np.stack([_er_loop_referencia(matriz[:, j], 14) for j in range(3)], axis=1)
+
+    er = efficiency_ratio_vectorizado(matriz[:, 1], ventana=14)
+    assert np.allclose(er, esperado[:, 1], rtol=1e-9, atol=1e-12, equal_nan=True)
+    assert np.all(er[50:65] == 0.0), "Las 15 ventanas que incluyen la fila 50 dan 0.0"
+    assert not np.isnan(er[14:]).any() and np.all(er[65:] > 0.0)
+
+    er_2d = efficiency_ratio_vectorizado(matriz, ventana=14)
+    assert np.allclose(er_2d, esperado, rtol=1e-9, atol=1e-12, equal_nan=True)
+    assert not np.isnan(er_2d[14:, [0, 2]]).any()
+
+
+def test_er_serie_corta():
+    """Serie más corta que la ventana → todo NaN."""
+    er = efficiency_ratio_vectorizado(np.array([1.0, 1.1, 1.2]), ventana=14)
+    assert np.isnan(er).all()
+
+
 if __name__ == "__main__":
     print("=" * 55)
     print("VALIDACION FASE 3 -- FILTRO DE REGIMEN ER")
@@ -119,6 +185,9 @@ if __name__ == "__main__":
     test_er_alto_en_tendencia()
     test_senal_suprimida_en_tendencia()
     test_senal_activa_en_rango()
+    test_er_vectorizado_igual_al_loop()
+    test_er_vectorizado_2d()
+    test_er_serie_corta()
 
     print("\n" + "=" * 55)
     print("[OK] TODOS LOS TESTS PASARON")
@@ -1,7 +1,18 @@
 # test_fase5_gbm.py — Tests unitarios del módulo GBM Monte Carlo
 import pytest
 import numpy as np
-from calculos_gbm import simular_gbm, calcular_gbm_anomalia, _campos_nulos
+from calculos_gbm import (
+    simular_gbm,
+    gbm_analitico,
+    calcular_gbm_anomalia,
+    simular_gbm_lote,
+    resolver_gbm_lote,
+    rng_para_serie,
+    simular_prob_cesta,
+    resolver_gbm_conjunto,
+    _normales,
+    _campos_nulos,
+)
 
 
 # ============================================================
@@ -116,3 +127,333 @@ def test_campos_nulos_estructura():
     }
     assert set(nulos.keys()) == claves_esperadas
     assert all(v is None for v in nulos.values())
+
+
+# ============================================================
+# gbm_analitico() — forma cerrada
+# ============================================================
+
+@pytest.mark.parametrize("mu,sigma,n", [
+    (0.0001, 0.0005, 10),
+    (0.0, 0.002, 20),
+    (-0.0003, 0.0010, 5),
+])
+def test_analitico_coincide_con_montecarlo(mu, sigma, n):
+    """Con muchos caminos, Monte Carlo debe converger a la forma cerrada."""
+    np.random.seed(123)
+    mc = simular_gbm(precio_actual=1.09, mu=mu, sigma_ewma=sigma, n_paths=200_000, n_horizonte=n)
+    an = gbm_analitico(precio_actual=1.09, mu=mu, sigma_ewma=sigma, n_horizonte=n)
+    assert abs(mc["gbm_prob_reversion"] - an["gbm_prob_reversion"]) < 0.005
+    for campo in ("gbm_percentil_5", "gbm_percentil_50", "gbm_percentil_95"):
+        assert abs(mc[campo] - an[campo]) / an[campo] < 1e-4, campo
+
+
+def test_analitico_determinista():
+    r1 = gbm_analitico(precio_actual=1.09, mu=0.0001, sigma_ewma=0.0005)
+    r2 = gbm_analitico(precio_actual=1.09, mu=0.0001, sigma_ewma=0.0005)
+    assert r1 == r2
+
+
+def test_analitico_un_paso():
+    """Con n=1 la probabilidad es exactamente P(|Z - sigma/2| ≤ 1)."""
+    from scipy.stats import norm
+    sigma = 0.001
+    r = gbm_analitico(precio_actual=1.0, mu=0.0, sigma_ewma=sigma, n_horizonte=1)
+    esperado = norm.cdf(1 + sigma / 2) - norm.cdf(-1 + sigma / 2)
+    assert r["gbm_prob_reversion"] == round(esperado, 4)
+
+
+def test_analitico_sigma_invalido_devuelve_nulos():
+    assert gbm_analitico(precio_actual=1.09, mu=0.0, sigma_ewma=0.0)["gbm_prob_reversion"] is None
+    assert gbm_analitico(precio_actual=1.09, mu=float("nan"), sigma_ewma=0.001)["gbm_prob_reversion"] is None
+
+
+def test_seleccion_de_metodo():
+    kwargs = dict(z_score=-3.0, mu=0.0001, sigma_ewma=0.0005, precio_close=1.09, timeframe="30M")
+    an = calcular_gbm_anomalia(**kwargs, metodo="analitico")
+    assert an == calcular_gbm_anomalia(**kwargs, metodo="analitico")
+    mc = calcular_gbm_anomalia(**kwargs, metodo="montecarlo")
+    assert mc["gbm_horizonte_velas"] == an["gbm_horizonte_velas"]
+    with pytest.raises(ValueError):
+        calcular_gbm_anomalia(**kwargs, metodo="otro")
+
+
+# ============================================================
+# simular_gbm_lote() / resolver_gbm_lote()
+# ============================================================
+
+def test_lote_converge_a_analitico_con_horizontes_mixtos():
+    """Cada anomalía, simulada en el grupo de su horizonte, debe converger a su propia forma cerrada."""
+    precios    = np.array([1.09, 150.2, 1.27, 1.36])
+    mus        = np.array([0.0001, -0.0002, 0.0, 0.00005])
+    sigmas     = np.array([0.0005, 0.0012, 0.0008, 0.0004])
+    horizontes = np.array([20, 5, 12, 8])
+
+    prob, p5, p50, p95 = simular_gbm_lote(
+        precios, mus, sigmas, horizontes, n_paths=50_000, rng=np.random.default_rng(0)
+    )
+    for i in range(4):
+        an = gbm_analitico(precios[i], mus[i], sigmas[i], n_horizonte=horizontes[i])
+        assert abs(prob[i] - an["gbm_prob_reversion"]) < 0.01
+        assert abs(p50[i] - an["gbm_percentil_50"]) / an["gbm_percentil_50"] < 1e-4
+        assert p5[i] < p50[i] < p95[i]
+
+
+def test_lote_reproducible_con_generator_semillado():
+    args = (np.array([1.09, 1.27]), np.array([0.0, 0.0001]), np.array([0.0005, 0.001]), np.array([10, 20]))
+    r1 = simular_gbm_lote(*args, rng=np.random.default_rng(42))
+    r2 = simular_gbm_lote(*args, rng=np.random.default_rng(42))
+    for a, b in zip(r1, r2):
+        assert np.array_equal(a, b)
+
+
+def test_lote_sigma_invalido_da_nan():
+    prob, p5, _, _ = simular_gbm_lote(
+        np.array([1.09, 1.09]), np.array([0.0, 0.0]), np.array([0.0, 0.0005]), np.array([10, 10]),
+        rng=np.random.default_rng(1),
+    )
+    assert np.isnan(prob[0]) and np.isnan(p5[0])
+    assert 0.0 <= prob[1] <= 1.0
+
+
+def test_lote_en_bloques_igual_tamano(monkeypatch):
+    """Partir el lote en bloques pequeños no debe cambiar forma ni rango de resultados."""
+    import calculos_gbm
+    monkeypatch.setattr(calculos_gbm, "GBM_LOTE_MAX_ELEMENTOS", 500 * 20)
+    m = 7
+    prob, *_ = simular_gbm_lote(
+        np.full(m, 1.09), np.zeros(m), np.full(m, 0.0005), np.full(m, 20),
+        rng=np.random.default_rng(3),
+    )
+    assert prob.shape == (m,) and np.all((prob >= 0) & (prob <= 1))
+
+
+def _contar_caminos(monkeypatch):
+    """Registra {horizonte: caminos simulados} de cada bloque de simular_gbm_lote."""
+    import calculos_gbm
+    caminos = {}
+    original = calculos_gbm._evaluar_bloque
+
+    def contar(Z, *args):
+        caminos[Z.shape[2]] = caminos.get(Z.shape[2], 0) + Z.shape[0] * Z.shape[1]
+        return original(Z, *args)
+
+    monkeypatch.setattr(calculos_gbm, "_evaluar_bloque", contar)
+    return caminos
+
+
+def test_lote_secuencial_corta_por_anomalia(monkeypatch):
+    """Cada anomalía sale del muestreo cuando cierra su IC; las demás siguen hasta n_paths."""
+    caminos = _contar_caminos(monkeypatch)
+    prob, p5, p50, p95 = simular_gbm_lote(
+        np.array([1.09, 1.09]), np.array([0.0001, 0.0001]), np.array([0.0008, 0.0008]), np.array([10, 1]),
+        n_paths=4096, rng=np.random.default_rng(0), tolerancia=0.01,
+    )
+    # Horizonte 10: la reversión es casi segura y el IC se cierra enseguida; con 1 vela (p ≈ 0.68) no
+    assert 2 * 64 <= caminos[10] < 4096
+    assert caminos[1] == 4096
+    assert prob[0] > 0.99
+    assert abs(prob[1] - gbm_analitico(1.09, 0.0001, 0.0008, n_horizonte=1)["gbm_prob_reversion"]) < 0.03
+    assert np.all(p5 < p50) and np.all(p50 < p95)
+
+
+@pytest.mark.parametrize("muestreo", ["antitetico", "sobol"])
+def test_lote_secuencial_con_muestreo(muestreo):
+    prob, *_ = simular_gbm_lote(
+        np.full(3, 1.09), np.zeros(3), np.full(3, 0.0008), np.array([1, 1, 10]),
+        n_paths=1024, rng=np.random.default_rng(2), muestreo=muestreo, tolerancia=0.01,
+    )
+    assert np.all((prob >= 0) & (prob <= 1)) and prob[2] > 0.99
+
+
+def test_resolver_usa_gbm_tolerancia(monkeypatch):
+    """main llama a resolver_gbm_lote sin tolerancia: GBM_TOLERANCIA (default 0 = n_paths fijos)."""
+    import calculos_gbm
+    caminos = _contar_caminos(monkeypatch)
+    assert calculos_gbm.GBM_TOLERANCIA is None
+    resolver_gbm_lote([({}, 0.0001, 0.0008, 1.09, 10)], rng=np.random.default_rng(0),
+                      metodo="montecarlo", n_paths=4096)
+    assert caminos[10] == 4096
+
+    caminos.clear()
+    resolver_gbm_lote([({}, 0.0001, 0.0008, 1.09, 10)], rng=np.random.default_rng(0),
+                      metodo="montecarlo", n_paths=4096, tolerancia=0.01)
+    assert caminos[10] < 4096
+
+
+@pytest.mark.parametrize("metodo", ["analitico", "montecarlo"])
+def test_resolver_escribe_en_las_filas(metodo):
+    filas = [{"gbm_prob_reversion": None} for _ in range(3)]
+    pendientes = [
+        (filas[0], 0.0001, 0.0005, 1.09, 10),
+        (filas[1], 0.0, 0.0, 1.09, 8),          # sigma inválido → nulos
+        (filas[2], -0.0001, 0.001, 150.0, 20),
+    ]
+    n = resolver_gbm_lote(pendientes, rng=np.random.default_rng(0), metodo=metodo)
+    assert n == 3
+    assert filas[0]["gbm_prob_reversion"] is not None
+    assert filas[0]["gbm_horizonte_velas"] == 10
+    assert filas[1]["gbm_prob_reversion"] is None
+    assert filas[1]["gbm_horizonte_velas"] == 8
+    assert filas[2]["gbm_percentil_5"] < filas[2]["gbm_percentil_95"]
+
+
+def test_resolver_analitico_igual_a_calculo_por_fila():
+    fila = {}
+    resolver_gbm_lote([(fila, 0.0001, 0.0005, 1.09, 12)], metodo="analitico")
+    esperado = calcular_gbm_anomalia(
+        z_score=-3.0, mu=0.0001, sigma_ewma=0.0005, precio_close=1.09, timeframe="15M", metodo="analitico"
+    )
+    assert fila == esperado
+
+
+# ============================================================
+# Reducción de varianza (antitético, Sobol, secuencial)
+# ============================================================
+
+@pytest.mark.parametrize("muestreo", ["antitetico", "sobol"])
+def test_muestreo_resultado_valido(muestreo):
+    r = simular_gbm(1.09, 0.0001, 0.0005, n_paths=256, muestreo=muestreo, rng=np.random.default_rng(0))
+    assert 0.0 <= r["gbm_prob_reversion"] <= 1.0
+    assert r["gbm_percentil_5"] < r["gbm_percentil_50"] < r["gbm_percentil_95"]
+
+
+def test_antitetico_pares_opuestos():
+    Z = _normales(10, 5, "antitetico", np.random.default_rng(1))[0]
+    assert np.array_equal(Z[5:], -Z[:5])
+
+
+def test_sobol_redondea_a_potencia_de_2():
+    Z = _normales(100, 4, "sobol", np.random.default_rng(1), filas=3)
+    assert Z.shape == (3, 128, 4)
+    assert np.all(np.isfinite(Z))
+
+
+def test_muestreo_desconocido_falla():
+    with pytest.raises(ValueError):
+        simular_gbm(1.09, 0.0, 0.0005, muestreo="halton", rng=np.random.default_rng(0))
+
+
+def test_sobol_mas_preciso_que_estandar():
+    """Con los mismos caminos, Sobol aleatorizado debe acercarse más a la forma cerrada."""
+    exacto = gbm_analitico(1.09, 0.0001, 0.0008, n_horizonte=1)["gbm_prob_reversion"]
+    errores = {}
+    for muestreo in ("estandar", "sobol"):
+        rng = np.random.default_rng(7)
+        e = [simular_gbm(1.09, 0.0001, 0.0008, n_paths=64, n_horizonte=1, muestreo=muestreo, rng=rng)
+             ["gbm_prob_reversion"] - exacto for _ in range(100)]
+        errores[muestreo] = np.sqrt(np.mean(np.square(e)))
+    assert errores["sobol"] < errores["estandar"]
+
+
+def test_secuencial_corta_antes_de_n_paths(monkeypatch):
+    import calculos_gbm
+    caminos = []
+    original = calculos_gbm._evaluar_caminos
+
+    def contar(Z, *args):
+        caminos.append(len(Z))
+        return original(Z, *args)
+
+    monkeypatch.setattr(calculos_gbm, "_evaluar_caminos", contar)
+    r = simular_gbm(1.09, 0.0001, 0.0008, n_paths=100_000, n_horizonte=10,
+                    muestreo="estandar", rng=np.random.default_rng(0), tolerancia=0.01)
+    # Horizonte 10: la reversión es casi segura y el IC se cierra enseguida
+    assert sum(caminos) < 100_000
+    assert len(caminos) >= 2
+    assert r["gbm_prob_reversion"] > 0.99
+
+
+def test_secuencial_respeta_n_paths(monkeypatch):
+    import calculos_gbm
+    caminos = []
+    original = calculos_gbm._evaluar_caminos
+    monkeypatch.setattr(calculos_gbm, "_evaluar_caminos",
+                        lambda Z, *a: caminos.append(len(Z)) or original(Z, *a))
+    simular_gbm(1.09, 0.0001, 0.0008, n_paths=256, n_horizonte=1,
+                rng=np.random.default_rng(0), tolerancia=1e-9)
+    assert sum(caminos) == 256
+
+
+def test_rng_para_serie_reproducible_e_independiente(monkeypatch):
+    import calculos_gbm
+    monkeypatch.setattr(calculos_gbm, "_RNG_POR_SERIE", {})
+    a = rng_para_serie("EURUSD", "15M", semilla=123)
+    assert rng_para_serie("EURUSD", "15M", semilla=123) is a
+    muestra_a = a.standard_normal(8)
+    muestra_b = rng_para_serie("GBPUSD", "15M", semilla=123).standard_normal(8)
+    assert not np.array_equal(muestra_a, muestra_b)
+
+    # Otro proceso (caché vacía) reproduce el mismo stream sin importar el orden
+    monkeypatch.setattr(calculos_gbm, "_RNG_POR_SERIE", {})
+    rng_para_serie("GBPUSD", "15M", semilla=123).standard_normal(8)
+    assert np.array_equal(rng_para_serie("EURUSD", "15M", semilla=123).standard_normal(8), muestra_a)
+
+
+# ============================================================
+# Simulación conjunta correlacionada
+# ============================================================
+
+def test_cesta_entre_independiente_y_perfectamente_correlacionada():
+    """Sin correlación la cesta es p·p; con correlación perfecta, la marginal p (forma cerrada)."""
+    p = gbm_analitico(1.09, 0.0, 0.0008, n_horizonte=1)["gbm_prob_reversion"]
+    sigmas = [0.0008, 0.0008]
+    indep = simular_prob_cesta(sigmas, np.eye(2), n_horizonte=1, n_paths=50_000, rng=np.random.default_rng(1))
+    corr = simular_prob_cesta(sigmas, np.array([[1.0, 0.95], [0.95, 1.0]]), n_horizonte=1,
+                              n_paths=50_000, rng=np.random.default_rng(1))
+    perfecta = simular_prob_cesta(sigmas, np.ones((2, 2)), n_horizonte=1, n_paths=50_000,
+                                  rng=np.random.default_rng(1))
+    assert abs(indep - p * p) < 0.01
+    assert corr > indep + 0.05
+    assert abs(perfecta - p) < 0.01
+
+
+def test_cesta_correlacion_singular():
+    """Pares colineales (Corr no definida positiva) no deben romper la factorización."""
+    r = simular_prob_cesta([0.001] * 3, np.ones((3, 3)), n_horizonte=5, n_paths=256,
+                           rng=np.random.default_rng(2))
+    assert 0.0 <= r <= 1.0
+
+
+def _cov(symbols, rho=0.6, sigma=0.001):
+    k = len(symbols)
+    return sigma ** 2 * (rho * np.ones((k, k)) + (1 - rho) * np.eye(k))
+
+
+def test_resolver_conjunto_solo_agrega_la_cesta():
+    symbols = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD"]
+    filas = {sym: {} for sym in ["EURUSD", "GBPUSD", "USDJPY", "XAUUSD"]}
+    pendientes = {
+        "EURUSD": (filas["EURUSD"], 0.0, 0.0008, 1.09, 12),
+        "GBPUSD": (filas["GBPUSD"], 0.0001, 0.001, 1.27, 12),
+        "USDJPY": (filas["USDJPY"], 0.0, 0.0, 150.0, 12),     # sigma inválido
+        "XAUUSD": (filas["XAUUSD"], 0.0, 0.002, 2400.0, 12),  # fuera de la covarianza
+    }
+    assert resolver_gbm_conjunto(pendientes, _cov(symbols), symbols, rng=np.random.default_rng(0)) == 2
+
+    for sym in ("EURUSD", "GBPUSD"):
+        assert set(filas[sym]) == {"gbm_prob_cesta", "gbm_cesta_pares"}
+        assert filas[sym]["gbm_cesta_pares"] == 2
+        assert 0.0 <= filas[sym]["gbm_prob_cesta"] <= 1.0
+    assert filas["EURUSD"]["gbm_prob_cesta"] == filas["GBPUSD"]["gbm_prob_cesta"]
+    assert filas["USDJPY"] == {} and filas["XAUUSD"] == {}
+
+
+def test_campos_por_par_no_dependen_de_la_cesta():
+    """Un par anómalo recibe los mismos campos GBM (motor analítico) solo o con otro par anómalo."""
+    symbols = ["EURUSD", "GBPUSD"]
+    solo, con_otro, otro = {}, {}, {}
+    resolver_gbm_lote([(solo, 0.0, 0.0008, 1.09, 12)], metodo="analitico")
+    pendientes = {"EURUSD": (con_otro, 0.0, 0.0008, 1.09, 12), "GBPUSD": (otro, 0.0001, 0.001, 1.27, 12)}
+    resolver_gbm_lote(list(pendientes.values()), metodo="analitico")
+    resolver_gbm_conjunto(pendientes, _cov(symbols), symbols, rng=np.random.default_rng(0))
+    assert {k: v for k, v in con_otro.items() if "cesta" not in k} == solo
+    assert con_otro["gbm_cesta_pares"] == 2
+
+
+def test_resolver_conjunto_un_solo_par_no_simula():
+    fila = {}
+    pendientes = {"EURUSD": (fila, 0.0, 0.0008, 1.09, 12)}
+    assert resolver_gbm_conjunto(pendientes, _cov(["EURUSD", "GBPUSD"]), ["EURUSD", "GBPUSD"]) == 0
+    assert fila == {}
+    assert resolver_gbm_conjunto(pendientes, None, []) == 0
@@ -7,6 +7,7 @@ from calculos_multipair import (
     calcular_covarianza,
     calcular_pca,
     detectar_exposicion_usd,
+    calcular_correlacion,
     calcular_correlacion_con_eurusd,
     calcular_zscores_vectorizados,
     es_movimiento_sistemico,
@@ -163,6 +164,25 @@ def test_exposicion_retorna_todos_los_simbolos():
     assert set(exp.keys()) == set(SYMBOLS)
 
 
+# ============================================================
+# calcular_correlacion()
+# ============================================================
+
+def test_matriz_correlacion_igual_a_numpy():
+    """Debe coincidir con np.corrcoef sobre la misma matriz de retornos."""
+    R, _, _ = construir_matriz_retornos(_make_dfs())
+    corr = calcular_correlacion(calcular_covarianza(R))
+    assert np.allclose(corr, np.corrcoef(R, rowvar=False))
+    assert np.array_equal(np.diag(corr), np.ones(len(SYMBOLS)))
+
+
+def test_matriz_correlacion_varianza_cero():
+    """Una serie constante no produce NaN: diagonal 1, fuera de ella 0."""
+    cov = np.array([[1e-6, 0.0], [0.0, 0.0]])
+    corr = calcular_correlacion(cov)
+    assert np.array_equal(corr, np.eye(2))
+
+
 # ============================================================
 # calcular_correlacion_con_eurusd()
 # ============================================================
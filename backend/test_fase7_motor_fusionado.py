@@ -0,0 +1,72 @@
+# test_fase7_motor_fusionado.py — Motor fusionado vs cadena de 6 funciones
+import pytest
+import numpy as np
+import pandas as pd
+from calculos_rendlog import calcular_rendimientos_log, calcular_bandas_sigma, calcular_efficiency_ratio
+from calculos_orderflow import calcular_delta_volumen, calcular_volumen_relativo, detectar_anomalia_volumen
+from calculos_fusion import calcular_columnas, calcular_estadisticas_df, COLUMNAS_ESTADISTICAS
+
+
+def _make_ohlcv(n, seed=0):
+    """DataFrame OHLCV sintético con formato de obtener_datos_historicos()."""
+    rng = np.random.default_rng(seed)
+    close = 1.08 + np.cumsum(rng.normal(0, 0.0005, n))
+    if n > 14:
+        close[10:14] = close[10]   # tramo plano: dojis + ER = 0
+    return pd.DataFrame({
+        'time':        pd.date_range('2026-01-01', periods=n, freq='1min'),
+        'open':        np.r_[close[0], close[:-1]],
+        'high':        close + 0.0001,
+        'low':         close - 0.0001,
+        'close':       close,
+        'tick_volume': rng.integers(10, 500, n).astype(np.uint64),
+    })
+
+
+def _cadena(df, ventana, timeframe, symbol):
+    """Cadena original de main.calcular_estadisticas()."""
+    df = calcular_rendimientos_log(df)
+    df = calcular_bandas_sigma(df, ventana=ventana, timeframe=timeframe, symbol=symbol)
+    df = calcular_delta_volumen(df)
+    df = calcular_volumen_relativo(df, ventana=min(ventana, 20))
+    df = detectar_anomalia_volumen(df, ventana=ventana)
+    df = calcular_efficiency_ratio(df)
+    return df
+
+
+@pytest.mark.parametrize("n,ventana,tf,symbol", [
+    (60, 20, "1M", "EURUSD"),
+    (60, 14, "4H", "USDJPY"),
+    (1000, 20, "30M", None),
+])
+def test_mismo_dataframe_que_la_cadena(n, ventana, tf, symbol):
+    """El adaptador debe devolver las mismas columnas, dtypes y valores que la cadena."""
+    df = _make_ohlcv(n)
+    esperado = _cadena(df, ventana, tf, symbol)
+    obtenido = calcular_estadisticas_df(df, ventana=ventana, timeframe=tf, symbol=symbol)
+    pd.testing.assert_frame_equal(esperado, obtenido, check_exact=False, rtol=1e-9)
+
+
+def test_columnas_completas():
+    df = _make_ohlcv(60)
+    cols = calcular_columnas(df['open'].values, df['close'].values, df['tick_volume'].values)
+    assert set(cols.keys()) == set(COLUMNAS_ESTADISTICAS)
+    assert all(len(v) == 60 for v in cols.values())
+
+
+def test_volumen_constante_no_genera_anomalia():
+    """σ de volumen = 0 → z_score NaN se rellena con 0 y no hay anomalía."""
+    df = _make_ohlcv(60)
+    df['tick_volume'] = np.uint64(100)
+    cols = calcular_columnas(df['open'].values, df['close'].values, df['tick_volume'].values)
+    assert not cols['anomalia_volumen'].any()
+    assert np.all(cols['z_score_volumen'] == 0)
+    assert np.all(cols['volumen_relativo'] == 1.0)
+
+
+def test_serie_muy_corta():
+    """Menos velas que la ventana → sin excepciones, columnas móviles en NaN."""
+    df = _make_ohlcv(5)
+    obtenido = calcular_estadisticas_df(df, ventana=20, timeframe="1M")
+    esperado = _cadena(df, 20, "1M", None)
+    pd.testing.assert_frame_equal(esperado, obtenido, check_exact=False, rtol=1e-9)
@@ -0,0 +1,88 @@
+# test_fase8_serializacion.py — build_rows columnar vs versión original con iterrows()
+import pytest
+import numpy as np
+import pandas as pd
+import calculos_gbm
+import serializacion
+from config import DEFAULT_CONFIG
+from serializacion import build_rows
+from bench_build_rows import build_rows_iterrows, make_df_calculado
+
+PCA_SISTEMICO = {"pca_valido": True, "pc1_varianza": 0.7, "pc1_loadings": {"EURUSD": 0.8}}
+PCA_NO_SISTEMICO = {"pca_valido": True, "pc1_varianza": 0.4, "pc1_loadings": {"EURUSD": 0.5}}
+
+
+@pytest.fixture(autouse=True)
+def _gbm_con_estado_global(monkeypatch):
+    """build_rows sortea el GBM con rng_para_serie(); la referencia, con np.random: el mismo stream en ambas."""
+    monkeypatch.setattr(serializacion, "rng_para_serie", lambda *args, **kwargs: None)
+
+
+def _comparar(df, pca_result=None, exposure=None, config=DEFAULT_CONFIG):
+    np.random.seed(1)
+    esperado = build_rows_iterrows(df, config, "1M", "EURUSD", pca_result, exposure)
+    np.random.seed(1)
+    obtenido = build_rows(df, config, "1M", "EURUSD", pca_result, exposure)
+    assert obtenido == esperado
+
+
+@pytest.mark.parametrize("pca_result", [None, PCA_SISTEMICO, PCA_NO_SISTEMICO])
+def test_misma_salida_que_iterrows(pca_result):
+    _comparar(make_df_calculado(300), pca_result, {"EURUSD": True})
+
+
+def test_umbrales_de_usuario():
+    config = dict(DEFAULT_CONFIG, umbral_sigma_compra=-1.0, umbral_sigma_venta=1.5)
+    _comparar(make_df_calculado(200), PCA_SISTEMICO, config=config)
+
+
+def test_nan_e_inf_saneados():
+    """NaN/Inf en columnas numéricas deben sanearse igual que _safe_float fila a fila."""
+    df = make_df_calculado(100).reset_index(drop=True)
+    df.loc[3, 'media'] = np.nan
+    df.loc[4, 'std'] = 0.0
+    df.loc[5, 'banda_2sigma_superior'] = np.inf
+    df.loc[6, 'efficiency_ratio'] = np.nan
+    df.loc[7, 'volumen_relativo'] = np.nan
+    df.loc[8, 'z_score_volumen'] = np.nan
+    df.loc[9, 'vol_ratio'] = -np.inf
+    _comparar(df)
+
+
+def test_columnas_ausentes():
+    """Sin columnas de orderflow ni ER deben usarse los defaults."""
+    df = make_df_calculado(50)[['time', 'close', 'log_return', 'media', 'std', 'std_static']]
+    _comparar(df)
+
+
+def test_timestamp_iso_con_fracciones():
+    df = make_df_calculado(20).reset_index(drop=True)
+    df['time'] = df['time'] + pd.Timedelta(milliseconds=250)
+    rows = build_rows(df, DEFAULT_CONFIG, "1M", "EURUSD")
+    assert rows[0]['data_timestamp'] == df['time'].iloc[0].isoformat()
+
+
+def test_tipos_nativos_para_json():
+    rows = build_rows(make_df_calculado(60), DEFAULT_CONFIG, "1M", "EURUSD")
+    r = rows[-1]
+    assert type(r['rendlog']['z_score']) is float
+    assert type(r['orderflow']['delta']) is int
+    assert type(r['orderflow']['tick_volume']) is int
+    assert type(r['orderflow']['anomalia_vol']) is bool
+
+
+def test_slice_vacio():
+    assert build_rows(make_df_calculado(60).iloc[0:0], DEFAULT_CONFIG, "1M", "EURUSD") == []
+
+
+def test_gbm_diferido_al_lote_igual_a_por_fila(monkeypatch):
+    """build_rows(gbm_pendientes=...) + resolver_gbm_lote debe dar las mismas filas (motor analítico)."""
+    from calculos_gbm import resolver_gbm_lote
+    monkeypatch.setattr(calculos_gbm, "GBM_METODO", "analitico")
+    df = make_df_calculado(500)
+    directo = build_rows(df, DEFAULT_CONFIG, "5M", "EURUSD")
+    pendientes = []
+    diferido = build_rows(df, DEFAULT_CONFIG, "5M", "EURUSD", gbm_pendientes=pendientes)
+    assert pendientes, "El fixture debe contener anomalías"
+    resolver_gbm_lote(pendientes, metodo="analitico")
+    assert diferido == directo
@@ -0,0 +1,106 @@
+# test_fase9_buffer_velas.py — Tests del buffer circular de velas (BufferVelas)
+import pytest
+import numpy as np
+import pandas as pd
+from buffer_velas import BufferVelas
+from config import BROKER_UTC_OFFSET_HOURS
+
+# dtype de copy_rates_* en MetaTrader5
+DTYPE_RATES = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+    ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8"),
+])
+PASO = 15 * 60
+
+
+def _rates(n, inicio=1_767_225_600, seed=0):
+    """Rates sintéticos de MT5: n velas de 15M consecutivas."""
+    rng = np.random.default_rng(seed)
+    rates = np.zeros(n, dtype=DTYPE_RATES)
+    rates["time"] = inicio + PASO * np.arange(n)
+    close = 1.09 * np.exp(np.cumsum(rng.normal(0, 0.0005, n)))
+    rates["open"] = np.concatenate([[1.09], close[:-1]])
+    rates["close"] = close
+    rates["high"] = np.maximum(rates["open"], close) + 0.0002
+    rates["low"] = np.minimum(rates["open"], close) - 0.0002
+    rates["tick_volume"] = rng.integers(50, 500, n)
+    return rates
+
+
+def _df_mt5(rates):
+    """Mismo DataFrame que obtener_datos_historicos() construye a partir de los rates."""
+    df = pd.DataFrame(rates)
+    df['time'] = pd.to_datetime(df['time'], unit='s') - pd.Timedelta(hours=BROKER_UTC_OFFSET_HOURS)
+    return df[['time', 'open', 'high', 'low', 'close', 'tick_volume']]
+
+
+def test_sembrado_igual_a_dataframe_mt5():
+    rates = _rates(60)
+    buffer = BufferVelas.desde_rates(rates, capacidad=60)
+    pd.testing.assert_frame_equal(buffer.dataframe(), _df_mt5(rates))
+    assert len(buffer) == 60
+    assert buffer.ultimo_time == _df_mt5(rates)['time'].iloc[-1]
+
+
+@pytest.mark.parametrize("por_paso", [1, 3, 7])
+def test_agregar_incremental_igual_a_ventana_completa(por_paso):
+    """Tras dar la vuelta al anillo varias veces, la ventana coincide con pedir las últimas 60."""
+    todas = _rates(200)
+    buffer = BufferVelas.desde_rates(todas[:60], capacidad=60)
+    fin = 60
+    while fin < len(todas):
+        nuevo_fin = min(fin + por_paso, len(todas))
+        # copy_rates_range desde el último time: incluye la última vela ya almacenada
+        assert buffer.actualizar(todas[fin - 1:nuevo_fin]) == nuevo_fin - fin
+        fin = nuevo_fin
+        pd.testing.assert_frame_equal(buffer.dataframe(), _df_mt5(todas[fin - 60:fin]))
+
+
+def test_vela_en_formacion_se_sobrescribe():
+    rates = _rates(10)
+    buffer = BufferVelas.desde_rates(rates, capacidad=10)
+    actualizada = rates[-1:].copy()
+    actualizada["close"] = 1.2
+    actualizada["tick_volume"] = 999
+    assert buffer.actualizar(actualizada) == 0
+    assert buffer.columna("close")[-1] == 1.2
+    assert buffer.columna("tick_volume")[-1] == 999
+    assert len(buffer) == 10
+
+
+def test_velas_antiguas_se_ignoran():
+    rates = _rates(20)
+    buffer = BufferVelas.desde_rates(rates[10:], capacidad=10)
+    assert buffer.actualizar(rates[:9]) == 0
+    pd.testing.assert_frame_equal(buffer.dataframe(), _df_mt5(rates[10:]))
+
+
+def test_mas_velas_que_capacidad():
+    rates = _rates(100)
+    buffer = BufferVelas.desde_rates(rates[:5], capacidad=8)
+    assert buffer.actualizar(rates[5:]) == 95
+    pd.testing.assert_frame_equal(buffer.dataframe(), _df_mt5(rates[-8:]))
+
+
+def test_buffer_parcial_y_ventana_n():
+    rates = _rates(30)
+    buffer = BufferVelas.desde_rates(rates[:20], capacidad=50)
+    assert len(buffer) == 20
+    buffer.actualizar(rates[19:])
+    pd.testing.assert_frame_equal(buffer.dataframe(12), _df_mt5(rates[-12:]))
+
+
+def test_columna_es_vista_contigua_sin_copia():
+    buffer = BufferVelas.desde_rates(_rates(70), capacidad=60)
+    close = buffer.columna("close")
+    assert close.flags["C_CONTIGUOUS"]
+    assert np.shares_memory(close, buffer.columna("close", 5))
+
+
+def test_vacio_y_capacidad_invalida():
+    buffer = BufferVelas(5)
+    assert buffer.ultimo_epoch is None and buffer.ultimo_time is None
+    assert buffer.actualizar(None) == 0
+    assert buffer.dataframe().empty
+    with pytest.raises(ValueError):
+        BufferVelas(0)